@@ -0,0 +1,64 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the program generation throughput for each assertion tier.
+# The tiers are fixed when the modules are imported, hence each tier is measured in a separate Python process.
+
+from params.runparams import PATH_TO_TMP, ASSERT_TIERS
+from common.designcfgs import get_design_boot_addr
+from cascade.basicblock import gen_basicblocks
+import common.profiledesign
+from common.profiledesign import profile_get_medeleg_mask
+
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+ASSERTTIERPERF_MEMSIZE = 1 << 18
+ASSERTTIERPERF_NMAX_BBS = 50
+
+# @brief Generates programs in the current process and prints, as a json line, the number of instructions and the generation duration of each program.
+# @param medeleg_mask the mask profiled by the parent process, see profile_get_medeleg_mask. The profiling requires an RTL simulation, hence it is not repeated for each tier.
+def _measure_gen_throughput(design_name: str, num_instances: int, randseed_base: int, medeleg_mask):
+    from cascade.fuzzerstate import FuzzerState
+    common.profiledesign.PROFILED_MEDELEG_MASK = medeleg_mask
+    num_instrs, durations = [], []
+    for randseed in range(randseed_base, randseed_base + num_instances):
+        random.seed(randseed)
+        start = time.time()
+        fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, ASSERTTIERPERF_MEMSIZE, randseed, ASSERTTIERPERF_NMAX_BBS, True)
+        gen_basicblocks(fuzzerstate)
+        durations.append(time.time() - start)
+        num_instrs.append(fuzzerstate.get_num_fuzzing_instructions_sofar())
+    print(json.dumps({'num_instrs': num_instrs, 'durations': durations}))
+
+# @brief Measures the generation throughput for each assertion tier, on the same program descriptors.
+# Also checks that the assertion tier does not influence the generated programs.
+# @return a dict: tier name -> generated instructions per second
+def benchmark_assert_tiers(design_name: str, num_instances: int, randseed_base: int = 0):
+    fuzzer_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    profile_get_medeleg_mask(design_name)
+    medeleg_mask = common.profiledesign.PROFILED_MEDELEG_MASK
+    results = dict()
+    ref_num_instrs = None
+    for tier_name in ASSERT_TIERS:
+        cmd = [sys.executable, '-c', f"from benchmarking.asserttierperf import _measure_gen_throughput; _measure_gen_throughput('{design_name}', {num_instances}, {randseed_base}, {medeleg_mask})"]
+        proc = subprocess.run(cmd, cwd=fuzzer_root, env={**os.environ, 'CASCADE_ASSERT_TIER': tier_name}, capture_output=True, text=True)
+        if proc.returncode:
+            raise Exception(f"Generation failed for assertion tier `{tier_name}`:\n{proc.stderr}")
+        tier_results = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        if ref_num_instrs is None:
+            ref_num_instrs = tier_results['num_instrs']
+        assert tier_results['num_instrs'] == ref_num_instrs, f"The assertion tier `{tier_name}` changed the generated programs."
+
+        results[tier_name] = sum(tier_results['num_instrs']) / sum(tier_results['durations'])
+        print(f"{tier_name:>9} assertions: {results[tier_name]:10.0f} generated instructions/s")
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, f"asserttierperf_{design_name}.json"), 'w'))
+    print('Saved assertion tier performance results to', os.path.join(PATH_TO_TMP, f"asserttierperf_{design_name}.json"))
+    return results
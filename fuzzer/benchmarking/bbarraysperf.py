@@ -0,0 +1,89 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the encoding throughput of the basic block instructions of each test instance,
+# when the instruction objects are encoded one by one through gen_bytecode_int, and when they are encoded in one pass from their structure-of-arrays representation (see cascade/bbarrays.py).
+# It also checks that both encodings are identical, and that the instruction objects are rebuilt identically from the arrays.
+
+from params.runparams import PATH_TO_TMP
+from common.designcfgs import get_design_boot_addr
+from common.spike import calibrate_spikespeed
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.bbarrays import BasicBlockArrays
+from cascade.cfinstructionclasses import get_instr_obj_attrs
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.spikeresolution import spike_resolution
+
+import itertools
+import json
+import numpy as np
+import os
+import random
+import time
+
+# Number of repetitions of each measured encoding.
+BBARRAYSPERF_NUM_REPS = 10
+
+# @return the mean duration of the function call, in seconds.
+def _measure_seconds(fn):
+    start = time.perf_counter()
+    for _ in range(BBARRAYSPERF_NUM_REPS):
+        fn()
+    return (time.perf_counter() - start) / BBARRAYSPERF_NUM_REPS
+
+# @brief Checks that the rebuilt objects have the same class and attributes as the original ones.
+def _check_roundtrip(instr_objs: list, rebuilt_instr_objs: list, instance_str: str):
+    assert len(instr_objs) == len(rebuilt_instr_objs)
+    for instr_obj, rebuilt_instr_obj in zip(instr_objs, rebuilt_instr_objs):
+        assert type(instr_obj) is type(rebuilt_instr_obj) and get_instr_obj_attrs(instr_obj) == get_instr_obj_attrs(rebuilt_instr_obj), f"Mismatch between the original and the rebuilt instruction objects for instance {instance_str}: {get_instr_obj_attrs(instr_obj)} vs. {get_instr_obj_attrs(rebuilt_instr_obj)}."
+
+# @brief Compares the object-wise and the structure-of-arrays encodings of the basic block instructions of the same instances.
+# @param num_instances the number of test instances.
+def benchmark_bb_arrays(design_name: str, num_instances: int, randseed_base: int = 0):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_instances > 0
+
+    calibrate_spikespeed()
+    profile_get_medeleg_mask(design_name)
+
+    results = []
+    for instance_id in range(num_instances):
+        randseed = randseed_base + instance_id
+        memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+        random.seed(randseed)
+        fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+        gen_basicblocks(fuzzerstate)
+        # The arrays are also built before the resolution, where the placeholder offsets are unknown.
+        _check_roundtrip(fuzzerstate.instr_objs_seq[-1], BasicBlockArrays.from_instrs(fuzzerstate.instr_objs_seq[-1]).to_instrs(), fuzzerstate.instance_to_str())
+        spike_resolution(fuzzerstate)
+
+        instr_objs = list(itertools.chain(*fuzzerstate.instr_objs_seq))
+        bb_arrays = BasicBlockArrays.from_instrs(instr_objs)
+        _check_roundtrip(instr_objs, bb_arrays.to_instrs(), fuzzerstate.instance_to_str())
+
+        curr_result = {'num_instrs': len(instr_objs), 'num_opaque_instrs': len(bb_arrays.opaque_objs)}
+        for is_spike_resolution in (True, False):
+            mode_name = 'spike' if is_spike_resolution else 'rtl'
+            words_objs = np.array([instr_obj.gen_bytecode_int(is_spike_resolution) for instr_obj in instr_objs], dtype='<u4')
+            assert np.array_equal(words_objs, bb_arrays.encode(is_spike_resolution)), f"Mismatch between the object-wise and the structure-of-arrays encodings for instance {fuzzerstate.instance_to_str()}."
+            curr_result[f"{mode_name}_objs_seconds"] = _measure_seconds(lambda: np.array([instr_obj.gen_bytecode_int(is_spike_resolution) for instr_obj in instr_objs], dtype='<u4'))
+            curr_result[f"{mode_name}_arrays_seconds"] = _measure_seconds(lambda: bb_arrays.encode(is_spike_resolution))
+            # Encoding each basic block from its own arrays, to show the fixed cost of the vectorized operations.
+            bbs_arrays = [BasicBlockArrays.from_instrs(bb_instrs) for bb_instrs in fuzzerstate.instr_objs_seq]
+            curr_result[f"{mode_name}_arrays_per_bb_seconds"] = _measure_seconds(lambda: [curr_bb_arrays.encode(is_spike_resolution) for curr_bb_arrays in bbs_arrays])
+        curr_result['from_instrs_seconds'] = _measure_seconds(lambda: BasicBlockArrays.from_instrs(instr_objs))
+        curr_result['to_instrs_seconds'] = _measure_seconds(lambda: bb_arrays.to_instrs())
+        results.append(curr_result)
+
+    json_path = os.path.join(PATH_TO_TMP, f"bbarraysperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, 'instances': results}, f)
+    print('Saved basic block arrays results to', json_path)
+
+    tot_num_instrs = sum(r['num_instrs'] for r in results)
+    print(f"{tot_num_instrs/num_instances:.0f} basic block instructions per instance, of which {100*sum(r['num_opaque_instrs'] for r in results)/tot_num_instrs:.1f}% opaque")
+    for stat_name in ('spike_objs_seconds', 'spike_arrays_seconds', 'spike_arrays_per_bb_seconds', 'rtl_objs_seconds', 'rtl_arrays_seconds', 'rtl_arrays_per_bb_seconds', 'from_instrs_seconds', 'to_instrs_seconds'):
+        print(f"{stat_name:>27}: {tot_num_instrs/sum(r[stat_name] for r in results)/1e6:.2f} M instructions per second")
+    return results
@@ -0,0 +1,59 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the retries of the basic block generation with full resets and with rollbacks to checkpoints (see gen_basicblocks in cascade/basicblock.py).
+# The retries are rare with the default memory sizes, hence the memory size can be fixed to a small value to provoke them.
+
+from params.runparams import PATH_TO_TMP
+from common.designcfgs import get_design_boot_addr
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks, get_bbgen_retry_stats, reset_bbgen_retry_stats
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+
+import json
+import os
+import random
+import time
+
+# @brief Generates the same instances with full resets and with rollbacks.
+# @param num_instances the number of test instances.
+# @param memsize if not None, the memory size of all the instances.
+def benchmark_bbgen_retries(design_name: str, num_instances: int, memsize: int = None, randseed_base: int = 0):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_instances > 0
+    profile_get_medeleg_mask(design_name)
+
+    prev_env_val = os.environ.get('CASCADE_BBGEN_ROLLBACK')
+    results = {}
+    try:
+        for mode_name, use_rollback in (('reset', False), ('rollback', True)):
+            os.environ['CASCADE_BBGEN_ROLLBACK'] = str(int(use_rollback))
+            reset_bbgen_retry_stats()
+            gen_seconds = 0
+            for instance_id in range(num_instances):
+                randseed = randseed_base + instance_id
+                # Both modes generate the same instances.
+                random.seed(randseed)
+                curr_memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True, memsize)
+                random.seed(randseed)
+                start = time.perf_counter()
+                fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, curr_memsize, randseed, nmax_bbs, authorize_privileges)
+                gen_basicblocks(fuzzerstate)
+                gen_seconds += time.perf_counter() - start
+            results[mode_name] = {'gen_seconds': gen_seconds, **get_bbgen_retry_stats()}
+    finally:
+        if prev_env_val is None:
+            del os.environ['CASCADE_BBGEN_ROLLBACK']
+        else:
+            os.environ['CASCADE_BBGEN_ROLLBACK'] = prev_env_val
+
+    json_path = os.path.join(PATH_TO_TMP, f"bbgenretryperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, 'memsize': memsize, **results}, f)
+    print('Saved generation retry results to', json_path)
+
+    for mode_name, mode_results in results.items():
+        print(f"{mode_name:>8}: {mode_results['num_full_resets']} full resets, {mode_results['num_rollbacks']} rollbacks ({mode_results['num_rolled_back_bbs']} basic blocks) for {mode_results['num_generations']} generations, "
+            f"retries {1e3*mode_results['retry_seconds']/num_instances:.2f} ms of {1e3*mode_results['gen_seconds']/num_instances:.2f} ms per instance")
+    return results
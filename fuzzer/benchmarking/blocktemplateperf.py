@@ -0,0 +1,108 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the per-instance savings of the initial and final block templates (see cascade/initialblock.py and cascade/finalblock.py),
+# and checks that the programs and memory images are identical with and without templates.
+
+from params.runparams import PATH_TO_TMP
+from common.designcfgs import get_design_boot_addr
+from common.spike import SPIKE_STARTADDR
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.initialblock import gen_initial_basic_block
+from cascade.finalblock import finalblock
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.genelf import gen_memimage_from_bbs
+from cascade.spikeresolution import prepare_spike_resolution
+
+import json
+import os
+import random
+import time
+
+# Number of repetitions of the measured steps for each instance.
+BLOCKTEMPLATEPERF_NUM_REPS = 10
+
+# @brief Generates an instance and measures the construction of its initial block, of its final block and of its memory image.
+# @return a pair (dict of durations in seconds, program signature)
+def _measure_instance(design_name: str, randseed: int, use_templates: bool):
+    from cascade.fuzzerstate import FuzzerState
+    os.environ['CASCADE_BLOCK_TEMPLATES'] = str(int(use_templates))
+    # Both modes generate the same instances.
+    random.seed(randseed)
+    memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+
+    # Initial block, on fresh fuzzerstates
+    initial_block_seconds = 0
+    for rep_id in range(BLOCKTEMPLATEPERF_NUM_REPS):
+        random.seed(randseed)
+        fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+        fuzzerstate.reset()
+        start = time.perf_counter()
+        gen_initial_basic_block(fuzzerstate, SPIKE_STARTADDR)
+        initial_block_seconds += time.perf_counter() - start
+
+    random.seed(randseed)
+    fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+    gen_basicblocks(fuzzerstate)
+    random_state = random.getstate()
+    prepare_spike_resolution(fuzzerstate)
+
+    # Final block. The final block may activate the FPU, which is restored after each repetition.
+    final_block_seconds = 0
+    is_fpu_activated = getattr(fuzzerstate, 'is_fpu_activated', None)
+    for rep_id in range(BLOCKTEMPLATEPERF_NUM_REPS):
+        start = time.perf_counter()
+        finalblock(fuzzerstate, design_name)
+        final_block_seconds += time.perf_counter() - start
+        fuzzerstate.is_fpu_activated = is_fpu_activated
+
+    # Memory image, where the template bytes replace the encoding of the template instructions.
+    memimage_seconds = 0
+    for rep_id in range(BLOCKTEMPLATEPERF_NUM_REPS):
+        start = time.perf_counter()
+        memimage = gen_memimage_from_bbs(fuzzerstate, True)
+        memimage_seconds += time.perf_counter() - start
+
+    durations = {
+        'initial_block_seconds': initial_block_seconds / BLOCKTEMPLATEPERF_NUM_REPS,
+        'final_block_seconds': final_block_seconds / BLOCKTEMPLATEPERF_NUM_REPS,
+        'memimage_seconds': memimage_seconds / BLOCKTEMPLATEPERF_NUM_REPS,
+    }
+    signature = (random_state, bytes(memimage), [instr_obj.gen_bytecode_int(False) for instr_obj in fuzzerstate.final_bb], is_fpu_activated)
+    return durations, signature
+
+# @brief Measures the same instances with and without block templates.
+# @param num_instances the number of test instances.
+def benchmark_block_templates(design_name: str, num_instances: int, randseed_base: int = 0):
+    assert num_instances > 0
+    profile_get_medeleg_mask(design_name)
+
+    prev_env_val = os.environ.get('CASCADE_BLOCK_TEMPLATES')
+    results = {'rebuilt': [], 'templates': []}
+    try:
+        for instance_id in range(num_instances):
+            ref_signature = None
+            for mode_name, use_templates in (('rebuilt', False), ('templates', True)):
+                durations, signature = _measure_instance(design_name, randseed_base + instance_id, use_templates)
+                if ref_signature is None:
+                    ref_signature = signature
+                assert signature == ref_signature, f"Mismatch between the programs with and without block templates for seed {randseed_base + instance_id}."
+                results[mode_name].append(durations)
+    finally:
+        if prev_env_val is None:
+            del os.environ['CASCADE_BLOCK_TEMPLATES']
+        else:
+            os.environ['CASCADE_BLOCK_TEMPLATES'] = prev_env_val
+
+    json_path = os.path.join(PATH_TO_TMP, f"blocktemplateperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, **results}, f)
+    print('Saved block template results to', json_path)
+
+    for mode_name, mode_results in results.items():
+        print(f"{mode_name:>9}: " + ', '.join(f"{stat_name[:-len('_seconds')]} {1e6*sum(r[stat_name] for r in mode_results)/num_instances:.1f} us" for stat_name in mode_results[0]))
+    savings_seconds = sum(sum(r.values()) for r in results['rebuilt']) - sum(sum(r.values()) for r in results['templates'])
+    print(f"Savings: {1e6*savings_seconds/num_instances:.1f} us per instance")
+    return results
@@ -0,0 +1,115 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the per-instruction overhead removed by the design profile (see cascade/designprofile.py).
+# Each instruction type pick of the generation is also taken by filtering the weights of the design again, like before the profile, from the same random state, and both must pick the same instruction.
+# It also measures the construction of the profile, the design capability queries that it replaces, and the pickling of the profile for the pool workers.
+
+from params.runparams import PATH_TO_TMP
+from common.designcfgs import get_design_boot_addr, is_design_32bit, design_has_float_support, design_has_double_support, design_has_muldiv_support, design_has_atop_support, design_has_misaligned_data_support, design_has_supervisor_mode, design_has_user_mode, design_has_compressed_support, design_has_pmp
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.designprofile import build_design_profile, get_design_profile
+from cascade.randomize.pickinstrtype import gen_instrtype_weights
+import cascade.basicblock
+
+import json
+import os
+import pickle
+import random
+import time
+
+# Number of repetitions of the per-design measurements.
+DESIGNPROFILEPERF_NUM_REPS = 100
+
+# @brief Replaces the instruction type picks of the basic block generation, and compares the picks with and without the design profile from the same random state.
+class _ComparingInstrTypePicker:
+    def __init__(self, gen_next_instrstr_from_isaclass):
+        self.gen_next_instrstr_from_isaclass = gen_next_instrstr_from_isaclass
+        self.num_picks = 0
+        self.profile_seconds = 0
+        self.filtered_seconds = 0
+
+    def __call__(self, isaclass, fuzzerstate):
+        random_state = random.getstate()
+        start = time.perf_counter()
+        keys_and_weights_dict = gen_instrtype_weights(isaclass, fuzzerstate.design_name)
+        filtered_ret = None
+        while filtered_ret is None or keys_and_weights_dict[filtered_ret] == 0:
+            filtered_ret = random.choices(list(keys_and_weights_dict.keys()), weights=keys_and_weights_dict.values())[0]
+        self.filtered_seconds += time.perf_counter() - start
+
+        random.setstate(random_state)
+        start = time.perf_counter()
+        profile_ret = self.gen_next_instrstr_from_isaclass(isaclass, fuzzerstate)
+        self.profile_seconds += time.perf_counter() - start
+
+        assert profile_ret == filtered_ret, f"Mismatch between the instruction type picks with and without the design profile of {fuzzerstate.instance_to_str()}: {profile_ret} instead of {filtered_ret}."
+        self.num_picks += 1
+        return profile_ret
+
+# @brief The design capability queries of the fuzzer state before the design profile.
+def _query_design_capabilities(design_name: str):
+    return (not is_design_32bit(design_name), design_has_compressed_support(design_name), design_has_float_support(design_name), design_has_double_support(design_name),
+        design_has_muldiv_support(design_name), design_has_atop_support(design_name), design_has_misaligned_data_support(design_name),
+        design_has_supervisor_mode(design_name), design_has_user_mode(design_name), design_has_pmp(design_name))
+
+# @brief Measures a function over DESIGNPROFILEPERF_NUM_REPS calls.
+# @return the mean duration in seconds.
+def _measure_reps(fn, *args):
+    start = time.perf_counter()
+    for _ in range(DESIGNPROFILEPERF_NUM_REPS):
+        fn(*args)
+    return (time.perf_counter() - start) / DESIGNPROFILEPERF_NUM_REPS
+
+# @brief Generates instances while comparing the instruction type picks with and without the design profile, and measures the profile itself.
+# @param num_instances the number of test instances.
+def benchmark_design_profile(design_name: str, num_instances: int, randseed_base: int = 0):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_instances > 0
+    profile_get_medeleg_mask(design_name)
+
+    # Per-design measurements
+    design_profile = get_design_profile(design_name)
+    pickled_profile = pickle.dumps(design_profile)
+    assert pickle.loads(pickled_profile).instrtype_cum_weights == design_profile.instrtype_cum_weights, "The design profile does not survive pickling."
+    profile_stats = {
+        'build_seconds': _measure_reps(build_design_profile, design_name),
+        'capabilities_seconds': _measure_reps(_query_design_capabilities, design_name),
+        'lookup_seconds': _measure_reps(get_design_profile, design_name),
+        'unpickle_seconds': _measure_reps(pickle.loads, pickled_profile),
+        'pickle_size': len(pickled_profile),
+    }
+
+    results = []
+    prev_gen_next_instrstr_from_isaclass = cascade.basicblock.gen_next_instrstr_from_isaclass
+    try:
+        for instance_id in range(num_instances):
+            randseed = randseed_base + instance_id
+            memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+            picker = _ComparingInstrTypePicker(prev_gen_next_instrstr_from_isaclass)
+            cascade.basicblock.gen_next_instrstr_from_isaclass = picker
+            random.seed(randseed)
+            fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+            cascade.basicblock.gen_basicblocks(fuzzerstate)
+            results.append({
+                'num_picks': picker.num_picks,
+                'profile_seconds': picker.profile_seconds,
+                'filtered_seconds': picker.filtered_seconds,
+            })
+    finally:
+        cascade.basicblock.gen_next_instrstr_from_isaclass = prev_gen_next_instrstr_from_isaclass
+
+    json_path = os.path.join(PATH_TO_TMP, f"designprofileperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, 'profile': profile_stats, 'instances': results}, f)
+    print('Saved design profile results to', json_path)
+
+    print(f"Profile: build {1e6*profile_stats['build_seconds']:.1f} us, lookup {1e6*profile_stats['lookup_seconds']:.2f} us instead of {1e6*profile_stats['capabilities_seconds']:.2f} us of capability queries, pickle {profile_stats['pickle_size']} bytes unpickled in {1e6*profile_stats['unpickle_seconds']:.1f} us")
+    num_picks = sum(r['num_picks'] for r in results)
+    print(f"Instruction type picks: {num_picks}")
+    for stat_name in ('filtered_seconds', 'profile_seconds'):
+        print(f"{stat_name[:-len('_seconds')]:>9}: {1e6*sum(r[stat_name] for r in results)/num_picks:.2f} us per pick")
+    print(f"Speedup: {sum(r['filtered_seconds'] for r in results)/sum(r['profile_seconds'] for r in results):.2f}x")
+    return profile_stats, results
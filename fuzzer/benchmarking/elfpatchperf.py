@@ -0,0 +1,87 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module breaks down the construction time of the spike resolution and RTL ELFs of each test instance,
+# where the RTL memory image is either generated from the instructions or derived by patching the spike resolution image (see gen_rtl_memimage_by_patching in cascade/genelf.py).
+# It also checks that both RTL memory images are identical, and that the memory image of the medeleg profiling snippet, which has no random data block, context setter or final block, holds exactly its instructions.
+
+from params.runparams import PATH_TO_TMP
+from common.bytestoelf import gen_elf_bytes
+from common.designcfgs import get_design_boot_addr
+from common.spike import calibrate_spikespeed, SPIKE_STARTADDR
+from common.profiledesign import profile_get_medeleg_mask, __gen_medeleg_profiling_snippet
+from cascade.basicblock import gen_basicblocks
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.genelf import gen_memimage_from_bbs, gen_patchable_memimage_from_bbs, gen_rtl_memimage_by_patching
+from cascade.spikeresolution import spike_resolution
+
+import json
+import os
+import random
+import time
+
+# @brief Checks the memory image of the medeleg profiling snippet against the image built instruction by instruction.
+def _check_medeleg_profiling_memimage(design_name: str):
+    fuzzerstate = __gen_medeleg_profiling_snippet(design_name)
+    expected_memimage = bytearray(fuzzerstate.memsize)
+    for bb_start_addr, bb_instrs in zip(fuzzerstate.bb_start_addr_seq, fuzzerstate.instr_objs_seq):
+        for instr_id, instr_obj in enumerate(bb_instrs):
+            expected_memimage[bb_start_addr+4*instr_id:bb_start_addr+4*instr_id+4] = instr_obj.gen_bytecode_int(False).to_bytes(4, 'little') # NO_COMPRESSED
+    assert gen_memimage_from_bbs(fuzzerstate, False) == expected_memimage, f"Mismatch in the memory image of the medeleg profiling snippet for design `{design_name}`."
+
+# @brief Measures the construction steps of the ELFs of the same instances, and checks that the patched and the generated RTL images are identical.
+# @param num_instances the number of test instances.
+def benchmark_elf_patch(design_name: str, num_instances: int, randseed_base: int = 0):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_instances > 0
+
+    calibrate_spikespeed()
+    profile_get_medeleg_mask(design_name)
+    _check_medeleg_profiling_memimage(design_name)
+
+    results = []
+    for instance_id in range(num_instances):
+        randseed = randseed_base + instance_id
+        memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+        random.seed(randseed)
+        fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+        gen_basicblocks(fuzzerstate)
+        spike_resolution(fuzzerstate)
+
+        # The spike resolution image is generated again for the measurement. The patch locations do not depend on the resolution.
+        start = time.time()
+        spike_memimage = gen_patchable_memimage_from_bbs(fuzzerstate)
+        spike_image_seconds = time.time() - start
+
+        start = time.time()
+        gen_elf_bytes(bytes(spike_memimage), fuzzerstate.bb_start_addr_seq[0], SPIKE_STARTADDR, fuzzerstate.is_design_64bit)
+        elf_bytes_seconds = time.time() - start
+
+        start = time.time()
+        rtl_memimage_generated = gen_memimage_from_bbs(fuzzerstate, False)
+        rtl_image_generated_seconds = time.time() - start
+
+        start = time.time()
+        rtl_memimage_patched = gen_rtl_memimage_by_patching(fuzzerstate)
+        rtl_image_patched_seconds = time.time() - start
+
+        assert rtl_memimage_patched == rtl_memimage_generated, f"Mismatch between the patched and the generated RTL memory images for instance {fuzzerstate.instance_to_str()}."
+        results.append({
+            'num_instrs': sum(map(len, fuzzerstate.instr_objs_seq)),
+            'num_patched_words': len(fuzzerstate.patchable_memimage[1]) + len(fuzzerstate.final_bb),
+            'spike_image_seconds': spike_image_seconds,
+            'elf_bytes_seconds': elf_bytes_seconds,
+            'rtl_image_generated_seconds': rtl_image_generated_seconds,
+            'rtl_image_patched_seconds': rtl_image_patched_seconds,
+        })
+
+    json_path = os.path.join(PATH_TO_TMP, f"elfpatchperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, 'instances': results}, f)
+    print('Saved ELF patching results to', json_path)
+
+    for stat_name in ('spike_image_seconds', 'elf_bytes_seconds', 'rtl_image_generated_seconds', 'rtl_image_patched_seconds'):
+        print(f"{stat_name:>28}: {1000*sum(r[stat_name] for r in results)/num_instances:.3f} ms per instance")
+    print(f"Patched words: {sum(r['num_patched_words'] for r in results)/sum(r['num_instrs'] for r in results)*100:.1f}% of the basic block instructions")
+    return results
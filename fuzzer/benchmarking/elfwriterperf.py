@@ -0,0 +1,81 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module checks the native ELF writer against the makeelf+objcopy reference, and measures the throughput of both.
+
+from params.runparams import PATH_TO_TMP, NO_REMOVE_TMPFILES
+from common.bytestoelf import gen_elf, gen_elf_objcopy, get_elf_loadable_image
+
+import json
+import os
+import random
+import time
+
+# Memory sizes typically produced by gen_new_test_instance
+ELFWRITERPERF_MEMSIZES = [1 << 14, 1 << 16, 1 << 18, 1 << 20]
+
+def _gen_random_image(memsize: int):
+    return random.randbytes(memsize)
+
+# @brief Writes random images with both writers and compares them.
+# The loadable image (class, machine, entry point, segments and section content and address) must be identical.
+# Byte identity of the whole files is reported but not required, since objcopy chooses its own file layout.
+# @return the number of byte-identical files.
+def check_elfwriter_equivalence(num_images: int, randseed: int = 0):
+    random.seed(randseed)
+    elfpath_native = os.path.join(PATH_TO_TMP, 'elfwriter_native.elf')
+    elfpath_objcopy = os.path.join(PATH_TO_TMP, 'elfwriter_objcopy.elf')
+
+    num_byte_identical = 0
+    for image_id in range(num_images):
+        memsize = random.choice(ELFWRITERPERF_MEMSIZES)
+        inbytes = _gen_random_image(memsize)
+        start_addr = random.randrange(memsize >> 2) << 2
+        section_addr = random.choice((None, 0x80000000, random.randrange(1 << 29) << 2))
+        is_64bit = random.random() < 0.5
+
+        gen_elf(inbytes, start_addr, section_addr, elfpath_native, is_64bit)
+        gen_elf_objcopy(inbytes, start_addr, section_addr, elfpath_objcopy, is_64bit)
+        with open(elfpath_native, 'rb') as f:
+            elf_bytes_native = f.read()
+        with open(elfpath_objcopy, 'rb') as f:
+            elf_bytes_objcopy = f.read()
+
+        image_native = get_elf_loadable_image(elf_bytes_native)
+        image_objcopy = get_elf_loadable_image(elf_bytes_objcopy)
+        for key in image_objcopy:
+            assert image_native[key] == image_objcopy[key], f"Mismatch in `{key}` for image {image_id} (memsize={memsize}, start_addr={hex(start_addr)}, section_addr={section_addr}, is_64bit={is_64bit})."
+        num_byte_identical += int(elf_bytes_native == elf_bytes_objcopy)
+
+    if not NO_REMOVE_TMPFILES:
+        os.remove(elfpath_native)
+        os.remove(elfpath_objcopy)
+
+    print(f"ELF writer equivalence: {num_images}/{num_images} loadable images match, {num_byte_identical}/{num_images} files are byte-identical.")
+    return num_byte_identical
+
+# @brief Measures the throughput of both ELF writers for each memory size.
+def benchmark_elfwriter_throughput(num_reps: int):
+    assert num_reps > 0
+    elfpath = os.path.join(PATH_TO_TMP, 'elfwriterperf.elf')
+
+    results = dict()
+    for memsize in ELFWRITERPERF_MEMSIZES:
+        inbytes = _gen_random_image(memsize)
+        results[memsize] = dict()
+        for writer_name, writer in (('native', gen_elf), ('objcopy', gen_elf_objcopy)):
+            for is_64bit in (False, True):
+                start = time.time()
+                for _ in range(num_reps):
+                    writer(inbytes, 0, 0x80000000, elfpath, is_64bit)
+                duration = time.time() - start
+                results[memsize][f"{writer_name}_{64 if is_64bit else 32}"] = num_reps / duration
+                print(f"memsize {memsize:>8} B, {writer_name:>7}, {64 if is_64bit else 32}-bit: {num_reps / duration:10.1f} ELFs/s, {num_reps * memsize / duration / (1 << 20):8.1f} MB/s")
+
+    if not NO_REMOVE_TMPFILES:
+        os.remove(elfpath)
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, 'elfwriterperf.json'), 'w'))
+    print('Saved ELF writer throughput results to', os.path.join(PATH_TO_TMP, 'elfwriterperf.json'))
+    return results
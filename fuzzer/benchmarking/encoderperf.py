@@ -0,0 +1,102 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module compares the table-driven instruction encoder against the rv/* encoder functions, both for equivalence and for performance.
+
+from params.runparams import PATH_TO_TMP
+from params.fuzzparams import MAX_NUM_PICKABLE_REGS
+from rv.util import INSTRUCTION_IDS, PARAM_SIZES_BITS_32, PARAM_SIZES_BITS_64, PARAM_IS_SIGNED
+from rv.encodingtable import ENCODING_FIELDS
+from cascade.cfinstructionclasses import *
+
+import json
+import os
+import random
+import time
+
+# @brief Draws a random immediate for the given instruction, including the boundary values once in a while.
+def _gen_random_imm(rng, instr_str: str, is_design_64bit: bool):
+    instr_id = INSTRUCTION_IDS[instr_str]
+    imm_size = (PARAM_SIZES_BITS_64 if is_design_64bit else PARAM_SIZES_BITS_32)[instr_id][-1]
+    if PARAM_IS_SIGNED[instr_id][-1]:
+        imm_min, imm_max = -(1 << (imm_size-1)), (1 << (imm_size-1)) - 1
+    else:
+        imm_min, imm_max = 0, (1 << imm_size) - 1
+    return rng.choice((imm_min, imm_max, rng.randint(imm_min, imm_max), rng.randint(imm_min, imm_max)))
+
+# @brief Instantiates random instructions of all the uncompressed CFInstruction subclasses.
+# @return a list of CFInstruction objects, with num_instrs_per_mnemonic instructions per mnemonic.
+def _gen_random_cfinstrs(num_instrs_per_mnemonic: int, randseed: int):
+    rng = random.Random(randseed)
+    reg = lambda: rng.randrange(MAX_NUM_PICKABLE_REGS)
+    rm = lambda: rng.randrange(8)
+    imm = lambda instr_str: _gen_random_imm(rng, instr_str, True)
+
+    instr_factories = [
+        (R12DInstructions,         lambda s: R12DInstruction(s, reg(), reg(), reg())),
+        (ImmRdInstructions,        lambda s: ImmRdInstruction(s, reg(), imm(s), True)),
+        (RegImmInstructions,       lambda s: RegImmInstruction(s, reg(), reg(), imm(s), True)),
+        (BranchInstructions,       lambda s: BranchInstruction(s, reg(), reg(), imm(s), rng.random() < 0.5, True)),
+        (JALInstructions,          lambda s: JALInstruction(s, reg(), _gen_random_imm(rng, s, False))),
+        (JALRInstructions,         lambda s: JALRInstruction(s, reg(), reg(), imm(s), 0, True)),
+        (SpecialInstructions,      lambda s: SpecialInstruction(s, reg(), reg())),
+        (EcallEbreakInstructions,  lambda s: EcallEbreakInstruction(s)),
+        (IntLoadInstructions,      lambda s: IntLoadInstruction(s, reg(), reg(), imm(s), 0, True)),
+        (IntStoreInstructions,     lambda s: IntStoreInstruction(s, reg(), reg(), imm(s), 0, True)),
+        (FloatLoadInstructions,    lambda s: FloatLoadInstruction(s, reg(), reg(), imm(s), 0, True)),
+        (FloatStoreInstructions,   lambda s: FloatStoreInstruction(s, reg(), reg(), imm(s), 0, True)),
+        (FloatToIntInstructions,   lambda s: FloatToIntInstruction(s, reg(), reg(), rm(), True)),
+        (IntToFloatInstructions,   lambda s: IntToFloatInstruction(s, reg(), reg(), rm(), True)),
+        (Float4Instructions,       lambda s: Float4Instruction(s, reg(), reg(), reg(), reg(), rm(), True)),
+        (Float3Instructions,       lambda s: Float3Instruction(s, reg(), reg(), reg(), rm(), True)),
+        (Float3NoRmInstructions,   lambda s: Float3NoRmInstruction(s, reg(), reg(), reg(), True)),
+        (Float2Instructions,       lambda s: Float2Instruction(s, reg(), reg(), rm(), True)),
+        (FloatIntRd2Instructions,  lambda s: FloatIntRd2Instruction(s, reg(), reg(), reg(), True)),
+        (FloatIntRd1Instructions,  lambda s: FloatIntRd1Instruction(s, reg(), reg(), True)),
+        (FloatIntRs1Instructions,  lambda s: FloatIntRs1Instruction(s, reg(), reg(), True)),
+        (CSRRegInstructions,       lambda s: CSRRegInstruction(s, reg(), reg(), rng.randrange(1 << 12))),
+        (CSRImmInstructions,       lambda s: CSRImmInstruction(s, reg(), rng.randrange(1 << 5), rng.randrange(1 << 12))),
+    ]
+
+    ret = []
+    for instr_strs, instr_factory in instr_factories:
+        for instr_str in instr_strs:
+            for _ in range(num_instrs_per_mnemonic):
+                ret.append(instr_factory(instr_str))
+    return ret
+
+# @brief Checks that the table-driven encoder is bit-identical to the rv/* encoder functions, for all the instructions of the encoding table.
+def check_encoder_equivalence(num_instrs_per_mnemonic: int, randseed: int = 0):
+    instrobjs = _gen_random_cfinstrs(num_instrs_per_mnemonic, randseed)
+
+    covered_instr_strs = set(map(lambda s: s.instr_str, instrobjs))
+    assert covered_instr_strs == set(ENCODING_FIELDS.keys()), f"Mnemonics not covered by the check: {set(ENCODING_FIELDS.keys()) ^ covered_instr_strs}"
+
+    for instrobj in instrobjs:
+        for is_spike_resolution in (False, True):
+            bytecode_table = instrobj.gen_bytecode_int(is_spike_resolution)
+            bytecode_reference = instrobj.gen_bytecode_int_reference(is_spike_resolution)
+            assert bytecode_table == bytecode_reference, f"Encoding mismatch for `{instrobj.instr_str}` (is_spike_resolution: {is_spike_resolution}): table {hex(bytecode_table)}, reference {hex(bytecode_reference)}."
+    print(f"Instruction encoder equivalence: {len(instrobjs)} instructions passed for {len(covered_instr_strs)} mnemonics.")
+
+# @brief Measures the number of instructions encoded per second by the table-driven and the reference encoders.
+def benchmark_encoder_throughput(num_reps: int, num_instrs_per_mnemonic: int = 100):
+    instrobjs = _gen_random_cfinstrs(num_instrs_per_mnemonic, 0)
+    results = dict()
+    for encoder_name in ('table', 'reference'):
+        start = time.time()
+        for _ in range(num_reps):
+            if encoder_name == 'table':
+                for instrobj in instrobjs:
+                    instrobj.gen_bytecode_int(False)
+            else:
+                for instrobj in instrobjs:
+                    instrobj.gen_bytecode_int_reference(False)
+        duration = time.time() - start
+        results[encoder_name] = num_reps * len(instrobjs) / duration
+        print(f"{encoder_name:>9} encoder: {results[encoder_name]:12.0f} instructions/s")
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, 'encoderperf.json'), 'w'))
+    print('Saved instruction encoder performance results to', os.path.join(PATH_TO_TMP, 'encoderperf.json'))
+    return results
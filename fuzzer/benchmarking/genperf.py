@@ -0,0 +1,69 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the intermediate program generation time as a function of the program length.
+
+from params.runparams import PATH_TO_TMP
+from common.designcfgs import get_design_boot_addr
+from cascade.basicblock import gen_basicblocks
+
+import json
+import os
+import random
+import time
+
+GENPERF_NUM_INSTRS_SWEEP = [100, 300, 1000, 3000, 10000, 30000]
+
+# @brief Generates programs of increasing lengths and measures the generation durations.
+# The memory is large and the number of basic blocks is not limiting, so that the number of instructions is the cap.
+# @return a dict: requested number of instructions -> list of pairs (effective number of instructions, generation duration in seconds)
+def benchmark_gen_duration_vs_length(design_name: str, num_reps: int, num_instrs_sweep: list = GENPERF_NUM_INSTRS_SWEEP):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_reps > 0
+
+    memsize = 1 << 20 # Dont want to be limited by the mem size
+    nmax_bbs = 100000
+
+    results = dict()
+    for num_instrs in num_instrs_sweep:
+        results[num_instrs] = []
+        for rep_id in range(num_reps):
+            randseed = 1000 * num_instrs + rep_id
+            random.seed(randseed)
+            start = time.time()
+            fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, False, num_instrs)
+            gen_basicblocks(fuzzerstate)
+            duration = time.time() - start
+            results[num_instrs].append((fuzzerstate.get_num_fuzzing_instructions_sofar(), duration))
+        mean_num_instrs = sum(map(lambda s: s[0], results[num_instrs])) / num_reps
+        mean_duration = sum(map(lambda s: s[1], results[num_instrs])) / num_reps
+        print(f"{num_instrs:>6} requested instructions: {mean_num_instrs:>9.1f} generated in {mean_duration*1000:9.2f} ms ({1e6*mean_duration/mean_num_instrs:.2f} us/instr)")
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, f"genperf_{design_name}.json"), 'w'))
+    print('Saved generation performance results to', os.path.join(PATH_TO_TMP, f"genperf_{design_name}.json"))
+    return results
+
+def plot_gen_duration_vs_length(design_name: str):
+    import matplotlib.pyplot as plt
+    import matplotlib
+    matplotlib.rcParams['pdf.fonttype'] = 42
+    matplotlib.rcParams['ps.fonttype'] = 42
+
+    assert os.path.exists(os.path.join(PATH_TO_TMP, f"genperf_{design_name}.json"))
+    results = json.load(open(os.path.join(PATH_TO_TMP, f"genperf_{design_name}.json"), 'r'))
+
+    all_points = [point for points in results.values() for point in points]
+
+    fig, ax = plt.subplots(figsize=(4, 3))
+    ax.grid(color='gray', zorder=0, linewidth=0.4)
+    ax.scatter(list(map(lambda s: s[0], all_points)), list(map(lambda s: s[1], all_points)), color='k', s=4, zorder=3)
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('Number of instructions')
+    ax.set_ylabel('Generation duration (s)')
+    fig.tight_layout()
+
+    print('Saving figure to', os.path.join(PATH_TO_TMP, f"genperf_{design_name}.png"))
+    plt.savefig(os.path.join(PATH_TO_TMP, f"genperf_{design_name}.png"), dpi=300)
+    plt.savefig(os.path.join(PATH_TO_TMP, f"genperf_{design_name}.pdf"), dpi=300)
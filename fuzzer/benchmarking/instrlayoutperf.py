@@ -0,0 +1,90 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the memory footprint of the instruction objects of each test instance (see the __slots__ in cascade/cfinstructionclasses.py),
+# and the time to deep-copy and to pickle them. The fuzzerstate is deep-copied for each probe of the reduction (see cascade/reduce.py), which is also measured.
+
+from params.runparams import PATH_TO_TMP
+from common.designcfgs import get_design_boot_addr
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.cfinstructionclasses import get_instr_obj_attrs
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+
+from copy import deepcopy
+import itertools
+import json
+import os
+import pickle
+import random
+import time
+import tracemalloc
+
+# Number of repetitions of each measured copy.
+INSTRLAYOUTPERF_NUM_REPS = 5
+
+# @return the mean duration of the function call, in seconds.
+def _measure_seconds(fn):
+    start = time.perf_counter()
+    for _ in range(INSTRLAYOUTPERF_NUM_REPS):
+        fn()
+    return (time.perf_counter() - start) / INSTRLAYOUTPERF_NUM_REPS
+
+# @return the number of bytes allocated by the function call, which are still allocated when it returns.
+def _measure_alloc_bytes(fn):
+    tracemalloc.start()
+    try:
+        before_bytes, _ = tracemalloc.get_traced_memory()
+        ret = fn()
+        after_bytes, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del ret
+    return after_bytes - before_bytes
+
+# @brief Measures the memory, deep copy and pickle costs of the instructions of the same instances.
+# @param num_instances the number of test instances.
+def benchmark_instr_layout(design_name: str, num_instances: int, randseed_base: int = 0):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_instances > 0
+
+    profile_get_medeleg_mask(design_name)
+
+    results = []
+    for instance_id in range(num_instances):
+        randseed = randseed_base + instance_id
+        memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+        random.seed(randseed)
+        fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+        gen_basicblocks(fuzzerstate)
+
+        instr_objs_seq = fuzzerstate.instr_objs_seq
+        num_instrs = sum(map(len, instr_objs_seq))
+        pickled_bytes = pickle.dumps(instr_objs_seq, protocol=pickle.HIGHEST_PROTOCOL)
+        # Check that the copies are faithful
+        for instr_obj, copied_instr_obj in zip(itertools.chain(*instr_objs_seq), itertools.chain(*pickle.loads(pickled_bytes))):
+            assert type(instr_obj) is type(copied_instr_obj) and get_instr_obj_attrs(instr_obj).keys() == get_instr_obj_attrs(copied_instr_obj).keys(), f"Mismatch between the original and the unpickled instruction objects for instance {fuzzerstate.instance_to_str()}."
+
+        results.append({
+            'num_instrs': num_instrs,
+            'bytes_per_instr': _measure_alloc_bytes(lambda: deepcopy(instr_objs_seq)) / num_instrs,
+            'pickled_bytes_per_instr': len(pickled_bytes) / num_instrs,
+            'deepcopy_instrs_seconds': _measure_seconds(lambda: deepcopy(instr_objs_seq)),
+            'deepcopy_fuzzerstate_seconds': _measure_seconds(lambda: deepcopy(fuzzerstate)),
+            'pickle_dumps_seconds': _measure_seconds(lambda: pickle.dumps(instr_objs_seq, protocol=pickle.HIGHEST_PROTOCOL)),
+            'pickle_loads_seconds': _measure_seconds(lambda: pickle.loads(pickled_bytes)),
+        })
+
+    json_path = os.path.join(PATH_TO_TMP, f"instrlayoutperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, 'instances': results}, f)
+    print('Saved instruction layout results to', json_path)
+
+    tot_num_instrs = sum(r['num_instrs'] for r in results)
+    print(f"{tot_num_instrs/num_instances:.0f} basic block instructions per instance")
+    for stat_name in ('bytes_per_instr', 'pickled_bytes_per_instr'):
+        print(f"{stat_name:>28}: {sum(r[stat_name]*r['num_instrs'] for r in results)/tot_num_instrs:.1f} bytes per instruction")
+    for stat_name in ('deepcopy_instrs_seconds', 'deepcopy_fuzzerstate_seconds', 'pickle_dumps_seconds', 'pickle_loads_seconds'):
+        print(f"{stat_name:>28}: {1000*sum(r[stat_name] for r in results)/num_instances:.2f} ms per program")
+    return results
@@ -0,0 +1,83 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the ISA instruction class picks with and without the cache of filtered weights (see cascade/randomize/pickisainstrclass.py).
+# Each pick of the generation is also taken by the uncached path from the same random state, and both must pick the same class with the same weights.
+
+from params.runparams import PATH_TO_TMP
+from common.designcfgs import get_design_boot_addr
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.randomize.pickisainstrclass import gen_next_isainstrclass, get_isainstrclass_weights_uncached, get_isainstrclass_cum_weights, _gen_next_isainstrclass_from_weights
+import cascade.basicblock
+
+from itertools import accumulate
+import json
+import os
+import random
+import time
+
+# @brief Replaces the instruction class picks of the basic block generation, and compares the cached and uncached picks from the same random state.
+class _ComparingIsaClassPicker:
+    def __init__(self):
+        self.num_picks = 0
+        self.cached_seconds = 0
+        self.uncached_seconds = 0
+        self.num_states = 0
+
+    def __call__(self, fuzzerstate):
+        random_state = random.getstate()
+        start = time.perf_counter()
+        uncached_weights = get_isainstrclass_weights_uncached(fuzzerstate)
+        uncached_ret = _gen_next_isainstrclass_from_weights(uncached_weights)
+        self.uncached_seconds += time.perf_counter() - start
+
+        random.setstate(random_state)
+        start = time.perf_counter()
+        cached_ret = gen_next_isainstrclass(fuzzerstate)
+        self.cached_seconds += time.perf_counter() - start
+
+        assert get_isainstrclass_cum_weights(fuzzerstate) == (list(uncached_weights.keys()), list(accumulate(uncached_weights.values()))), f"Mismatch between the cached and uncached weights of {fuzzerstate.instance_to_str()}."
+        assert cached_ret == uncached_ret, f"Mismatch between the cached and uncached picks of {fuzzerstate.instance_to_str()}: {cached_ret} instead of {uncached_ret}."
+        self.num_picks += 1
+        return cached_ret
+
+# @brief Generates instances while comparing the cached and uncached instruction class picks.
+# @param num_instances the number of test instances.
+def benchmark_isaclass(design_name: str, num_instances: int, randseed_base: int = 0):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_instances > 0
+    profile_get_medeleg_mask(design_name)
+
+    results = []
+    prev_gen_next_isainstrclass = cascade.basicblock.gen_next_isainstrclass
+    try:
+        for instance_id in range(num_instances):
+            randseed = randseed_base + instance_id
+            memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+            picker = _ComparingIsaClassPicker()
+            cascade.basicblock.gen_next_isainstrclass = picker
+            random.seed(randseed)
+            fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+            cascade.basicblock.gen_basicblocks(fuzzerstate)
+            results.append({
+                'num_picks': picker.num_picks,
+                'num_states': len(fuzzerstate.isapickweights_cache),
+                'cached_seconds': picker.cached_seconds,
+                'uncached_seconds': picker.uncached_seconds,
+            })
+    finally:
+        cascade.basicblock.gen_next_isainstrclass = prev_gen_next_isainstrclass
+
+    json_path = os.path.join(PATH_TO_TMP, f"isaclassperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, 'instances': results}, f)
+    print('Saved ISA class pick results to', json_path)
+
+    num_picks = sum(r['num_picks'] for r in results)
+    print(f"Picks: {num_picks}, distinct states per instance: {sum(r['num_states'] for r in results)/num_instances:.1f}")
+    for stat_name in ('uncached_seconds', 'cached_seconds'):
+        print(f"{stat_name[:-len('_seconds')]:>9}: {1e6*sum(r[stat_name] for r in results)/num_picks:.2f} us per pick")
+    print(f"Speedup: {sum(r['uncached_seconds'] for r in results)/sum(r['cached_seconds'] for r in results):.2f}x")
+    return results
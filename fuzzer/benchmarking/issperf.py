@@ -0,0 +1,341 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module checks the reference ISS of common/iss.py and compares its latency with Spike's.
+# - The floating-point operations of common/issfpu.py are compared with numpy and with exact rational arithmetic.
+# - The ISS resolves programs and then traces their RTL ELF, whose control flow and final register values must match the resolution, as in the check_pc_spike_again mode of the Spike resolution.
+# - The Spike resolution ELFs and their dump requests are recorded under PATH_TO_TMP, as well as the RTL ELFs of the programs that the ISS resolves.
+#   If Spike is available, the ISS is compared with Spike on all the recorded cases, including the ones recorded by previous runs: the register dumps of the resolution ELFs, and the PC traces and final register values of the RTL ELFs.
+
+from params.runparams import PATH_TO_TMP
+from common.bytestoelf import gen_elf, get_elf_loadable_image
+from common.designcfgs import get_design_boot_addr, get_design_march_flags_nocompressed
+from common.iss import ReferenceIss, IssUnsupportedError, run_iss_regs_at_pc_locs, run_iss_trace_all_pcs, get_iss_stats, reset_iss_stats
+from common.issfpu import FLOAT32, FLOAT64, RM_RNE, FFLAG_NX, fadd, fmul, fdiv, fsqrt, fmuladd, f_to_int, int_to_f, f_to_f
+from common.profiledesign import profile_get_medeleg_mask
+from common.spike import calibrate_spikespeed, run_trace_regs_at_pc_locs, run_trace_all_pcs, SPIKE_STARTADDR
+from cascade.basicblock import gen_basicblocks
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.genelf import gen_memimage_from_bbs
+from cascade.spikeresolution import gen_regdump_reqs, _transmit_addrs_to_producers_for_spike_resolution, _feed_regdump_to_instrs, _check_pc_trace_from_spike
+from cascade.util import IntRegIndivState
+
+from fractions import Fraction
+import itertools
+import json
+import numpy as np
+import os
+import random
+import shutil
+import time
+
+ISSPERF_NUM_FPU_CASES = 20000
+ISSPERF_NMAX_BBS = 50
+
+###
+# Floating-point unit
+###
+
+# @return the numpy float and unsigned integer types of the format.
+def _get_np_types(fmt):
+    return (np.float32, np.uint32) if fmt is FLOAT32 else (np.float64, np.uint64)
+
+def _bits_to_np(bits: int, fmt):
+    float_type, uint_type = _get_np_types(fmt)
+    return np.array([bits], dtype=uint_type).view(float_type)[0]
+
+def _np_to_bits(val, fmt) -> int:
+    float_type, uint_type = _get_np_types(fmt)
+    return int(np.array([val], dtype=float_type).view(uint_type)[0])
+
+# @brief Draws operands that are likely to hit special values, subnormals, cancellations and overflows.
+def _gen_random_float_bits(rng, fmt) -> int:
+    dice = rng.random()
+    if dice < 0.1:
+        return rng.choice((0, fmt.sign_bit, fmt.inf, fmt.inf | fmt.sign_bit, fmt.canonical_nan, fmt.inf | 1, fmt.max_finite, 1, 1 << fmt.num_frac_bits, fmt.bias << fmt.num_frac_bits)) | (fmt.sign_bit if rng.random() < 0.5 else 0)
+    if dice < 0.2:
+        # Subnormals
+        return rng.randrange(1 << fmt.num_frac_bits) | (fmt.sign_bit if rng.random() < 0.5 else 0)
+    if dice < 0.6:
+        # Moderate exponents, for cancellations and exact results
+        biased_exp = fmt.bias + rng.randint(-4, 4)
+        return (rng.randrange(2) << (fmt.num_bits - 1)) | (biased_exp << fmt.num_frac_bits) | rng.randrange(1 << fmt.num_frac_bits) >> rng.choice((0, 0, fmt.num_frac_bits // 2, fmt.num_frac_bits))
+    return rng.randrange(1 << fmt.num_bits)
+
+def _is_nan_bits(bits: int, fmt) -> bool:
+    return bits & ~fmt.sign_bit > fmt.inf
+
+# @brief Checks the result of an ISS operation against the reference value given as a numpy float.
+def _check_fpu_result(op_name: str, fmt, operands: tuple, iss_bits: int, ref_val):
+    if np.isnan(ref_val):
+        assert iss_bits == fmt.canonical_nan, f"{op_name} on {list(map(hex, operands))}: expected the canonical NaN, got {hex(iss_bits)}."
+    else:
+        assert iss_bits == _np_to_bits(ref_val, fmt), f"{op_name} on {list(map(hex, operands))}: expected {hex(_np_to_bits(ref_val, fmt))}, got {hex(iss_bits)}."
+
+# @brief Rounds an exact rational to binary64, to nearest even.
+# @return the bits
+def _round_fraction_to_f64(val: Fraction) -> int:
+    try:
+        # The true division of Python integers is correctly rounded.
+        return _np_to_bits(np.float64(val.numerator / val.denominator), FLOAT64)
+    except OverflowError:
+        return FLOAT64.inf | (FLOAT64.sign_bit if val < 0 else 0)
+
+# @brief Checks the floating-point operations in round to nearest even against numpy, the inexact flag and the fused multiply-add against exact rational arithmetic, and the conversions against Python.
+def check_iss_fpu(num_cases: int, randseed: int = 0):
+    rng = random.Random(randseed)
+    np_ops = {'add': np.add, 'sub': np.subtract, 'mul': np.multiply, 'div': np.divide}
+    iss_ops = {
+        'add': lambda a, b, fmt: fadd(a, b, fmt, RM_RNE),
+        'sub': lambda a, b, fmt: fadd(a, b, fmt, RM_RNE, True),
+        'mul': lambda a, b, fmt: fmul(a, b, fmt, RM_RNE),
+        'div': lambda a, b, fmt: fdiv(a, b, fmt, RM_RNE),
+    }
+    exact_ops = {'add': lambda a, b: a + b, 'sub': lambda a, b: a - b, 'mul': lambda a, b: a * b, 'div': lambda a, b: a / b}
+
+    with np.errstate(all='ignore'):
+        for _ in range(num_cases):
+            fmt = rng.choice((FLOAT32, FLOAT64))
+            a, b, c = (_gen_random_float_bits(rng, fmt) for _ in range(3))
+            np_a, np_b = _bits_to_np(a, fmt), _bits_to_np(b, fmt)
+
+            for op_name in np_ops:
+                iss_bits, iss_flags = iss_ops[op_name](a, b, fmt)
+                ref_val = np_ops[op_name](np_a, np_b)
+                _check_fpu_result(op_name, fmt, (a, b), iss_bits, ref_val)
+                if np.isfinite(np_a) and np.isfinite(np_b) and np.isfinite(ref_val) and not (op_name == 'div' and np_b == 0):
+                    is_exact = Fraction(float(ref_val)) == exact_ops[op_name](Fraction(float(np_a)), Fraction(float(np_b)))
+                    assert bool(iss_flags & FFLAG_NX) != is_exact, f"{op_name} on {hex(a)}, {hex(b)}: wrong inexact flag {iss_flags}."
+
+            iss_bits, _ = fsqrt(a, fmt, RM_RNE)
+            _check_fpu_result('sqrt', fmt, (a,), iss_bits, np.sqrt(np_a))
+
+            if fmt is FLOAT64:
+                np_c = _bits_to_np(c, fmt)
+                iss_bits, _ = fmuladd(a, b, c, fmt, RM_RNE, False, False)
+                if np.isfinite(np_a) and np.isfinite(np_b) and np.isfinite(np_c):
+                    exact = Fraction(float(np_a)) * Fraction(float(np_b)) + Fraction(float(np_c))
+                    # The sign of exact zeros depends on the operand signs, and is covered by the addition check.
+                    if exact:
+                        assert iss_bits == _round_fraction_to_f64(exact), f"fmadd on {hex(a)}, {hex(b)}, {hex(c)}: expected {hex(_round_fraction_to_f64(exact))}, got {hex(iss_bits)}."
+                iss_bits, _ = f_to_f(a, FLOAT64, FLOAT32, RM_RNE)
+                _check_fpu_result('fcvt.s.d', FLOAT32, (a,), iss_bits, np.float32(np_a))
+            else:
+                iss_bits, _ = f_to_f(a, FLOAT32, FLOAT64, RM_RNE)
+                _check_fpu_result('fcvt.d.s', FLOAT64, (a,), iss_bits, np.float64(np_a))
+
+            # Conversions to integers saturate, and NaNs convert to the maximal value.
+            for num_bits, is_signed in ((32, True), (32, False), (64, True), (64, False)):
+                min_val, max_val = (-(1 << (num_bits - 1)), (1 << (num_bits - 1)) - 1) if is_signed else (0, (1 << num_bits) - 1)
+                if np.isnan(np_a):
+                    ref_int = max_val
+                elif np.isinf(np_a):
+                    ref_int = min_val if np_a < 0 else max_val
+                else:
+                    ref_int = min(max(round(Fraction(float(np_a))), min_val), max_val)
+                iss_int, _ = f_to_int(a, fmt, RM_RNE, num_bits, is_signed)
+                assert iss_int == ref_int & ((1 << num_bits) - 1), f"Conversion of {hex(a)} to a {num_bits}-bit integer (signed: {is_signed}): expected {hex(ref_int)}, got {hex(iss_int)}."
+
+            # Conversions from integers. The integers are exact in binary64, hence numpy rounds them once to binary32.
+            int_val = rng.choice((rng.randrange(-(1 << 63), 1 << 63), rng.randrange(-(1 << 31), 1 << 31), rng.randrange(1 << 64)))
+            iss_bits, _ = int_to_f(int_val, FLOAT64, RM_RNE)
+            _check_fpu_result('fcvt.d.l', FLOAT64, (int_val,), iss_bits, np.float64(float(int_val)))
+            int_val >>= 11
+            iss_bits, _ = int_to_f(int_val, FLOAT32, RM_RNE)
+            _check_fpu_result('fcvt.s.l', FLOAT32, (int_val,), iss_bits, np.float32(np.float64(int_val)))
+
+###
+# Programs
+###
+
+# @brief Generates a program and transmits the addresses to the producers, as the Spike resolution does before running Spike.
+# @param force_authorize_privileges if True, the program may change privileges, even if gen_new_test_instance does not authorize it.
+# @return the fuzzerstate
+def _gen_fuzzerstate(design_name: str, randseed: int, nmax_bbs: int, force_authorize_privileges: bool = False):
+    from cascade.fuzzerstate import FuzzerState
+    memsize, _, _, _, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+    authorize_privileges = authorize_privileges or force_authorize_privileges
+    random.seed(randseed)
+    fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+    gen_basicblocks(fuzzerstate)
+    _transmit_addrs_to_producers_for_spike_resolution(fuzzerstate)
+    return fuzzerstate
+
+def _get_issdiff_dir(design_name: str) -> str:
+    return os.path.join(PATH_TO_TMP, 'issdiff', design_name)
+
+# @brief Records the Spike resolution ELF of the program and the parameters of its register dump requests.
+def _record_issdiff_case(fuzzerstate, memimage: bytes, regdump_reqs: list):
+    case_prefix = os.path.join(_get_issdiff_dir(fuzzerstate.design_name), fuzzerstate.instance_to_str())
+    gen_elf(bytes(memimage), start_addr=fuzzerstate.bb_start_addr_seq[0], section_addr=SPIKE_STARTADDR, destination_path=case_prefix + '.elf', is_64bit=fuzzerstate.is_design_64bit)
+    manifest = {
+        'rvflags': get_design_march_flags_nocompressed(fuzzerstate.design_name),
+        'regdump_reqs': regdump_reqs,
+        'final_addr': fuzzerstate.final_bb_base_addr+SPIKE_STARTADDR,
+        'num_fp_regs': fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0,
+        'has_fpdouble_support': fuzzerstate.design_has_fpud,
+    }
+    with open(case_prefix + '.json', 'w') as f:
+        json.dump(manifest, f)
+
+# @brief Records the RTL ELF of a resolved program, whose full trace has numinstrs instructions, next to its Spike resolution case.
+def _record_issdiff_rtl_case(fuzzerstate, memimage: bytes, numinstrs: int):
+    case_prefix = os.path.join(_get_issdiff_dir(fuzzerstate.design_name), fuzzerstate.instance_to_str())
+    gen_elf(bytes(memimage), start_addr=fuzzerstate.bb_start_addr_seq[0], section_addr=SPIKE_STARTADDR, destination_path=case_prefix + '.rtl.elf', is_64bit=fuzzerstate.is_design_64bit)
+    with open(case_prefix + '.json', 'r') as f:
+        manifest = json.load(f)
+    manifest['rtl_numinstrs'] = numinstrs
+    with open(case_prefix + '.json', 'w') as f:
+        json.dump(manifest, f)
+
+# Opcodes of the instruction classes whose coverage is reported by _get_iss_trace_coverage.
+ISSPERF_FP_OPCODES = (0b0000111, 0b0100111, 0b1000011, 0b1000111, 0b1001011, 0b1001111, 0b1010011)
+ISSPERF_W_OPCODES = (0b0011011, 0b0111011)
+ISSPERF_SYSTEM_OPCODE = 0b1110011
+
+# @brief Runs the first numinstrs instructions of the memory image with the ISS, and counts the executed instructions of the classes that are the most likely to differ from Spike.
+# @return a dict of the numbers of CSR instructions, floating-point instructions, W instructions, traps and privilege changes, or None if the ISS does not support the program.
+def _get_iss_trace_coverage(memimage: bytes, rvflags: str, numinstrs: int) -> dict:
+    iss = ReferenceIss(memimage, rvflags, SPIKE_STARTADDR, SPIKE_STARTADDR)
+    ret = {'csr': 0, 'fp': 0, 'w': 0, 'traps': 0, 'priv_changes': 0}
+    try:
+        for _ in range(numinstrs):
+            offset = iss.pc - SPIKE_STARTADDR
+            word = int.from_bytes(memimage[offset:offset+4], 'little') if 0 <= offset <= len(memimage) - 4 else 0
+            opcode = word & 0x7f
+            if opcode == ISSPERF_SYSTEM_OPCODE and (word >> 12) & 0x7:
+                ret['csr'] += 1
+            elif opcode in ISSPERF_FP_OPCODES:
+                ret['fp'] += 1
+            elif opcode in ISSPERF_W_OPCODES:
+                ret['w'] += 1
+            prev_num_traps, prev_priv = iss.num_traps, iss.priv
+            iss.run_steps(1)
+            ret['traps'] += iss.num_traps - prev_num_traps
+            ret['priv_changes'] += int(iss.priv != prev_priv)
+    except IssUnsupportedError:
+        return None
+    return ret
+
+# @brief Resolves programs with the ISS, checks the resolution by tracing the RTL ELF with the ISS, and records the resolution ELFs.
+# @return a pair (number of programs resolved by the ISS, total ISS resolution duration in seconds)
+def check_iss_self_consistency(design_name: str, num_instances: int, randseed_base: int = 0):
+    os.makedirs(_get_issdiff_dir(design_name), exist_ok=True)
+    num_resolved = 0
+    iss_seconds = 0
+    for instance_id in range(num_instances):
+        randseed = randseed_base + instance_id
+        # The privileges are rarely authorized by gen_new_test_instance, hence they are authorized in half of the programs, such that the recorded cases cover the privilege changes.
+        fuzzerstate = _gen_fuzzerstate(design_name, randseed, ISSPERF_NMAX_BBS, instance_id % 2 == 0)
+        memimage = gen_memimage_from_bbs(fuzzerstate, True)
+        regdump_reqs = gen_regdump_reqs(fuzzerstate)
+        _record_issdiff_case(fuzzerstate, memimage, regdump_reqs)
+        rvflags = get_design_march_flags_nocompressed(design_name)
+        num_fp_regs = fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0
+
+        start = time.time()
+        iss_ret = run_iss_regs_at_pc_locs(memimage, rvflags, SPIKE_STARTADDR, regdump_reqs, True, fuzzerstate.final_bb_base_addr+SPIKE_STARTADDR, num_fp_regs, fuzzerstate.design_has_fpud)
+        iss_seconds += time.time() - start
+        if iss_ret is None:
+            continue
+        num_resolved += 1
+        regvals, (finalintregvals_resol, finalfpuregvals_resol) = iss_ret
+        random.seed(randseed)
+        _feed_regdump_to_instrs(fuzzerstate, regvals)
+
+        numinstrs = len(list(itertools.chain.from_iterable(fuzzerstate.instr_objs_seq)))+1
+        rtl_memimage = gen_memimage_from_bbs(fuzzerstate, False)
+        _record_issdiff_rtl_case(fuzzerstate, rtl_memimage, numinstrs)
+        trace_ret = run_iss_trace_all_pcs(rtl_memimage, rvflags, numinstrs, SPIKE_STARTADDR, True, num_fp_regs, fuzzerstate.design_has_fpud)
+        assert trace_ret is not None, f"The ISS resolved instance {fuzzerstate.instance_to_str()} but does not support its RTL ELF."
+        pc_seq, (finalintregvals_check, finalfpuregvals_check) = trace_ret
+        _check_pc_trace_from_spike(fuzzerstate, pc_seq)
+        for reg_id in range(1, fuzzerstate.num_pickable_regs):
+            if fuzzerstate.intregpickstate.get_regstate(reg_id) in (IntRegIndivState.FREE, IntRegIndivState.CONSUMED):
+                assert finalintregvals_resol[reg_id] == finalintregvals_check[reg_id], f"Instance {fuzzerstate.instance_to_str()}: mismatch in x{reg_id} value. Resolution: `{hex(finalintregvals_resol[reg_id])}`, check: `{hex(finalintregvals_check[reg_id])}`."
+        assert finalfpuregvals_resol == finalfpuregvals_check, f"Instance {fuzzerstate.instance_to_str()}: mismatch in the floating register values."
+    return num_resolved, iss_seconds
+
+# @brief Compares the ISS with Spike on all the recorded cases of the design.
+# The register dumps are compared on the Spike resolution ELFs, and the PC traces and final register values on the RTL ELFs.
+# @return a dict with the numbers of compared cases, of cases supported by the ISS and of mismatches, the total durations of the ISS and of Spike,
+#         and the numbers of instructions of each class executed in the compared RTL traces (see _get_iss_trace_coverage).
+def check_iss_against_spike(design_name: str):
+    ret = {'num_cases': 0, 'num_iss_supported': 0, 'num_mismatches': 0, 'num_traces': 0, 'num_iss_supported_traces': 0, 'num_trace_mismatches': 0, 'iss_seconds': 0, 'spike_seconds': 0, 'trace_coverage': dict()}
+    issdiff_dir = _get_issdiff_dir(design_name)
+    for manifest_name in sorted(os.listdir(issdiff_dir)):
+        if not manifest_name.endswith('.json'):
+            continue
+        with open(os.path.join(issdiff_dir, manifest_name), 'r') as f:
+            manifest = json.load(f)
+        elfpath = os.path.join(issdiff_dir, manifest_name[:-len('.json')] + '.elf')
+        with open(elfpath, 'rb') as f:
+            elf_image = get_elf_loadable_image(f.read())
+        memimage = elf_image['segments'][0][3]
+        regdump_reqs = list(map(tuple, manifest['regdump_reqs']))
+        call_args = (SPIKE_STARTADDR, regdump_reqs, True, manifest['final_addr'], manifest['num_fp_regs'], manifest['has_fpdouble_support'])
+
+        start = time.time()
+        iss_ret = run_iss_regs_at_pc_locs(memimage, manifest['rvflags'], *call_args)
+        ret['iss_seconds'] += time.time() - start
+        start = time.time()
+        spike_ret = run_trace_regs_at_pc_locs(f"issdiff_{manifest_name[:-len('.json')]}", elfpath, manifest['rvflags'], *call_args)
+        ret['spike_seconds'] += time.time() - start
+
+        ret['num_cases'] += 1
+        if iss_ret is not None:
+            ret['num_iss_supported'] += 1
+            if iss_ret != spike_ret:
+                print(f"Mismatch between the ISS and Spike on the register dumps of the recorded case {elfpath}.")
+                ret['num_mismatches'] += 1
+
+        if 'rtl_numinstrs' not in manifest:
+            continue
+        rtl_elfpath = elfpath[:-len('.elf')] + '.rtl.elf'
+        with open(rtl_elfpath, 'rb') as f:
+            rtl_memimage = get_elf_loadable_image(f.read())['segments'][0][3]
+        trace_args = (manifest['rtl_numinstrs'], SPIKE_STARTADDR, True, manifest['num_fp_regs'], manifest['has_fpdouble_support'])
+        iss_trace_ret = run_iss_trace_all_pcs(rtl_memimage, manifest['rvflags'], *trace_args)
+        spike_trace_ret = run_trace_all_pcs(f"issdiff_rtl_{manifest_name[:-len('.json')]}", rtl_elfpath, manifest['rvflags'], *trace_args, None)
+        ret['num_traces'] += 1
+        if iss_trace_ret is not None:
+            ret['num_iss_supported_traces'] += 1
+            if iss_trace_ret != spike_trace_ret:
+                print(f"Mismatch between the ISS and Spike on the PC trace or the final register values of the recorded case {rtl_elfpath}.")
+                ret['num_trace_mismatches'] += 1
+            for instr_class, num_instrs in _get_iss_trace_coverage(rtl_memimage, manifest['rvflags'], manifest['rtl_numinstrs']).items():
+                ret['trace_coverage'][instr_class] = ret['trace_coverage'].get(instr_class, 0) + num_instrs
+    return ret
+
+# @brief Runs all the checks and reports the ISS latency and coverage, and the Spike latency if Spike is available.
+def benchmark_iss(design_name: str, num_instances: int, randseed_base: int = 0):
+    assert num_instances > 0
+
+    profile_get_medeleg_mask(design_name)
+    reset_iss_stats()
+
+    check_iss_fpu(ISSPERF_NUM_FPU_CASES, randseed_base)
+    print(f"Checked {ISSPERF_NUM_FPU_CASES} floating-point cases.")
+
+    num_resolved, iss_seconds = check_iss_self_consistency(design_name, num_instances, randseed_base)
+    iss_stats = get_iss_stats()
+    results = {
+        'num_instances': num_instances,
+        'iss_coverage': num_resolved / num_instances,
+        'iss_ms_per_instance': iss_seconds / num_instances * 1000,
+        'fallback_reasons': iss_stats['fallback_reasons'],
+    }
+    print(f"ISS: resolved {num_resolved}/{num_instances} instances, {results['iss_ms_per_instance']:.2f} ms per instance. Fallback reasons: {iss_stats['fallback_reasons']}")
+
+    if shutil.which('spike') is None:
+        print('Spike is not available: skipping the comparison with Spike on the recorded cases.')
+    else:
+        calibrate_spikespeed()
+        spike_diff_results = check_iss_against_spike(design_name)
+        results['spike_diff'] = spike_diff_results
+        print(f"ISS vs Spike: {spike_diff_results['num_iss_supported']}/{spike_diff_results['num_cases']} recorded cases supported, {spike_diff_results['num_mismatches']} register dump mismatches. {spike_diff_results['num_iss_supported_traces']}/{spike_diff_results['num_traces']} recorded RTL traces supported, {spike_diff_results['num_trace_mismatches']} PC trace or final register mismatches. Executed in the compared traces: {spike_diff_results['trace_coverage']}. ISS: {spike_diff_results['iss_seconds'] / spike_diff_results['num_cases'] * 1000:.2f} ms per case, Spike: {spike_diff_results['spike_seconds'] / spike_diff_results['num_cases'] * 1000:.2f} ms per case.")
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, f"issperf_{design_name}.json"), 'w'))
+    print('Saved ISS results to', os.path.join(PATH_TO_TMP, f"issperf_{design_name}.json"))
+    return results
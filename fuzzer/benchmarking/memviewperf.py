@@ -0,0 +1,167 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module compares the MemoryView backends, both for equivalence and for performance.
+
+from params.runparams import PATH_TO_TMP
+from cascade.memview import MEMVIEW_BACKENDS
+
+import json
+import os
+import random
+import time
+
+# The backends that consume the random numbers in the same way, and hence must return the same free address picks. MemoryViewPrefixSum samples from the same distribution with different draws, see check_memview_sampler.
+MEMVIEW_RNG_EQUIVALENT_BACKENDS = ('list', 'bisect')
+
+# @brief Applies the same random sequence of allocations and queries to a MemoryView, similarly to what a program generation does with the blacklist.
+# The allocations are small (typically 4-byte blacklisted instructions) and spread across the memory.
+# @param with_free_addr_picks if False, the results of gen_random_free_addr are not included. The allocations do not depend on them.
+# @return the list of query results, used for comparing the backends.
+def _memview_workload(memview_class, memsize: int, num_allocs: int, num_queries_per_alloc: int, randseed: int, with_free_addr_picks: bool = True):
+    rng = random.Random(randseed)
+    memview = memview_class(memsize)
+    query_results = []
+    for _ in range(num_allocs):
+        start = rng.randrange(memsize >> 2) << 2
+        size = rng.choice((4, 4, 4, 8, 24))
+        if memview.is_mem_range_free(start, start + size):
+            memview.alloc_mem_range(start, size)
+        for _ in range(num_queries_per_alloc):
+            addr = rng.randrange(memsize)
+            query_results.append(memview.is_mem_free(addr))
+            query_results.append(memview.get_available_contig_space(addr))
+        # gen_random_free_addr uses the global random module.
+        random.seed(rng.randrange(1 << 32))
+        picked_addr = memview.gen_random_free_addr(2, 24, 0, memsize)
+        if with_free_addr_picks:
+            query_results.append(picked_addr)
+    query_results.append(memview.freepairs)
+    query_results.append(memview.get_allocated_ratio())
+    return query_results
+
+# @brief Checks that all the backends return the same results on random workloads.
+# The free address picks are only compared between the backends of MEMVIEW_RNG_EQUIVALENT_BACKENDS.
+def check_memview_backends_equivalence(num_workloads: int, memsize: int = 1 << 16, num_allocs: int = 2000):
+    for workload_id in range(num_workloads):
+        ref_results = None
+        for backend_name in MEMVIEW_RNG_EQUIVALENT_BACKENDS:
+            curr_results = _memview_workload(MEMVIEW_BACKENDS[backend_name], memsize, num_allocs, 4, workload_id)
+            if ref_results is None:
+                ref_results = curr_results
+            assert curr_results == ref_results, f"MemoryView backend `{backend_name}` differs from the reference on workload {workload_id}."
+        ref_results = None
+        for backend_name, memview_class in MEMVIEW_BACKENDS.items():
+            curr_results = _memview_workload(memview_class, memsize, num_allocs, 4, workload_id, False)
+            if ref_results is None:
+                ref_results = curr_results
+            assert curr_results == ref_results, f"MemoryView backend `{backend_name}` differs from the reference on workload {workload_id}, excluding the free address picks."
+    print(f"MemoryView backends equivalence: {num_workloads} workloads passed for backends {list(MEMVIEW_BACKENDS.keys())}, with identical free address picks for backends {list(MEMVIEW_RNG_EQUIVALENT_BACKENDS)}.")
+
+# @brief Checks the free address sampler of a backend against the exhaustive list of valid addresses, on small memories filled up to high saturation ratios.
+# Each returned address must be free, aligned and followed by min_space free bytes in the requested window, None must only be returned if there is no such address,
+# and the picks must be uniform among the valid addresses. Uniformity is checked with a chi-squared statistic, which must not exceed its mean by more than 5 standard deviations.
+# @return the numbers of checked requests, of requests without valid address and of uniformity checks.
+def check_memview_sampler(backend_name: str = 'bisect_prefixsum', num_workloads: int = 20, memsize: int = 1 << 12, num_picks: int = 200, num_uniformity_picks: int = 20000):
+    memview_class = MEMVIEW_BACKENDS[backend_name]
+    stats = {'num_requests': 0, 'num_empty_requests': 0, 'num_uniformity_checks': 0}
+    for workload_id in range(num_workloads):
+        rng = random.Random(workload_id)
+        memview = memview_class(memsize)
+        for start, size in _gen_saturating_allocs(memsize, rng.choice((0.3, 0.5, 0.8, 0.9, 0.95)), workload_id):
+            memview.alloc_mem_range(start, size)
+        random.seed(workload_id)
+        for pick_id in range(num_picks):
+            alignment_bits = rng.choice((2, 3, 4))
+            min_space = rng.choice((4, 8, 24))
+            # Same constraint on the bounds as in gen_random_free_addr.
+            while True:
+                left_bound = rng.randrange(-64, memsize)
+                right_bound = rng.randrange(left_bound + 1, memsize + 64)
+                if ((max(left_bound, 0)+(1 << alignment_bits)-1) >> alignment_bits) < ((min(right_bound, memsize)-min_space) >> alignment_bits):
+                    break
+            window_start = (max(left_bound, 0)+(1 << alignment_bits)-1) >> alignment_bits
+            window_end = (min(right_bound, memsize)-min_space) >> alignment_bits
+            valid_addrs = [unit << alignment_bits for unit in range(window_start, window_end) if memview.is_mem_range_free(unit << alignment_bits, (unit << alignment_bits)+min_space)]
+
+            picked_addr = memview.gen_random_free_addr(alignment_bits, min_space, left_bound, right_bound)
+            stats['num_requests'] += 1
+            if not valid_addrs:
+                assert picked_addr is None, f"MemoryView backend `{backend_name}` picked {hex(picked_addr)} although no address is valid, on workload {workload_id}, pick {pick_id}."
+                stats['num_empty_requests'] += 1
+                continue
+            assert picked_addr is not None, f"MemoryView backend `{backend_name}` found no address although {len(valid_addrs)} are valid, on workload {workload_id}, pick {pick_id}."
+            assert picked_addr in valid_addrs, f"MemoryView backend `{backend_name}` picked the invalid address {hex(picked_addr)} (alignment_bits={alignment_bits}, min_space={min_space}, bounds=[{hex(left_bound)}, {hex(right_bound)})), on workload {workload_id}, pick {pick_id}."
+
+            # Check the uniformity of the picks for the first request of the workload that has several valid addresses.
+            if len(valid_addrs) > 1 and stats['num_uniformity_checks'] <= workload_id:
+                pick_counts = dict.fromkeys(valid_addrs, 0)
+                for _ in range(num_uniformity_picks):
+                    pick_counts[memview.gen_random_free_addr(alignment_bits, min_space, left_bound, right_bound)] += 1
+                expected_count = num_uniformity_picks / len(valid_addrs)
+                chi2 = sum((curr_count - expected_count) ** 2 for curr_count in pick_counts.values()) / expected_count
+                num_dofs = len(valid_addrs) - 1
+                assert chi2 <= num_dofs + 5 * (2 * num_dofs) ** 0.5, f"MemoryView backend `{backend_name}` does not pick uniformly among {len(valid_addrs)} valid addresses (chi2={chi2:.1f}), on workload {workload_id}, pick {pick_id}."
+                stats['num_uniformity_checks'] += 1
+    print(f"MemoryView sampler of backend `{backend_name}`: {stats['num_requests']} requests passed, of which {stats['num_empty_requests']} without valid address, and {stats['num_uniformity_checks']} uniformity checks.")
+    return stats
+
+# @brief Measures the duration of the workload for each backend and each number of allocations in a 1 MB memory.
+def benchmark_memview_backends(allocs_sweep: list = (1000, 2000, 5000, 10000), memsize: int = 1 << 20):
+    results = {backend_name: dict() for backend_name in MEMVIEW_BACKENDS}
+    for num_allocs in allocs_sweep:
+        for backend_name, memview_class in MEMVIEW_BACKENDS.items():
+            start = time.time()
+            _memview_workload(memview_class, memsize, num_allocs, 4, 0)
+            results[backend_name][num_allocs] = time.time() - start
+            print(f"{backend_name:>8}, {num_allocs:>6} allocations: {results[backend_name][num_allocs]:.3f} s")
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, 'memviewperf.json'), 'w'))
+    print('Saved MemoryView performance results to', os.path.join(PATH_TO_TMP, 'memviewperf.json'))
+    return results
+
+# @brief Generates allocations that fill a memory up to the given saturation ratio.
+# The memory is swept linearly, alternating allocated blocks and free gaps, whose mean sizes are chosen to reach the saturation ratio.
+# @return a list of (start, size) allocations.
+def _gen_saturating_allocs(memsize: int, saturation_ratio: float, randseed: int):
+    rng = random.Random(randseed)
+    mean_gap_words = 8 * (1 - saturation_ratio) / saturation_ratio # Allocated blocks have a mean size of 8 words.
+    allocs = []
+    curr_addr = 0
+    while True:
+        curr_addr += round(rng.uniform(0, 2 * mean_gap_words)) << 2
+        size = rng.randrange(1, 16) << 2
+        if curr_addr + size > memsize:
+            break
+        allocs.append((curr_addr, size))
+        curr_addr += size
+    return allocs
+
+# @brief Measures the free address sampling duration and failure rate of the rejection and prefix sum samplers, for several memory saturation ratios.
+# The requests resemble the ones of basic block placement (16-byte aligned, 24 B) and of memory operations (8-byte aligned, 8 B).
+def benchmark_memview_sampler_saturation(saturation_ratios: list = (0.1, 0.3, 0.5, 0.7, 0.8, 0.9, 0.95), memsize: int = 1 << 20, num_picks: int = 2000):
+    sampler_backends = ('bisect', 'bisect_prefixsum')
+    results = {backend_name: dict() for backend_name in sampler_backends}
+    for saturation_ratio in saturation_ratios:
+        allocs = _gen_saturating_allocs(memsize, saturation_ratio, 0)
+        for backend_name in sampler_backends:
+            memview = MEMVIEW_BACKENDS[backend_name](memsize)
+            for start, size in allocs:
+                memview.alloc_mem_range(start, size)
+            random.seed(0)
+            num_failures = 0
+            start_time = time.time()
+            for pick_id in range(num_picks):
+                if pick_id & 1:
+                    picked_addr = memview.gen_random_free_addr(4, 24, 0, memsize)
+                else:
+                    picked_addr = memview.gen_random_free_addr(3, 8, 0, memsize)
+                num_failures += int(picked_addr is None)
+            duration = time.time() - start_time
+            results[backend_name][saturation_ratio] = {'us_per_pick': 1e6 * duration / num_picks, 'failure_ratio': num_failures / num_picks}
+            print(f"saturation {saturation_ratio:.2f}, {backend_name:>16}: {1e6 * duration / num_picks:8.2f} us/pick, {100 * num_failures / num_picks:5.1f}% failures")
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, 'memviewsamplerperf.json'), 'w'))
+    print('Saved MemoryView sampler results to', os.path.join(PATH_TO_TMP, 'memviewsamplerperf.json'))
+    return results
@@ -0,0 +1,116 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the register picks per second of the integer and floating register pick states (see cascade/randomize/pickreg.py),
+# with draws from the random module (determinism mode) and from a numpy.random.Generator (see RegPickGenerator).
+# It checks that the determinism mode picks the same registers as random.choices, and that both modes map a seed to a single program.
+
+from params.runparams import PATH_TO_TMP
+from params.fuzzparams import MAX_NUM_PICKABLE_REGS, MAX_NUM_PICKABLE_FLOATING_REGS
+from common.designcfgs import get_design_boot_addr
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.genelf import gen_memimage_from_bbs
+from cascade.randomize.pickreg import IntRegPickState, FloatRegPickState, RegPickGenerator
+from cascade.spikeresolution import prepare_spike_resolution
+from cascade.util import IntRegIndivState
+
+import json
+import os
+import random
+import time
+
+# Number of picks of each measured kind.
+REGPICKPERF_NUM_PICKS = 100000
+# Number of picks compared against random.choices.
+REGPICKPERF_NUM_CHECKED_PICKS = 5000
+
+# @brief Checks that the integer picks of the determinism mode are the picks of random.choices on the effective weights.
+def _check_against_random_choices(randseed: int):
+    random.seed(randseed)
+    intregpickstate = IntRegPickState(MAX_NUM_PICKABLE_REGS, False)
+    for pick_id in range(REGPICKPERF_NUM_CHECKED_PICKS):
+        weights = intregpickstate.get_effective_weights(intregpickstate.get_free_regs_onehot())
+        random_state = random.getstate()
+        expected_reg = random.choices(range(MAX_NUM_PICKABLE_REGS), weights)[0]
+        random.setstate(random_state)
+        if pick_id % 2:
+            picked_reg = intregpickstate.pick_int_outputreg()
+        else:
+            picked_reg = intregpickstate.pick_int_inputreg()
+        assert picked_reg == expected_reg, f"Mismatch with random.choices at pick {pick_id}: {picked_reg} instead of {expected_reg}."
+        # Occasionally take a register out of the free ones
+        if pick_id % 7 == 0 and picked_reg and intregpickstate.get_num_regs_in_state(IntRegIndivState.FREE) > MAX_NUM_PICKABLE_REGS // 2:
+            intregpickstate.set_regstate(picked_reg, IntRegIndivState.PRODUCED0)
+
+# @return a dict of picks per second for each pick kind.
+def _measure_picks_per_second(rng) -> dict:
+    intregpickstate = IntRegPickState(MAX_NUM_PICKABLE_REGS, False, rng)
+    floatregpickstate = FloatRegPickState(MAX_NUM_PICKABLE_FLOATING_REGS, rng)
+    pick_fns = {
+        'int_inputreg': intregpickstate.pick_int_inputreg,
+        'int_outputreg': intregpickstate.pick_int_outputreg,
+        'int_reg_in_state': lambda: intregpickstate.pick_int_reg_in_state(IntRegIndivState.FREE),
+        'float_inputreg': floatregpickstate.pick_float_inputreg,
+        'float_outputreg': floatregpickstate.pick_float_outputreg,
+    }
+    ret = dict()
+    for pick_name, pick_fn in pick_fns.items():
+        start = time.perf_counter()
+        for _ in range(REGPICKPERF_NUM_PICKS):
+            pick_fn()
+        ret[pick_name] = REGPICKPERF_NUM_PICKS / (time.perf_counter() - start)
+    return ret
+
+# @return a pair (generation duration in seconds, program signature)
+def _gen_program(design_name: str, randseed: int):
+    from cascade.fuzzerstate import FuzzerState
+    # Both modes generate the same instances.
+    random.seed(randseed)
+    memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+    random.seed(randseed)
+    start = time.perf_counter()
+    fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+    gen_basicblocks(fuzzerstate)
+    gen_seconds = time.perf_counter() - start
+    random_state = random.getstate()
+    prepare_spike_resolution(fuzzerstate)
+    return gen_seconds, (random_state, bytes(gen_memimage_from_bbs(fuzzerstate, True)))
+
+# @brief Measures the register picks, and the generation of the same instances in both modes.
+# @param num_instances the number of test instances.
+def benchmark_regpick(design_name: str, num_instances: int, randseed_base: int = 0):
+    assert num_instances > 0
+    profile_get_medeleg_mask(design_name)
+
+    _check_against_random_choices(randseed_base)
+
+    results = {'picks_per_second': {}, 'gen_seconds': {}}
+    prev_env_val = os.environ.get('CASCADE_REGPICK_NUMPY_RNG')
+    try:
+        for mode_name, use_numpy_rng in (('random', False), ('generator', True)):
+            results['picks_per_second'][mode_name] = _measure_picks_per_second(RegPickGenerator(randseed_base) if use_numpy_rng else None)
+            os.environ['CASCADE_REGPICK_NUMPY_RNG'] = str(int(use_numpy_rng))
+            results['gen_seconds'][mode_name] = []
+            for instance_id in range(num_instances):
+                gen_seconds, signature = _gen_program(design_name, randseed_base + instance_id)
+                _, signature_again = _gen_program(design_name, randseed_base + instance_id)
+                assert signature == signature_again, f"The seed {randseed_base + instance_id} maps to several programs in mode `{mode_name}`."
+                results['gen_seconds'][mode_name].append(gen_seconds)
+    finally:
+        if prev_env_val is None:
+            del os.environ['CASCADE_REGPICK_NUMPY_RNG']
+        else:
+            os.environ['CASCADE_REGPICK_NUMPY_RNG'] = prev_env_val
+
+    json_path = os.path.join(PATH_TO_TMP, f"regpickperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, **results}, f)
+    print('Saved register pick results to', json_path)
+
+    for mode_name in results['picks_per_second']:
+        print(f"{mode_name:>9}: " + ', '.join(f"{pick_name} {picks_per_second/1e3:.0f} k/s" for pick_name, picks_per_second in results['picks_per_second'][mode_name].items()))
+        print(f"{'':>9}  generation {1000*sum(results['gen_seconds'][mode_name])/num_instances:.2f} ms per instance")
+    return results
@@ -0,0 +1,138 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the integer register state snapshots that are saved at the end of each basic block (see IntRegSnapshot in cascade/randomize/pickreg.py).
+# The snapshots of each program are compared with the flat saved states used before them, which copied all the registers and deep-copied the producer coordinates at each basic block.
+# The flat states are rebuilt from the snapshots, hence they hold the same register states.
+
+from params.runparams import PATH_TO_TMP
+from common.designcfgs import get_design_boot_addr
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.randomize.pickreg import IntRegPickState, IntRegSnapshot
+
+from copy import copy, deepcopy
+import json
+import numpy as np
+import os
+import random
+import sys
+import time
+
+# @return the number of bytes of the objects reachable from obj, counting the shared objects once.
+def _get_retained_size(obj, seen_ids: set = None) -> int:
+    if seen_ids is None:
+        seen_ids = set()
+    if id(obj) in seen_ids:
+        return 0
+    seen_ids.add(id(obj))
+    # The size of the numpy arrays includes their data.
+    ret = sys.getsizeof(obj)
+    if isinstance(obj, IntRegSnapshot):
+        children = (obj.parent, obj.reg_weights, obj.changed_regs)
+    elif isinstance(obj, dict):
+        children = list(obj.keys()) + list(obj.values())
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    else:
+        children = ()
+    for child in children:
+        ret += _get_retained_size(child, seen_ids)
+    return ret
+
+# @return the flat saved state of the same registers as the snapshot, as returned by save_curr_state before the snapshots.
+def _to_flat_state(snapshot: IntRegSnapshot) -> tuple:
+    reg_states, producer_ids, producer_coords = zip(*snapshot.get_regs())
+    return snapshot.reg_weights.copy(), np.array(reg_states, np.int8), np.array(producer_ids), [list(reg_producer_coords) for reg_producer_coords in producer_coords]
+
+# @brief The copies of save_curr_state before the snapshots.
+def _copy_flat_state(flat_state: tuple) -> tuple:
+    return copy(flat_state[0]), copy(flat_state[1]), copy(flat_state[2]), deepcopy(flat_state[3])
+
+# @brief Saves the integer register states during the generation, and measures the saves.
+class _TimingSnapshotSaver:
+    def __init__(self, save_curr_state):
+        self.save_curr_state = save_curr_state
+        self.num_saves = 0
+        self.save_seconds = 0
+
+    def __call__(self, intregpickstate):
+        start = time.perf_counter()
+        ret = self.save_curr_state(intregpickstate)
+        self.save_seconds += time.perf_counter() - start
+        self.num_saves += 1
+        return ret
+
+# @brief Generates instances and measures their integer register state snapshots against flat saved states.
+# @param num_instances the number of test instances.
+def benchmark_reg_snapshots(design_name: str, num_instances: int, randseed_base: int = 0):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_instances > 0
+    profile_get_medeleg_mask(design_name)
+
+    results = []
+    prev_save_curr_state = IntRegPickState.save_curr_state
+    try:
+        for instance_id in range(num_instances):
+            randseed = randseed_base + instance_id
+            memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+            saver = _TimingSnapshotSaver(prev_save_curr_state)
+            # A function rather than the saver itself, such that it binds to the register pick states.
+            IntRegPickState.save_curr_state = lambda intregpickstate: saver(intregpickstate)
+            random.seed(randseed)
+            fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+            gen_basicblocks(fuzzerstate)
+            IntRegPickState.save_curr_state = prev_save_curr_state
+
+            snapshots = fuzzerstate.saved_reg_states
+            flat_states = [_to_flat_state(snapshot) for snapshot in snapshots]
+
+            # Restore each basic block from a copy of the final register state, like the reduction does.
+            intregpickstate = deepcopy(fuzzerstate.intregpickstate)
+            start = time.perf_counter()
+            for snapshot in snapshots:
+                intregpickstate.restore_state(snapshot)
+            restore_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            for flat_state in flat_states:
+                _copy_flat_state(flat_state)
+            flat_save_seconds = time.perf_counter() - start
+
+            # Copies of all the saved states, as in each deepcopy of the fuzzer state.
+            start = time.perf_counter()
+            deepcopy(snapshots)
+            deepcopy_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            deepcopy(flat_states)
+            flat_deepcopy_seconds = time.perf_counter() - start
+
+            results.append({
+                'num_bbs': len(snapshots),
+                'num_pickable_regs': fuzzerstate.num_pickable_regs,
+                'num_saves': saver.num_saves,
+                'save_seconds': saver.save_seconds,
+                'flat_save_seconds': flat_save_seconds * saver.num_saves / len(flat_states),
+                'restore_seconds': restore_seconds,
+                'deepcopy_seconds': deepcopy_seconds,
+                'flat_deepcopy_seconds': flat_deepcopy_seconds,
+                'num_bytes': _get_retained_size(snapshots),
+                'flat_num_bytes': _get_retained_size(flat_states),
+            })
+    finally:
+        IntRegPickState.save_curr_state = prev_save_curr_state
+
+    json_path = os.path.join(PATH_TO_TMP, f"regsnapshotperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, 'instances': results}, f)
+    print('Saved register snapshot results to', json_path)
+
+    num_bbs = sum(r['num_bbs'] for r in results)
+    num_saves = sum(r['num_saves'] for r in results)
+    print(f"Basic blocks: {num_bbs} ({num_bbs/num_instances:.1f} per program), saves: {num_saves}")
+    print(f"Memory per program: {sum(r['num_bytes'] for r in results)/num_instances/1024:.1f} KiB instead of {sum(r['flat_num_bytes'] for r in results)/num_instances/1024:.1f} KiB")
+    print(f"Save: {1e6*sum(r['save_seconds'] for r in results)/num_saves:.2f} us instead of {1e6*sum(r['flat_save_seconds'] for r in results)/num_saves:.2f} us")
+    print(f"Restore: {1e6*sum(r['restore_seconds'] for r in results)/num_bbs:.2f} us")
+    print(f"Deepcopy per program: {1e3*sum(r['deepcopy_seconds'] for r in results)/num_instances:.2f} ms instead of {1e3*sum(r['flat_deepcopy_seconds'] for r in results)/num_instances:.2f} ms")
+    return results
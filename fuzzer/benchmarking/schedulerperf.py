@@ -0,0 +1,84 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module compares the worker utilisation of the event-driven campaign scheduler against the former sleep-polling loop.
+# The workload is a stub that sleeps, so that the measurement does not depend on the design, on Spike or on the RTL simulator.
+
+from params.runparams import PATH_TO_TMP
+from common.scheduler import run_campaign
+
+import json
+import multiprocessing as mp
+import os
+import random
+import threading
+import time
+
+SCHEDULERPERF_POLLING_PERIOD_SECONDS = 2
+
+# @brief Stub instance that only takes some time.
+def _stub_workload(duration_seconds: float):
+    start = time.time()
+    time.sleep(duration_seconds)
+    return time.time() - start
+
+# @brief Draws the stub instance durations, similar to short fuzzing instances.
+def _gen_stub_durations(num_instances: int, min_duration_seconds: float, max_duration_seconds: float, randseed: int):
+    rng = random.Random(randseed)
+    return [rng.uniform(min_duration_seconds, max_duration_seconds) for _ in range(num_instances)]
+
+# @brief Reproduces the former scheduling loop, where the parent process polls the number of finished instances every polling period.
+# @return a pair (wall seconds, busy seconds)
+def _run_polling_campaign(num_workers: int, durations: list):
+    callback_lock = threading.Lock()
+    finished_durations = []
+    newly_finished_tests = 0
+
+    def test_done_callback(ret):
+        nonlocal newly_finished_tests
+        with callback_lock:
+            finished_durations.append(ret)
+            newly_finished_tests += 1
+
+    start_time = time.time()
+    pool = mp.Pool(processes=num_workers)
+    num_submitted = 0
+    for _ in range(min(num_workers, len(durations))):
+        pool.apply_async(_stub_workload, args=(durations[num_submitted],), callback=test_done_callback)
+        num_submitted += 1
+
+    while True:
+        time.sleep(SCHEDULERPERF_POLLING_PERIOD_SECONDS)
+        with callback_lock:
+            if len(finished_durations) == len(durations):
+                break
+            for _ in range(min(newly_finished_tests, len(durations) - num_submitted)):
+                pool.apply_async(_stub_workload, args=(durations[num_submitted],), callback=test_done_callback)
+                num_submitted += 1
+            newly_finished_tests = 0
+    wall_seconds = time.time() - start_time
+
+    pool.close()
+    pool.terminate()
+    return wall_seconds, sum(finished_durations)
+
+# @brief Measures the worker utilisation of both schedulers on the same stub durations.
+# @return a dict: scheduler name -> dict with the wall time and the utilisation
+def benchmark_scheduler_utilisation(num_workers: int, num_instances: int, min_duration_seconds: float = 0.1, max_duration_seconds: float = 1.0, randseed: int = 0):
+    durations = _gen_stub_durations(num_instances, min_duration_seconds, max_duration_seconds, randseed)
+    results = dict()
+
+    campaign_stats = run_campaign(_stub_workload, lambda instance_id: (durations[instance_id],), num_workers, 0, num_instances)
+    assert campaign_stats.num_completed == num_instances
+    results['eventdriven'] = {'wall_seconds': campaign_stats.wall_seconds, 'utilisation': campaign_stats.get_utilisation()}
+
+    wall_seconds, busy_seconds = _run_polling_campaign(num_workers, durations)
+    results['polling'] = {'wall_seconds': wall_seconds, 'utilisation': busy_seconds / (num_workers * wall_seconds)}
+
+    for scheduler_name, scheduler_results in results.items():
+        print(f"{scheduler_name:>11} scheduler: {scheduler_results['wall_seconds']:7.2f}s wall time, {100*scheduler_results['utilisation']:5.1f}% worker utilisation")
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, f"schedulerperf_{num_workers}_{num_instances}.json"), 'w'))
+    print('Saved scheduler utilisation results to', os.path.join(PATH_TO_TMP, f"schedulerperf_{num_workers}_{num_instances}.json"))
+    return results
@@ -0,0 +1,75 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the throughput of the batched spike resolution (see spike_resolution_batch in cascade/spikeresolution.py) for several batch sizes,
+# and checks that it returns the same expected register values as the single-instance spike resolution.
+
+from params.runparams import PATH_TO_TMP
+from params.fuzzparams import is_iss_enabled
+from common.designcfgs import get_design_boot_addr
+from common.spike import calibrate_spikespeed
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.spikeresolution import spike_resolution, spike_resolution_batch, prepare_spike_resolution
+
+import json
+import os
+import random
+import time
+
+SPIKEBATCHPERF_BATCH_SIZES = (1, 2, 4, 8, 16)
+
+# @brief Generates the basic blocks of a test instance, in the same way as gen_fuzzerstate_elf_expectedvals.
+def _gen_fuzzerstate(design_name: str, randseed: int):
+    from cascade.fuzzerstate import FuzzerState
+    random.seed(randseed)
+    memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+    random.seed(randseed)
+    fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+    gen_basicblocks(fuzzerstate)
+    return fuzzerstate
+
+# @brief Resolves the same test instances with the single-instance spike resolution and with batches of several sizes, where the batch size is also the number of concurrent Spike processes.
+# @param num_instances the number of test instances.
+def benchmark_spike_batch(design_name: str, num_instances: int, randseed_base: int = 0):
+    assert num_instances > 0
+    assert not is_iss_enabled(), "The reference ISS must be disabled to measure the Spike runs."
+
+    calibrate_spikespeed()
+    profile_get_medeleg_mask(design_name)
+
+    # Single-instance spike resolution
+    ref_expected_regvals = []
+    single_seconds = 0
+    for instance_id in range(num_instances):
+        fuzzerstate = _gen_fuzzerstate(design_name, randseed_base + instance_id)
+        start = time.time()
+        ref_expected_regvals.append(spike_resolution(fuzzerstate))
+        single_seconds += time.time() - start - fuzzerstate.time_seconds_spent_in_gen_elf
+    results = {'single': {'seconds': single_seconds, 'instances_per_second': num_instances / single_seconds}}
+
+    # Batched spike resolution
+    for batch_size in SPIKEBATCHPERF_BATCH_SIZES:
+        batch_seconds = 0
+        for batch_start in range(0, num_instances, batch_size):
+            fuzzerstates = []
+            for instance_id in range(batch_start, min(batch_start + batch_size, num_instances)):
+                fuzzerstates.append(_gen_fuzzerstate(design_name, randseed_base + instance_id))
+                prepare_spike_resolution(fuzzerstates[-1])
+            start = time.time()
+            expected_regvals = spike_resolution_batch(fuzzerstates, max_num_procs=batch_size)
+            batch_seconds += time.time() - start - sum(fuzzerstate.time_seconds_spent_in_gen_elf for fuzzerstate in fuzzerstates)
+            for fuzzerstate, curr_expected_regvals in zip(fuzzerstates, expected_regvals):
+                assert curr_expected_regvals == ref_expected_regvals[fuzzerstate.randseed - randseed_base], f"Mismatch between the batched and the single-instance spike resolutions for instance {fuzzerstate.instance_to_str()} (batch size {batch_size})."
+        results[f"batch{batch_size}"] = {'seconds': batch_seconds, 'instances_per_second': num_instances / batch_seconds}
+
+    json_path = os.path.join(PATH_TO_TMP, f"spikebatchperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, 'num_instances': num_instances, **results}, f)
+    print('Saved Spike batch resolution results to', json_path)
+
+    for mode_name, mode_results in results.items():
+        print(f"{mode_name:>8}: {mode_results['instances_per_second']:.1f} instances/s ({mode_results['instances_per_second']/results['single']['instances_per_second']:.2f}x), {1000*mode_results['seconds']/num_instances:.2f} ms per instance")
+    return results
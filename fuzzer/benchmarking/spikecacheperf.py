@@ -0,0 +1,55 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module measures the benefit of the on-disk Spike cache of common/spikecache.py when the same descriptors are resolved again, as during program reduction or repeated campaigns.
+
+from params.runparams import PATH_TO_TMP, NO_REMOVE_TMPFILES
+from common.spike import calibrate_spikespeed, run_trace_regs_at_pc_locs
+from common.spikecache import clear_spike_cache, get_spike_cache_stats, reset_spike_cache_stats
+from common.profiledesign import profile_get_medeleg_mask
+from benchmarking.spikeforkserverperf import _gen_spikeresol_args
+
+import json
+import os
+import time
+
+# @brief Resolves the same instances without the cache, then twice with an initially empty cache, and checks that all the register dumps are identical.
+# Clears the Spike cache.
+# @return a dict: pass name -> mean latency in seconds
+def benchmark_spike_cache(design_name: str, num_instances: int, randseed_base: int = 0):
+    assert num_instances > 0
+
+    calibrate_spikespeed()
+    profile_get_medeleg_mask(design_name)
+
+    all_spikeresol_args = [_gen_spikeresol_args(design_name, randseed_base + instance_id) for instance_id in range(num_instances)]
+
+    clear_spike_cache()
+    reset_spike_cache_stats()
+
+    results = dict()
+    ref_outs = []
+    for pass_name, use_spike_cache in (('uncached', False), ('cold', True), ('warm', True)):
+        latencies = []
+        for instance_id, spikeresol_args in enumerate(all_spikeresol_args):
+            start = time.time()
+            curr_out = run_trace_regs_at_pc_locs(*spikeresol_args, use_spike_cache=use_spike_cache)
+            latencies.append(time.time() - start)
+            if pass_name == 'uncached':
+                ref_outs.append(curr_out)
+            assert curr_out == ref_outs[instance_id], f"Mismatch between the cached and the uncached Spike outputs for instance {spikeresol_args[0]} ({pass_name} pass)."
+        results[pass_name] = sum(latencies) / num_instances
+        print(f"{pass_name:>9} pass: {results[pass_name]*1000:8.2f} ms per spike resolution")
+
+    spike_cache_stats = get_spike_cache_stats()
+    assert spike_cache_stats['misses'] == num_instances and spike_cache_stats['hits'] == num_instances, f"Unexpected Spike cache counters: {spike_cache_stats}"
+    print(f"Spike cache counters: {spike_cache_stats}")
+
+    if not NO_REMOVE_TMPFILES:
+        for spikeresol_args in all_spikeresol_args:
+            os.remove(spikeresol_args[1])
+
+    json.dump({'latencies': results, 'cache_stats': spike_cache_stats}, open(os.path.join(PATH_TO_TMP, f"spikecacheperf_{design_name}.json"), 'w'))
+    print('Saved Spike cache performance results to', os.path.join(PATH_TO_TMP, f"spikecacheperf_{design_name}.json"))
+    return results
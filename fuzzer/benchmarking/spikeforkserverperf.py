@@ -0,0 +1,81 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module compares the per-instance latency of the spike resolution when forking Spike for each call, and when forking Spike from the fork server of common/spikeforkserver.py.
+
+from params.runparams import PATH_TO_TMP, NO_REMOVE_TMPFILES
+from common.designcfgs import get_design_boot_addr, get_design_march_flags_nocompressed
+from common.spike import calibrate_spikespeed, run_trace_regs_at_pc_locs, SPIKE_STARTADDR
+from common.spikeforkserver import close_spike_forkservers
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.genelf import gen_elf_from_bbs
+from cascade.spikeresolution import gen_regdump_reqs, _transmit_addrs_to_producers_for_spike_resolution
+
+import json
+import os
+import random
+import time
+
+# @brief Generates the spike resolution ELF and the spike resolution arguments of a new test instance.
+# @return the argument tuple of run_trace_regs_at_pc_locs, without the use_spike_forkserver argument.
+def _gen_spikeresol_args(design_name: str, randseed: int):
+    from cascade.fuzzerstate import FuzzerState
+    memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+    random.seed(randseed)
+    fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+    gen_basicblocks(fuzzerstate)
+    _transmit_addrs_to_producers_for_spike_resolution(fuzzerstate)
+    elfpath = gen_elf_from_bbs(fuzzerstate, True, 'spikeforkserverperf', fuzzerstate.instance_to_str(), SPIKE_STARTADDR)
+    return (fuzzerstate.instance_to_str(), elfpath, get_design_march_flags_nocompressed(design_name), SPIKE_STARTADDR, gen_regdump_reqs(fuzzerstate), True, fuzzerstate.final_bb_base_addr+SPIKE_STARTADDR, fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0, fuzzerstate.design_has_fpud)
+
+# @brief Measures the spike resolution latency of both paths on the same instances, and checks that both paths return the same register dumps.
+# @param num_instances the number of test instances.
+# @param num_reps the number of repetitions for each instance and each path.
+def benchmark_spike_forkserver_latency(design_name: str, num_instances: int, num_reps: int = 3, randseed_base: int = 0):
+    assert num_instances > 0
+    assert num_reps > 0
+
+    calibrate_spikespeed()
+    profile_get_medeleg_mask(design_name)
+
+    latencies_forked = []
+    latencies_forkserver = []
+    num_instrs = []
+
+    for instance_id in range(num_instances):
+        spikeresol_args = _gen_spikeresol_args(design_name, randseed_base + instance_id)
+        num_instrs.append(len(spikeresol_args[4]))
+
+        ref_out = None
+        for use_spike_forkserver, latencies in ((False, latencies_forked), (True, latencies_forkserver)):
+            curr_latencies = []
+            for _ in range(num_reps):
+                start = time.time()
+                curr_out = run_trace_regs_at_pc_locs(*spikeresol_args, use_spike_forkserver=use_spike_forkserver)
+                curr_latencies.append(time.time() - start)
+                if ref_out is None:
+                    ref_out = curr_out
+                assert curr_out == ref_out, f"Mismatch between the forked and the fork server Spike outputs for instance {spikeresol_args[0]} (use_spike_forkserver={use_spike_forkserver})."
+            latencies.append(min(curr_latencies))
+
+        if not NO_REMOVE_TMPFILES:
+            os.remove(spikeresol_args[1])
+
+    close_spike_forkservers()
+
+    save_dict = {
+        'design_name': design_name,
+        'num_regdump_reqs': num_instrs,
+        'latencies_forked': latencies_forked,
+        'latencies_forkserver': latencies_forkserver,
+    }
+    json.dump(save_dict, open(os.path.join(PATH_TO_TMP, f"spikeforkserverperf_{design_name}.json"), 'w'))
+    print('Saved Spike fork server latency results to', os.path.join(PATH_TO_TMP, f"spikeforkserverperf_{design_name}.json"))
+
+    mean_forked = sum(latencies_forked) / num_instances
+    mean_forkserver = sum(latencies_forkserver) / num_instances
+    print(f"Spike resolution latency for `{design_name}` over {num_instances} instances: forked: {mean_forked*1000:.2f} ms, fork server: {mean_forkserver*1000:.2f} ms (speedup: {mean_forked/mean_forkserver:.2f}x).")
+    return mean_forked, mean_forkserver
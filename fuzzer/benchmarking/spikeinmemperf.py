@@ -0,0 +1,77 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module reports the filesystem operations and the latency of the spike resolution of each test instance,
+# when the ELF and the debug commands are written to PATH_TO_TMP, and when they are delivered in memory (see common/spikeinmem.py).
+
+from params.runparams import PATH_TO_TMP, NO_REMOVE_TMPFILES
+from common.designcfgs import get_design_boot_addr, get_design_march_flags_nocompressed
+from common.spike import calibrate_spikespeed, run_trace_regs_at_pc_locs, SPIKE_STARTADDR
+from common.spikeinmem import get_spike_fs_stats, get_spike_num_fs_ops, reset_spike_fs_stats, remove_spike_inmem_elf, count_spike_file_removal
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.genelf import gen_elf_from_bbs
+from cascade.spikeresolution import gen_regdump_reqs, _transmit_addrs_to_producers_for_spike_resolution
+
+import json
+import os
+import random
+import time
+
+# @brief Runs the Spike part of the spike resolution of a test instance, with the given delivery mode.
+# @return a triple (register dumps, latency in seconds, filesystem operation counters)
+def _run_spikeresol_instance(fuzzerstate, design_name: str, use_spike_inmem: bool):
+    reset_spike_fs_stats()
+    start = time.time()
+    elfpath = gen_elf_from_bbs(fuzzerstate, True, 'spikeinmemperf', fuzzerstate.instance_to_str(), SPIKE_STARTADDR, use_spike_inmem)
+    ret = run_trace_regs_at_pc_locs(fuzzerstate.instance_to_str(), elfpath, get_design_march_flags_nocompressed(design_name), SPIKE_STARTADDR, gen_regdump_reqs(fuzzerstate), True, fuzzerstate.final_bb_base_addr+SPIKE_STARTADDR, fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0, fuzzerstate.design_has_fpud, use_spike_forkserver=False, use_spike_cache=False, use_spike_inmem=use_spike_inmem)
+    if use_spike_inmem:
+        remove_spike_inmem_elf(elfpath)
+    elif not NO_REMOVE_TMPFILES:
+        os.remove(elfpath)
+        count_spike_file_removal()
+    latency = time.time() - start
+    fs_stats = get_spike_fs_stats()
+    fs_stats['num_fs_ops'] = get_spike_num_fs_ops()
+    return ret, latency, fs_stats
+
+# @brief Compares both delivery modes on the same instances, and checks that they return the same register dumps.
+# @param num_instances the number of test instances.
+def benchmark_spike_inmem(design_name: str, num_instances: int, randseed_base: int = 0):
+    from cascade.fuzzerstate import FuzzerState
+    assert num_instances > 0
+
+    calibrate_spikespeed()
+    profile_get_medeleg_mask(design_name)
+
+    results = {'ondisk': [], 'inmem': []}
+    for instance_id in range(num_instances):
+        randseed = randseed_base + instance_id
+        memsize, _, _, nmax_bbs, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+        random.seed(randseed)
+        fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+        gen_basicblocks(fuzzerstate)
+        _transmit_addrs_to_producers_for_spike_resolution(fuzzerstate)
+
+        ref_out = None
+        for mode_name, use_spike_inmem in (('ondisk', False), ('inmem', True)):
+            curr_out, latency, fs_stats = _run_spikeresol_instance(fuzzerstate, design_name, use_spike_inmem)
+            if ref_out is None:
+                ref_out = curr_out
+            assert curr_out == ref_out, f"Mismatch between the on-disk and the in-memory Spike outputs for instance {fuzzerstate.instance_to_str()}."
+            fs_stats['latency'] = latency
+            results[mode_name].append(fs_stats)
+
+    json_path = os.path.join(PATH_TO_TMP, f"spikeinmemperf_{design_name}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'design_name': design_name, **results}, f)
+    print('Saved Spike in-memory delivery results to', json_path)
+
+    for mode_name, mode_results in results.items():
+        mean_num_fs_ops = sum(r['num_fs_ops'] for r in mode_results) / num_instances
+        mean_num_bytes_written = sum(r['num_bytes_written'] for r in mode_results) / num_instances
+        mean_latency = sum(r['latency'] for r in mode_results) / num_instances
+        print(f"{mode_name:>6}: {mean_num_fs_ops:.1f} filesystem operations and {mean_num_bytes_written:.0f} bytes written per instance, {mean_latency*1000:.2f} ms latency")
+    return results
@@ -0,0 +1,112 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module checks the streaming Spike register dump parser of common/spikestream.py against the parser of run_trace_regs_at_pc_locs, and compares their throughputs.
+# The Spike outputs are synthesized in the format of spike -d, hence Spike is not required.
+
+from params.runparams import PATH_TO_TMP
+from common.spike import _parse_trace_regs_at_pc_locs
+from common.spikestream import SpikeRegdumpStreamParser
+
+import json
+import os
+import random
+import time
+
+SPIKEPARSERPERF_INTREG_NAMES = [
+    'zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7', 's2', 's3', 's4', 's5', 's6', 's7', 's8', 's9', 's10', 's11', 't3', 't4', 't5', 't6'
+]
+# Probability of an exception report line before a register dump.
+SPIKEPARSERPERF_PROBA_EXCEPTION = 0.05
+# Probability of a privilege dump instead of a register dump.
+SPIKEPARSERPERF_PROBA_PRIV = 0.02
+
+# @brief Synthesizes the Spike output of run_trace_regs_at_pc_locs.
+# @return the output bytes
+def _gen_spike_regdump_output(rng, num_regdump_reqs: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool, is_design_64bit: bool) -> bytes:
+    xlen_hexdigits = 16 if is_design_64bit else 8
+    lines = ["warning: tohost and fromhost symbols not in ELF; can't communicate with target"]
+    for _ in range(num_regdump_reqs):
+        if rng.random() < SPIKEPARSERPERF_PROBA_EXCEPTION:
+            lines.append(f"core   0: exception trap_illegal_instruction, epc 0x{rng.randrange(1 << 32):016x}")
+        if rng.random() < SPIKEPARSERPERF_PROBA_PRIV:
+            lines.append(rng.choice('MSU'))
+        else:
+            lines.append(f"0x{rng.randrange(1 << (4*xlen_hexdigits)):0{xlen_hexdigits}x}")
+    if dump_final_reg_vals:
+        for row_id in range(8):
+            lines.append(''.join(f"{SPIKEPARSERPERF_INTREG_NAMES[4*row_id+col_id]:>4}: 0x{rng.randrange(1 << (4*xlen_hexdigits)):0{xlen_hexdigits}x}" for col_id in range(4)))
+        for _ in range(num_fp_regs):
+            if has_fpdouble_support:
+                lines.append(f"0x{'f'*16}{rng.randrange(1 << 64):016x}")
+            else:
+                lines.append(f"0x{'f'*24}{rng.randrange(1 << 32):08x}")
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+# @brief Feeds the output to a new stream parser, in chunks of random sizes.
+# @return the parser
+def _stream_parse(rng, spike_out: bytes, num_regdump_reqs: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool, max_chunk_bytes: int):
+    parser = SpikeRegdumpStreamParser(num_regdump_reqs, dump_final_reg_vals, num_fp_regs, has_fpdouble_support)
+    chunk_start = 0
+    while chunk_start < len(spike_out):
+        chunk_end = chunk_start + rng.randint(1, max_chunk_bytes)
+        parser.feed(spike_out[chunk_start:chunk_end])
+        chunk_start = chunk_end
+    parser.finish()
+    return parser
+
+# @brief Checks the stream parser against the reference parser on random outputs split into random chunks,
+# and checks that truncated outputs are reported as incomplete.
+def check_stream_parser_equivalence(num_cases: int, randseed: int = 0):
+    rng = random.Random(randseed)
+    num_truncations = 0
+    for case_id in range(num_cases):
+        num_regdump_reqs = rng.choice((0, 1, rng.randrange(2, 100), rng.randrange(100, 5000)))
+        dump_final_reg_vals = rng.random() < 0.8
+        is_design_64bit = rng.random() < 0.5
+        num_fp_regs = rng.choice((0, 8, 32)) if is_design_64bit else 0
+        has_fpdouble_support = is_design_64bit
+        rvflags = 'rv64g' if is_design_64bit else 'rv32i'
+        spike_out = _gen_spike_regdump_output(rng, num_regdump_reqs, dump_final_reg_vals, num_fp_regs, has_fpdouble_support, is_design_64bit)
+        regdump_reqs = [None] * num_regdump_reqs # The reference parser only uses the number of requests.
+
+        ref_ret = _parse_trace_regs_at_pc_locs(spike_out, rvflags, regdump_reqs, dump_final_reg_vals, num_fp_regs, has_fpdouble_support, '')
+        parser = _stream_parse(rng, spike_out, num_regdump_reqs, dump_final_reg_vals, num_fp_regs, has_fpdouble_support, rng.choice((1, 7, 4096, len(spike_out))))
+        assert parser.is_done(), f"Case {case_id}: the stream parser did not complete."
+        assert parser.get_result() == ref_ret, f"Case {case_id}: mismatch between the stream parser and the reference parser."
+
+        # Any truncation removes at least the trailing newline of the last expected line.
+        if not (num_regdump_reqs or dump_final_reg_vals):
+            continue
+        truncated_len = rng.randrange(len(spike_out))
+        truncated_parser = _stream_parse(rng, spike_out[:truncated_len], num_regdump_reqs, dump_final_reg_vals, num_fp_regs, has_fpdouble_support, 4096)
+        assert not truncated_parser.is_done(), f"Case {case_id}: the stream parser did not detect the truncation at byte {truncated_len}/{len(spike_out)}."
+        num_truncations += 1
+    print(f"Spike stream parser equivalence: {num_cases} outputs and {num_truncations} truncated outputs passed.")
+
+# @brief Measures the throughput of the stream parser and of the reference parser, in MB/s of Spike output.
+def benchmark_stream_parser_throughput(num_regdump_reqs: int = 200000, num_reps: int = 5, randseed: int = 0):
+    rng = random.Random(randseed)
+    spike_out = _gen_spike_regdump_output(rng, num_regdump_reqs, True, 32, True, True)
+    regdump_reqs = [None] * num_regdump_reqs
+
+    results = dict()
+    for parser_name in ('stream', 'reference'):
+        start = time.time()
+        for _ in range(num_reps):
+            if parser_name == 'stream':
+                parser = SpikeRegdumpStreamParser(num_regdump_reqs, True, 32, True)
+                for chunk_start in range(0, len(spike_out), 1 << 16):
+                    parser.feed(spike_out[chunk_start:chunk_start + (1 << 16)])
+                parser.finish()
+                parser.get_result()
+            else:
+                _parse_trace_regs_at_pc_locs(spike_out, 'rv64g', regdump_reqs, True, 32, True, '')
+        duration = time.time() - start
+        results[parser_name] = num_reps * len(spike_out) / duration / 1e6
+        print(f"{parser_name:>9} parser: {results[parser_name]:8.1f} MB/s")
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, 'spikeparserperf.json'), 'w'))
+    print('Saved Spike parser performance results to', os.path.join(PATH_TO_TMP, 'spikeparserperf.json'))
+    return results
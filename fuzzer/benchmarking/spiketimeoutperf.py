@@ -0,0 +1,98 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module compares the adaptive Spike timeout model of common/spiketimeout.py against the calibrated timeout, on simulated Spike runtime traces.
+# A trace is a sequence of runs with a size and a runtime, where the runtime is infinite for hanging runs.
+# A run that is killed at its deadline although it would have completed is a false kill. The worker time of a killed run is its deadline.
+
+from params.runparams import PATH_TO_TMP
+from common.spiketimeout import SpikeTimeoutModel
+
+import json
+import numpy as np
+import os
+
+# Simulated Spike runtime: fixed cost plus a cost per unit of size, with a multiplicative log-normal noise.
+SPIKETIMEOUTPERF_FIXED_SECONDS = 0.05
+SPIKETIMEOUTPERF_SECONDS_PER_UNIT = 2e-4
+SPIKETIMEOUTPERF_NOISE_SIGMA = 0.3
+# Occasional slowdowns of the system, which multiply the runtime of a run by a factor between 2 and 4.
+SPIKETIMEOUTPERF_SLOWDOWN_PROBABILITY = 0.01
+# Sizes are log-normally distributed around this median.
+SPIKETIMEOUTPERF_MEDIAN_SIZE = 200
+# The calibrated timeout, as given by get_spike_timeout_seconds() on a typical machine.
+SPIKETIMEOUTPERF_CALIBRATED_TIMEOUT_SECONDS = 10
+
+# Scenario name -> (hang probability, factor by which the runtimes are multiplied in the second half of the trace)
+SPIKETIMEOUTPERF_SCENARIOS = {
+    'stationary': (0.01, 1),
+    'hangs':      (0.05, 1),
+    'drift':      (0.01, 3),
+}
+
+# @brief Generates a simulated runtime trace.
+# @return a pair of numpy arrays (sizes, runtimes), where the runtimes of the hanging runs are infinite.
+def _gen_runtime_trace(num_runs: int, hang_probability: float, drift_factor: float, rng: np.random.Generator):
+    sizes = np.maximum(1, rng.lognormal(np.log(SPIKETIMEOUTPERF_MEDIAN_SIZE), 1, num_runs)).astype(np.int64)
+    runtimes = (SPIKETIMEOUTPERF_FIXED_SECONDS + SPIKETIMEOUTPERF_SECONDS_PER_UNIT * sizes) * rng.lognormal(0, SPIKETIMEOUTPERF_NOISE_SIGMA, num_runs)
+    runtimes *= np.where(rng.random(num_runs) < SPIKETIMEOUTPERF_SLOWDOWN_PROBABILITY, rng.uniform(2, 4, num_runs), 1)
+    runtimes[num_runs // 2:] *= drift_factor
+    runtimes[rng.random(num_runs) < hang_probability] = np.inf
+    return sizes, runtimes
+
+# @brief Replays a trace on a single worker.
+# @param model the timeout model, or None to only use the calibrated timeout.
+# @return a dict of statistics
+def _replay_runtime_trace(sizes, runtimes, model: SpikeTimeoutModel):
+    num_false_kills = 0
+    worker_seconds = 0
+    hang_seconds = 0
+    for size, runtime in zip(sizes.tolist(), runtimes.tolist()):
+        if model is None:
+            deadline = SPIKETIMEOUTPERF_CALIBRATED_TIMEOUT_SECONDS
+        else:
+            deadline = model.get_deadline_seconds(size, SPIKETIMEOUTPERF_CALIBRATED_TIMEOUT_SECONDS)
+        if runtime > deadline:
+            num_false_kills += int(runtime != np.inf)
+            worker_seconds += deadline
+            if runtime == np.inf:
+                hang_seconds += deadline
+            if model is not None:
+                model.record_timeout(size, deadline)
+        else:
+            worker_seconds += runtime
+            if model is not None:
+                model.record_runtime(size, runtime, deadline)
+    num_completing_runs = int(np.sum(runtimes != np.inf))
+    return {
+        'num_false_kills': num_false_kills,
+        'false_kill_rate': num_false_kills / max(num_completing_runs, 1),
+        'worker_seconds': worker_seconds,
+        'hang_seconds': hang_seconds,
+        'num_near_misses': 0 if model is None else model.num_near_misses,
+    }
+
+# @brief Replays simulated runtime traces with the calibrated and the adaptive timeouts.
+# @return a dict: scenario name -> dict: timeout name -> statistics
+def benchmark_spike_timeout(num_runs: int, randseed: int = 0):
+    results = dict()
+    for scenario_name, (hang_probability, drift_factor) in SPIKETIMEOUTPERF_SCENARIOS.items():
+        sizes, runtimes = _gen_runtime_trace(num_runs, hang_probability, drift_factor, np.random.default_rng(randseed))
+        results[scenario_name] = {
+            'calibrated': _replay_runtime_trace(sizes, runtimes, None),
+            'adaptive': _replay_runtime_trace(sizes, runtimes, SpikeTimeoutModel()),
+        }
+        results[scenario_name]['reclaimed_seconds'] = results[scenario_name]['calibrated']['worker_seconds'] - results[scenario_name]['adaptive']['worker_seconds']
+
+    for scenario_name, scenario_results in results.items():
+        for timeout_name in ('calibrated', 'adaptive'):
+            timeout_results = scenario_results[timeout_name]
+            print(f"{scenario_name:>10} {timeout_name:>10}: {timeout_results['worker_seconds']:9.1f}s worker time, of which {timeout_results['hang_seconds']:8.1f}s on hanging runs, {timeout_results['num_false_kills']:4d} false kills ({100*timeout_results['false_kill_rate']:.3f}%), {timeout_results['num_near_misses']:4d} near-misses")
+        print(f"{scenario_name:>10} reclaimed {scenario_results['reclaimed_seconds']:.1f}s of worker time ({100*scenario_results['reclaimed_seconds']/scenario_results['calibrated']['worker_seconds']:.1f}%)")
+
+    json_path = os.path.join(PATH_TO_TMP, 'spiketimeoutperf.json')
+    with open(json_path, 'w') as f:
+        json.dump(results, f)
+    print('Saved Spike timeout benchmark results to', json_path)
+    return results
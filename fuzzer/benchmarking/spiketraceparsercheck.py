@@ -0,0 +1,113 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module checks the parser of run_trace_commits against the positional parser of the debug backend of run_trace_all_pcs (see common/spike.py) on recorded Spike outputs.
+# record_spike_trace_logs runs Spike with both trace backends on generated programs and stores the raw outputs, such that check_spike_trace_parsers can later run without Spike.
+
+from params.runparams import PATH_TO_TMP, NO_REMOVE_TMPFILES
+import common.spike
+from common.spike import calibrate_spikespeed, run_trace_all_pcs, SPIKE_DISASM_LINE_REGEX, SPIKE_COMMIT_LINE_REGEX
+from common.profiledesign import profile_get_medeleg_mask
+from benchmarking.spiketraceperf import _gen_trace_args
+
+from pathlib import Path
+import json
+import os
+
+# @brief Records the raw Spike outputs of both trace backends for generated programs.
+# @param log_dir the directory where the outputs are stored, as <identifier>.<backend>.log, with the parser arguments in <identifier>.json.
+def record_spike_trace_logs(design_name: str, num_instances: int, log_dir: str, nmax_bbs: int = 20, randseed_base: int = 0):
+    assert num_instances > 0
+    calibrate_spikespeed()
+    profile_get_medeleg_mask(design_name)
+    Path(log_dir).mkdir(parents=True, exist_ok=True)
+
+    # The parsers are wrapped to store their inputs. They are called by run_trace_all_pcs and run_trace_commits through the module.
+    prev_parsers = {'debug': common.spike._parse_trace_all_pcs, 'commitlog': common.spike._parse_trace_commits}
+    recorded_outs = dict()
+    def record_debug_out(spike_out, *args):
+        recorded_outs['debug'] = spike_out
+        return prev_parsers['debug'](spike_out, *args)
+    def record_commitlog_out(identifier_str, spike_out, *args):
+        recorded_outs['commitlog'] = spike_out
+        return prev_parsers['commitlog'](identifier_str, spike_out, *args)
+    common.spike._parse_trace_all_pcs = record_debug_out
+    common.spike._parse_trace_commits = record_commitlog_out
+    try:
+        for instance_id in range(num_instances):
+            trace_args = _gen_trace_args(design_name, randseed_base + instance_id, nmax_bbs)
+            identifier_str, elfpath, rvflags, numinstrs, _, dump_final_reg_vals, num_fp_regs, has_fpdouble_support, _ = trace_args
+            recorded_outs.clear()
+            for trace_backend in prev_parsers:
+                run_trace_all_pcs(*trace_args, trace_backend=trace_backend)
+            for trace_backend, spike_out in recorded_outs.items():
+                with open(os.path.join(log_dir, f"{identifier_str}.{trace_backend}.log"), 'wb') as f:
+                    f.write(spike_out)
+            with open(os.path.join(log_dir, f"{identifier_str}.json"), 'w') as f:
+                json.dump({'rvflags': rvflags, 'numinstrs': numinstrs, 'dump_final_reg_vals': dump_final_reg_vals, 'num_fp_regs': num_fp_regs, 'has_fpdouble_support': has_fpdouble_support}, f)
+            if not NO_REMOVE_TMPFILES:
+                os.remove(elfpath)
+    finally:
+        common.spike._parse_trace_all_pcs = prev_parsers['debug']
+        common.spike._parse_trace_commits = prev_parsers['commitlog']
+    print(f"Recorded the Spike traces of {num_instances} programs to {log_dir}.")
+
+# @return a dict of the numbers of the kinds of processor lines in the output.
+def _count_spike_trace_lines(spike_out: bytes) -> dict:
+    ret = {'disasm': 0, 'commit': 0, 'exception': 0, 'trap_pc': 0}
+    for line in spike_out.split(b"\n"):
+        if not line.startswith(b'core'):
+            continue
+        if b'exception' in line or b'tval 0x' in line:
+            ret['exception'] += 1
+        elif SPIKE_COMMIT_LINE_REGEX.match(line):
+            ret['commit'] += 1
+        elif SPIKE_DISASM_LINE_REGEX.match(line):
+            ret['disasm'] += 1
+        else:
+            ret['trap_pc'] += 1
+    return ret
+
+# @brief Checks, for each recorded program, that the parser of run_trace_commits returns the same PCs and final register values as the positional parser,
+# both on the output of the debug backend and on the output of the commitlog backend.
+# @return a dict of the numbers of programs, instructions and processor lines of each kind that were checked.
+def check_spike_trace_parsers(log_dir: str):
+    json_filenames = sorted(filename for filename in os.listdir(log_dir) if filename.endswith('.json'))
+    if not json_filenames:
+        raise ValueError(f"No recorded Spike trace in `{log_dir}`.")
+
+    stats = {'num_programs': 0, 'num_instrs': 0, 'num_mismatches': 0, 'debug': dict(), 'commitlog': dict()}
+    for json_filename in json_filenames:
+        identifier_str = json_filename[:-len('.json')]
+        with open(os.path.join(log_dir, json_filename)) as f:
+            parser_args = json.load(f)
+        parser_args = (parser_args['rvflags'], parser_args['numinstrs'], parser_args['dump_final_reg_vals'], parser_args['num_fp_regs'], parser_args['has_fpdouble_support'])
+        spike_outs = dict()
+        for trace_backend in ('debug', 'commitlog'):
+            with open(os.path.join(log_dir, f"{identifier_str}.{trace_backend}.log"), 'rb') as f:
+                spike_outs[trace_backend] = f.read()
+            for line_kind, num_lines in _count_spike_trace_lines(spike_outs[trace_backend]).items():
+                stats[trace_backend][line_kind] = stats[trace_backend].get(line_kind, 0) + num_lines
+
+        ref_ret = common.spike._parse_trace_all_pcs(spike_outs['debug'], *parser_args)
+        for trace_backend, spike_out in spike_outs.items():
+            commits_ret = common.spike._parse_trace_commits(identifier_str, spike_out, *parser_args)
+            # Same output shapes as run_trace_all_pcs with the commitlog backend.
+            if parser_args[2]:
+                (pcs, _, _), final_reg_vals = commits_ret
+                curr_ret = pcs.tolist(), final_reg_vals
+            else:
+                curr_ret = commits_ret[0].tolist()
+            if curr_ret != ref_ret:
+                print(f"Mismatch between the Spike trace parsers for {identifier_str} on the output of the {trace_backend} backend.")
+                stats['num_mismatches'] += 1
+        stats['num_programs'] += 1
+        stats['num_instrs'] += parser_args[1]
+
+    with open(os.path.join(PATH_TO_TMP, 'spiketraceparsercheck.json'), 'w') as f:
+        json.dump(stats, f)
+    print(f"Spike trace parsers: {stats['num_mismatches']} mismatches over {stats['num_programs']} programs and {stats['num_instrs']} instructions.")
+    for trace_backend in ('debug', 'commitlog'):
+        print(f"  {trace_backend} outputs: " + ', '.join(f"{num_lines} {line_kind} lines" for line_kind, num_lines in stats[trace_backend].items()))
+    return stats
@@ -0,0 +1,68 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module compares the duration of the full PC traces made by run_trace_all_pcs with the debug and the commitlog backends, across program sizes.
+
+from params.runparams import PATH_TO_TMP, NO_REMOVE_TMPFILES
+from common.designcfgs import get_design_boot_addr, get_design_march_flags_nocompressed
+from common.spike import calibrate_spikespeed, run_trace_all_pcs, SPIKE_STARTADDR, SPIKE_TRACE_BACKENDS
+from common.profiledesign import profile_get_medeleg_mask
+from cascade.basicblock import gen_basicblocks
+from cascade.fuzzfromdescriptor import gen_new_test_instance
+from cascade.genelf import gen_elf_from_bbs
+from cascade.spikeresolution import spike_resolution
+
+import itertools
+import json
+import os
+import random
+import time
+
+SPIKETRACEPERF_NUM_BBS = [5, 20, 80, 320]
+
+# @brief Generates a resolved program and its RTL ELF located for Spike.
+# @return the argument tuple of run_trace_all_pcs, without the trace_backend argument.
+def _gen_trace_args(design_name: str, randseed: int, nmax_bbs: int):
+    from cascade.fuzzerstate import FuzzerState
+    memsize, _, _, _, authorize_privileges = gen_new_test_instance(design_name, randseed, True)
+    random.seed(randseed)
+    fuzzerstate = FuzzerState(get_design_boot_addr(design_name), design_name, memsize, randseed, nmax_bbs, authorize_privileges)
+    gen_basicblocks(fuzzerstate)
+    spike_resolution(fuzzerstate)
+    elfpath = gen_elf_from_bbs(fuzzerstate, False, 'spiketraceperf', fuzzerstate.instance_to_str(), SPIKE_STARTADDR)
+    numinstrs = len(list(itertools.chain.from_iterable(fuzzerstate.instr_objs_seq)))+1
+    return (fuzzerstate.instance_to_str(), elfpath, get_design_march_flags_nocompressed(design_name), numinstrs, SPIKE_STARTADDR, True, fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0, fuzzerstate.design_has_fpud, fuzzerstate)
+
+# @brief Measures the trace duration of each backend on the same programs, and checks that both backends return the same traces.
+# @return a dict: number of basic blocks -> backend name -> mean trace duration per instruction, in seconds
+def benchmark_spike_trace_backends(design_name: str, num_instances: int, randseed_base: int = 0):
+    assert num_instances > 0
+
+    calibrate_spikespeed()
+    profile_get_medeleg_mask(design_name)
+
+    results = dict()
+    for nmax_bbs in SPIKETRACEPERF_NUM_BBS:
+        durations = {trace_backend: 0 for trace_backend in SPIKE_TRACE_BACKENDS}
+        tot_numinstrs = 0
+        for instance_id in range(num_instances):
+            trace_args = _gen_trace_args(design_name, randseed_base + instance_id, nmax_bbs)
+            tot_numinstrs += trace_args[3]
+            ref_out = None
+            for trace_backend in SPIKE_TRACE_BACKENDS:
+                start = time.time()
+                curr_out = run_trace_all_pcs(*trace_args, trace_backend=trace_backend)
+                durations[trace_backend] += time.time() - start
+                if ref_out is None:
+                    ref_out = curr_out
+                assert curr_out == ref_out, f"Mismatch between the Spike trace backends for instance {trace_args[0]} (backend: {trace_backend})."
+            if not NO_REMOVE_TMPFILES:
+                os.remove(trace_args[1])
+
+        results[nmax_bbs] = {trace_backend: durations[trace_backend] / tot_numinstrs for trace_backend in SPIKE_TRACE_BACKENDS}
+        print(f"{nmax_bbs:4} basic blocks ({tot_numinstrs // num_instances:6} instructions on average): " + ', '.join(f"{trace_backend}: {durations[trace_backend] / num_instances * 1000:9.2f} ms" for trace_backend in SPIKE_TRACE_BACKENDS))
+
+    json.dump(results, open(os.path.join(PATH_TO_TMP, f"spiketraceperf_{design_name}.json"), 'w'))
+    print('Saved Spike trace performance results to', os.path.join(PATH_TO_TMP, f"spiketraceperf_{design_name}.json"))
+    return results
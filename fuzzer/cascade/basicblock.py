@@ -7,7 +7,7 @@
 from params.runparams import DO_ASSERT
 from common.spike import SPIKE_STARTADDR
 from rv.csrids import CSR_IDS
-from params.fuzzparams import BRANCH_TAKEN_PROBA, LIMIT_MEM_SATURATION_RATIO, RANDOM_DATA_BLOCK_MIN_SIZE_BYTES, RANDOM_DATA_BLOCK_MAX_SIZE_BYTES
+from params.fuzzparams import BRANCH_TAKEN_PROBA, LIMIT_MEM_SATURATION_RATIO, RANDOM_DATA_BLOCK_MIN_SIZE_BYTES, RANDOM_DATA_BLOCK_MAX_SIZE_BYTES, BBGEN_CHECKPOINT_PERIOD, BBGEN_MAX_ROLLBACKS, is_bbgen_rollback_enabled
 from cascade.randomize.createcfinstr import create_instr, create_regfsm_instrobjs
 from cascade.randomize.pickinstrtype import gen_next_instrstr_from_isaclass
 from cascade.randomize.pickisainstrclass import gen_next_isainstrclass, ISAInstrClass
@@ -24,11 +24,52 @@ from cascade.blacklist import blacklist_changing_instructions, blacklist_final_b
 from cascade.privilegestate import PrivilegeStateEnum
 
 import random
+import time
+
+###
+# Generation retries
+###
+
+# Counters of the generation retries of the current process, see gen_basicblocks.
+# retry_seconds is the wall time of the generation attempts, or of the parts of attempts since the last rollback, that ended with a failure.
+# A redraw of the store locations after a failed reservation of the context setter counts as a rollback of 0 basic blocks.
+__bbgen_retry_stats = {'num_generations': 0, 'num_full_resets': 0, 'num_rollbacks': 0, 'num_rolled_back_bbs': 0, 'retry_seconds': 0}
+
+# @return a copy of the generation retry counters of the current process.
+def get_bbgen_retry_stats() -> dict:
+    return dict(__bbgen_retry_stats)
+
+def reset_bbgen_retry_stats():
+    for stat_name in __bbgen_retry_stats:
+        __bbgen_retry_stats[stat_name] = 0
+
+# @brief Records a failure of the generation.
+# @param num_rolled_back_bbs None for a full reset, else the number of basic blocks discarded by the rollback.
+# @return the start of the next attempt.
+def _record_bbgen_retry(attempt_start: float, num_rolled_back_bbs: int = None) -> float:
+    now = time.perf_counter()
+    __bbgen_retry_stats['retry_seconds'] += now - attempt_start
+    if num_rolled_back_bbs is None:
+        __bbgen_retry_stats['num_full_resets'] += 1
+    else:
+        __bbgen_retry_stats['num_rollbacks'] += 1
+        __bbgen_retry_stats['num_rolled_back_bbs'] += num_rolled_back_bbs
+    return now
+
+###
+# Basic block generation
+###
 
 # @brief Generates a series of basic blocks.
 # Does not transmit the next bb address to the control flow instructions.
+# If is_bbgen_rollback_enabled, a failed basic block generation first rolls back to checkpoints taken at basic block boundaries, and only resets the whole fuzzer state after BBGEN_MAX_ROLLBACKS rollbacks.
+# Likewise, a failed reservation of the context setter first draws fewer store locations, at most BBGEN_MAX_ROLLBACKS times.
 # @param fuzzerstate a freshly created fuzzerstate.
 def gen_basicblocks(fuzzerstate):
+    is_rollback_enabled = is_bbgen_rollback_enabled()
+    __bbgen_retry_stats['num_generations'] += 1
+    attempt_start = time.perf_counter()
+
     # Until the generation succeeds
     while True:
 
@@ -50,32 +91,40 @@ def gen_basicblocks(fuzzerstate):
         # Reserve space for the context setter basic block, but do not instantiate 
         # it because we do not know yet what it will look like until we have a concrete 
         # context to restore. Until then, we just know arbitrary bounds.
-        if not alloc_context_saver_bb(fuzzerstate):
+        # The size of the context setter grows with the number of store locations. Hence, if rollbacks are enabled, a failed reservation draws fewer store locations and tries again, instead of resetting the whole fuzzer state.
+        is_ctxsv_allocated = alloc_context_saver_bb(fuzzerstate)
+        num_ctxsv_redraws = 0
+        while not is_ctxsv_allocated and is_rollback_enabled and fuzzerstate.num_store_locations > 1 and num_ctxsv_redraws < BBGEN_MAX_ROLLBACKS:
+            fuzzerstate.redraw_num_store_locations()
+            attempt_start = _record_bbgen_retry(attempt_start, 0)
+            num_ctxsv_redraws += 1
+            is_ctxsv_allocated = alloc_context_saver_bb(fuzzerstate)
+        if not is_ctxsv_allocated:
+            attempt_start = _record_bbgen_retry(attempt_start)
             continue
 
         # Finally, generate the store locations. This can be swapped with generating the final basic block.
         fuzzerstate.memstorestate.init_store_locations(fuzzerstate.num_store_locations, fuzzerstate.memview)
 
+        # The checkpoints of the basic block generation, in increasing number of basic blocks.
+        num_rollbacks = 0
+        bb_checkpoints = [fuzzerstate.save_bbgen_checkpoint()] if is_rollback_enabled else []
         while True:
-            bb_gen_success = gen_basicblock(fuzzerstate)
-            # This corresponds to failing to find space for a new basic block. 
-            # In this case, this block may also not have completed, and we drop it.
-            if bb_gen_success == False:
-                break
-            # Save the register states
-            fuzzerstate.save_reg_state()
-            # Stop generating if no more bb can be produced
-            if fuzzerstate.nmax_bbs is not None and len(fuzzerstate.instr_objs_seq) >= fuzzerstate.nmax_bbs \
-                  or fuzzerstate.memview.get_allocated_ratio() >= LIMIT_MEM_SATURATION_RATIO \
-                  or fuzzerstate.has_reached_max_instr_num():
-                break
-            fuzzerstate.memview.alloc_mem_range(fuzzerstate.next_bb_addr, BASIC_BLOCK_MIN_SPACE)
-            # print('Mem occupation:', fuzzerstate.memview.get_allocated_ratio(), end='\r')
+            gen_basicblocks_until_stop(fuzzerstate, bb_checkpoints if is_rollback_enabled else None)
 
-        # Find a suitable last bb and connect it with the final block
-        pop_success = pop_last_bbs_to_connect_with_final_block(fuzzerstate)
+            # Find a suitable last bb and connect it with the final block
+            num_bbs_before_pop = len(fuzzerstate.instr_objs_seq)
+            pop_success = pop_last_bbs_to_connect_with_final_block(fuzzerstate)
+            if pop_success or not bb_checkpoints or num_rollbacks >= BBGEN_MAX_ROLLBACKS:
+                break
+            # Each further failure rolls back to an older checkpoint.
+            bb_checkpoint = bb_checkpoints.pop()
+            fuzzerstate.restore_bbgen_checkpoint(bb_checkpoint)
+            attempt_start = _record_bbgen_retry(attempt_start, num_bbs_before_pop - bb_checkpoint.get_num_bbs())
+            num_rollbacks += 1
         if pop_success:
             break
+        attempt_start = _record_bbgen_retry(attempt_start)
         # Staying in the external loop is typically extremely rare. Staying corresponds 
         # to not being able to jump to the final bb despite popping any number of bbs. 
         # This may happen mostly with large memories and with a very high prevalence 
@@ -108,6 +157,28 @@ def gen_basicblocks(fuzzerstate):
 
     return fuzzerstate
 
+# @brief Generates basic blocks until no more basic block can or should be produced.
+# The space of the first basic block to generate must already be reserved.
+# @param bb_checkpoints if not None, a checkpoint is appended every BBGEN_CHECKPOINT_PERIOD basic blocks.
+def gen_basicblocks_until_stop(fuzzerstate, bb_checkpoints: list = None):
+    while True:
+        bb_gen_success = gen_basicblock(fuzzerstate)
+        # This corresponds to failing to find space for a new basic block. 
+        # In this case, this block may also not have completed, and we drop it.
+        if bb_gen_success == False:
+            break
+        # Save the register states
+        fuzzerstate.save_reg_state()
+        # Stop generating if no more bb can be produced
+        if fuzzerstate.nmax_bbs is not None and len(fuzzerstate.instr_objs_seq) >= fuzzerstate.nmax_bbs \
+              or fuzzerstate.memview.get_allocated_ratio() >= LIMIT_MEM_SATURATION_RATIO \
+              or fuzzerstate.has_reached_max_instr_num():
+            break
+        fuzzerstate.memview.alloc_mem_range(fuzzerstate.next_bb_addr, BASIC_BLOCK_MIN_SPACE)
+        # print('Mem occupation:', fuzzerstate.memview.get_allocated_ratio(), end='\r')
+        if bb_checkpoints is not None and (not bb_checkpoints or len(fuzzerstate.instr_objs_seq) - bb_checkpoints[-1].get_num_bbs() >= BBGEN_CHECKPOINT_PERIOD):
+            bb_checkpoints.append(fuzzerstate.save_bbgen_checkpoint())
+
 # The first BASIC_BLOCK_MIN_SPACE must be pre-allocated. The rationale is that we 
 # want to pre-allocate at least for the first basic block, to prevent the store 
 # data from landing exactly there.
@@ -520,8 +591,7 @@ def pop_last_bbs_to_connect_with_final_block(fuzzerstate):
             return True
         # else, in case the last block could not reach the final block, then we discard it and try with the previous one.
         popped_at_least_once = True
-        fuzzerstate.instr_objs_seq.pop()
-        fuzzerstate.bb_start_addr_seq.pop()
+        fuzzerstate.pop_last_bb()
         fuzzerstate.saved_reg_states.pop()
     return False
 
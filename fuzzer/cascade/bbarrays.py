@@ -0,0 +1,203 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module provides a structure-of-arrays representation of a sequence of instructions, typically a basic block or all the basic blocks of a program.
+# Each instruction is a row of numpy columns (class, instruction id, registers, immediate, etc.), so that the whole sequence is encoded in one pass of vectorized operations instead of one gen_bytecode_int call per instruction object.
+# The encoding is bit-identical to gen_bytecode_int, and relies on the encoding table of rv/encodingtable.py.
+# The arrays are a snapshot of the instruction objects: the placeholder offsets must be resolved before the arrays are built, for the encoding to use them.
+# As the vectorized operations have a fixed cost per call, the representation pays off for whole programs rather than for individual basic blocks (see benchmarking/bbarraysperf.py).
+# The generator, genelf and the reduction still build and encode the instruction objects, hence converting to the arrays would only add a pass. The representation is therefore only used by benchmarking/bbarraysperf.py, until a path keeps whole programs in array form.
+
+from params.fuzzparams import RELOCATOR_REGISTER_ID, RDEP_MASK_REGISTER_ID
+from params.runparams import DO_ASSERT
+from rv.util import INSTRUCTION_IDS, INSTRUCTION_IDS_INV
+from rv.encodingtable import ENCODING_FORMAT_R, ENCODING_FORMAT_R4, ENCODING_FORMAT_I, ENCODING_FORMAT_S, ENCODING_FORMAT_B, ENCODING_FORMAT_U, ENCODING_FORMAT_J, ENCODING_FORMATS, ENCODING_BASES, ENCODING_ID_ADDI, ENCODING_ID_JAL
+from cascade.cfinstructionclasses import CFInstruction, R12DInstruction, ImmRdInstruction, RegImmInstruction, BranchInstruction, JALInstruction, JALRInstruction, SpecialInstruction, EcallEbreakInstruction, IntLoadInstruction, IntStoreInstruction, FloatLoadInstruction, FloatStoreInstruction, FloatToIntInstruction, IntToFloatInstruction, Float4Instruction, Float3Instruction, Float3NoRmInstruction, Float2Instruction, FloatIntRd2Instruction, FloatIntRd1Instruction, FloatIntRs1Instruction, CSRRegInstruction, CSRImmInstruction, PlaceholderProducerInstr0, PlaceholderProducerInstr1, PlaceholderPreConsumerInstr, PlaceholderConsumerInstr
+
+import numpy as np
+from operator import attrgetter
+
+# The integer columns of the representation. Columns that an instruction class does not use are zero.
+BBARRAYS_COLUMNS = ('instr_id', 'rd', 'rs1', 'rs2', 'rs3', 'rm', 'imm', 'producer_id', 'is_design_64bit', 'plan_taken', 'dont_relocate_spike', 'relocation_offset', 'spike_resolution_offset', 'rtl_offset')
+# The columns that hold booleans, and the columns where None is represented by BBARRAYS_NONE.
+BBARRAYS_BOOL_COLUMNS = ('is_design_64bit', 'plan_taken', 'dont_relocate_spike')
+BBARRAYS_NULLABLE_COLUMNS = ('spike_resolution_offset', 'rtl_offset')
+BBARRAYS_NONE = np.iinfo(np.int64).min
+
+# Instruction class: tuple of (attribute name, column name).
+# - The attributes instr_str and iscompressed are not stored, since they derive from the instruction id and compressed instructions are not supported.
+# - The floating-point registers share the columns of the integer registers at the same encoding position, and the CSR ids share the immediate column.
+# - The instruction id of the placeholders is the one of the instruction they are encoded into.
+# The other instruction objects (exception instructions, CSR writers, etc.) are kept as opaque objects, which are encoded through gen_bytecode_int.
+BBARRAYS_CLASS_ATTRS = {
+    R12DInstruction:             (('rd', 'rd'), ('rs1', 'rs1'), ('rs2', 'rs2')),
+    ImmRdInstruction:            (('rd', 'rd'), ('imm', 'imm'), ('is_design_64bit', 'is_design_64bit')),
+    RegImmInstruction:           (('rd', 'rd'), ('rs1', 'rs1'), ('imm', 'imm'), ('is_design_64bit', 'is_design_64bit')),
+    BranchInstruction:           (('rs1', 'rs1'), ('rs2', 'rs2'), ('imm', 'imm'), ('plan_taken', 'plan_taken'), ('is_design_64bit', 'is_design_64bit')),
+    JALInstruction:              (('rd', 'rd'), ('imm', 'imm'), ('is_design_64bit', 'is_design_64bit')),
+    JALRInstruction:             (('rd', 'rd'), ('rs1', 'rs1'), ('imm', 'imm'), ('producer_id', 'producer_id'), ('is_design_64bit', 'is_design_64bit')),
+    SpecialInstruction:          (('rd', 'rd'), ('rs1', 'rs1')),
+    EcallEbreakInstruction:      (),
+    IntLoadInstruction:          (('rd', 'rd'), ('rs1', 'rs1'), ('imm', 'imm'), ('producer_id', 'producer_id'), ('is_design_64bit', 'is_design_64bit')),
+    IntStoreInstruction:         (('rs1', 'rs1'), ('rs2', 'rs2'), ('imm', 'imm'), ('producer_id', 'producer_id'), ('is_design_64bit', 'is_design_64bit')),
+    FloatLoadInstruction:        (('frd', 'rd'), ('rs1', 'rs1'), ('imm', 'imm'), ('producer_id', 'producer_id'), ('is_design_64bit', 'is_design_64bit')),
+    FloatStoreInstruction:       (('rs1', 'rs1'), ('frs2', 'rs2'), ('imm', 'imm'), ('producer_id', 'producer_id'), ('is_design_64bit', 'is_design_64bit')),
+    FloatToIntInstruction:       (('rd', 'rd'), ('frs1', 'rs1'), ('rm', 'rm')),
+    IntToFloatInstruction:       (('frd', 'rd'), ('rs1', 'rs1'), ('rm', 'rm')),
+    Float4Instruction:           (('frd', 'rd'), ('frs1', 'rs1'), ('frs2', 'rs2'), ('frs3', 'rs3'), ('rm', 'rm')),
+    Float3Instruction:           (('frd', 'rd'), ('frs1', 'rs1'), ('frs2', 'rs2'), ('rm', 'rm')),
+    Float3NoRmInstruction:       (('frd', 'rd'), ('frs1', 'rs1'), ('frs2', 'rs2')),
+    Float2Instruction:           (('frd', 'rd'), ('frs1', 'rs1'), ('rm', 'rm')),
+    FloatIntRd2Instruction:      (('rd', 'rd'), ('frs1', 'rs1'), ('frs2', 'rs2')),
+    FloatIntRd1Instruction:      (('rd', 'rd'), ('frs1', 'rs1')),
+    FloatIntRs1Instruction:      (('frd', 'rd'), ('rs1', 'rs1')),
+    CSRRegInstruction:           (('rd', 'rd'), ('rs1', 'rs1'), ('csr_id', 'imm')),
+    CSRImmInstruction:           (('rd', 'rd'), ('uimm', 'rs1'), ('csr_id', 'imm')),
+    PlaceholderProducerInstr0:   (('rd', 'rd'), ('producer_id', 'producer_id'), ('relocation_offset', 'relocation_offset'), ('spike_resolution_offset', 'spike_resolution_offset'), ('rtl_offset', 'rtl_offset'), ('is_design_64bit', 'is_design_64bit')),
+    PlaceholderProducerInstr1:   (('rd', 'rd'), ('producer_id', 'producer_id'), ('relocation_offset', 'relocation_offset'), ('spike_resolution_offset', 'spike_resolution_offset'), ('rtl_offset', 'rtl_offset'), ('is_design_64bit', 'is_design_64bit')),
+    PlaceholderPreConsumerInstr: (('rdep', 'rd'),),
+    PlaceholderConsumerInstr:    (('rd', 'rd'), ('rdep', 'rs1'), ('rprod', 'rs2'), ('producer_id', 'producer_id'), ('dont_relocate_spike', 'dont_relocate_spike')),
+}
+BBARRAYS_PLACEHOLDER_INSTR_IDS = {
+    PlaceholderProducerInstr0:   INSTRUCTION_IDS["lui"],
+    PlaceholderProducerInstr1:   INSTRUCTION_IDS["addi"],
+    PlaceholderPreConsumerInstr: INSTRUCTION_IDS["and"],
+    PlaceholderConsumerInstr:    INSTRUCTION_IDS["xor"],
+}
+
+# The classes in the order of their class ids. Opaque objects have the class id BBARRAYS_OPAQUE_CLASS_ID.
+BBARRAYS_CLASSES = tuple(BBARRAYS_CLASS_ATTRS.keys())
+BBARRAYS_OPAQUE_CLASS_ID = -1
+
+# The module-level tables below are accessed from the methods of BasicBlockArrays, hence are not double-underscored.
+_bbarrays_class_ids = {instr_class: class_id for class_id, instr_class in enumerate(BBARRAYS_CLASSES)}
+# Instruction class: tuple of (attribute getter, column name)
+_bbarrays_class_getters = {instr_class: tuple((attrgetter(attr_name), column_name) for attr_name, column_name in class_attrs) for instr_class, class_attrs in BBARRAYS_CLASS_ATTRS.items()}
+
+# Indexed by instruction id. The instructions without table entry have the format -1 and are never instantiated as CFInstruction objects.
+_bbarrays_formats = np.array([-1 if encoding_format is None else encoding_format for encoding_format in ENCODING_FORMATS], dtype=np.int64)
+_bbarrays_bases   = np.array([0 if encoding_base is None else encoding_base for encoding_base in ENCODING_BASES], dtype=np.int64)
+
+class BasicBlockArrays:
+    # @param num_instrs the number of rows.
+    def __init__(self, num_instrs: int):
+        self.num_instrs = num_instrs
+        self.class_ids = np.full(num_instrs, BBARRAYS_OPAQUE_CLASS_ID, dtype=np.int64)
+        for column_name in BBARRAYS_COLUMNS:
+            setattr(self, column_name, np.zeros(num_instrs, dtype=np.int64))
+        # Row index: opaque object
+        self.opaque_objs = dict()
+
+    def __len__(self):
+        return self.num_instrs
+
+    # @brief Builds the arrays from a sequence of instruction objects. The objects are read, not retained, except the opaque ones.
+    # The rows of each instruction class are filled column by column.
+    @classmethod
+    def from_instrs(cls, instr_objs):
+        instr_objs = list(instr_objs)
+        ret = cls(len(instr_objs))
+
+        # Group the row indices by instruction class
+        rows_per_class = dict()
+        for row_id, instr_obj in enumerate(instr_objs):
+            instr_class = type(instr_obj)
+            if instr_class in _bbarrays_class_getters:
+                if instr_class in rows_per_class:
+                    rows_per_class[instr_class].append(row_id)
+                else:
+                    rows_per_class[instr_class] = [row_id]
+            else:
+                ret.opaque_objs[row_id] = instr_obj
+
+        for instr_class, row_ids in rows_per_class.items():
+            class_objs = [instr_objs[row_id] for row_id in row_ids]
+            row_ids = np.array(row_ids, dtype=np.int64)
+            ret.class_ids[row_ids] = _bbarrays_class_ids[instr_class]
+            if instr_class in BBARRAYS_PLACEHOLDER_INSTR_IDS:
+                ret.instr_id[row_ids] = BBARRAYS_PLACEHOLDER_INSTR_IDS[instr_class]
+            else:
+                ret.instr_id[row_ids] = np.fromiter(map(attrgetter('instr_id'), class_objs), dtype=np.int64, count=len(class_objs))
+            for getter, column_name in _bbarrays_class_getters[instr_class]:
+                if column_name in BBARRAYS_NULLABLE_COLUMNS:
+                    getattr(ret, column_name)[row_ids] = [BBARRAYS_NONE if attr_val is None else attr_val for attr_val in map(getter, class_objs)]
+                else:
+                    getattr(ret, column_name)[row_ids] = np.fromiter(map(getter, class_objs), dtype=np.int64, count=len(class_objs))
+        return ret
+
+    # @brief Rebuilds the instruction objects. The constructors are not called, hence no random number is drawn and the operand checks are not repeated.
+    # @return a list of new instruction objects, in which the opaque objects are the original ones.
+    def to_instrs(self) -> list:
+        ret = [None] * self.num_instrs
+        columns = {column_name: getattr(self, column_name).tolist() for column_name in BBARRAYS_COLUMNS}
+        for column_name in BBARRAYS_BOOL_COLUMNS:
+            columns[column_name] = list(map(bool, columns[column_name]))
+        for column_name in BBARRAYS_NULLABLE_COLUMNS:
+            columns[column_name] = [None if col_val == BBARRAYS_NONE else col_val for col_val in columns[column_name]]
+
+        for row_id, class_id in enumerate(self.class_ids.tolist()):
+            if class_id == BBARRAYS_OPAQUE_CLASS_ID:
+                ret[row_id] = self.opaque_objs[row_id]
+                continue
+            instr_class = BBARRAYS_CLASSES[class_id]
+            instr_obj = instr_class.__new__(instr_class)
+            if issubclass(instr_class, CFInstruction):
+                instr_obj.instr_str = INSTRUCTION_IDS_INV[columns['instr_id'][row_id]]
+                instr_obj.instr_id = columns['instr_id'][row_id]
+                instr_obj.iscompressed = False
+            for attr_name, column_name in BBARRAYS_CLASS_ATTRS[instr_class]:
+                setattr(instr_obj, attr_name, columns[column_name][row_id])
+            ret[row_id] = instr_obj
+        return ret
+
+    # @brief Encodes all the rows, equivalently to calling gen_bytecode_int on each instruction object.
+    # @return a numpy array of little-endian uint32 words, one per row.
+    def encode(self, is_spike_resolution: bool) -> np.ndarray:
+        formats = _bbarrays_formats[self.instr_id]
+        bases = _bbarrays_bases[self.instr_id]
+        class_ids = self.class_ids
+        rd, rs1, rs2, imm = self.rd, self.rs1, self.rs2, self.imm
+
+        # Operands of the placeholders, which depend on is_spike_resolution
+        is_producer0   = class_ids == _bbarrays_class_ids[PlaceholderProducerInstr0]
+        is_producer1   = class_ids == _bbarrays_class_ids[PlaceholderProducerInstr1]
+        is_preconsumer = class_ids == _bbarrays_class_ids[PlaceholderPreConsumerInstr]
+        is_consumer    = class_ids == _bbarrays_class_ids[PlaceholderConsumerInstr]
+        offsets = self.spike_resolution_offset if is_spike_resolution else self.rtl_offset
+        if DO_ASSERT:
+            is_producer = is_producer0 | is_producer1
+            assert not np.any(is_producer & (offsets == BBARRAYS_NONE)), f"Producer cannot produce bytecode because it does not yet know the {'spike resolution' if is_spike_resolution else 'rtl'} offset."
+            if is_spike_resolution:
+                assert np.all(offsets[is_producer] < (1 << 32))
+            assert not np.any(is_consumer & (self.dont_relocate_spike != 0)), "We do not yet support dont_relocate_spike because it causes other problems that cause vals to change from the DUT by an offset of 0x80000000."
+        # The offsets are split like li_into_reg does. The bits of the int64 offsets are the ones of their unsigned counterparts.
+        imm = np.where(is_producer0, ((offsets >> 11) & 1) + (offsets >> 12), np.where(is_producer1, offsets, imm))
+        rs1 = np.where(is_producer1 | is_preconsumer, rd, rs1)
+        rs2 = np.where(is_preconsumer, RDEP_MASK_REGISTER_ID, rs2)
+        if is_spike_resolution:
+            rs1 = np.where(is_consumer, self.rs2, rs1)
+            rs2 = np.where(is_consumer, RELOCATOR_REGISTER_ID, rs2)
+
+        word_r = bases | (rd << 7) | (self.rm << 12) | (rs1 << 15) | (rs2 << 20)
+        word_i = bases | (rd << 7) | (rs1 << 15) | ((imm & 0xfff) << 20)
+        word_s = bases | ((imm & 0x1f) << 7) | (rs1 << 15) | (rs2 << 20) | (((imm >> 5) & 0x7f) << 25)
+        word_b = bases | (((imm >> 11) & 0x1) << 7) | (((imm >> 1) & 0xf) << 8) | (rs1 << 15) | (rs2 << 20) | (((imm >> 5) & 0x3f) << 25) | (((imm >> 12) & 0x1) << 31)
+        word_u = bases | (rd << 7) | ((imm & 0xfffff) << 12)
+        word_j_imm = (((imm >> 12) & 0xff) << 12) | (((imm >> 11) & 0x1) << 20) | (((imm >> 1) & 0x3ff) << 21) | (((imm >> 20) & 0x1) << 31)
+        word_j = bases | (rd << 7) | word_j_imm
+
+        words = np.select(
+            [formats == ENCODING_FORMAT_R, formats == ENCODING_FORMAT_R4, formats == ENCODING_FORMAT_I, formats == ENCODING_FORMAT_S, formats == ENCODING_FORMAT_B, formats == ENCODING_FORMAT_U, formats == ENCODING_FORMAT_J],
+            [word_r, word_r | (self.rs3 << 27), word_i, word_s, word_b, word_u, word_j])
+
+        # In spike resolution, the taken branches become jumps to the next basic block and the non-taken branches become nops.
+        if is_spike_resolution:
+            is_branch = class_ids == _bbarrays_class_ids[BranchInstruction]
+            words = np.where(is_branch & (self.plan_taken != 0), ENCODING_BASES[ENCODING_ID_JAL] | word_j_imm, words)
+            words = np.where(is_branch & (self.plan_taken == 0), ENCODING_BASES[ENCODING_ID_ADDI], words) # addi x0, x0, 0
+
+        words = words.astype('<u4')
+        for row_id, instr_obj in self.opaque_objs.items():
+            words[row_id] = instr_obj.gen_bytecode_int(is_spike_resolution)
+        return words
@@ -7,8 +7,9 @@
 from params.fuzzparams import MAX_NUM_PICKABLE_REGS, RELOCATOR_REGISTER_ID, RDEP_MASK_REGISTER_ID, FPU_ENDIS_REGISTER_ID, MPP_BOTH_ENDIS_REGISTER_ID, MPP_TOP_ENDIS_REGISTER_ID, SPP_ENDIS_REGISTER_ID
 from params.runparams import DO_ASSERT
 from rv.csrids import CSR_IDS
-from rv.util import INSTRUCTION_IDS, PARAM_SIZES_BITS_32, PARAM_SIZES_BITS_64, PARAM_IS_SIGNED
+from rv.util import INSTRUCTION_IDS, INSTRUCTION_IDS_INV, PARAM_SIZES_BITS_32, PARAM_SIZES_BITS_64, PARAM_IS_SIGNED
 from rv.asmutil import li_into_reg, twos_complement, to_unsigned
+from rv.encodingtable import ENCODING_ID_ADDI, ENCODING_ID_JAL, encode_rtype, encode_r4type, encode_itype, encode_stype, encode_btype, encode_utype, encode_jtype
 from rv.rvprivileged import rvprivileged_mret, rvprivileged_sret
 from rv.zifencei import *
 from rv.zicsr import *
@@ -21,6 +22,7 @@ from rv.rv64f import *
 from rv.rv64d import *
 from rv.rv64m import *
 
+from copy import deepcopy
 import random
 
 # These classes are here for generating multi-instruction fuzzing programs.
@@ -29,9 +31,40 @@ import random
 # Abstract classes
 ###
 
-class CFInstruction:
+# Values that are deep-copied by reference.
+INSTR_OBJ_ATOMIC_TYPES = frozenset((int, bool, str, float, type(None)))
+
+# Programs hold thousands of instruction objects, which are deep-copied during reduction. Hence, all the instruction classes derive from this class and declare __slots__ instead of having a per-instance __dict__.
+# Attributes must be declared in the __slots__ of their class, and all the slots must be assigned by the constructor.
+# The copies and the pickles only copy the slot values, and only the values that are not atomic are deep-copied.
+class CompactInstrObj:
+    __slots__ = ()
+    # The slots of the class and of its base classes. Set for each subclass.
+    slot_names = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.slot_names = tuple(slot_name for instr_class in reversed(cls.__mro__) for slot_name in instr_class.__dict__.get('__slots__', ()))
+
+    def __getstate__(self):
+        return tuple([getattr(self, slot_name) for slot_name in self.slot_names])
+
+    def __setstate__(self, state):
+        for slot_name, slot_val in zip(self.slot_names, state):
+            setattr(self, slot_name, slot_val)
+
+    def __deepcopy__(self, memo):
+        ret = self.__class__.__new__(self.__class__)
+        memo[id(self)] = ret
+        for slot_name in self.slot_names:
+            slot_val = getattr(self, slot_name)
+            setattr(ret, slot_name, slot_val if type(slot_val) in INSTR_OBJ_ATOMIC_TYPES else deepcopy(slot_val, memo))
+        return ret
+
+class CFInstruction(CompactInstrObj):
     # Could be any instruction
     authorized_instr_strs = range(len(INSTRUCTION_IDS))
+    __slots__ = ('instr_str', 'instr_id', 'iscompressed')
 
     # Check that it's not a wrong instruction id.
     def assert_authorized_instr_strs(self):
@@ -39,19 +72,27 @@ class CFInstruction:
             assert self.instr_str in self.__class__.authorized_instr_strs
 
     def __init__(self, instr_str: str, iscompressed: bool = False):
-        self.instr_str = instr_str
+        self.instr_id = INSTRUCTION_IDS[instr_str] # Key into the encoding table. Must be kept consistent with instr_str.
+        self.instr_str = INSTRUCTION_IDS_INV[self.instr_id] # Interned mnemonic, shared by all the instructions with the same id
         self.iscompressed = iscompressed
         assert not iscompressed, "Compressed instructions are not yet supported."
         self.assert_authorized_instr_strs()
 
+    # @brief Encodes the instruction using the precomputed encoding table of rv/encodingtable.py.
     # @param is_spike_resolution: some rare instructions (typically offset management placeholders) are treated differently between spike resolution and the subsequent actual simulation.
     def gen_bytecode_int(self, is_spike_resolution: bool):
         raise ValueError('Cannot generate bytecode in the abstract instruction classes.')
 
+    # @brief Encodes the instruction through the rv/* encoder functions. Must be bit-identical to gen_bytecode_int, and is used as a reference for checking it.
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
+        raise ValueError('Cannot generate bytecode in the abstract instruction classes.')
+
 # Any instruction with an immediate
 class ImmInstruction(CFInstruction):
     # static
     authorized_instr_strs = ("lui", "auipc", "jal", "jalr", "beq", "bne", "blt", "bge", "bltu", "bgeu", "lb", "lh", "lw", "lbu", "lhu", "sb", "sh", "sw", "addi", "slti", "sltiu", "xori", "ori", "andi", "slli", "srli", "srai", "lwu", "ld", "sd", "addiw", "slliw", "srliw", "sraiw", "flw", "fsw", "fld", "fsd")
+    __slots__ = ('is_design_64bit', 'imm')
+
     # Checks the immediate size.
     def assert_imm_size(self):
         if DO_ASSERT:
@@ -81,6 +122,7 @@ class ImmInstruction(CFInstruction):
 R12DInstructions = ("add", "sub", "sll", "slt", "sltu", "xor", "srl", "sra", "or", "and", "addw", "subw", "sllw", "srlw", "sraw", "mul", "mulh", "mulhsu", "mulhu", "div", "divu", "rem", "remu", "mulw", "divw", "divuw", "remw", "remuw")
 class R12DInstruction(CFInstruction):
     authorized_instr_strs = R12DInstructions
+    __slots__ = ('rd', 'rs1', 'rs2')
 
     def __init__(self, instr_str: str, rd: int, rs1: int, rs2: int, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -96,6 +138,9 @@ class R12DInstruction(CFInstruction):
         self.rd =  rd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.rd, self.rs1, self.rs2)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "add":
             return rv32i_add(self.rd, self.rs1, self.rs2)
@@ -164,6 +209,7 @@ class R12DInstruction(CFInstruction):
 ImmRdInstructions = ("lui", "auipc")
 class ImmRdInstruction(ImmInstruction):
     authorized_instr_strs = ImmRdInstructions
+    __slots__ = ('rd',)
 
     def __init__(self, instr_str: str, rd: int, imm: int, is_design_64bit: bool, iscompressed: bool = False, is_rd_nonpickable_ok: bool = False):
         super().__init__(instr_str, imm, is_design_64bit, iscompressed)
@@ -174,6 +220,9 @@ class ImmRdInstruction(ImmInstruction):
         self.rd =  rd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_utype(self.instr_id, self.rd, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "lui":
             return rv32i_lui(self.rd, self.imm)
@@ -188,6 +237,7 @@ class ImmRdInstruction(ImmInstruction):
 RegImmInstructions = ("addi", "slti", "sltiu", "xori", "ori", "andi", "slli", "srli", "srai", "addiw", "slliw", "srliw", "sraiw")
 class RegImmInstruction(ImmInstruction):
     authorized_instr_strs = RegImmInstructions
+    __slots__ = ('rd', 'rs1')
 
     def __init__(self, instr_str: str, rd: int, rs1: int, imm: int, is_design_64bit: bool, iscompressed: bool = False, is_rd_nonpickable_ok: bool = False):
         super().__init__(instr_str, imm, is_design_64bit, iscompressed)
@@ -202,6 +252,9 @@ class RegImmInstruction(ImmInstruction):
             assert False
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_itype(self.instr_id, self.rd, self.rs1, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "addi":
             return rv32i_addi(self.rd, self.rs1, self.imm)
@@ -238,6 +291,7 @@ class RegImmInstruction(ImmInstruction):
 BranchInstructions = ("beq", "bne", "blt", "bge", "bltu", "bgeu")
 class BranchInstruction(ImmInstruction):
     authorized_instr_strs = BranchInstructions
+    __slots__ = ('rs1', 'rs2', 'plan_taken')
 
     # @param plan_taken is True iff the branch instruction is planned to be taken.
     def __init__(self, instr_str: str, rs1: int, rs2: int, imm: int, plan_taken: bool, is_design_64bit: bool, iscompressed: bool = False):
@@ -270,9 +324,19 @@ class BranchInstruction(ImmInstruction):
             int_plan_taken ^ int(rs1_content < rs2_content),
         ]
 
-        self.instr_str = random.choices(BranchInstructions, can_take_opcodes, k=1)[0]
+        self.instr_id = INSTRUCTION_IDS[random.choices(BranchInstructions, can_take_opcodes, k=1)[0]]
+        self.instr_str = INSTRUCTION_IDS_INV[self.instr_id]
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        if is_spike_resolution:
+            if self.plan_taken:
+                return encode_jtype(ENCODING_ID_JAL, 0, self.imm) # Just unconditionally jump to the next basic block
+            else:
+                return encode_itype(ENCODING_ID_ADDI, 0, 0, 0) # Nop
+        else:
+            return encode_btype(self.instr_id, self.rs1, self.rs2, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         if is_spike_resolution:
             if self.plan_taken:
                 return rv32i_jal(0, self.imm) # Just unconditionally jump to the next basic block
@@ -300,6 +364,7 @@ class BranchInstruction(ImmInstruction):
 JALInstructions = ("jal",)
 class JALInstruction(ImmInstruction):
     authorized_instr_strs = JALInstructions
+    __slots__ = ('rd',)
 
     def __init__(self, instr_str: str, rd: int, imm: int, iscompressed: bool = False):
         # 32 or 64 bit does not matter for JAL
@@ -310,6 +375,9 @@ class JALInstruction(ImmInstruction):
         self.rd  = rd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_jtype(self.instr_id, self.rd, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         return rv32i_jal(self.rd, self.imm)
 
@@ -317,6 +385,7 @@ class JALInstruction(ImmInstruction):
 JALRInstructions = ("jalr",)
 class JALRInstruction(ImmInstruction):
     authorized_instr_strs = JALRInstructions
+    __slots__ = ('rd', 'rs1', 'producer_id')
 
     def __init__(self, instr_str: str, rd: int, rs1: int, imm: int, producer_id: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, imm, is_design_64bit, iscompressed)
@@ -330,6 +399,9 @@ class JALRInstruction(ImmInstruction):
         self.producer_id = producer_id
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_itype(self.instr_id, self.rd, self.rs1, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         return rv32i_jalr(self.rd, self.rs1, self.imm)
 
@@ -337,6 +409,7 @@ class JALRInstruction(ImmInstruction):
 SpecialInstructions = ("fence", "fence.i")
 class SpecialInstruction(CFInstruction):
     authorized_instr_strs = SpecialInstructions
+    __slots__ = ('rd', 'rs1')
 
     def __init__(self, instr_str: str, rd: int = 0, rs1: int = 0, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -344,6 +417,9 @@ class SpecialInstruction(CFInstruction):
         self.rs1 = rs1
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_itype(self.instr_id, self.rd, self.rs1, 0)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "fence":
             return rv32i_fence(self.rd, self.rs1)
@@ -357,11 +433,15 @@ class SpecialInstruction(CFInstruction):
 EcallEbreakInstructions = ("ecall", "ebreak")
 class EcallEbreakInstruction(CFInstruction):
     authorized_instr_strs = EcallEbreakInstructions
+    __slots__ = ()
 
     def __init__(self, instr_str: str, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_itype(self.instr_id, 0, 0, 0)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "ecall":
             return rv32i_ecall()
@@ -375,6 +455,7 @@ class EcallEbreakInstruction(CFInstruction):
 IntLoadInstructions = ("lb", "lh", "lw", "lbu", "lhu", "lwu", "ld")
 class IntLoadInstruction(ImmInstruction):
     authorized_instr_strs = IntLoadInstructions
+    __slots__ = ('rd', 'rs1', 'producer_id')
 
     def __init__(self, instr_str: str, rd: int, rs1: int, imm: int, producer_id: int, is_design_64bit: bool, iscompressed: bool = False, is_rd_nonpickable_ok: bool = False):
         super().__init__(instr_str, imm, is_design_64bit, iscompressed)
@@ -388,6 +469,9 @@ class IntLoadInstruction(ImmInstruction):
         self.producer_id = producer_id
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_itype(self.instr_id, self.rd, self.rs1, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "lb":
             return rv32i_lb(self.rd, self.rs1, self.imm)
@@ -412,6 +496,7 @@ class IntLoadInstruction(ImmInstruction):
 IntStoreInstructions = ("sb", "sh", "sw", "sd")
 class IntStoreInstruction(ImmInstruction):
     authorized_instr_strs = IntStoreInstructions
+    __slots__ = ('rs1', 'rs2', 'producer_id')
 
     def __init__(self, instr_str: str, rs1: int, rs2: int, imm: int, producer_id: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, imm, is_design_64bit, iscompressed)
@@ -425,6 +510,9 @@ class IntStoreInstruction(ImmInstruction):
         self.producer_id = producer_id
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_stype(self.instr_id, self.rs1, self.rs2, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "sb":
             return rv32i_sb(self.rs1, self.rs2, self.imm)
@@ -447,6 +535,7 @@ class IntStoreInstruction(ImmInstruction):
 FloatLoadInstructions = ("flw", "fld")
 class FloatLoadInstruction(ImmInstruction):
     authorized_instr_strs = FloatLoadInstructions
+    __slots__ = ('frd', 'rs1', 'producer_id')
 
     def __init__(self, instr_str: str, frd: int, rs1: int, imm: int, producer_id: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, imm, is_design_64bit, iscompressed)
@@ -460,6 +549,9 @@ class FloatLoadInstruction(ImmInstruction):
         self.producer_id = producer_id
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_itype(self.instr_id, self.frd, self.rs1, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "flw":
             return rv32f_flw(self.frd, self.rs1, self.imm)
@@ -474,6 +566,7 @@ class FloatLoadInstruction(ImmInstruction):
 FloatStoreInstructions = ("fsw", "fsd")
 class FloatStoreInstruction(ImmInstruction):
     authorized_instr_strs = FloatStoreInstructions
+    __slots__ = ('rs1', 'frs2', 'producer_id')
 
     def __init__(self, instr_str: str, rs1: int, frs2: int, imm: int, producer_id: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, imm, is_design_64bit, iscompressed)
@@ -487,6 +580,9 @@ class FloatStoreInstruction(ImmInstruction):
         self.producer_id = producer_id
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_stype(self.instr_id, self.rs1, self.frs2, self.imm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "fsw":
             return rv32f_fsw(self.rs1, self.frs2, self.imm)
@@ -501,6 +597,7 @@ class FloatStoreInstruction(ImmInstruction):
 FloatToIntInstructions = ("fcvt.w.s", "fcvt.wu.s", "fcvt.l.s", "fcvt.lu.s", "fcvt.w.d", "fcvt.wu.d", "fcvt.l.d", "fcvt.lu.d")
 class FloatToIntInstruction(CFInstruction):
     authorized_instr_strs = FloatToIntInstructions
+    __slots__ = ('rd', 'frs1', 'rm')
 
     def __init__(self, instr_str: str, rd: int, frs1: int, rm: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -516,6 +613,9 @@ class FloatToIntInstruction(CFInstruction):
         self.rd   = rd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.rd, self.frs1, 0, self.rm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "fcvt.w.s":
             return rv32f_fcvtws(self.rd, self.frs1, self.rm)
@@ -546,6 +646,7 @@ class FloatToIntInstruction(CFInstruction):
 IntToFloatInstructions = ("fcvt.s.w", "fcvt.s.wu", "fcvt.s.l", "fcvt.s.lu", "fcvt.d.w", "fcvt.d.wu", "fcvt.d.l", "fcvt.d.lu")
 class IntToFloatInstruction(CFInstruction):
     authorized_instr_strs = IntToFloatInstructions
+    __slots__ = ('frd', 'rs1', 'rm')
 
     def __init__(self, instr_str: str, frd: int, rs1: int, rm: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -561,6 +662,9 @@ class IntToFloatInstruction(CFInstruction):
         self.rm  = rm
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.frd, self.rs1, 0, self.rm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "fcvt.s.w":
             return rv32f_fcvtsw(self.frd, self.rs1, self.rm)
@@ -589,6 +693,7 @@ class IntToFloatInstruction(CFInstruction):
 Float4Instructions = ("fmadd.s", "fmsub.s", "fnmsub.s", "fnmadd.s", "fmadd.d", "fmsub.d", "fnmsub.d", "fnmadd.d")
 class Float4Instruction(CFInstruction):
     authorized_instr_strs = Float4Instructions
+    __slots__ = ('frd', 'frs1', 'frs2', 'frs3', 'rm')
 
     def __init__(self, instr_str: str, frd: int, frs1: int, frs2: int, frs3: int, rm: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -610,6 +715,9 @@ class Float4Instruction(CFInstruction):
         self.frd  = frd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_r4type(self.instr_id, self.frd, self.frs1, self.frs2, self.frs3, self.rm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "fmadd.s":
             return rv32f_fmadds(self.frd, self.frs1, self.frs2, self.frs3, self.rm)
@@ -636,6 +744,7 @@ class Float4Instruction(CFInstruction):
 Float3Instructions = ("fadd.s", "fsub.s", "fmul.s", "fdiv.s", "fadd.d", "fsub.d", "fmul.d", "fdiv.d")
 class Float3Instruction(CFInstruction):
     authorized_instr_strs = Float3Instructions
+    __slots__ = ('frd', 'frs1', 'frs2', 'rm')
 
     def __init__(self, instr_str: str, frd: int, frs1: int, frs2: int, rm: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -654,6 +763,9 @@ class Float3Instruction(CFInstruction):
         self.frd  = frd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.frd, self.frs1, self.frs2, self.rm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "fadd.s":
             return rv32f_fadds(self.frd, self.frs1, self.frs2, self.rm)
@@ -680,6 +792,7 @@ class Float3Instruction(CFInstruction):
 Float3NoRmInstructions = ("fsgnj.s", "fsgnjn.s", "fsgnjx.s", "fmin.s", "fmax.s", "fsgnj.d", "fsgnjn.d", "fsgnjx.d", "fmin.d", "fmax.d")
 class Float3NoRmInstruction(CFInstruction):
     authorized_instr_strs = Float3NoRmInstructions
+    __slots__ = ('frd', 'frs1', 'frs2')
 
     def __init__(self, instr_str: str, frd: int, frs1: int, frs2: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -695,6 +808,9 @@ class Float3NoRmInstruction(CFInstruction):
         self.frd  = frd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.frd, self.frs1, self.frs2)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if  self.instr_str == "fsgnj.s":
             return rv32f_fsgnjs(self.frd, self.frs1, self.frs2)
@@ -725,6 +841,7 @@ class Float3NoRmInstruction(CFInstruction):
 Float2Instructions = ("fsqrt.s", "fsqrt.d", "fcvt.d.s", "fcvt.s.d")
 class Float2Instruction(CFInstruction):
     authorized_instr_strs = Float2Instructions
+    __slots__ = ('frd', 'frs1', 'rm')
 
     def __init__(self, instr_str: str, frd: int, frs1: int, rm: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -740,6 +857,9 @@ class Float2Instruction(CFInstruction):
         self.frd  = frd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.frd, self.frs1, 0, self.rm)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "fsqrt.s":
             return rv32f_fsqrts(self.frd, self.frs1, self.rm)
@@ -760,6 +880,7 @@ class Float2Instruction(CFInstruction):
 FloatIntRd2Instructions = ("feq.s", "flt.s", "fle.s", "feq.d", "flt.d", "fle.d")
 class FloatIntRd2Instruction(CFInstruction):
     authorized_instr_strs = FloatIntRd2Instructions
+    __slots__ = ('rd', 'frs1', 'frs2')
 
     def __init__(self, instr_str: str, rd: int, frs1: int, frs2: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -775,6 +896,9 @@ class FloatIntRd2Instruction(CFInstruction):
         self.rd   = rd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.rd, self.frs1, self.frs2)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "feq.s":
             return rv32f_feqs(self.rd, self.frs1, self.frs2)
@@ -797,6 +921,7 @@ class FloatIntRd2Instruction(CFInstruction):
 FloatIntRd1Instructions = ("fmv.x.w", "fclass.s", "fclass.d", "fmv.x.d")
 class FloatIntRd1Instruction(CFInstruction):
     authorized_instr_strs = FloatIntRd1Instructions
+    __slots__ = ('rd', 'frs1')
 
     def __init__(self, instr_str: str, rd: int, frs1: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -809,6 +934,9 @@ class FloatIntRd1Instruction(CFInstruction):
         self.rd   = rd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.rd, self.frs1, 0)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "fmv.x.w":
             return rv32f_fmvxw(self.rd, self.frs1)
@@ -828,6 +956,7 @@ class FloatIntRd1Instruction(CFInstruction):
 FloatIntRs1Instructions = ("fmv.w.x", "fmv.d.x")
 class FloatIntRs1Instruction(CFInstruction):
     authorized_instr_strs = FloatIntRs1Instructions
+    __slots__ = ('frd', 'rs1')
 
     def __init__(self, instr_str: str, frd: int, rs1: int, is_design_64bit: bool, iscompressed: bool = False):
         super().__init__(instr_str, iscompressed)
@@ -840,6 +969,9 @@ class FloatIntRs1Instruction(CFInstruction):
         self.frd = frd
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_rtype(self.instr_id, self.frd, self.rs1, 0)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32f
         if self.instr_str == "fmv.w.x":
             return rv32f_fmvwx(self.frd, self.rs1)
@@ -864,6 +996,8 @@ class FloatIntRs1Instruction(CFInstruction):
 class CSRInstruction(CFInstruction):
     # static
     authorized_instr_strs = ("csrrw", "csrrs", "csrrc", "csrrwi", "csrrsi", "csrrci")
+    __slots__ = ('csr_id',)
+
     # Checks the immediate size.
     def assert_csr_size(self):
         if DO_ASSERT:
@@ -880,6 +1014,7 @@ class CSRInstruction(CFInstruction):
 CSRRegInstructions = "csrrw", "csrrs", "csrrc"
 class CSRRegInstruction(CSRInstruction):
     authorized_instr_strs = CSRRegInstructions
+    __slots__ = ('rd', 'rs1')
 
     def __init__(self, instr_str: str, rd: int, rs1: int, csr_id: int, iscompressed: bool = False):
         super().__init__(instr_str, csr_id, iscompressed)
@@ -892,6 +1027,9 @@ class CSRRegInstruction(CSRInstruction):
         self.rs1 =  rs1
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_itype(self.instr_id, self.rd, self.rs1, self.csr_id)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "csrrw":
             return zicsr_csrrw(self.rd, self.rs1, self.csr_id)
@@ -907,6 +1045,7 @@ class CSRRegInstruction(CSRInstruction):
 CSRImmInstructions = "csrrwi", "csrrsi", "csrrci"
 class CSRImmInstruction(CSRInstruction):
     authorized_instr_strs = CSRImmInstructions
+    __slots__ = ('rd', 'uimm')
 
     def __init__(self, instr_str: str, rd: int, uimm: int, csr_id: int, iscompressed: bool = False):
         super().__init__(instr_str, csr_id, iscompressed)
@@ -919,6 +1058,9 @@ class CSRImmInstruction(CSRInstruction):
         self.uimm = uimm
 
     def gen_bytecode_int(self, is_spike_resolution: bool):
+        return encode_itype(self.instr_id, self.rd, self.uimm, self.csr_id)
+
+    def gen_bytecode_int_reference(self, is_spike_resolution: bool):
         # rv32i
         if self.instr_str == "csrrwi":
             return zicsr_csrrwi(self.rd, self.uimm, self.csr_id)
@@ -945,7 +1087,9 @@ class CSRImmInstruction(CSRInstruction):
 #   b. The offset consumer computes the generated, target address, by making the difference between the dependent register and the offset. This instruction does not require the spike resolution to be known, but still is different between the two scenari.
 
 # Does not inherit from CFInstruction.
-class PlaceholderProducerInstr0:
+class PlaceholderProducerInstr0(CompactInstrObj):
+    __slots__ = ('rd', 'producer_id', 'relocation_offset', 'spike_resolution_offset', 'rtl_offset', 'is_design_64bit')
+
     # When it is instantiated, the producer instructions do not know the offset yet, just the target address.
     def __init__(self, rd: int, producer_id: int, is_design_64bit: bool):
         self.rd = rd
@@ -967,7 +1111,9 @@ class PlaceholderProducerInstr0:
             return rv32i_lui(self.rd, li_into_reg(to_unsigned(self.rtl_offset, self.is_design_64bit), False)[0])
 
 # Does not inherit from CFInstruction.
-class PlaceholderProducerInstr1:
+class PlaceholderProducerInstr1(CompactInstrObj):
+    __slots__ = ('rd', 'producer_id', 'relocation_offset', 'spike_resolution_offset', 'rtl_offset', 'is_design_64bit')
+
     # When it is instantiated, the producer instructions do not know the offset yet, just the target address.
     def __init__(self, rd: int, producer_id: int, is_design_64bit: bool):
         self.rd = rd
@@ -989,7 +1135,9 @@ class PlaceholderProducerInstr1:
             return rv32i_addi(self.rd, self.rd, li_into_reg(to_unsigned(self.rtl_offset, self.is_design_64bit), False)[1])
 
 # Does not inherit from CFInstruction.
-class PlaceholderPreConsumerInstr:
+class PlaceholderPreConsumerInstr(CompactInstrObj):
+    __slots__ = ('rdep',)
+
     # @param rdep: the register that creates the dependency
     def __init__(self, rdep: int):
         self.rdep = rdep
@@ -999,7 +1147,9 @@ class PlaceholderPreConsumerInstr:
         return rv32i_and(self.rdep, self.rdep, RDEP_MASK_REGISTER_ID)
 
 # Does not inherit from CFInstruction.
-class PlaceholderConsumerInstr:
+class PlaceholderConsumerInstr(CompactInstrObj):
+    __slots__ = ('rd', 'rdep', 'rprod', 'producer_id', 'dont_relocate_spike')
+
     # @param rd: the generated register, i.e., the target address for example
     # @param rdep: the register that creates the dependency
     # @param producer_id: is required to feed spike's feedback
@@ -1023,11 +1173,17 @@ class PlaceholderConsumerInstr:
 def is_placeholder(obj):
     return isinstance(obj, PlaceholderProducerInstr0) or isinstance(obj, PlaceholderProducerInstr1) or isinstance(obj, PlaceholderPreConsumerInstr) or isinstance(obj, PlaceholderConsumerInstr)
 
+# @return a dict of the attributes of an instruction object, which replaces vars() since the instruction classes have no __dict__.
+def get_instr_obj_attrs(obj: CompactInstrObj) -> dict:
+    return {slot_name: getattr(obj, slot_name) for slot_name in obj.slot_names}
+
 ###
 # Raw data
 ###
 
-class RawDataWord:
+class RawDataWord(CompactInstrObj):
+    __slots__ = ('wordval',)
+
     # @param intentionally_signed: When unset, we expect a non-negative wordval
     def __init__(self, wordval: int, signed: bool = False):
         if DO_ASSERT:
@@ -1053,7 +1209,9 @@ class RawDataWord:
 # When an exception is encountered, we find back the last corresponding tvec write and set its expected value properly.
 # Inheritance from ExceptionInstruction allows us to distinguish, for example, a real JAL form a JAL to a misaligned address that should cause an exception.
 # It also serves to abstract exception types in general parts of the codebase such as basicblock.py.
-class ExceptionInstruction:
+class ExceptionInstruction(CompactInstrObj):
+    __slots__ = ('instr_str', 'is_mtvec', 'producer_id')
+
     # @param producer_id: Used for exceptions (typically intentionally faulty jalr/loads/stores) that require a produced register for themselves in addition to the target address (held in the corresponding tvec). Keep None if none is needed.
     # @param is_mtvec: if the exception will be handled in machine mode. If false, then stvec.
     # Remargk: is_mtvec also determines which of mepc and sepc will be set.
@@ -1063,6 +1221,8 @@ class ExceptionInstruction:
         self.producer_id = producer_id
 
 class SimpleIllegalInstruction(ExceptionInstruction):
+    __slots__ = ()
+
     def __init__(self, is_mtvec):
         super().__init__(is_mtvec, None)
     def gen_bytecode_int(self, is_spike_resolution: bool):
@@ -1070,6 +1230,8 @@ class SimpleIllegalInstruction(ExceptionInstruction):
 
 # Exception that encapsulates an instruction that causes an exception, such as a misaligned JAL.
 class SimpleExceptionEncapsulator(ExceptionInstruction):
+    __slots__ = ('instr',)
+
     def __init__(self, is_mtvec, producer_id: int, instr):
         super().__init__(is_mtvec, producer_id)
         if DO_ASSERT:
@@ -1093,6 +1255,7 @@ class MisalignedMemInstruction(ExceptionInstruction):
     MISALIGNED_FSW = 9
     MISALIGNED_FLD = 10 # Requires D extension
     MISALIGNED_FSD = 11
+    __slots__ = ('misaligned_addr', 'meminstr')
 
     def __init__(self, is_mtvec: bool, fuzzerstate, is_load: bool, iscompressed: bool = False):
         super().__init__(is_mtvec, None) # We compute the producer id later
@@ -1202,7 +1365,9 @@ class MisalignedMemInstruction(ExceptionInstruction):
 
 # @remark we use a specific instruction for xtvec to find them easily when an exception occurs, to transmit back the expected value to the producer
 # @brief this instruction writes to mtvec or stvec
-class TvecWriterInstruction():
+class TvecWriterInstruction(CompactInstrObj):
+    __slots__ = ('instr_str', 'producer_id', 'is_mtvec', 'csr_instr')
+
     def __init__(self, is_mtvec: bool, rd: int, rs1: int, producer_id: int):
         self.instr_str = 'TvecWriterInstruction'  # Just for compatibility with the fuzzer
 
@@ -1217,7 +1382,9 @@ class TvecWriterInstruction():
 
 # @remark we use a specific instruction for xtvec to find them easily when an exception occurs, to transmit back the expected value to the producer
 # @brief this instruction writes to mepc or sepc
-class EPCWriterInstruction():
+class EPCWriterInstruction(CompactInstrObj):
+    __slots__ = ('instr_str', 'producer_id', 'is_mepc', 'csr_instr')
+
     def __init__(self, is_mepc: bool, rd: int, rs1: int, producer_id: int):
         self.instr_str = 'EPCWriterInstruction'  # Just for compatibility with the fuzzer
 
@@ -1232,7 +1399,9 @@ class EPCWriterInstruction():
 
 # @brief this instruction writes to mtvec or stvec
 # @The value written may differ between Spike and CPU
-class GenericCSRWriterInstruction():
+class GenericCSRWriterInstruction(CompactInstrObj):
+    __slots__ = ('instr_str', 'producer_id', 'val_to_write_spike', 'val_to_write_cpu', 'csr_instr')
+
     def __init__(self, csr_id: int, rd: int, rs1: int, producer_id: int, val_to_write_spike: int, val_to_write_cpu: int):
         if DO_ASSERT:
             assert csr_id in CSR_IDS
@@ -1251,7 +1420,9 @@ class GenericCSRWriterInstruction():
     def gen_bytecode_int(self, is_spike_resolution: bool):
         return self.csr_instr.gen_bytecode_int(is_spike_resolution)
 
-class PrivilegeDescentInstruction():
+class PrivilegeDescentInstruction(CompactInstrObj):
+    __slots__ = ('instr_str', 'is_mret')
+
     def __init__(self, is_mret: bool):
         self.instr_str = 'PrivilegeDescentInstruction' # Just for compatibility with the fuzzer
         self.is_mret = is_mret
@@ -163,7 +163,7 @@ def gen_context_setter(fuzzerstate, saved_context, next_jmp_addr: int):
 
     # mtvec
     # if fuzzerstate.design_has_supervisor_mode:
-    if 'picorv32' not in fuzzerstate.design_name:
+    if not fuzzerstate.design_profile.is_picorv32:
         addr_csr_loads[CSR_IDS.MTVEC] = curr_addr
         fuzzerstate.ctxsv_bb.append(None)
         fuzzerstate.ctxsv_bb.append(IntLoadInstruction("lwu" if fuzzerstate.is_design_64bit else "lw", 1, 1, 0, -1, fuzzerstate.is_design_64bit))
@@ -372,7 +372,7 @@ def gen_context_setter(fuzzerstate, saved_context, next_jmp_addr: int):
         fuzzerstate.ctxsv_bb.append(RawDataWord(saved_context.sscratch >> 32))
         curr_addr += 8 # NO_COMPRESSED
 
-    if 'picorv32' not in fuzzerstate.design_name:
+    if not fuzzerstate.design_profile.is_picorv32:
         fuzzerstate.ctxsv_bb[addr_to_id_in_ctxsv(addr_csr_loads[CSR_IDS.MTVEC])] = RegImmInstruction("addi", 1, MAX_NUM_PICKABLE_REGS, curr_addr-fuzzerstate.ctxsv_bb_base_addr, fuzzerstate.is_design_64bit, is_rd_nonpickable_ok=True)
         fuzzerstate.ctxsv_bb.append(RawDataWord(saved_context.mtvec))
         fuzzerstate.ctxsv_bb.append(RawDataWord(0xdeadbeef))
@@ -0,0 +1,109 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module compiles the design configuration into a frozen per-design generation profile.
+# The profile holds the design capabilities, the design families that the generator treats specially together with the bug tolerances that apply to them, and the instruction type weight tables.
+# The generator consults the profile through fuzzerstate.design_profile instead of parsing the march flags and checking the design name on its hot paths.
+# The profiles are picklable, so that the pool workers can receive them ready-built, see install_design_profiles.
+
+from params.runparams import DO_ASSERT
+from common.designcfgs import is_design_32bit, design_has_float_support, design_has_double_support, design_has_muldiv_support, design_has_atop_support, design_has_misaligned_data_support, design_has_supervisor_mode, design_has_user_mode, design_has_compressed_support, design_has_pmp
+from cascade.toleratebugs import get_tolerances_version, is_forbid_vexriscv_csrs, is_no_interaction_minstret
+from cascade.randomize.pickinstrtype import INSTRTYPE_INITIAL_RELATIVE_WEIGHTS, gen_instrtype_weights
+
+from dataclasses import dataclass
+from itertools import accumulate
+
+# Not hashable because of the dict field, hence compared by identity.
+@dataclass(frozen=True, eq=False)
+class DesignProfile:
+    design_name: str
+    tolerances_version: int # The profile is stale once the tolerated bugs change, see toleratebugs.py
+
+    # Capabilities
+    is_design_64bit: bool
+    design_has_compressed_support: bool
+    design_has_fpu: bool
+    design_has_fpud: bool
+    design_has_muldiv: bool
+    design_has_amo: bool
+    design_has_misaligned_data_support: bool
+    design_has_supervisor_mode: bool
+    design_has_user_mode: bool
+    design_has_pmp: bool
+
+    # Design families, matched as substrings of the design name like in the rest of the fuzzer
+    is_vexriscv: bool
+    is_picorv32: bool
+    is_kronos: bool
+    is_rocket: bool
+    is_cva6: bool
+    is_boom: bool
+
+    # Forbidden operations
+    forbid_vexriscv_csrs: bool    # is_forbid_vexriscv_csrs() on vexriscv
+    no_interaction_minstret: bool # is_no_interaction_minstret(design_name)
+
+    # instrtype_cum_weights[isaclass] = (tuple of instruction strings, tuple of cumulative weights), see gen_next_instrstr_from_isaclass.
+    # Only the ISA classes with some instruction of non-zero weight are present.
+    instrtype_cum_weights: dict
+
+# @brief Builds the profile of a design from its configuration. Prefer get_design_profile, which builds it once per process.
+def build_design_profile(design_name: str) -> DesignProfile:
+    instrtype_cum_weights = dict()
+    for isaclass in INSTRTYPE_INITIAL_RELATIVE_WEIGHTS:
+        keys_and_weights_dict = gen_instrtype_weights(isaclass, design_name)
+        if not any(keys_and_weights_dict.values()):
+            continue
+        # Accumulated in the same order as random.choices does.
+        instrtype_cum_weights[isaclass] = tuple(keys_and_weights_dict.keys()), tuple(accumulate(keys_and_weights_dict.values()))
+
+    design_has_fpu = design_has_float_support(design_name)
+    design_has_fpud = design_has_double_support(design_name)
+    if DO_ASSERT:
+        assert design_has_fpu or not design_has_fpud, "Cannot have double but not simple precision"
+
+    return DesignProfile(
+        design_name                        = design_name,
+        tolerances_version                 = get_tolerances_version(),
+        is_design_64bit                    = not is_design_32bit(design_name),
+        design_has_compressed_support      = design_has_compressed_support(design_name),
+        design_has_fpu                     = design_has_fpu,
+        design_has_fpud                    = design_has_fpud,
+        design_has_muldiv                  = design_has_muldiv_support(design_name),
+        design_has_amo                     = design_has_atop_support(design_name),
+        design_has_misaligned_data_support = design_has_misaligned_data_support(design_name),
+        design_has_supervisor_mode         = design_has_supervisor_mode(design_name),
+        design_has_user_mode               = design_has_user_mode(design_name),
+        design_has_pmp                     = design_has_pmp(design_name),
+        is_vexriscv                        = "vexriscv" in design_name,
+        is_picorv32                        = "picorv32" in design_name,
+        is_kronos                          = "kronos" in design_name,
+        is_rocket                          = "rocket" in design_name,
+        is_cva6                            = "cva6" in design_name,
+        is_boom                            = "boom" in design_name,
+        forbid_vexriscv_csrs               = "vexriscv" in design_name and is_forbid_vexriscv_csrs(),
+        no_interaction_minstret            = is_no_interaction_minstret(design_name),
+        instrtype_cum_weights              = instrtype_cum_weights,
+    )
+
+###
+# Per-process profile cache
+###
+
+# design_name -> DesignProfile
+__design_profiles = dict()
+
+def get_design_profile(design_name: str) -> DesignProfile:
+    ret = __design_profiles.get(design_name)
+    if ret is None or ret.tolerances_version != get_tolerances_version():
+        ret = build_design_profile(design_name)
+        __design_profiles[design_name] = ret
+    return ret
+
+# @brief Installs profiles built by another process, typically as the initializer of a worker pool: `mp.Pool(..., initializer=install_design_profiles, initargs=([get_design_profile(design_name)],))`.
+# A profile built with other tolerances than the ones of this process is rebuilt on its first use.
+def install_design_profiles(design_profiles: list):
+    for design_profile in design_profiles:
+        __design_profiles[design_profile.design_name] = design_profile
@@ -7,17 +7,37 @@
 from params.runparams import DO_ASSERT
 from rv.csrids import CSR_IDS
 from common.designcfgs import is_design_32bit, get_design_stop_sig_addr, get_design_reg_dump_addr, design_has_float_support, design_has_double_support, get_design_fpreg_dump_addr
-from params.fuzzparams import RDEP_MASK_REGISTER_ID, MAX_NUM_PICKABLE_REGS, MAX_NUM_PICKABLE_FLOATING_REGS, FPU_ENDIS_REGISTER_ID
+from params.fuzzparams import RDEP_MASK_REGISTER_ID, MAX_NUM_PICKABLE_REGS, MAX_NUM_PICKABLE_FLOATING_REGS, FPU_ENDIS_REGISTER_ID, is_block_templates_enabled
 from cascade.privilegestate import PrivilegeStateEnum
 from rv.asmutil import li_into_reg
 from cascade.cfinstructionclasses import ImmRdInstruction, RegImmInstruction, IntStoreInstruction, FloatStoreInstruction, JALInstruction, SpecialInstruction, CSRRegInstruction
 
+import numpy as np
+
 def get_finalblock_max_size():
     return (10 + 2*MAX_NUM_PICKABLE_REGS + 2*MAX_NUM_PICKABLE_FLOATING_REGS - 1) * 4
 
+# Final block templates: (design name, whether the floating registers are dumped) -> (instruction objects, encoded bytes). The instruction objects are shared by the programs and must not be modified.
+__finalblock_templates = dict()
+
 # We must instantiate it in the end because we must know whether we have the privileges to turn on the FPU.
 # Returns the instruction objects of the tail basic block
 def finalblock(fuzzerstate, design_name: str):
+    if not is_block_templates_enabled():
+        return __gen_finalblock(fuzzerstate, design_name)
+
+    # The only dependency on the fuzzerstate is whether the floating registers are dumped, which is when the FPU gets enabled by the final block.
+    dumps_fpregs = design_has_float_support(design_name) and not fuzzerstate.is_fpu_activated and fuzzerstate.privilegestate.privstate == PrivilegeStateEnum.MACHINE
+    template_key = (design_name, dumps_fpregs)
+    if template_key not in __finalblock_templates:
+        instrs = __gen_finalblock(fuzzerstate, design_name)
+        __finalblock_templates[template_key] = (tuple(instrs), np.array([instr_obj.gen_bytecode_int(False) for instr_obj in instrs], dtype='<u4').tobytes()) # NO_COMPRESSED
+    elif dumps_fpregs:
+        fuzzerstate.is_fpu_activated = True
+    fuzzerstate.final_bb_template = __finalblock_templates[template_key]
+    return list(__finalblock_templates[template_key][0])
+
+def __gen_finalblock(fuzzerstate, design_name: str):
     try:
         stopsig_addr = get_design_stop_sig_addr(design_name)
     except:
@@ -2,22 +2,45 @@
 # Licensed under the General Public License, Version 3.0, see LICENSE for details.
 # SPDX-License-Identifier: GPL-3.0-only
 
-from params.runparams import DO_ASSERT
-from params.fuzzparams import RELOCATOR_REGISTER_ID, RDEP_MASK_REGISTER_ID, FPU_ENDIS_REGISTER_ID, MIN_NUM_PICKABLE_REGS, MAX_NUM_PICKABLE_REGS, MIN_NUM_PICKABLE_FLOATING_REGS, MAX_NUM_PICKABLE_FLOATING_REGS, MPP_BOTH_ENDIS_REGISTER_ID, MPP_TOP_ENDIS_REGISTER_ID, SPP_ENDIS_REGISTER_ID, MAX_NUM_STORE_LOCATIONS
-from common.designcfgs import is_design_32bit, design_has_float_support, design_has_double_support, design_has_muldiv_support, design_has_atop_support, design_has_misaligned_data_support, get_design_boot_addr, design_has_supervisor_mode, design_has_user_mode, design_has_compressed_support, design_has_pmp
+from params.runparams import DO_ASSERT, DO_EXPENSIVE_ASSERT
+from params.fuzzparams import get_memview_backend, is_regpick_numpy_rng_enabled, RELOCATOR_REGISTER_ID, RDEP_MASK_REGISTER_ID, FPU_ENDIS_REGISTER_ID, MIN_NUM_PICKABLE_REGS, MAX_NUM_PICKABLE_REGS, MIN_NUM_PICKABLE_FLOATING_REGS, MAX_NUM_PICKABLE_FLOATING_REGS, MPP_BOTH_ENDIS_REGISTER_ID, MPP_TOP_ENDIS_REGISTER_ID, SPP_ENDIS_REGISTER_ID, MAX_NUM_STORE_LOCATIONS
 from common.spike import SPIKE_STARTADDR
 
 from cascade.util import ISAInstrClass, ExceptionCauseVal
-from cascade.memview import MemoryView
+from cascade.memview import MEMVIEW_BACKENDS
+from cascade.designprofile import get_design_profile
 from cascade.contextreplay import get_context_setter_max_size
 from cascade.privilegestate import PrivilegeState
 from cascade.randomize.pickstoreaddr import MemStoreState
-from cascade.randomize.pickreg import IntRegPickState, FloatRegPickState
+from cascade.randomize.pickreg import IntRegPickState, FloatRegPickState, RegPickGenerator
 from cascade.randomize.pickisainstrclass import ISAINSTRCLASS_INITIAL_BOOSTERS
 from cascade.randomize.pickexceptionop import EXCEPTION_OP_TYPE_INITIAL_BOOSTERS
 
+from copy import copy
+from dataclasses import dataclass
 import random
 
+# Checkpoint of the basic block generation, taken at a basic block boundary by save_bbgen_checkpoint.
+# The basic blocks are shared with the fuzzer state, because complete basic blocks are not modified during the generation.
+@dataclass
+class BBGenCheckpoint:
+    instr_objs_seq: list
+    bb_start_addr_seq: list
+    saved_reg_states: list
+    num_instrs_per_bb: list
+    num_fuzzing_instrs: int
+    num_fuzzing_instrs_per_class: dict
+    next_bb_addr: int
+    memview_state: tuple
+    privilegestate: PrivilegeState
+    is_fpu_activated: bool # None if the design has no FPU
+    is_minstret_inaccurate_because_ecall_ebreak: bool
+    special_instrs_count: int
+    num_fpuendis_coords: int
+
+    def get_num_bbs(self):
+        return len(self.instr_objs_seq)
+
 class FuzzerState:
     # @param randseed for identification purposes only.
     def __init__(self, design_base_addr: int, design_name: str, memsize: int, randseed: int, nmax_bbs: int, authorize_privileges: bool, nmax_instructions: int = None, nodependencybias: bool = False):
@@ -31,16 +54,29 @@ class FuzzerState:
 
         self.design_name = design_name
         self.design_base_addr = design_base_addr
-        self.is_design_64bit = not is_design_32bit(design_name)
-        self.design_has_compressed_support     : bool = design_has_compressed_support(design_name)
-        self.design_has_fpu                    : bool = design_has_float_support(design_name)
-        self.design_has_fpud                   : bool = design_has_double_support(design_name)
-        self.design_has_muldiv                 : bool = design_has_muldiv_support(design_name)
-        self.design_has_amo                    : bool = design_has_atop_support(design_name)
-        self.design_has_misaligned_data_support: bool = design_has_misaligned_data_support(design_name)
-        self.design_has_supervisor_mode        : bool = design_has_supervisor_mode(design_name)
-        self.design_has_user_mode              : bool = design_has_user_mode(design_name)
-        self.design_has_pmp                    : bool = design_has_pmp(design_name)
+        # Compiled once per design, see cascade/designprofile.py.
+        self.design_profile = get_design_profile(design_name)
+        self.is_design_64bit                   : bool = self.design_profile.is_design_64bit
+        self.design_has_compressed_support     : bool = self.design_profile.design_has_compressed_support
+        self.design_has_fpu                    : bool = self.design_profile.design_has_fpu
+        self.design_has_fpud                   : bool = self.design_profile.design_has_fpud
+        self.design_has_muldiv                 : bool = self.design_profile.design_has_muldiv
+        self.design_has_amo                    : bool = self.design_profile.design_has_amo
+        self.design_has_misaligned_data_support: bool = self.design_profile.design_has_misaligned_data_support
+        self.design_has_supervisor_mode        : bool = self.design_profile.design_has_supervisor_mode
+        self.design_has_user_mode              : bool = self.design_profile.design_has_user_mode
+        self.design_has_pmp                    : bool = self.design_profile.design_has_pmp
+
+        # The MemoryView class, typically MemoryView or MemoryViewBisect, which share the same API and behavior.
+        if get_memview_backend() not in MEMVIEW_BACKENDS:
+            raise ValueError(f"Unknown MemoryView backend: `{get_memview_backend()}`. Supported backends: {list(MEMVIEW_BACKENDS.keys())}.")
+        self.memview_class = MEMVIEW_BACKENDS[get_memview_backend()]
+
+        # Cumulated duration of the ELF constructions for this program, for spike resolution and for RTL simulation. Maintained by gen_elf_from_bbs.
+        self.time_seconds_spent_in_gen_elf = 0
+
+        # Random generator of the register picks if enabled, else the picks draw from the random module. It is not reseeded on reset.
+        self.regpick_rng = RegPickGenerator(randseed) if is_regpick_numpy_rng_enabled() else None
 
         self.gen_pick_weights()
         self.reset()
@@ -50,23 +86,28 @@ class FuzzerState:
     def reset(self):
         self.initial_block_data_start, self.initial_block_data_end = None, None
         self.random_block_content4by4bytes = []
+        self.random_data_block_start_addr, self.random_data_block_end_addr = -1, -1 # Set by gen_random_data_block. Absent, for example, in the profiling snippets.
 
         self.next_bb_addr = 0
-        self.memview = MemoryView(self.memsize)
-        self.memview_blacklist = MemoryView(self.memsize) # For load blacklist
+        self.memview = self.memview_class(self.memsize)
+        self.memview_blacklist = self.memview_class(self.memsize) # For load blacklist
 
         self.num_store_locations = random.randint(1, MAX_NUM_STORE_LOCATIONS)
         self.ctxsv_size_upperbound: int = get_context_setter_max_size(self) # Can be called once is_design_64bit, design_has_fpu and design_has_fpud are set, and the number of store locations is known.
 
         self.memstorestate = MemStoreState()
-        self.intregpickstate = IntRegPickState(self.num_pickable_regs, self.nodependencybias)
-        self.floatregpickstate = FloatRegPickState(self.num_pickable_floating_regs)
+        self.intregpickstate = IntRegPickState(self.num_pickable_regs, self.nodependencybias, self.regpick_rng)
+        self.floatregpickstate = FloatRegPickState(self.num_pickable_floating_regs, self.regpick_rng)
         self.privilegestate = PrivilegeState()
 
         # self.instr_objs_seq does NEVER contain the final basic block.
         self.instr_objs_seq = [] # List (queue) of (for each basic block) lists of instruction objects
         self.bb_start_addr_seq = [] # List (queue) of bb start addresses. Self-managed through init_new_bb.
-        self.saved_reg_states = [] # List (queue) of register save objects, as saved by pickreg.py
+        self.saved_reg_states = [] # List (queue) of register snapshots (IntRegSnapshot), as saved by pickreg.py. Successive snapshots share the unmodified registers.
+        # Running instruction counters, maintained by add_instruction, init_new_bb and pop_last_bb. The initial block is not counted as fuzzing instructions.
+        self.num_instrs_per_bb = [] # For each basic block in self.instr_objs_seq
+        self.num_fuzzing_instrs = 0
+        self.num_fuzzing_instrs_per_class = dict() # Instruction Python class -> number of fuzzing instructions
 
         # Strictly increasing when we create new producer0, to ensure uniqueness
         self.next_producer_id = 0
@@ -87,6 +128,12 @@ class FuzzerState:
         self.ctxdmp_bb_base_addr = -1
         self.ctxdmp_bb_jal_instr_id = -1 # Useful because the last elements in ctxdmp_bb are data.
 
+        # Templates of the initial and final blocks, as pairs (instruction objects, encoded bytes), if the blocks were instantiated from templates. See initialblock.py and finalblock.py.
+        self.initial_bb_template = None
+        self.final_bb_template = None
+        # Spike resolution memory image, as a triple (memory image, patch locations, number of words of the spike resolution final block). Maintained by gen_patchable_memimage_from_bbs, and released by gen_elf_from_bbs once the RTL image is patched.
+        self.patchable_memimage = None
+
         # Instructions after the basic blocks, called block tails
         self.block_tail_instrs = [] # List of pairs (instr_obj, instr_addr)
 
@@ -103,8 +150,45 @@ class FuzzerState:
     def add_instruction(self, new_instrobjs):
         if isinstance(new_instrobjs, list):
             self.instr_objs_seq[-1].extend(new_instrobjs)
+            self.__count_instrs(new_instrobjs, 1)
         else:
-            self.instr_objs_seq[-1].append(new_instrobjs)            
+            self.instr_objs_seq[-1].append(new_instrobjs)
+            self.__count_instrs((new_instrobjs,), 1)
+
+    # @brief updates the running instruction counters of a basic block
+    # @param sign: 1 when adding instructions, -1 when removing them
+    # @param bb_id: the index of the basic block in instr_objs_seq, the latest one by default
+    def __count_instrs(self, instrobjs, sign: int, bb_id: int = -1):
+        if bb_id < 0:
+            bb_id += len(self.instr_objs_seq)
+        self.num_instrs_per_bb[bb_id] += sign * len(instrobjs)
+        if bb_id > 0:
+            self.num_fuzzing_instrs += sign * len(instrobjs)
+            for instrobj in instrobjs:
+                self.num_fuzzing_instrs_per_class[type(instrobj)] = self.num_fuzzing_instrs_per_class.get(type(instrobj), 0) + sign
+
+    # @brief replaces an instruction of some basic block, and updates the instruction counters accordingly
+    def set_instr(self, bb_id: int, instr_id: int, new_instrobj):
+        bb = self.instr_objs_seq[bb_id]
+        self.__count_instrs((bb[instr_id],), -1, bb_id)
+        bb[instr_id] = new_instrobj
+        self.__count_instrs((new_instrobj,), 1, bb_id)
+
+    # @brief replaces all the instructions of some basic block, and updates the instruction counters accordingly
+    def set_bb_instrs(self, bb_id: int, new_instrobjs: list):
+        self.__count_instrs(self.instr_objs_seq[bb_id], -1, bb_id)
+        self.instr_objs_seq[bb_id] = new_instrobjs
+        self.__count_instrs(new_instrobjs, 1, bb_id)
+
+    # @brief checks the running instruction counters against the instruction sequence
+    def check_instr_counters(self):
+        assert self.num_instrs_per_bb == [len(bb) for bb in self.instr_objs_seq], f"Instruction counters per bb mismatch: {self.num_instrs_per_bb} vs. {[len(bb) for bb in self.instr_objs_seq]}"
+        assert self.num_fuzzing_instrs == sum([len(bb) for bb in self.instr_objs_seq[1:]]), f"Fuzzing instruction counter mismatch: {self.num_fuzzing_instrs} vs. {sum([len(bb) for bb in self.instr_objs_seq[1:]])}"
+        num_per_class = dict()
+        for bb in self.instr_objs_seq[1:]:
+            for instrobj in bb:
+                num_per_class[type(instrobj)] = num_per_class.get(type(instrobj), 0) + 1
+        assert num_per_class == {k: v for k, v in self.num_fuzzing_instrs_per_class.items() if v}, "Fuzzing instruction counter per class mismatch."
     
     # @brief registers the coordinates of a FPU enable/disable instruction
     def add_fpu_coord(self):
@@ -115,9 +199,15 @@ class FuzzerState:
     # @brief removes the current basic block for the generated program and
     # restores registers to their states in the previous basic block
     def restore_previous_state(self):
+        self.pop_last_bb()
+        self.intregpickstate.restore_state(self.saved_reg_states[-1])
+
+    # @brief removes the last basic block and its start address, and updates the instruction counters accordingly
+    def pop_last_bb(self):
+        self.__count_instrs(self.instr_objs_seq[-1], -1)
         self.instr_objs_seq.pop()
         self.bb_start_addr_seq.pop()
-        self.intregpickstate.restore_state(self.saved_reg_states[-1])
+        self.num_instrs_per_bb.pop()
 
     # @brief returns the current address for the next instruction to generate
     def get_current_addr(self):
@@ -127,9 +217,56 @@ class FuzzerState:
     def save_reg_state(self):
         self.saved_reg_states.append(self.intregpickstate.save_curr_state())
 
+    # @brief draws a smaller number of store locations, and hence a smaller context setter. Must be called before the store locations are initialized.
+    def redraw_num_store_locations(self):
+        if DO_ASSERT:
+            assert self.num_store_locations > 1
+        self.num_store_locations = random.randint(1, self.num_store_locations - 1)
+        self.ctxsv_size_upperbound = get_context_setter_max_size(self)
+
+    # @brief takes a checkpoint of the generation. Must be called at a basic block boundary, once the register states are saved.
+    # The pick weights and the producer ids are not part of the checkpoint, because they only bias the next picks.
+    def save_bbgen_checkpoint(self) -> BBGenCheckpoint:
+        return BBGenCheckpoint(
+            instr_objs_seq                              = copy(self.instr_objs_seq),
+            bb_start_addr_seq                           = copy(self.bb_start_addr_seq),
+            saved_reg_states                            = copy(self.saved_reg_states),
+            num_instrs_per_bb                           = copy(self.num_instrs_per_bb),
+            num_fuzzing_instrs                          = self.num_fuzzing_instrs,
+            num_fuzzing_instrs_per_class                = copy(self.num_fuzzing_instrs_per_class),
+            next_bb_addr                                = self.next_bb_addr,
+            memview_state                               = self.memview.save_curr_state(),
+            privilegestate                              = copy(self.privilegestate),
+            is_fpu_activated                            = self.is_fpu_activated if self.design_has_fpu else None,
+            is_minstret_inaccurate_because_ecall_ebreak = self.is_minstret_inaccurate_because_ecall_ebreak,
+            special_instrs_count                        = self.special_instrs_count,
+            num_fpuendis_coords                         = len(self.fpuendis_coords),
+        )
+
+    # @brief rolls the generation back to a checkpoint, which can be restored several times.
+    def restore_bbgen_checkpoint(self, checkpoint: BBGenCheckpoint):
+        self.instr_objs_seq = copy(checkpoint.instr_objs_seq)
+        self.bb_start_addr_seq = copy(checkpoint.bb_start_addr_seq)
+        self.saved_reg_states = copy(checkpoint.saved_reg_states)
+        self.num_instrs_per_bb = copy(checkpoint.num_instrs_per_bb)
+        self.num_fuzzing_instrs = checkpoint.num_fuzzing_instrs
+        self.num_fuzzing_instrs_per_class = copy(checkpoint.num_fuzzing_instrs_per_class)
+        self.next_bb_addr = checkpoint.next_bb_addr
+        self.intregpickstate.restore_state(self.saved_reg_states[-1])
+        self.memview.restore_state(checkpoint.memview_state)
+        self.privilegestate = copy(checkpoint.privilegestate)
+        if self.design_has_fpu:
+            self.is_fpu_activated = checkpoint.is_fpu_activated
+        self.is_minstret_inaccurate_because_ecall_ebreak = checkpoint.is_minstret_inaccurate_because_ecall_ebreak
+        self.special_instrs_count = checkpoint.special_instrs_count
+        del self.fpuendis_coords[checkpoint.num_fpuendis_coords:]
+        if DO_EXPENSIVE_ASSERT:
+            self.check_instr_counters()
+
     # @brief initializes a new basic block
     def init_new_bb(self):
         self.instr_objs_seq.append([])
+        self.num_instrs_per_bb.append(0)
 
         self.curr_bb_start_addr = self.next_bb_addr
         self.next_bb_addr = None
@@ -167,6 +304,8 @@ class FuzzerState:
             ISAInstrClass.DESCEND_PRV: (random.random() + 0.05) * ISAINSTRCLASS_INITIAL_BOOSTERS[ISAInstrClass.DESCEND_PRV],
             ISAInstrClass.SPECIAL:     (random.random() + 0.05) * ISAINSTRCLASS_INITIAL_BOOSTERS[ISAInstrClass.SPECIAL],
         }
+        # Filtered cumulative isa pick weights, keyed by generator state bitmask (see cascade/randomize/pickisainstrclass.py). Must be emptied if isapickweights changes.
+        self.isapickweights_cache = dict()
         self.exceptionoppickweights = {
             ExceptionCauseVal.ID_INSTR_ADDR_MISALIGNED:        (random.random() + 0.05) * EXCEPTION_OP_TYPE_INITIAL_BOOSTERS[ExceptionCauseVal.ID_INSTR_ADDR_MISALIGNED],
             ExceptionCauseVal.ID_INSTR_ACCESS_FAULT:           (random.random() + 0.05) * EXCEPTION_OP_TYPE_INITIAL_BOOSTERS[ExceptionCauseVal.ID_INSTR_ACCESS_FAULT],
@@ -234,8 +373,14 @@ class FuzzerState:
         return self.get_num_fuzzing_instructions_sofar() >= self.nmax_instructions
     
     # @brief counts the number of generated intruction, does not count the 
-    # initial and final blocks
+    # initial and final blocks. Relies on the running counters, which only follow
+    # the modifications made through the FuzzerState methods.
     def get_num_fuzzing_instructions_sofar(self):
-        if len(self.instr_objs_seq) <= 1:
-            return 0
-        return sum([len(bb) for bb in self.instr_objs_seq[1:]])
+        if DO_EXPENSIVE_ASSERT:
+            self.check_instr_counters()
+        return self.num_fuzzing_instrs
+
+    # @brief returns the number of generated instructions per instruction Python class, 
+    # without the initial and final blocks
+    def get_num_fuzzing_instructions_per_class(self):
+        return {k: v for k, v in self.num_fuzzing_instrs_per_class.items() if v}
@@ -12,6 +12,7 @@ from cascade.basicblock import gen_basicblocks
 from cascade.fuzzsim import SimulatorEnum, runtest_simulator
 from cascade.genelf import gen_elf_from_bbs
 from cascade.spikeresolution import spike_resolution
+from common.spikeinmem import count_spike_file_removal
 
 import os
 import random
@@ -39,15 +40,14 @@ def gen_fuzzerstate_elf_expectedvals(memsize: int, design_name: str, randseed: i
     gen_basicblocks(fuzzerstate)
     time_seconds_spent_in_gen_bbs = time.time() - start
 
-    # spike resolution
+    # spike resolution. The ELF constructions it performs are accounted for in time_seconds_spent_in_gen_elf.
     start = time.time()
     expected_regvals = spike_resolution(fuzzerstate, check_pc_spike_again)
-    time_seconds_spent_in_spike_resol = time.time() - start
+    time_seconds_spent_in_spike_resol = time.time() - start - fuzzerstate.time_seconds_spent_in_gen_elf
 
-    start = time.time()
-    # This is typically quite short
-    rtl_elfpath = gen_elf_from_bbs(fuzzerstate, False, 'rtl', fuzzerstate.instance_to_str(), fuzzerstate.design_base_addr)
-    time_seconds_spent_in_gen_elf = time.time() - start
+    # This is typically quite short, since only the words that differ from the spike resolution image are encoded.
+    rtl_elfpath = gen_elf_from_bbs(fuzzerstate, False, 'rtl', fuzzerstate.instance_to_str(), fuzzerstate.design_base_addr, from_patchable_memimage=True)
+    time_seconds_spent_in_gen_elf = fuzzerstate.time_seconds_spent_in_gen_elf
     return fuzzerstate, rtl_elfpath, expected_regvals, time_seconds_spent_in_gen_bbs, time_seconds_spent_in_spike_resol, time_seconds_spent_in_gen_elf
 
 ###
@@ -66,6 +66,7 @@ def run_rtl(memsize: int, design_name: str, randseed: int, nmax_bbs: int, author
         print('rtl elfpath', rtl_elfpath)
     if not NO_REMOVE_TMPFILES:
         os.remove(rtl_elfpath)
+        count_spike_file_removal()
         del rtl_elfpath
 
     if not is_success:
@@ -4,82 +4,151 @@
 
 # This module generates ELF files from a program generated by Cascade.
 
-from params.runparams import DO_ASSERT, PATH_TO_TMP
-from common.bytestoelf import gen_elf
+from params.runparams import DO_ASSERT, DO_EXPENSIVE_ASSERT, PATH_TO_TMP
+from common.bytestoelf import gen_elf, gen_elf_bytes
+from common.spikeinmem import write_spike_inmem_elf, count_spike_file_write
 from cascade.finalblock import finalblock_spike_resolution
+from cascade.blacklist import INSTRUCTION_TYPES_TO_BLACKLIST
 
-from collections import defaultdict
+import numpy as np
+import operator
 import os
+import time
 
-# From a fuzzerstate, generates an ELF, may it be for spike resolution or for RTL simulation
+# The basic block instructions whose bytecode depends on is_spike_resolution. With the final block, they are the only words that differ between the spike resolution image and the RTL image.
+GENELF_PATCHED_INSTR_TYPES = tuple(INSTRUCTION_TYPES_TO_BLACKLIST)
+
+# @brief Encodes a sequence of words into a contiguous buffer and places it into the memory image.
+# @param placed_intervals list of (start, end, name) triples, to which the placed interval is appended for the overlap check.
+# @param word_dtype the numpy dtype of the words, typically '<u4' for instructions and '<u8' for doublewords.
+def __place_words(memimage: bytearray, placed_intervals: list, start_addr: int, words: list, word_dtype: str, name: str):
+    if not words: # Absent blocks typically have a start address of -1.
+        return
+    __place_bytes(memimage, placed_intervals, start_addr, np.array(words, dtype=word_dtype).tobytes(), name)
+
+# @brief Places an encoded buffer into the memory image, see __place_words.
+def __place_bytes(memimage: bytearray, placed_intervals: list, start_addr: int, curr_bytes: bytes, name: str):
+    end_addr = start_addr + len(curr_bytes)
+    # A slice assignment beyond the image would silently extend it.
+    if start_addr < 0 or end_addr > len(memimage):
+        raise ValueError(f"Trying to write {name} out of the memory: [{hex(start_addr)}, {hex(end_addr)}) with memory size {hex(len(memimage))}.")
+    memimage[start_addr:end_addr] = curr_bytes
+    if DO_ASSERT:
+        placed_intervals.append((start_addr, end_addr, name))
+
+# @brief Places a block of instructions into the memory image. If the block starts with the instructions of a block template (see initialblock.py and finalblock.py), their pre-encoded bytes are used.
+# The template instructions do not depend on is_spike_resolution.
+# @param template a pair (instruction objects, encoded bytes), or None.
+def __place_instrs(memimage: bytearray, placed_intervals: list, start_addr: int, instr_objs: list, is_spike_resolution: bool, template, name: str):
+    if template is not None and len(instr_objs) >= len(template[0]) and all(map(operator.is_, instr_objs, template[0])):
+        template_instrs, template_bytes = template
+        __place_bytes(memimage, placed_intervals, start_addr, template_bytes + np.array([instr_obj.gen_bytecode_int(is_spike_resolution) for instr_obj in instr_objs[len(template_instrs):]], dtype='<u4').tobytes(), name) # NO_COMPRESSED
+    else:
+        __place_words(memimage, placed_intervals, start_addr, [instr_obj.gen_bytecode_int(is_spike_resolution) for instr_obj in instr_objs], '<u4', name) # NO_COMPRESSED
+
+# @brief Checks that no two placed intervals overlap.
+def __check_no_overlap(placed_intervals: list):
+    placed_intervals.sort()
+    for interval_id in range(1, len(placed_intervals)):
+        prev_start, prev_end, prev_name = placed_intervals[interval_id-1]
+        curr_start, curr_end, curr_name = placed_intervals[interval_id]
+        assert prev_end <= curr_start, f"Trying to write twice to the same address: {prev_name} [{hex(prev_start)}, {hex(prev_end)}) overlaps with {curr_name} [{hex(curr_start)}, {hex(curr_end)})."
+
+# From a fuzzerstate, generates the memory image, may it be for spike resolution or for RTL simulation
 # Also integrates the final block.
-# @param instr_objs an iterable (one per basic block) of iterables of CFInstructions or placeholders
-# @param test_identifier typically the random seed, mem size, design name, max number of bbs
-# @return the generated elf path
-def gen_elf_from_bbs(fuzzerstate, is_spike_resolution, prefixname: str, test_identifier: str, start_addr: int):
+# Each block is encoded into a contiguous buffer that is placed into the memory image by slice assignment.
+# @param patch_locs if not None, the pairs (address, instruction object) of the basic block instructions of GENELF_PATCHED_INSTR_TYPES are appended to it.
+# @return the memory image as a bytearray of size fuzzerstate.memsize, whose first byte is at address 0 relative to the memory start
+def gen_memimage_from_bbs(fuzzerstate, is_spike_resolution, patch_locs: list = None) -> bytearray:
     if DO_ASSERT:
         assert len(fuzzerstate.instr_objs_seq) == len(fuzzerstate.bb_start_addr_seq)
 
+    memimage = bytearray(fuzzerstate.memsize) # Zero-filled
+    placed_intervals = [] # Only populated if DO_ASSERT
+
     # Create the bytecode for the ELF file
-    addr_instrs = defaultdict(bytes) # addr_instrs[addr] = single byte
-    for bb_start_addr, bb_instrs in zip(fuzzerstate.bb_start_addr_seq, fuzzerstate.instr_objs_seq):
-        for instr_id_in_bb, instr_obj in enumerate(bb_instrs):
-            curr_bytecode = instr_obj.gen_bytecode_int(is_spike_resolution=is_spike_resolution).to_bytes(4, 'little')
-            for curr_byte_id, curr_byte in enumerate(curr_bytecode):
-                curr_addr = bb_start_addr + 4*instr_id_in_bb + curr_byte_id # NO_COMPRESSED
-                if DO_ASSERT:
-                    assert curr_addr not in addr_instrs, f"Trying to write twice to the same address: {hex(curr_addr)}"
-                addr_instrs[curr_addr] = curr_byte
+    for bb_id, (bb_start_addr, bb_instrs) in enumerate(zip(fuzzerstate.bb_start_addr_seq, fuzzerstate.instr_objs_seq)):
+        __place_instrs(memimage, placed_intervals, bb_start_addr, bb_instrs, is_spike_resolution, None if bb_id else fuzzerstate.initial_bb_template, f"basic block {bb_id}")
+        if patch_locs is not None:
+            patch_locs += [(bb_start_addr + 4*instr_id, instr_obj) for instr_id, instr_obj in enumerate(bb_instrs) if isinstance(instr_obj, GENELF_PATCHED_INSTR_TYPES)] # NO_COMPRESSED
 
     for instr_id_in_bb, instr_obj in enumerate(fuzzerstate.ctxsv_bb):
         if instr_obj is None:
             raise ValueError(f"instrobj is None for ctxsv_bb at index {instr_id_in_bb}")
-        curr_bytecode = instr_obj.gen_bytecode_int(is_spike_resolution=is_spike_resolution).to_bytes(4, 'little')
-        for curr_byte_id, curr_byte in enumerate(curr_bytecode):
-            curr_addr = fuzzerstate.ctxsv_bb_base_addr + 4*instr_id_in_bb + curr_byte_id # NO_COMPRESSED
-            if DO_ASSERT:
-                assert curr_addr not in addr_instrs, f"Trying to write twice to the same address: {hex(curr_addr)}"
-            addr_instrs[curr_addr] = curr_byte
+    __place_words(memimage, placed_intervals, fuzzerstate.ctxsv_bb_base_addr, [instr_obj.gen_bytecode_int(is_spike_resolution) for instr_obj in fuzzerstate.ctxsv_bb], '<u4', "context setter block") # NO_COMPRESSED
 
     # Add the initial register values
-    for reg_data_id, reg_data_doubleword in enumerate(fuzzerstate.initial_reg_data_content):
-        curr_bytecode = reg_data_doubleword.to_bytes(8, 'little')
-        for curr_byte_id, curr_byte in enumerate(curr_bytecode):
-            curr_addr = fuzzerstate.initial_reg_data_addr + 8*reg_data_id + curr_byte_id # doublewords therefore 8
-            if DO_ASSERT:
-                assert curr_addr not in addr_instrs, f"Trying to write twice to the same address: {hex(curr_addr)}"
-            addr_instrs[curr_addr] = curr_byte
+    __place_words(memimage, placed_intervals, fuzzerstate.initial_reg_data_addr, fuzzerstate.initial_reg_data_content, '<u8', "initial register data") # doublewords therefore 8
 
     # Add the final basic block
     if is_spike_resolution:
         final_block = finalblock_spike_resolution()
     else:
         final_block = fuzzerstate.final_bb
-    for instr_id_in_bb, instr_obj in enumerate(final_block):
-        curr_bytecode = instr_obj.gen_bytecode_int(is_spike_resolution=is_spike_resolution).to_bytes(4, 'little')
-        for curr_byte_id, curr_byte in enumerate(curr_bytecode):
-            curr_addr = fuzzerstate.final_bb_base_addr + 4*instr_id_in_bb + curr_byte_id # NO_COMPRESSED
-            if DO_ASSERT:
-                assert curr_addr not in addr_instrs, f"Trying to write twice to the same address: {hex(curr_addr)}"
-            addr_instrs[curr_addr] = curr_byte
+    __place_instrs(memimage, placed_intervals, fuzzerstate.final_bb_base_addr, final_block, is_spike_resolution, fuzzerstate.final_bb_template, "final block")
 
     # Add the random data block
-    for word_id, word_content in enumerate(fuzzerstate.random_block_content4by4bytes):
-        curr_bytecode = word_content.to_bytes(4, 'little')
-        for curr_byte_id, curr_byte in enumerate(curr_bytecode):
-            curr_addr = fuzzerstate.random_data_block_start_addr + 4*word_id + curr_byte_id # NO_COMPRESSED
-            if DO_ASSERT:
-                assert curr_addr not in addr_instrs, f"Trying to write twice to the same address: {hex(curr_addr)}"
-            addr_instrs[curr_addr] = curr_byte
-
-    # Generate a bytes object
-    curr_bytearray = bytearray(fuzzerstate.memsize) # Zero-filled
-    for curr_addr, curr_byte in addr_instrs.items():
-        curr_bytearray[curr_addr] = curr_byte
-    curr_bytes = bytes(curr_bytearray)
-
-    elfpath = os.path.join(PATH_TO_TMP, f"{prefixname}{test_identifier}.elf")
+    __place_words(memimage, placed_intervals, fuzzerstate.random_data_block_start_addr, fuzzerstate.random_block_content4by4bytes, '<u4', "random data block")
+
+    if DO_ASSERT:
+        __check_no_overlap(placed_intervals)
+    return memimage
+
+# Generates the spike resolution memory image, and keeps it in fuzzerstate.patchable_memimage with the locations of the words that differ in the RTL image.
+# @return the spike resolution memory image, which must not be modified.
+def gen_patchable_memimage_from_bbs(fuzzerstate) -> bytearray:
+    patch_locs = []
+    memimage = gen_memimage_from_bbs(fuzzerstate, True, patch_locs)
+    fuzzerstate.patchable_memimage = (memimage, patch_locs, len(finalblock_spike_resolution()))
+    return memimage
+
+# Generates the RTL memory image from the spike resolution image kept by gen_patchable_memimage_from_bbs, by only encoding the words that differ: the instructions of GENELF_PATCHED_INSTR_TYPES, whose bytecode is resolved by now, and the final block.
+# The fuzzerstate must not have been modified since the spike resolution image was generated, except by the spike resolution itself.
+# @return the memory image, equal to gen_memimage_from_bbs(fuzzerstate, False)
+def gen_rtl_memimage_by_patching(fuzzerstate) -> bytearray:
+    if fuzzerstate.patchable_memimage is None:
+        raise ValueError(f"No spike resolution memory image to patch for {fuzzerstate.instance_to_str()}.")
+    spike_memimage, patch_locs, num_spike_final_words = fuzzerstate.patchable_memimage
+    memimage = bytearray(spike_memimage)
+
+    if patch_locs:
+        patch_addrs = np.fromiter((addr for addr, _ in patch_locs), dtype=np.int64, count=len(patch_locs))
+        # The view must be released before the image is used as a bytearray again.
+        memimage_words = np.frombuffer(memimage, dtype='<u4', count=len(memimage) >> 2)
+        memimage_words[patch_addrs >> 2] = np.fromiter((instr_obj.gen_bytecode_int(False) for _, instr_obj in patch_locs), dtype=np.uint32, count=len(patch_locs)) # NO_COMPRESSED
+        del memimage_words
+
+    # Replace the final block
+    memimage[fuzzerstate.final_bb_base_addr:fuzzerstate.final_bb_base_addr+4*num_spike_final_words] = bytes(4*num_spike_final_words) # NO_COMPRESSED
+    __place_instrs(memimage, [], fuzzerstate.final_bb_base_addr, fuzzerstate.final_bb, False, fuzzerstate.final_bb_template, "final block")
+
+    if DO_EXPENSIVE_ASSERT:
+        assert memimage == gen_memimage_from_bbs(fuzzerstate, False), f"The patched RTL memory image differs from the generated one for {fuzzerstate.instance_to_str()}."
+    return memimage
+
+# From a fuzzerstate, generates an ELF, may it be for spike resolution or for RTL simulation
+# The duration of the call is accumulated into fuzzerstate.time_seconds_spent_in_gen_elf.
+# @param test_identifier typically the random seed, mem size, design name, max number of bbs
+# @param in_memory if True, the ELF is placed in memory (see common/spikeinmem.py) and must be released by remove_spike_inmem_elf instead of being removed.
+# @param from_patchable_memimage if True, the RTL image is derived from the last spike resolution image, see gen_rtl_memimage_by_patching, which is then released. Ignored for spike resolution.
+# @return the generated elf path
+def gen_elf_from_bbs(fuzzerstate, is_spike_resolution, prefixname: str, test_identifier: str, start_addr: int, in_memory: bool = False, from_patchable_memimage: bool = False):
+    start_time = time.time()
+    if is_spike_resolution:
+        memimage = gen_patchable_memimage_from_bbs(fuzzerstate)
+    elif from_patchable_memimage:
+        memimage = gen_rtl_memimage_by_patching(fuzzerstate)
+        # The fuzzerstate may outlive the ELF, for example when deep-copied in reduce.py, so the spike resolution image is released after its single use.
+        fuzzerstate.patchable_memimage = None
+    else:
+        memimage = gen_memimage_from_bbs(fuzzerstate, is_spike_resolution)
 
     # Generate the ELF object
-    gen_elf(curr_bytes, start_addr=fuzzerstate.bb_start_addr_seq[0], section_addr=start_addr, destination_path=elfpath, is_64bit=fuzzerstate.is_design_64bit)
+    if in_memory:
+        elfpath = write_spike_inmem_elf(gen_elf_bytes(bytes(memimage), fuzzerstate.bb_start_addr_seq[0], start_addr, fuzzerstate.is_design_64bit), f"{prefixname}{test_identifier}.elf")
+    else:
+        elfpath = os.path.join(PATH_TO_TMP, f"{prefixname}{test_identifier}.elf")
+        gen_elf(bytes(memimage), start_addr=fuzzerstate.bb_start_addr_seq[0], section_addr=start_addr, destination_path=elfpath, is_64bit=fuzzerstate.is_design_64bit)
+        count_spike_file_write(os.path.getsize(elfpath))
+    fuzzerstate.time_seconds_spent_in_gen_elf += time.time() - start_time
     return elfpath
@@ -13,11 +13,15 @@
 # Internally, MemoryView is implemented as a sorted iterable of pairs (free_start_addr, free_end_addr_plus_one)
 # Internally, it offers the guarantee that if (a, b) and (c, d) are in the iterable in this order, then b < c (i.e., no superposition and no juxtaposition)
 
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
 import random
-# from params.runparams import DO_ASSERT
-DO_ASSERT = True
+from params.runparams import get_assert_flags
+
+DO_CHEAP_ASSERT, DO_ASSERT, _ = get_assert_flags('memview')
 
 MEMVIEW_ALLOC_MAX_ATTEMPTS = 1000
+MEMVIEW_PREFIXSUM_REJECTION_ATTEMPTS = 8 # Number of cheap rejection draws before falling back to the prefix sums in MemoryViewPrefixSum
 
 class MemoryView:
     # @param memsize should be at least 4, typically much higher. It is also typically a power of 2.
@@ -65,7 +69,7 @@ class MemoryView:
         for curr_pair_id, curr_pair in enumerate(self.freepairs):
             if start < curr_pair[1]:
                 # Check that the range is initially free.
-                if DO_ASSERT:
+                if DO_CHEAP_ASSERT:
                     assert start >= curr_pair[0] and end <= curr_pair[1], "The memory range to allocate is not free."
                 # Remove the tuple and replace it with at most two smaller tuples. This will automatically coalesce.
                 if start == curr_pair[0] and end == curr_pair[1]:
@@ -143,5 +147,209 @@ class MemoryView:
         free_sum = sum(map(lambda p: p[1] - p[0], self.freepairs))
         return (self.memsize - free_sum)/self.memsize
 
+    # Save and restore the allocations, for the checkpoints of the basic block generation.
+    def save_curr_state(self):
+        return list(self.freepairs), self.occupied_addrs
+    def restore_state(self, saved_state: tuple):
+        self.freepairs = list(saved_state[0])
+        self.occupied_addrs = saved_state[1]
+
+    def to_string(self):
+        return str(self.freepairs)
+
+# MemoryViewBisect offers the same API and the same behavior as MemoryView, including the consumption of random numbers.
+# Internally, the free pairs are stored as two sorted lists of starts and (excluded) ends, so that the pair containing an address is found by bisection.
+# Queries are in O(log n) and allocations only insert or remove list elements instead of rebuilding the list.
+class MemoryViewBisect:
+    # @param memsize should be at least 4, typically much higher. It is also typically a power of 2.
+    def __init__(self, memsize: int):
+        self.freestarts = [0]
+        self.freeends = [memsize]
+        self.memsize = memsize
+        self.occupied_addrs = 0 # Follow the number of occupied addresses.
+
+    # For compatibility with MemoryView.
+    @property
+    def freepairs(self):
+        return list(zip(self.freestarts, self.freeends))
+
+    # @return the index of the first free pair whose end is strictly larger than addr. May be equal to the number of pairs.
+    def __find_pair_id(self, addr: int):
+        return bisect_right(self.freeends, addr)
+
+    # In particular, returns False if it goes beyond the memory boundaries.
+    def is_mem_free(self, addr: int):
+        pair_id = self.__find_pair_id(addr)
+        return pair_id < len(self.freeends) and self.freestarts[pair_id] <= addr
+
+    # @param start: first address of the range
+    # @param end:   last address of the range, excluded
+    # In particular, returns False if it goes beyond the memory boundaries.
+    def is_mem_range_free(self, start: int, end: int):
+        pair_id = self.__find_pair_id(start)
+        return pair_id < len(self.freeends) and start >= self.freestarts[pair_id] and end <= self.freeends[pair_id]
+
+    # @param addr: the current address
+    # @return: the number of addresses, including addr, that are free until the next allocated address (or until the end of the memory).
+    def get_available_contig_space(self, addr: int):
+        pair_id = self.__find_pair_id(addr)
+        if pair_id < len(self.freeends) and addr >= self.freestarts[pair_id]:
+            return self.freeends[pair_id] - addr
+        return 0
+
+    # @param start:         first address of the range.
+    # @param alloc_size:    size of the memory region to allocate, excluding the last adress
+    def alloc_mem_range(self, start: int, alloc_size: int):
+        end = start + alloc_size
+        if DO_ASSERT:
+            assert end > start, f"Expected start ({start}) > end ({end}) in alloc_mem_range."
+        self.occupied_addrs += end-start
+        pair_id = self.__find_pair_id(start)
+        if pair_id == len(self.freeends):
+            raise ValueError("Trying to allocate a memory range that was already not free.")
+        pair_start, pair_end = self.freestarts[pair_id], self.freeends[pair_id]
+        # Check that the range is initially free.
+        if DO_CHEAP_ASSERT:
+            assert start >= pair_start and end <= pair_end, "The memory range to allocate is not free."
+        # Remove the pair or replace it with at most two smaller pairs.
+        if start == pair_start and end == pair_end:
+            del self.freestarts[pair_id]
+            del self.freeends[pair_id]
+        elif start == pair_start:
+            self.freestarts[pair_id] = end
+        elif end == pair_end:
+            self.freeends[pair_id] = start
+        else:
+            self.freeends[pair_id] = start
+            self.freestarts.insert(pair_id+1, end)
+            self.freeends.insert(pair_id+1, pair_end)
+
+    # @param store_instr_str: for example `sw`.
+    # @param addr may be outside of memview
+    def alloc_from_store_instruction(self, store_instr_str: str, addr: int):
+        MemoryView.alloc_from_store_instruction(self, store_instr_str, addr)
+
+    # @param alignment_bits: bits of alignment. For example, 0 for no specific alignment, 1 for 2-byte alignment, 2 for 4-byte, etc.
+    # @param min_space:      the minimal number of memory addresses that are free, starting from the returned address
+    # @param left_bound:     byte address. Included. May exceed memory bounds, in which case will be brought back to memory boundaries.
+    # @param right_bound:    byte address. Excluded. May exceed memory bounds, in which case will be brought back to memory boundaries.
+    # @param max_attempts:   max random attempts. After this number of unsuccessful attempts, the function will return None. Must be strictly positive.
+    # @return None if no corresponding address was found in max_attempts. Else, return the address
+    def gen_random_free_addr(self, alignment_bits: int, min_space: int, left_bound: int, right_bound: int, max_attempts: int = MEMVIEW_ALLOC_MAX_ATTEMPTS):
+        return MemoryView.gen_random_free_addr(self, alignment_bits, min_space, left_bound, right_bound, max_attempts)
+
+    # @brief Computes the percentage of the memory that is allocated
+    def get_allocated_ratio(self):
+        free_sum = sum(self.freeends) - sum(self.freestarts)
+        return (self.memsize - free_sum)/self.memsize
+
+    # Save and restore the allocations, for the checkpoints of the basic block generation.
+    def save_curr_state(self):
+        return list(self.freestarts), list(self.freeends), self.occupied_addrs
+    def restore_state(self, saved_state: tuple):
+        self.freestarts = list(saved_state[0])
+        self.freeends = list(saved_state[1])
+        self.occupied_addrs = saved_state[2]
+
     def to_string(self):
         return str(self.freepairs)
+
+# MemoryViewPrefixSum samples free addresses exactly instead of relying on up to MEMVIEW_ALLOC_MAX_ATTEMPTS rejected draws.
+# For each (alignment_bits, min_space) request type, it maintains, for each free pair, the range of valid aligned start units and the prefix sums of their sizes.
+# A uniformly random valid address is then found with a single draw and a bisection. These prefix sums are invalidated by each allocation.
+# Since each rejection draw is also uniform among the valid addresses, we first try a few cheap rejection draws, which mostly succeed when the memory is sparsely used.
+# The returned addresses follow the same distribution as with MemoryView, but the random numbers are consumed differently, so that the generated programs differ.
+# Besides, None is only returned if there is no valid address at all.
+class MemoryViewPrefixSum(MemoryViewBisect):
+    def __init__(self, memsize: int):
+        super().__init__(memsize)
+        self.__prefixsums = dict() # (alignment_bits, min_space) -> (start units, end units (excluded), prefix sums of the numbers of valid units)
+
+    def alloc_mem_range(self, start: int, alloc_size: int):
+        super().alloc_mem_range(start, alloc_size)
+        self.__prefixsums.clear()
+
+    def restore_state(self, saved_state: tuple):
+        super().restore_state(saved_state)
+        self.__prefixsums.clear()
+
+    # @brief Computes (or gets from the cache) the valid start units of each free pair for the given request type.
+    def __get_prefixsums(self, alignment_bits: int, min_space: int):
+        key = (alignment_bits, min_space)
+        if key not in self.__prefixsums:
+            unit_starts = [(s+(1 << alignment_bits)-1) >> alignment_bits for s in self.freestarts]
+            unit_ends = [((e-min_space) >> alignment_bits) + 1 for e in self.freeends]
+            prefixsums = [0] + list(accumulate(max(0, unit_end-unit_start) for unit_start, unit_end in zip(unit_starts, unit_ends)))
+            self.__prefixsums[key] = (unit_starts, unit_ends, prefixsums)
+        return self.__prefixsums[key]
+
+    # @brief See MemoryView.gen_random_free_addr.
+    # @param max_attempts: unused, kept for API compatibility.
+    def gen_random_free_addr(self, alignment_bits: int, min_space: int, left_bound: int, right_bound: int, max_attempts: int = MEMVIEW_ALLOC_MAX_ATTEMPTS):
+        left_bound  = max(left_bound, 0)
+        right_bound = min(right_bound, self.memsize)
+        if DO_ASSERT:
+            assert max_attempts > 0
+            assert min_space >= 0
+            assert left_bound >= 0
+            assert right_bound <= self.memsize
+            assert left_bound < right_bound
+            # The bounds must be sufficiently spaced. In our use case, this is not at all a problem.
+            assert ((left_bound+(1 << alignment_bits)-1) >> alignment_bits) < ((right_bound-min_space) >> alignment_bits)
+
+        # The candidate units are in [window_start, window_end)
+        window_start = (left_bound+(1 << alignment_bits)-1) >> alignment_bits
+        window_end = (right_bound-min_space) >> alignment_bits
+
+        # Without space requirement, any address in the window is valid.
+        if min_space == 0:
+            return random.randrange(window_start, window_end) << alignment_bits
+
+        # Fast path: rejection sampling
+        for _ in range(MEMVIEW_PREFIXSUM_REJECTION_ATTEMPTS):
+            picked_addr = random.randrange(window_start, window_end) << alignment_bits
+            if self.is_mem_range_free(picked_addr, picked_addr+min_space):
+                return picked_addr
+
+        # Exact path: the clipped first and last overlapping pairs, and the unclipped pairs in between.
+        unit_starts, unit_ends, prefixsums = self.__get_prefixsums(alignment_bits, min_space)
+        first_pair_id = bisect_right(unit_ends, window_start)
+        last_pair_id = bisect_left(unit_starts, window_end) - 1
+        if first_pair_id > last_pair_id:
+            return None
+        first_start = max(unit_starts[first_pair_id], window_start)
+        first_count = max(0, min(unit_ends[first_pair_id], window_end) - first_start)
+        if first_pair_id == last_pair_id:
+            middle_count, last_start, last_count = 0, 0, 0
+        else:
+            middle_count = prefixsums[last_pair_id] - prefixsums[first_pair_id+1]
+            last_start = max(unit_starts[last_pair_id], window_start)
+            last_count = max(0, min(unit_ends[last_pair_id], window_end) - last_start)
+        total_count = first_count + middle_count + last_count
+        if total_count == 0:
+            return None
+
+        picked_id = random.randrange(total_count)
+        if picked_id < first_count:
+            picked_unit = first_start + picked_id
+        elif picked_id < first_count + middle_count:
+            prefix_val = prefixsums[first_pair_id+1] + picked_id - first_count
+            pair_id = bisect_right(prefixsums, prefix_val) - 1
+            picked_unit = unit_starts[pair_id] + prefix_val - prefixsums[pair_id]
+        else:
+            picked_unit = last_start + picked_id - first_count - middle_count
+
+        picked_addr = picked_unit << alignment_bits
+        if DO_ASSERT:
+            assert picked_addr >= 0
+            assert picked_addr + min_space <= self.memsize
+            assert picked_addr % (1 << alignment_bits) == 0
+            assert self.is_mem_range_free(picked_addr, picked_addr+min_space)
+        return picked_addr
+
+# The available MemoryView backends, as selected by the CASCADE_MEMVIEW_BACKEND environment variable.
+MEMVIEW_BACKENDS = {
+    'list': MemoryView,
+    'bisect': MemoryViewBisect,
+    'bisect_prefixsum': MemoryViewPrefixSum,
+}
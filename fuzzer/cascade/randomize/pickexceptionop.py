@@ -7,7 +7,7 @@
 from cascade.cfinstructionclasses import JALInstruction, SimpleIllegalInstruction, SimpleExceptionEncapsulator, MisalignedMemInstruction, EcallEbreakInstruction, TvecWriterInstruction, EPCWriterInstruction, GenericCSRWriterInstruction, CSRRegInstruction, PrivilegeDescentInstruction, CSRRegInstructions, Float3Instruction, Float3Instructions
 from cascade.privilegestate import PrivilegeStateEnum
 from cascade.randomize.createcfinstr import gen_random_rounding_mode
-from cascade.toleratebugs import is_tolerate_rocket_minstret, is_tolerate_kronos_readbadcsr, is_tolerate_picorv32_readnonimplcsr, is_forbid_vexriscv_csrs, is_tolerate_vexriscv_fpu_disabled, is_tolerate_vexriscv_fpu_leak
+from cascade.toleratebugs import is_tolerate_rocket_minstret, is_tolerate_kronos_readbadcsr, is_tolerate_picorv32_readnonimplcsr, is_tolerate_vexriscv_fpu_disabled, is_tolerate_vexriscv_fpu_leak
 from cascade.util import ExceptionCauseVal, IntRegIndivState
 from common.spike import SPIKE_MEDELEG_MASK
 from params.fuzzparams import MPP_BOTH_ENDIS_REGISTER_ID, MPP_TOP_ENDIS_REGISTER_ID, SPP_ENDIS_REGISTER_ID, SIMPLE_ILLEGAL_INSTRUCTION_PROBA, PROBA_PICK_WRONG_FPU, MAX_NUM_PICKABLE_FLOATING_REGS, MAX_NUM_PICKABLE_REGS
@@ -81,17 +81,17 @@ def _get_exceptionoptype_filtered_weights(fuzzerstate):
 # @param old_privilege the privilege state before the exception
 def pick_illegal_instruction(is_mtvec, fuzzerstate, old_privilege):
 
-    if "vexriscv" in fuzzerstate.design_name and is_tolerate_vexriscv_fpu_disabled() and not fuzzerstate.is_fpu_activated:
+    if fuzzerstate.design_profile.is_vexriscv and is_tolerate_vexriscv_fpu_disabled() and not fuzzerstate.is_fpu_activated:
         rm = gen_random_rounding_mode()
         frs1, frs2 = random.randrange(MAX_NUM_PICKABLE_FLOATING_REGS), random.randrange(MAX_NUM_PICKABLE_FLOATING_REGS)
         frd = random.randrange(MAX_NUM_PICKABLE_FLOATING_REGS)
         return SimpleExceptionEncapsulator(is_mtvec, None, Float3Instruction('fadd.s', 0, 0, 0, 0, False))
-    if "vexriscv" in fuzzerstate.design_name and is_tolerate_vexriscv_fpu_leak() and fuzzerstate.is_fpu_activated:
+    if fuzzerstate.design_profile.is_vexriscv and is_tolerate_vexriscv_fpu_leak() and fuzzerstate.is_fpu_activated:
         rs1 = random.randrange(MAX_NUM_PICKABLE_REGS)
         rd = random.randrange(MAX_NUM_PICKABLE_REGS)
         return SimpleExceptionEncapsulator(is_mtvec, None, CSRRegInstruction('csrrw', rd, rs1, CSR_IDS.FCSR))
 
-    if "vexriscv" in fuzzerstate.design_name and is_forbid_vexriscv_csrs():
+    if fuzzerstate.design_profile.forbid_vexriscv_csrs:
         corrected_simple_illegal_instruction_proba = 1
     else:
         corrected_simple_illegal_instruction_proba = SIMPLE_ILLEGAL_INSTRUCTION_PROBA
@@ -99,7 +99,7 @@ def pick_illegal_instruction(is_mtvec, fuzzerstate, old_privilege):
         return SimpleIllegalInstruction(is_mtvec)
 
     if not fuzzerstate.design_has_fpu or not fuzzerstate.is_fpu_activated \
-        and not ("vexriscv" in fuzzerstate.design_name and is_forbid_vexriscv_csrs()):
+        and not fuzzerstate.design_profile.forbid_vexriscv_csrs:
         if random.random() < PROBA_PICK_WRONG_FPU * 0.01**fuzzerstate.design_has_fpu:
             rm = gen_random_rounding_mode()
             frs1, frs2 = random.randrange(MAX_NUM_PICKABLE_FLOATING_REGS), random.randrange(MAX_NUM_PICKABLE_FLOATING_REGS)
@@ -107,8 +107,8 @@ def pick_illegal_instruction(is_mtvec, fuzzerstate, old_privilege):
             return SimpleExceptionEncapsulator(is_mtvec, None, Float3Instruction(random.choice(Float3Instructions), frd, frs1, frs2, rm, False))
 
     if old_privilege == PrivilegeStateEnum.MACHINE:
-        if 'kronos' in fuzzerstate.design_name and not is_tolerate_kronos_readbadcsr() \
-            or 'picorv32' in fuzzerstate.design_name and not is_tolerate_picorv32_readnonimplcsr():
+        if fuzzerstate.design_profile.is_kronos and not is_tolerate_kronos_readbadcsr() \
+            or fuzzerstate.design_profile.is_picorv32 and not is_tolerate_picorv32_readnonimplcsr():
             candidate_instructions = [
                 SimpleExceptionEncapsulator(is_mtvec, None, SimpleIllegalInstruction(is_mtvec)),
             ]
@@ -187,7 +187,7 @@ def gen_next_exception_instr_from_instroptype(fuzzerstate, exception_op_type: Ex
     elif exception_op_type == ExceptionCauseVal.ID_ILLEGAL_INSTRUCTION:
         return pick_illegal_instruction(is_mtvec, fuzzerstate, old_privilege)
     elif exception_op_type == ExceptionCauseVal.ID_BREAKPOINT:
-        fuzzerstate.is_minstret_inaccurate_because_ecall_ebreak = ('rocket' in fuzzerstate.design_name and not is_tolerate_rocket_minstret()) # rocket has minstret inaccurate because of ecall/ebreak
+        fuzzerstate.is_minstret_inaccurate_because_ecall_ebreak = (fuzzerstate.design_profile.is_rocket and not is_tolerate_rocket_minstret()) # rocket has minstret inaccurate because of ecall/ebreak
         return SimpleExceptionEncapsulator(is_mtvec, None, EcallEbreakInstruction("ebreak"))
     elif exception_op_type == ExceptionCauseVal.ID_LOAD_ADDR_MISALIGNED:
         if DO_ASSERT:
@@ -204,17 +204,17 @@ def gen_next_exception_instr_from_instroptype(fuzzerstate, exception_op_type: Ex
     elif exception_op_type == ExceptionCauseVal.ID_ENVIRONMENT_CALL_FROM_U_MODE:
         if DO_ASSERT:
             assert old_privilege == PrivilegeStateEnum.USER
-        fuzzerstate.is_minstret_inaccurate_because_ecall_ebreak = ('rocket' in fuzzerstate.design_name and not is_tolerate_rocket_minstret()) # rocket has minstret inaccurate because of ecall/ebreak
+        fuzzerstate.is_minstret_inaccurate_because_ecall_ebreak = (fuzzerstate.design_profile.is_rocket and not is_tolerate_rocket_minstret()) # rocket has minstret inaccurate because of ecall/ebreak
         return SimpleExceptionEncapsulator(is_mtvec, None, EcallEbreakInstruction("ecall"))
     elif exception_op_type == ExceptionCauseVal.ID_ENVIRONMENT_CALL_FROM_S_MODE:
         if DO_ASSERT:
             assert old_privilege == PrivilegeStateEnum.SUPERVISOR
-        fuzzerstate.is_minstret_inaccurate_because_ecall_ebreak = ('rocket' in fuzzerstate.design_name and not is_tolerate_rocket_minstret()) # rocket has minstret inaccurate because of ecall/ebreak
+        fuzzerstate.is_minstret_inaccurate_because_ecall_ebreak = (fuzzerstate.design_profile.is_rocket and not is_tolerate_rocket_minstret()) # rocket has minstret inaccurate because of ecall/ebreak
         return SimpleExceptionEncapsulator(is_mtvec, None, EcallEbreakInstruction("ecall"))
     elif exception_op_type == ExceptionCauseVal.ID_ENVIRONMENT_CALL_FROM_M_MODE:
         if DO_ASSERT:
             assert old_privilege == PrivilegeStateEnum.MACHINE
-        fuzzerstate.is_minstret_inaccurate_because_ecall_ebreak = ('rocket' in fuzzerstate.design_name and not is_tolerate_rocket_minstret()) # rocket has minstret inaccurate because of ecall/ebreak
+        fuzzerstate.is_minstret_inaccurate_because_ecall_ebreak = (fuzzerstate.design_profile.is_rocket and not is_tolerate_rocket_minstret()) # rocket has minstret inaccurate because of ecall/ebreak
         return SimpleExceptionEncapsulator(is_mtvec, None, EcallEbreakInstruction("ecall"))
     elif exception_op_type == ExceptionCauseVal.ID_INSTRUCTION_PAGE_FAULT:
         raise NotImplementedError("ID_INSTRUCTION_PAGE_FAULT not yet supported")
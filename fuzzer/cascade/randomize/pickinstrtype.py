@@ -7,6 +7,7 @@ from cascade.toleratebugs import is_tolerate_cva6_fdivs_flags, is_tolerate_vexri
 from cascade.util import ISAInstrClass, IntRegIndivState, INSTRUCTIONS_BY_ISA_CLASS
 from params.fuzzparams import NUM_MIN_FREE_INTREGS
 
+from bisect import bisect_right
 from copy import copy
 from collections import defaultdict
 import random
@@ -111,26 +112,16 @@ def forbid_vexriscv_ops(keys_and_weights_dict):
 
     return keys_and_weights_dict_ret
 
-###
-# Exposed functions
-###
-
-# @param isaclass
-# @return a CFInstruction object or a placeholder object
-def gen_next_instrstr_from_isaclass(isaclass: ISAInstrClass, fuzzerstate) -> str:
-    # This global may prevent from copying the dict
-    global INSTRTYPE_INITIAL_RELATIVE_WEIGHTS
-
+# @brief The instruction type weights of an ISA class do not change during the generation. They are compiled into the design profile (see cascade/designprofile.py).
+# @return a dict of instruction strings to weights, in the order of the cumulative weights.
+def gen_instrtype_weights(isaclass: ISAInstrClass, design_name: str) -> dict:
     keys_and_weights_dict = defaultdict(int, INSTRTYPE_INITIAL_RELATIVE_WEIGHTS[isaclass])
 
     # No floating point sign injection
-    if "vexriscv" in fuzzerstate.design_name:
+    if "vexriscv" in design_name:
         keys_and_weights_dict = forbid_vexriscv_ops(keys_and_weights_dict)
 
-    if isaclass == ISAInstrClass.SPECIAL:
-        fuzzerstate.special_instrs_count += 1
-
-    if fuzzerstate.design_name == "cva6":
+    if design_name == "cva6":
         # Double precision
         keys_and_weights_dict["fsqrt.d"] = 0
         if not is_tolerate_cva6_division():
@@ -146,7 +137,17 @@ def gen_next_instrstr_from_isaclass(isaclass: ISAInstrClass, fuzzerstate) -> str
             
         if not is_tolerate_cva6_fdivs_flags():
             keys_and_weights_dict["fdiv.s"] = 0
+    return keys_and_weights_dict
 
+###
+# Exposed functions
+###
+
+# @param isaclass
+# @return a CFInstruction object or a placeholder object
+def gen_next_instrstr_from_isaclass(isaclass: ISAInstrClass, fuzzerstate) -> str:
+    if isaclass == ISAInstrClass.SPECIAL:
+        fuzzerstate.special_instrs_count += 1
 
     if DO_ASSERT:
         assert isaclass != ISAInstrClass.REGFSM   , "ISAInstrClass.REGFSM must be treated separately"
@@ -156,7 +157,9 @@ def gen_next_instrstr_from_isaclass(isaclass: ISAInstrClass, fuzzerstate) -> str
         assert isaclass != ISAInstrClass.PPFSM    , "ISAInstrClass.PPFSM must be treated separately"
         assert isaclass != ISAInstrClass.EPCFSM   , "ISAInstrClass.EPCFSM must be treated separately"
 
-    ret = None
-    while ret is None or keys_and_weights_dict[ret] == 0:
-        ret = random.choices(list(keys_and_weights_dict.keys()), weights=keys_and_weights_dict.values())[0]
-    return ret
+    # The search in the cumulative weights is the one of random.choices, and never lands on a zero weight.
+    instrstrs, cum_weights = fuzzerstate.design_profile.instrtype_cum_weights[isaclass]
+    ret_id = bisect_right(cum_weights, random.random() * cum_weights[-1], 0, len(cum_weights) - 1)
+    if DO_ASSERT:
+        assert cum_weights[ret_id] != (cum_weights[ret_id-1] if ret_id else 0)
+    return instrstrs[ret_id]
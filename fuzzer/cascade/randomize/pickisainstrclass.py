@@ -2,13 +2,15 @@
 # Licensed under the General Public License, Version 3.0, see LICENSE for details.
 # SPDX-License-Identifier: GPL-3.0-only
 
-from params.runparams import DO_ASSERT
-from cascade.toleratebugs import is_tolerate_kronos_fence, is_tolerate_picorv32_fence, is_forbid_vexriscv_csrs, is_tolerate_picorv32_missingmandatorycsrs, is_tolerate_picorv32_readnonimplcsr, is_tolerate_picorv32_writehpm, is_tolerate_picorv32_readhpm_nocsrrs
+from params.runparams import DO_ASSERT, DO_EXPENSIVE_ASSERT
+from cascade.toleratebugs import is_tolerate_kronos_fence, is_tolerate_picorv32_fence, is_tolerate_picorv32_missingmandatorycsrs, is_tolerate_picorv32_readnonimplcsr, is_tolerate_picorv32_writehpm, is_tolerate_picorv32_readhpm_nocsrrs
 from cascade.util import ISAInstrClass, IntRegIndivState
 from params.fuzzparams import NUM_MIN_FREE_INTREGS, MAX_NUM_FENCES_PER_EXECUTION
 from cascade.privilegestate import PrivilegeStateEnum, is_ready_to_descend_privileges
 import random
+from bisect import bisect_right
 from copy import copy
+from itertools import accumulate
 
 # This module helps picking an ISAInstrClass.
 # This is the first step of generating a random instruction without a specific structure.
@@ -44,6 +46,21 @@ ISAINSTRCLASS_INITIAL_BOOSTERS = {
     ISAInstrClass.SPECIAL:     0.0001
 }
 
+# Fields of the generator state bitmask, see gen_isainstrclass_state_mask.
+# Together with the fuzzerstate attributes that do not change during the generation (design capabilities, design name, isapickweights and exceptionoppickweights), they determine the filtered weights.
+# The readiness to descend privileges and to take exceptions are functions of these fields, hence they are only evaluated when a state is seen for the first time.
+ISAINSTRCLASS_STATE_PRIVSTATE_SHIFT       = 0 # 2 bits, PrivilegeStateEnum
+ISAINSTRCLASS_STATE_MSTATUS_MPP_SHIFT     = 2 # 2 bits, PrivilegeStateEnum
+ISAINSTRCLASS_STATE_MTVEC_POPULATED       = 1 << 4
+ISAINSTRCLASS_STATE_STVEC_POPULATED       = 1 << 5
+ISAINSTRCLASS_STATE_MEPC_POPULATED        = 1 << 6
+ISAINSTRCLASS_STATE_SEPC_POPULATED        = 1 << 7
+ISAINSTRCLASS_STATE_FPU_ACTIVATED         = 1 << 8
+ISAINSTRCLASS_STATE_TOO_MANY_SPECIALS     = 1 << 9
+ISAINSTRCLASS_STATE_REGFSM_POSSIBLE       = 1 << 10
+ISAINSTRCLASS_STATE_CONSUMED_REG_EXISTS   = 1 << 11
+ISAINSTRCLASS_STATE_MEDELEG_SHIFT         = 12 # Remaining bits, medeleg value
+
 ###
 # Helper functions
 ###
@@ -101,36 +118,36 @@ def _get_isainstrclass_filtered_weights(fuzzerstate):
     if not fuzzerstate.privilegestate.privstate == PrivilegeStateEnum.MACHINE:
         ret_dict[ISAInstrClass.FPUFSM] = 0
     if (not fuzzerstate.authorize_privileges) or not (fuzzerstate.privilegestate.privstate == PrivilegeStateEnum.MACHINE and fuzzerstate.design_has_supervisor_mode) \
-        or "vexriscv" in fuzzerstate.design_name and is_forbid_vexriscv_csrs():
+        or fuzzerstate.design_profile.forbid_vexriscv_csrs:
         # There is no notion of delegation if supervisor mode is not supported
         ret_dict[ISAInstrClass.MEDELEG] = 0
     # For now, do not populate the mtvec/stvec more than necessary
     if (not fuzzerstate.authorize_privileges) or not (fuzzerstate.privilegestate.privstate == PrivilegeStateEnum.MACHINE and not fuzzerstate.privilegestate.is_mtvec_populated) and not ((fuzzerstate.privilegestate.privstate in (PrivilegeStateEnum.MACHINE, PrivilegeStateEnum.SUPERVISOR)) and not fuzzerstate.privilegestate.is_stvec_populated and fuzzerstate.design_has_supervisor_mode) or \
-        "picorv32" in fuzzerstate.design_name \
-        or "vexriscv" in fuzzerstate.design_name and is_forbid_vexriscv_csrs():
+        fuzzerstate.design_profile.is_picorv32 \
+        or fuzzerstate.design_profile.forbid_vexriscv_csrs:
         ret_dict[ISAInstrClass.TVECFSM] = 0
     # For now, do not populate the mepc/sepc more than necessary
     if (not fuzzerstate.authorize_privileges) or not ((fuzzerstate.privilegestate.privstate == PrivilegeStateEnum.MACHINE and not (fuzzerstate.privilegestate.is_mepc_populated or fuzzerstate.privilegestate.is_sepc_populated)) or \
         fuzzerstate.privilegestate.privstate == PrivilegeStateEnum.SUPERVISOR and not fuzzerstate.privilegestate.is_sepc_populated) or \
-        "picorv32" in fuzzerstate.design_name \
-        or "vexriscv" in fuzzerstate.design_name and is_forbid_vexriscv_csrs():
+        fuzzerstate.design_profile.is_picorv32 \
+        or fuzzerstate.design_profile.forbid_vexriscv_csrs:
         ret_dict[ISAInstrClass.EPCFSM] = 0
     # Do not descend privileges as long as medeleg is undefined because we have no way of certainly coming back up
     # However, this ISA class still encompasses setting mpp and spp bits, to we tolerate this ISA class at all times when executing as a non-user.
     if not is_ready_to_descend_privileges(fuzzerstate):
         ret_dict[ISAInstrClass.DESCEND_PRV] = 0
     # Decrease the proba if we know it will be a mpp/spp
-    if (not fuzzerstate.authorize_privileges) or fuzzerstate.privilegestate.privstate != PrivilegeStateEnum.MACHINE or "picorv32" in fuzzerstate.design_name: # To support sret from machine mode: `not in (PrivilegeStateEnum.MACHINE, PrivilegeStateEnum.SUPERVISOR):`
+    if (not fuzzerstate.authorize_privileges) or fuzzerstate.privilegestate.privstate != PrivilegeStateEnum.MACHINE or fuzzerstate.design_profile.is_picorv32: # To support sret from machine mode: `not in (PrivilegeStateEnum.MACHINE, PrivilegeStateEnum.SUPERVISOR):`
         ret_dict[ISAInstrClass.PPFSM] = 0
     # No exception if no exception is possible
-    if (not fuzzerstate.authorize_privileges) or not fuzzerstate.privilegestate.is_ready_to_take_exception(fuzzerstate) or "picorv32" in fuzzerstate.design_name:
+    if (not fuzzerstate.authorize_privileges) or not fuzzerstate.privilegestate.is_ready_to_take_exception(fuzzerstate) or fuzzerstate.design_profile.is_picorv32:
         ret_dict[ISAInstrClass.EXCEPTION] = 0
     if not fuzzerstate.privilegestate.privstate in (PrivilegeStateEnum.MACHINE, PrivilegeStateEnum.SUPERVISOR) \
-        or "vexriscv" in fuzzerstate.design_name and is_forbid_vexriscv_csrs() \
-        or "picorv32" in fuzzerstate.design_name and not is_tolerate_picorv32_missingmandatorycsrs() and not is_tolerate_picorv32_readnonimplcsr() and not is_tolerate_picorv32_writehpm() and not is_tolerate_picorv32_readhpm_nocsrrs():
+        or fuzzerstate.design_profile.forbid_vexriscv_csrs \
+        or fuzzerstate.design_profile.is_picorv32 and not is_tolerate_picorv32_missingmandatorycsrs() and not is_tolerate_picorv32_readnonimplcsr() and not is_tolerate_picorv32_writehpm() and not is_tolerate_picorv32_readhpm_nocsrrs():
         ret_dict[ISAInstrClass.RANDOM_CSR] = 0
-    if "kronos" in fuzzerstate.design_name and not is_tolerate_kronos_fence() \
-        or "picorv32" in fuzzerstate.design_name and not is_tolerate_picorv32_fence() \
+    if fuzzerstate.design_profile.is_kronos and not is_tolerate_kronos_fence() \
+        or fuzzerstate.design_profile.is_picorv32 and not is_tolerate_picorv32_fence() \
             or (MAX_NUM_FENCES_PER_EXECUTION is not None and fuzzerstate.special_instrs_count > MAX_NUM_FENCES_PER_EXECUTION):
         ret_dict[ISAInstrClass.SPECIAL] = 0
 
@@ -167,14 +184,62 @@ def _filter_sensitive_instr_weights(fuzzerstate, filtered_weights: list):
         filtered_weights[ISAInstrClass.MEMFPU]  = 0
         filtered_weights[ISAInstrClass.MEMFPUD] = 0
 
+# @return a dict of the weights of all the filters, as used by the uncached instruction class picks.
+def get_isainstrclass_weights_uncached(fuzzerstate) -> dict:
+    filtered_weights = _get_isainstrclass_filtered_weights(fuzzerstate)
+    _filter_regfsm_weight(fuzzerstate, filtered_weights)
+    _filter_sensitive_instr_weights(fuzzerstate, filtered_weights)
+    return filtered_weights
+
+# @brief Encodes the generator state that the filtered weights depend on, besides the attributes that do not change during the generation.
+# @return an int made of the ISAINSTRCLASS_STATE_* fields
+def gen_isainstrclass_state_mask(fuzzerstate) -> int:
+    privilegestate = fuzzerstate.privilegestate
+    ret = (privilegestate.privstate << ISAINSTRCLASS_STATE_PRIVSTATE_SHIFT) | (privilegestate.curr_mstatus_mpp << ISAINSTRCLASS_STATE_MSTATUS_MPP_SHIFT) | (privilegestate.medeleg_val << ISAINSTRCLASS_STATE_MEDELEG_SHIFT)
+    if privilegestate.is_mtvec_populated:
+        ret |= ISAINSTRCLASS_STATE_MTVEC_POPULATED
+    if privilegestate.is_stvec_populated:
+        ret |= ISAINSTRCLASS_STATE_STVEC_POPULATED
+    if privilegestate.is_mepc_populated:
+        ret |= ISAINSTRCLASS_STATE_MEPC_POPULATED
+    if privilegestate.is_sepc_populated:
+        ret |= ISAINSTRCLASS_STATE_SEPC_POPULATED
+    if fuzzerstate.design_has_fpu and fuzzerstate.is_fpu_activated:
+        ret |= ISAINSTRCLASS_STATE_FPU_ACTIVATED
+    if MAX_NUM_FENCES_PER_EXECUTION is not None and fuzzerstate.special_instrs_count > MAX_NUM_FENCES_PER_EXECUTION:
+        ret |= ISAINSTRCLASS_STATE_TOO_MANY_SPECIALS
+    num_regs_per_state = fuzzerstate.intregpickstate.get_num_regs_per_state()
+    if num_regs_per_state[IntRegIndivState.FREE] > NUM_MIN_FREE_INTREGS or num_regs_per_state[IntRegIndivState.PRODUCED0] or num_regs_per_state[IntRegIndivState.PRODUCED1]:
+        ret |= ISAINSTRCLASS_STATE_REGFSM_POSSIBLE
+    if num_regs_per_state[IntRegIndivState.CONSUMED]:
+        ret |= ISAINSTRCLASS_STATE_CONSUMED_REG_EXISTS
+    return ret
+
+# @brief The filtered weights of a state are computed once per fuzzerstate by get_isainstrclass_weights_uncached, and kept in fuzzerstate.isapickweights_cache as cumulative weights.
+# @return a pair (list of ISAInstrClass, list of cumulative weights)
+def get_isainstrclass_cum_weights(fuzzerstate):
+    state_mask = gen_isainstrclass_state_mask(fuzzerstate)
+    ret = fuzzerstate.isapickweights_cache.get(state_mask)
+    if ret is None:
+        filtered_weights = get_isainstrclass_weights_uncached(fuzzerstate)
+        # Accumulated in the same order as random.choices does.
+        ret = list(filtered_weights.keys()), list(accumulate(filtered_weights.values()))
+        fuzzerstate.isapickweights_cache[state_mask] = ret
+    elif DO_EXPENSIVE_ASSERT:
+        filtered_weights = get_isainstrclass_weights_uncached(fuzzerstate)
+        assert ret == (list(filtered_weights.keys()), list(accumulate(filtered_weights.values()))), f"Stale cached isa pick weights for state mask {hex(state_mask)}."
+    return ret
+
 ###
 # Exposed function
 ###
 
+# Picks the same instruction classes as _gen_next_isainstrclass_from_weights(get_isainstrclass_weights_uncached(fuzzerstate)) for the same random state.
+# The search in the cumulative weights is the one of random.choices.
 # Do NOT @cache this function, as it is a random function.
 def gen_next_isainstrclass(fuzzerstate) -> ISAInstrClass:
-    filtered_weights = _get_isainstrclass_filtered_weights(fuzzerstate)
-    _filter_regfsm_weight(fuzzerstate, filtered_weights)
-    _filter_sensitive_instr_weights(fuzzerstate, filtered_weights)
-
-    return _gen_next_isainstrclass_from_weights(filtered_weights)
+    isainstrclasses, cum_weights = get_isainstrclass_cum_weights(fuzzerstate)
+    ret_id = bisect_right(cum_weights, random.random() * cum_weights[-1], 0, len(cum_weights) - 1)
+    if DO_ASSERT:
+        assert cum_weights[ret_id] != (cum_weights[ret_id-1] if ret_id else 0)
+    return isainstrclasses[ret_id]
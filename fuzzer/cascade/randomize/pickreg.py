@@ -2,43 +2,156 @@
 # Licensed under the General Public License, Version 3.0, see LICENSE for details.
 # SPDX-License-Identifier: GPL-3.0-only
 
-from params.runparams import DO_ASSERT, DO_EXPENSIVE_ASSERT
-from params.fuzzparams import REGPICK_PROTUBERANCE_RATIO, NUM_MIN_FREE_INTREGS
+from params.runparams import get_assert_flags
+from params.fuzzparams import REGPICK_PROTUBERANCE_RATIO, NUM_MIN_FREE_INTREGS, INTREG_SNAPSHOT_KEYFRAME_PERIOD
 from cascade.randomize.createcfinstr import create_targeted_producer0_instrobj, create_targeted_producer1_instrobj, create_targeted_consumer_instrobj
 from cascade.util import IntRegIndivState
 
-from copy import copy, deepcopy
+from bisect import bisect_right
+from itertools import accumulate
 import math
 import numpy as np
 import random
 
+DO_CHEAP_ASSERT, DO_ASSERT, DO_EXPENSIVE_ASSERT = get_assert_flags('pickreg')
+
+# The register states and weights are kept as numpy arrays, and the picks are weighted draws by a search in the cumulative sum of the weights.
+# The cumulative sums are Python lists, because the numpy per-call overhead dominates for the few pickable registers.
+# If rng is None, the draws are taken from the random module in the same way as random.choices, such that a seed always maps to the same program as with random.choices.
+# Else, rng is a RegPickGenerator, which yields other programs for the same seed (see is_regpick_numpy_rng_enabled in params/fuzzparams.py).
+
+# Number of draws taken at once from the numpy.random.Generator, whose per-call overhead is much larger than a single draw.
+REGPICK_RNG_BUFFER_SIZE = 1024
+
+# Draws from a seeded numpy.random.Generator, in blocks of REGPICK_RNG_BUFFER_SIZE.
+# The draws do not depend on the block size, therefore a seed always maps to the same sequence of draws.
+class RegPickGenerator:
+    def __init__(self, seed: int):
+        self.generator = np.random.default_rng(seed)
+        # Remaining draws of the current block, in reverse order
+        self.__buffer = []
+    # @return a float in [0, 1), like random.random.
+    def random(self) -> float:
+        if not self.__buffer:
+            self.__buffer = self.generator.random(REGPICK_RNG_BUFFER_SIZE).tolist()
+            self.__buffer.reverse()
+        return self.__buffer.pop()
+
+# @param weights a non-negative numpy array with a positive sum.
+# @return the cumulative sum of the weights as a list, summed in the same order as random.choices.
+def get_cum_reg_weights(weights) -> list:
+    ret = list(accumulate(weights.tolist()))
+    if DO_ASSERT:
+        assert ret[-1] > 0, "Cannot pick a register with all-zero weights."
+    return ret
+
+# @param cum_weights a list, typically from get_cum_reg_weights.
+# @param k the number of draws, or None for a single draw.
+# @return a register index if k is None, else a list of k register indices.
+def pick_reg_from_cum_weights(cum_weights: list, rng, k: int = None):
+    draw = random.random if rng is None else rng.random
+    total = cum_weights[-1]
+    # Like random.choices, clip to the last index to be robust to rounding errors.
+    hi = len(cum_weights) - 1
+    if k is None:
+        return bisect_right(cum_weights, draw() * total, 0, hi)
+    return [bisect_right(cum_weights, draw() * total, 0, hi) for _ in range(k)]
+
+# @brief Picks uniformly among the set registers of a one-hot array.
+# Equivalent to pick_reg_from_cum_weights on the cumulative sum of the one-hot array: with integer steps, the search lands on the floor(draw)-th set register.
+# @return a register index.
+def pick_reg_from_onehot(regs_onehot, rng) -> int:
+    set_regs = np.flatnonzero(regs_onehot).tolist()
+    if DO_ASSERT:
+        assert set_regs, "Cannot pick a register from an all-zero one-hot array."
+    draw = random.random if rng is None else rng.random
+    return set_regs[min(int(draw() * len(set_regs)), len(set_regs) - 1)]
+
+# @brief Favors the recently produced register, in place.
+# The other weights are scaled in bulk such that all weights sum to 1.
+# @param outreg the produced register.
+def update_reg_weights(reg_weights, outreg: int):
+    if DO_ASSERT:
+        assert 0 <= outreg
+        assert outreg < len(reg_weights)
+        assert math.isclose(reg_weights.sum(), 1, abs_tol=0.001), f"{reg_weights.sum()} {str(reg_weights)}"
+    # The lines here below are a heuristic algorithm to favor more recently produced registers
+    sum_of_others = reg_weights.sum() - reg_weights[outreg]
+    # Same operation order as an elementwise update, to keep the weights bit-identical.
+    reg_weights *= (1-REGPICK_PROTUBERANCE_RATIO)
+    reg_weights /= sum_of_others
+    reg_weights[outreg] = REGPICK_PROTUBERANCE_RATIO
+
+# Saved state of an IntRegPickState, see IntRegPickState.save_curr_state.
+# A snapshot only holds the registers modified since its parent snapshot, and shares the others with its ancestors. A snapshot without parent (a keyframe) holds all the registers.
+# The snapshots are immutable, hence they are shared between the saved states of successive basic blocks and between the copies of the fuzzer state.
+class IntRegSnapshot:
+    __slots__ = ('parent', 'depth', 'reg_weights', 'changed_regs')
+    # @param reg_weights a numpy array that must not be modified anymore.
+    # @param changed_regs a dict reg_id -> (state, producer id, producer coordinates).
+    def __init__(self, parent, reg_weights, changed_regs: dict):
+        self.parent = parent
+        # Number of ancestors
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.reg_weights = reg_weights
+        self.changed_regs = changed_regs
+    def __copy__(self):
+        return self
+    def __deepcopy__(self, memo):
+        return self
+    # @return a list of (state, producer id, producer coordinates), indexed by register id.
+    def get_regs(self) -> list:
+        changed_regs_chain = []
+        snapshot = self
+        while snapshot is not None:
+            changed_regs_chain.append(snapshot.changed_regs)
+            snapshot = snapshot.parent
+        regs = dict()
+        for changed_regs in reversed(changed_regs_chain):
+            regs.update(changed_regs)
+        if DO_ASSERT:
+            assert sorted(regs) == list(range(len(regs))), "The snapshot chain does not start with a keyframe."
+        return [regs[reg_id] for reg_id in range(len(regs))]
+
 class IntRegPickState:
     # no_dependency_bias: only to evaluate the impact of the dependency bias
-    def __init__(self, num_pickable_regs: int, no_dependency_bias: bool):
+    # @param rng a RegPickGenerator for the picks, or None to draw from the random module, see pick_reg_from_cum_weights.
+    def __init__(self, num_pickable_regs: int, no_dependency_bias: bool, rng: RegPickGenerator = None):
         self.num_pickable_regs = num_pickable_regs
         self.nodependencybias = no_dependency_bias
+        self.rng = rng
         self.__reg_weights  = np.ones(self.num_pickable_regs)
         self.__reg_weights /= np.sum(self.__reg_weights)
-        self.__reg_states   = [IntRegIndivState.FREE for _ in range(self.num_pickable_regs)]
+        self.__reg_states   = np.full(self.num_pickable_regs, IntRegIndivState.FREE, np.int8)
         # Permits matching sensitive instructions with the producers
         self.__last_producer_ids = np.zeros(self.num_pickable_regs)
-        # For each register, a pair of (basic block id, instr in basic block) that produced the register
-        self.__last_producer_coords = [[[None, None], [None, None]] for _ in range(self.num_pickable_regs)]
+        # For each register, a pair of (basic block id, instr in basic block) that produced the register. The pairs are replaced rather than modified, such that the snapshots can share them.
+        self.__last_producer_coords = [((None, None), (None, None))] * self.num_pickable_regs
         if DO_ASSERT:
             self.__last_producer_ids.fill(None) # To avoid luckily having offset 0
-        # Mnemonic list for speeding up searches
-        self.__regs_in_state_onehot = {curr_indiv_state: np.ones(self.num_pickable_regs, np.int8) if (curr_indiv_state == IntRegIndivState.FREE) else np.zeros(self.num_pickable_regs, np.int8) for curr_indiv_state in IntRegIndivState}
+        # Mnemonic one-hot matrix for speeding up searches, indexed by [state, reg_id]. Row 0 is unused.
+        self.__regs_in_state_onehot = np.zeros((max(IntRegIndivState) + 1, self.num_pickable_regs), np.int8)
+        self.__regs_in_state_onehot[IntRegIndivState.FREE] = 1
+        # Number of registers in each state, i.e., the row sums of the one-hot matrix
+        self.__num_regs_per_state = [0] * len(self.__regs_in_state_onehot)
+        self.__num_regs_per_state[IntRegIndivState.FREE] = self.num_pickable_regs
+        # Cumulative effective weights of the free registers, or None if the weights or the free registers changed since they were computed.
+        self.__free_cum_weights = None
+        # Last saved or restored snapshot, and the registers modified since then, see save_curr_state.
+        self.__last_snapshot = None
+        self.__dirty_regs = set()
         # Will ignore x0 if line below is uncommented. This is a design decision.
         # self.__reg_weights[0] = 0
+    # @return a fresh one-hot array, which may be modified by the caller.
     def get_free_regs_onehot(self):
-        ret = [int(self.__reg_states[reg_id] == IntRegIndivState.FREE) for reg_id in range(self.num_pickable_regs)]
+        ret = self.__regs_in_state_onehot[IntRegIndivState.FREE].copy()
         if DO_ASSERT:
-            assert sum(ret) >= NUM_MIN_FREE_INTREGS
+            assert ret.sum() >= NUM_MIN_FREE_INTREGS
         return ret
     def get_free_or_relocused_regs_onehot(self): # WARNING: Use those only for outputs, not for inputs.
-        ret = [int(self.__reg_states[reg_id] == IntRegIndivState.FREE) for reg_id in range(self.num_pickable_regs)]
+        ret = self.__regs_in_state_onehot[IntRegIndivState.FREE].copy()
         if DO_ASSERT:
-            assert sum(ret) >= NUM_MIN_FREE_INTREGS
+            assert ret.sum() >= NUM_MIN_FREE_INTREGS
         return ret
     # Weights after deducting the forbidden registers
     def get_effective_weights(self, authorized_regs_onehot):
@@ -47,29 +160,31 @@ class IntRegPickState:
         if self.nodependencybias:
             return authorized_regs_onehot
         return self.__reg_weights * authorized_regs_onehot
+    # Cached get_cum_reg_weights of the effective weights of the free registers.
+    def get_free_cum_weights(self):
+        if self.__free_cum_weights is None:
+            self.__free_cum_weights = get_cum_reg_weights(self.get_effective_weights(self.get_free_regs_onehot()))
+        return self.__free_cum_weights
     # Returns a free inputreg.
     def pick_int_inputreg(self, authorize_sideeffects: bool = True):
-        return random.choices(range(self.num_pickable_regs), self.get_effective_weights(self.get_free_regs_onehot()))[0]
+        return pick_reg_from_cum_weights(self.get_free_cum_weights(), self.rng)
     # Excludes the zero register
     def pick_int_inputreg_nonzero(self, authorize_sideeffects: bool = True):
         authorized_regs_onehot = self.get_free_regs_onehot()
-        was_zero_authorized = authorized_regs_onehot[0]
         authorized_regs_onehot[0] = 0
-        ret = random.choices(range(self.num_pickable_regs), self.get_effective_weights(authorized_regs_onehot))[0]
-        authorized_regs_onehot[0] = was_zero_authorized
-        return ret
+        return pick_reg_from_cum_weights(get_cum_reg_weights(self.get_effective_weights(authorized_regs_onehot)), self.rng)
     # Consuming multiple input registers in one go.
     def pick_int_inputregs(self, n: int):
-        authorized_regs_onehot = self.get_free_regs_onehot()
         if DO_ASSERT:
             assert n > 1, "The function pick_int_inputregs should not be used for n < 2. For n = 1, please use pick_int_inputreg."
-        return random.choices(range(self.num_pickable_regs), self.get_effective_weights(authorized_regs_onehot), k=n)
+        return pick_reg_from_cum_weights(self.get_free_cum_weights(), self.rng, n)
     # This updates the intregstate.
+    # The free registers are also the free or relocused ones, hence the cached cumulative weights apply.
     def pick_int_outputreg(self, authorize_sideeffects: bool = True):
-        authorized_regs_onehot = self.get_free_or_relocused_regs_onehot() # We could use any, but let's not waste the generated ones
+        # We could use any, but let's not waste the generated ones
         if DO_ASSERT:
-            assert np.max(authorized_regs_onehot) == 1, "Unexpectedly, some register was registered in two states at a time."
-        rd = random.choices(range(self.num_pickable_regs), self.get_effective_weights(authorized_regs_onehot))[0]
+            assert np.max(self.get_free_or_relocused_regs_onehot()) == 1, "Unexpectedly, some register was registered in two states at a time."
+        rd = pick_reg_from_cum_weights(self.get_free_cum_weights(), self.rng)
         if authorize_sideeffects:
             self._update_probaweights(rd)
             if rd:
@@ -77,42 +192,32 @@ class IntRegPickState:
         return rd
     def pick_int_outputreg_nonzero(self, authorize_sideeffects: bool = True):
         authorized_regs_onehot = self.get_free_or_relocused_regs_onehot() # We could use any, but let's not waste the generated ones
-        was_zero_authorized = authorized_regs_onehot[0]
         authorized_regs_onehot[0] = 0
         if DO_ASSERT:
             assert np.max(authorized_regs_onehot) == 1, "Unexpectedly, some register was registered in two states at a time."
-        rd = random.choices(range(self.num_pickable_regs), self.get_effective_weights(authorized_regs_onehot))[0]
+        rd = pick_reg_from_cum_weights(get_cum_reg_weights(self.get_effective_weights(authorized_regs_onehot)), self.rng)
         if authorize_sideeffects:
             self._update_probaweights(rd)
             if rd:
                 self.set_regstate(rd, IntRegIndivState.FREE)
-        authorized_regs_onehot[0] = was_zero_authorized
         return rd
     # @param outreg the produced register.
     def _update_probaweights(self, outreg: int):
-        if DO_ASSERT:
-            assert 0 <= outreg
-            assert outreg < self.num_pickable_regs
-            assert math.isclose(sum(self.__reg_weights), 1, abs_tol=0.001), f"{sum(self.__reg_weights)} {str(self.__reg_weights)}"
         # # Ignore x0
         # if outreg == 0:
         #     return
-        # The lines here below are a heuristic algorithm to favor more recently produced registers
-        sum_of_others = np.sum(self.__reg_weights) - self.__reg_weights[outreg]
-        for reg_id in range(self.num_pickable_regs):
-            # We also do it (for performance) for outreg and we overwrite it later
-            self.__reg_weights[reg_id] = self.__reg_weights[reg_id] * (1-REGPICK_PROTUBERANCE_RATIO) / sum_of_others
-        self.__reg_weights[outreg] = REGPICK_PROTUBERANCE_RATIO
+        update_reg_weights(self.__reg_weights, outreg)
+        self.__free_cum_weights = None
     # Getter and setter for register states
     def get_regstate(self, reg_id: int):
-        if DO_ASSERT:
+        if DO_CHEAP_ASSERT:
             assert 0 < reg_id
             assert reg_id < self.num_pickable_regs
-        return self.__reg_states[reg_id]
+        return IntRegIndivState(self.__reg_states[reg_id])
 
     # @param force: do not check compatibility before->after. Used for restoring some saved state, for example.
     def set_regstate(self, reg_id: int, new_state: int, force: bool = False):
-        if DO_ASSERT:
+        if DO_CHEAP_ASSERT:
             assert 0 < reg_id
             assert reg_id < self.num_pickable_regs
             if not force:
@@ -127,12 +232,17 @@ class IntRegPickState:
                 if DO_EXPENSIVE_ASSERT:
                     # Check that the register is registered in exactly one state
                     for s in IntRegIndivState:
-                        assert self.__regs_in_state_onehot[s][reg_id] == int(s == self.__reg_states[reg_id])
+                        assert self.__regs_in_state_onehot[s, reg_id] == int(s == self.__reg_states[reg_id])
+                    assert self.__num_regs_per_state == self.__regs_in_state_onehot.sum(axis=1).tolist()
                 else:
-                    assert self.__regs_in_state_onehot[self.__reg_states[reg_id]][reg_id]
-        self.__regs_in_state_onehot[self.__reg_states[reg_id]][reg_id] = 0
-        self.__regs_in_state_onehot[new_state][reg_id] = 1
+                    assert self.__regs_in_state_onehot[self.__reg_states[reg_id], reg_id]
+        self.__regs_in_state_onehot[self.__reg_states[reg_id], reg_id] = 0
+        self.__regs_in_state_onehot[new_state, reg_id] = 1
+        self.__num_regs_per_state[self.__reg_states[reg_id]] -= 1
+        self.__num_regs_per_state[new_state] += 1
         self.__reg_states[reg_id] = new_state
+        self.__free_cum_weights = None
+        self.__dirty_regs.add(reg_id)
     # Brings iteratively a register to the requested state, as fast as possible
     # @return nothing, but guarantees that a register will be in the target state
     def bring_some_reg_to_state(self, req_state: int, fuzzerstate):
@@ -158,74 +268,106 @@ class IntRegPickState:
             raise ValueError('Unexpected state.')
 
     # Save at the end of basic blocks, and restore if popping basic blocks from the end.
-    def save_curr_state(self):
-        return copy(self.__reg_weights), copy(self.__reg_states), copy(self.__last_producer_ids), deepcopy(self.__last_producer_coords)
+    # @return an IntRegSnapshot, which only holds the registers modified since the previous save or restore, or all the registers every INTREG_SNAPSHOT_KEYFRAME_PERIOD saves.
+    def save_curr_state(self) -> IntRegSnapshot:
+        parent = self.__last_snapshot
+        if parent is None or parent.depth + 1 >= INTREG_SNAPSHOT_KEYFRAME_PERIOD:
+            parent = None
+            changed_reg_ids = range(self.num_pickable_regs)
+        else:
+            changed_reg_ids = self.__dirty_regs
+        reg_states = self.__reg_states.tolist()
+        producer_ids = self.__last_producer_ids.tolist()
+        ret = IntRegSnapshot(parent, self.__reg_weights.copy(), {reg_id: (reg_states[reg_id], producer_ids[reg_id], self.__last_producer_coords[reg_id]) for reg_id in changed_reg_ids})
+        self.__last_snapshot = ret
+        self.__dirty_regs = set()
+        if DO_EXPENSIVE_ASSERT:
+            saved_reg_states, saved_producer_ids, saved_producer_coords = zip(*ret.get_regs())
+            assert list(saved_reg_states) == reg_states and list(saved_producer_coords) == self.__last_producer_coords, "The snapshot misses some modified register."
+            assert np.array_equal(saved_producer_ids, self.__last_producer_ids, equal_nan=True), "The snapshot misses some modified producer id."
+        return ret
     # Rarely called.
-    def restore_state(self, saved_state: tuple):
+    def restore_state(self, saved_state: IntRegSnapshot):
+        if DO_ASSERT:
+            assert isinstance(saved_state, IntRegSnapshot)
+        reg_states, producer_ids, producer_coords = zip(*saved_state.get_regs())
         if DO_ASSERT:
-            assert len(saved_state) == 4
+            assert len(reg_states) == self.num_pickable_regs
         # Restore the reg weights (this is not so important)
-        self.__reg_weights = copy(saved_state[0])
-        # Restore the reg states. Be careful to also restore the internal matrix. Therefore, use the API function.
-        for reg_id in range(1, self.num_pickable_regs):
-            self.set_regstate(reg_id, saved_state[1][reg_id], force=True)
-        self.__last_producer_ids = copy(saved_state[2])
-        self.__last_producer_coords = deepcopy(saved_state[3])
+        self.__reg_weights = saved_state.reg_weights.copy()
+        # Restore the reg states. Be careful to also restore the internal matrix, which is rebuilt in bulk. The zero register always stays free.
+        self.__reg_states[1:] = reg_states[1:]
+        self.__regs_in_state_onehot.fill(0)
+        self.__regs_in_state_onehot[self.__reg_states, np.arange(self.num_pickable_regs)] = 1
+        self.__num_regs_per_state = self.__regs_in_state_onehot.sum(axis=1).tolist()
+        self.__free_cum_weights = None
+        self.__last_producer_ids = np.array(producer_ids)
+        self.__last_producer_coords = list(producer_coords)
+        self.__last_snapshot = saved_state
+        self.__dirty_regs = set()
 
     # Getters and setters for producer ids 
     def get_producer_id(self, reg_id: int):
         return self.__last_producer_ids[reg_id]
     def set_producer_id(self, reg_id: int, producer_id: int):
         self.__last_producer_ids[reg_id] = producer_id
+        self.__dirty_regs.add(reg_id)
     def set_producer0_location(self, reg_id: int, bb_id: int, instr_id_in_bb: int):
-        self.__last_producer_coords[reg_id][0] = (bb_id, instr_id_in_bb)
+        self.__last_producer_coords[reg_id] = ((bb_id, instr_id_in_bb), self.__last_producer_coords[reg_id][1])
+        self.__dirty_regs.add(reg_id)
     def set_producer1_location(self, reg_id: int, bb_id: int, instr_id_in_bb: int):
-        self.__last_producer_coords[reg_id][1] = (bb_id, instr_id_in_bb)
+        self.__last_producer_coords[reg_id] = (self.__last_producer_coords[reg_id][0], (bb_id, instr_id_in_bb))
+        self.__dirty_regs.add(reg_id)
 
     # Getters for registers in a certain state
     def exists_reg_in_state(self, req_state: IntRegIndivState) -> bool:
-        return np.any(self.__regs_in_state_onehot[req_state])
+        return self.__num_regs_per_state[req_state] > 0
     def get_num_regs_in_state(self, req_state: IntRegIndivState) -> bool:
-        return np.sum(self.__regs_in_state_onehot[req_state])
+        return self.__num_regs_per_state[req_state]
+    # @return a list of the numbers of registers in each state, indexed by IntRegIndivState. Must not be modified.
+    def get_num_regs_per_state(self) -> list:
+        return self.__num_regs_per_state
+    # The pick never lands on a register in another state, hence no retry is needed.
     def pick_int_reg_in_state(self, req_state: IntRegIndivState):
         if DO_ASSERT:
             assert self.exists_reg_in_state(req_state), f"No reg in state `{req_state}`"
-        ret = None
-        while ret is None or not self.__regs_in_state_onehot[req_state][ret]:
-            ret = random.choices(range(self.num_pickable_regs), self.__regs_in_state_onehot[req_state], k=1)[0]
+        ret = pick_reg_from_onehot(self.__regs_in_state_onehot[req_state], self.rng)
+        if DO_ASSERT:
+            assert self.__regs_in_state_onehot[req_state, ret]
         return ret
     def display(self):
-        print('pickreg', self.__regs_in_state_onehot)
+        print('pickreg', {curr_indiv_state: self.__regs_in_state_onehot[curr_indiv_state] for curr_indiv_state in IntRegIndivState})
 
 # Float registers are never forbidden, therefore this is simpler than integer registers.
 class FloatRegPickState:
-    def __init__(self, num_pickable_floating_regs: int):
+    # @param rng a RegPickGenerator for the picks, or None to draw from the random module, see pick_reg_from_cum_weights.
+    def __init__(self, num_pickable_floating_regs: int, rng: RegPickGenerator = None):
         self.num_pickable_floating_regs = num_pickable_floating_regs
+        self.rng = rng
         self.__reg_weights = np.ones(self.num_pickable_floating_regs)
         self.__reg_weights /= sum(self.__reg_weights)
+        # Computed lazily, because designs without FPU have no pickable floating registers.
+        self.__cum_weights = None
+    # Cached get_cum_reg_weights of the weights.
+    def get_cum_weights(self):
+        if self.__cum_weights is None:
+            self.__cum_weights = get_cum_reg_weights(self.__reg_weights)
+        return self.__cum_weights
     # Consuming a register does not update the float pick state.
     def pick_float_inputreg(self):
-        return random.choices(range(self.num_pickable_floating_regs), self.__reg_weights)[0]
+        return pick_reg_from_cum_weights(self.get_cum_weights(), self.rng)
     # Consuming multiple input registers in one go.
     def pick_float_inputregs(self, n: int):
         if DO_ASSERT:
             assert n > 1, "The function pick_float_inputregs should not be used for n < 2. For n = 1, please use pick_float_inputreg."
-        return random.choices(range(self.num_pickable_floating_regs), self.__reg_weights, k=n)
+        return pick_reg_from_cum_weights(self.get_cum_weights(), self.rng, n)
     # This updates the floatregstate.
     def pick_float_outputreg(self):
-        rd = random.choices(range(self.num_pickable_floating_regs), self.__reg_weights)[0]
+        rd = pick_reg_from_cum_weights(self.get_cum_weights(), self.rng)
         self._update_floatregstate(rd)
         return rd
     # @param outreg the produced register.
     def _update_floatregstate(self, outreg: int):
-        if DO_ASSERT:
-            assert 0 <= outreg
-            assert outreg < self.num_pickable_floating_regs
-            assert math.isclose(sum(self.__reg_weights), 1, abs_tol=0.001), f"{sum(self.__reg_weights)} {str(self.__reg_weights)}"
-        # The lines here below are a heuristic algorithm to favor more recently produced registers
         if self.num_pickable_floating_regs > 1: # If there is a single one, we do not want to zero its weight
-            sum_of_others = np.sum(self.__reg_weights) - self.__reg_weights[outreg]
-            for reg_id in range(self.num_pickable_floating_regs):
-                # We also do it (for performance) for outreg and we overwrite it later
-                self.__reg_weights[reg_id] = self.__reg_weights[reg_id] * (1-REGPICK_PROTUBERANCE_RATIO) / sum_of_others
-            self.__reg_weights[outreg] = REGPICK_PROTUBERANCE_RATIO
+            update_reg_weights(self.__reg_weights, outreg)
+            self.__cum_weights = None
@@ -155,7 +155,7 @@ def _save_ctx_and_jump_to_pillar_specific_instr(fuzzerstate, index_first_bb_to_c
     gen_context_setter(fuzzerstate, saved_context, fuzzerstate.bb_start_addr_seq[index_first_bb_to_consider] + index_first_instr_to_consider * 4) # NO_COMPRESSED
 
     # Jump from the intial state to the context setter
-    fuzzerstate.instr_objs_seq[0][-1] = JALInstruction("jal", 0, fuzzerstate.ctxsv_bb_base_addr - 4*(len(fuzzerstate.instr_objs_seq[0])-1)) # NO_COMPRESSED
+    fuzzerstate.set_instr(0, -1, JALInstruction("jal", 0, fuzzerstate.ctxsv_bb_base_addr - 4*(len(fuzzerstate.instr_objs_seq[0])-1))) # NO_COMPRESSED
 
     return fuzzerstate
 
@@ -205,10 +205,10 @@ def gen_reduced_elf(fuzzerstate, max_bb_id_to_consider: int, max_instr_id_except
     # Pop intermediate instructions if required
     if max_instr_id_except_cf < len(test_fuzzerstate.instr_objs_seq[max_bb_id_to_consider]):
         curr_addr = test_fuzzerstate.bb_start_addr_seq[max_bb_id_to_consider] + (max_instr_id_except_cf+1) * 4 # NO_COMPRESSED
-        test_fuzzerstate.instr_objs_seq[max_bb_id_to_consider][max_instr_id_except_cf+1] = JALInstruction("jal", 0, test_fuzzerstate.final_bb_base_addr-curr_addr)
+        test_fuzzerstate.set_instr(max_bb_id_to_consider, max_instr_id_except_cf+1, JALInstruction("jal", 0, test_fuzzerstate.final_bb_base_addr-curr_addr))
     else:
         curr_addr = test_fuzzerstate.bb_start_addr_seq[max_bb_id_to_consider] + (len(test_fuzzerstate.instr_objs_seq[max_bb_id_to_consider])-1) * 4 # NO_COMPRESSED
-        test_fuzzerstate.instr_objs_seq[max_bb_id_to_consider][-1] = JALInstruction("jal", 0, test_fuzzerstate.final_bb_base_addr-curr_addr)
+        test_fuzzerstate.set_instr(max_bb_id_to_consider, -1, JALInstruction("jal", 0, test_fuzzerstate.final_bb_base_addr-curr_addr))
 
     ###
     # Remove the first basic blocks and instructions
@@ -283,8 +283,13 @@ def _try_flatten_cf(fuzzerstate):
     if DO_ASSERT:
         assert num_flat_instrs == len(new_flat_instrs), f"num_flat_instrs={num_flat_instrs} != len(new_flat_instrs)={len(new_flat_instrs)}"
 
-    flat_fuzzerstate.instr_objs_seq = [flat_fuzzerstate.instr_objs_seq[0], new_flat_instrs]
-    flat_fuzzerstate.bb_start_addr_seq = [flat_fuzzerstate.bb_start_addr_seq[0], addr_flat_instrs]
+    # Replace all the fuzzing basic blocks with the flat one. The reduction returns early if there is no fuzzing basic block.
+    while len(flat_fuzzerstate.instr_objs_seq) > 2:
+        flat_fuzzerstate.pop_last_bb()
+    flat_fuzzerstate.set_bb_instrs(1, new_flat_instrs)
+    flat_fuzzerstate.bb_start_addr_seq[1] = addr_flat_instrs
+    if DO_ASSERT:
+        flat_fuzzerstate.check_instr_counters()
     # flat_fuzzerstate.instr_objs_seq[-1][-1] = JALInstruction("jal", 0, flat_fuzzerstate.bb_start_addr_seq[1] - 4*(len(flat_fuzzerstate.instr_objs_seq[0])-1))
     # print('Base addr guessed', hex(flat_fuzzerstate.ctxsv_bb_base_addr + 4*flat_fuzzerstate.ctxsv_bb_jal_instr_id))
     # print('Tgt addr', hex(flat_fuzzerstate.bb_start_addr_seq[1]))
@@ -526,7 +531,7 @@ def _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id: int, faili
         for instr_id in range(pillar_instr, failing_instr_id+1):
             # Save the instruction before trying to turn it into a nop
             saved_instr = fuzzerstate.instr_objs_seq[failing_bb_id][instr_id]
-            fuzzerstate.instr_objs_seq[failing_bb_id][instr_id] = RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit)
+            fuzzerstate.set_instr(failing_bb_id, instr_id, RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit))
             # For debug printing
             curr_addr = fuzzerstate.bb_start_addr_seq[failing_bb_id] + 4*instr_id # NO_COMPRESSED
             try:
@@ -534,11 +539,11 @@ def _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id: int, faili
                     print(f"(D) Addr {hex(curr_addr)}: Substituted with a nop.")
                 else:
                     # If this nop substitution killed the mismatch, then we must keep this instruction as normal.
-                    fuzzerstate.instr_objs_seq[failing_bb_id][instr_id] = saved_instr
+                    fuzzerstate.set_instr(failing_bb_id, instr_id, saved_instr)
                     print(f"(D) Addr {hex(curr_addr)}: Not substituted instruction with a nop.")
             except:
                 # Possibly, the substitution killed the spike emulation, for example by changing a non-taken branch into a taken branch.
-                fuzzerstate.instr_objs_seq[failing_bb_id][instr_id] = saved_instr
+                fuzzerstate.set_instr(failing_bb_id, instr_id, saved_instr)
                 print(f"(D) Addr {hex(curr_addr)}: Not substituted instruction with a nop (spike simulation died).")
 
 
@@ -546,7 +551,7 @@ def _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id: int, faili
         for instr_id in range(pillar_instr, len(fuzzerstate.instr_objs_seq[pillar_bb_id])-1):
             saved_instr = fuzzerstate.instr_objs_seq[pillar_bb_id][instr_id]
             # If this is already a nop, then pass
-            fuzzerstate.instr_objs_seq[pillar_bb_id][instr_id] = RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit)
+            fuzzerstate.set_instr(pillar_bb_id, instr_id, RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit))
             # For debug printing
             curr_addr = fuzzerstate.bb_start_addr_seq[pillar_bb_id] + 4*instr_id # NO_COMPRESSED
             try:
@@ -554,11 +559,11 @@ def _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id: int, faili
                     print(f"(A) Addr {hex(curr_addr)}: Substituted with a nop.")
                 else:
                     # If this nop substitution killed the mismatch, then we must keep this instruction as normal.
-                    fuzzerstate.instr_objs_seq[pillar_bb_id][instr_id] = saved_instr
+                    fuzzerstate.set_instr(pillar_bb_id, instr_id, saved_instr)
                     print(f"(A) Addr {hex(curr_addr)}: Not substituted instruction with a nop.")
             except:
                 # Possibly, the substitution killed the spike emulation, for example by changing a non-taken branch into a taken branch.
-                fuzzerstate.instr_objs_seq[pillar_bb_id][instr_id] = saved_instr
+                fuzzerstate.set_instr(pillar_bb_id, instr_id, saved_instr)
                 print(f"(A) Addr {hex(curr_addr)}: Not substituted instruction with a nop (spike simulation died).")
                 exit(0)
 
@@ -567,7 +572,7 @@ def _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id: int, faili
             # For each intermediate bb, first start by turning all instructions into nops (except the last one)
             coarse_saved_instrs = [copy(fuzzerstate.instr_objs_seq[bb_id][instr_id]) for instr_id in range(len(fuzzerstate.instr_objs_seq[bb_id])-1)]
             for instr_id in range(len(fuzzerstate.instr_objs_seq[bb_id])-1):
-                fuzzerstate.instr_objs_seq[bb_id][instr_id] = RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit)
+                fuzzerstate.set_instr(bb_id, instr_id, RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit))
 
                 try:
                     if is_mismatch(fuzzerstate, failing_bb_id, failing_instr_id, pillar_bb_id, pillar_instr):
@@ -579,15 +584,15 @@ def _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id: int, faili
 
                 # In case the coarse grain substitution did not work, try fine grain substitution on each instruction
                 # If this nop substitution killed the mismatch, then we must keep this instruction as normal.
-                fuzzerstate.instr_objs_seq[bb_id][instr_id] = saved_instr
+                fuzzerstate.set_instr(bb_id, instr_id, saved_instr)
 
                 for instr_id in range(len(fuzzerstate.instr_objs_seq[bb_id])-1):
-                    fuzzerstate.instr_objs_seq[bb_id][instr_id] = coarse_saved_instrs[instr_id]
+                    fuzzerstate.set_instr(bb_id, instr_id, coarse_saved_instrs[instr_id])
                 del coarse_saved_instrs
 
                 for instr_id in range(len(fuzzerstate.instr_objs_seq[bb_id])-1):
                     saved_instr = copy(fuzzerstate.instr_objs_seq[bb_id][instr_id])
-                    fuzzerstate.instr_objs_seq[bb_id][instr_id] = RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit)
+                    fuzzerstate.set_instr(bb_id, instr_id, RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit))
                     # For debug printing
                     curr_addr = fuzzerstate.bb_start_addr_seq[bb_id] + 4*instr_id # NO_COMPRESSED
                     try:
@@ -595,16 +600,16 @@ def _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id: int, faili
                             print(f"(B) Addr {hex(curr_addr)}: Substituted with a nop.")
                         else:
                             # If this nop substitution killed the mismatch, then we must keep this instruction as normal.
-                            fuzzerstate.instr_objs_seq[bb_id][instr_id] = saved_instr
+                            fuzzerstate.set_instr(bb_id, instr_id, saved_instr)
                             print(f"(B) Addr {hex(curr_addr)}: Not substituted instruction with a nop.")
                     except:
                         # Possibly, the substitution killed the spike emulation, for example by changing a non-taken branch into a taken branch.
-                        fuzzerstate.instr_objs_seq[bb_id][instr_id] = saved_instr
+                        fuzzerstate.set_instr(bb_id, instr_id, saved_instr)
                         print(f"(B) Addr {hex(curr_addr)}: Not substituted instruction with a nop (spike simulation died).")
 
         for instr_id in range(failing_instr_id+1):
             saved_instr = fuzzerstate.instr_objs_seq[failing_bb_id][instr_id]
-            fuzzerstate.instr_objs_seq[failing_bb_id][instr_id] = RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit)
+            fuzzerstate.set_instr(failing_bb_id, instr_id, RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit))
             # For debug printing
             curr_addr = fuzzerstate.bb_start_addr_seq[failing_bb_id] + 4*instr_id # NO_COMPRESSED
             try:
@@ -612,14 +617,15 @@ def _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id: int, faili
                     print(f"(C) Addr {hex(curr_addr)}: Substituted with a nop.")
                 else:
                     # If this nop substitution killed the mismatch, then we must keep this instruction as normal.
-                    fuzzerstate.instr_objs_seq[failing_bb_id][instr_id] = saved_instr
+                    fuzzerstate.set_instr(failing_bb_id, instr_id, saved_instr)
                     print(f"(C) Addr {hex(curr_addr)}: Not substituted instruction with a nop.")
             except:
                 # Possibly, the substitution killed the spike emulation, for example by changing a non-taken branch into a taken branch.
-                fuzzerstate.instr_objs_seq[failing_bb_id][instr_id] = saved_instr
+                fuzzerstate.set_instr(failing_bb_id, instr_id, saved_instr)
                 print(f"(C) Addr {hex(curr_addr)}: Not substituted instruction with a nop (spike simulation died).")
 
-
+    if DO_ASSERT:
+        fuzzerstate.check_instr_counters()
     return fuzzerstate
 
 # This is the main function in this file.
@@ -662,7 +668,7 @@ def reduce_program(memsize: int, design_name: str, randseed: int, nmax_bbs: int,
             continue
         if DO_ASSERT:
             assert 'csr' in fuzzerstate.instr_objs_seq[block_id][instr_id].instr_str, f"Block id {block_id}, instr id {instr_id} was not a csr instruction but was {fuzzerstate.instr_objs_seq[block_id][instr_id].instr_str}"
-        fuzzerstate.instr_objs_seq[block_id][instr_id] = RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit)
+        fuzzerstate.set_instr(block_id, instr_id, RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit))
 
     ###
     # Find the first bb that causes trouble.
@@ -799,10 +805,10 @@ def reduce_program(memsize: int, design_name: str, randseed: int, nmax_bbs: int,
             failing_instr_id = _find_failing_instr_in_bb(fuzzerstate, failing_bb_id)
             pillar_instr = _find_pillar_instr(fuzzerstate, failing_bb_id, failing_instr_id, pillar_bb_id, fault_from_prev_bb)
             # Remove the instructions after and before
-            fuzzerstate.instr_objs_seq[-1] = fuzzerstate.instr_objs_seq[-1][:failing_instr_id+2]
+            fuzzerstate.set_bb_instrs(-1, fuzzerstate.instr_objs_seq[-1][:failing_instr_id+2])
             fuzzerstate.ctxsv_bb[fuzzerstate.ctxsv_bb_jal_instr_id] = JALInstruction("jal", 0, fuzzerstate.bb_start_addr_seq[1] + 4*(pillar_instr) - (fuzzerstate.ctxsv_bb_base_addr + 4*fuzzerstate.ctxsv_bb_jal_instr_id))
             for instr_id in range(pillar_instr):
-                fuzzerstate.instr_objs_seq[1][instr_id] = RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit) # RawDataWord(0)
+                fuzzerstate.set_instr(1, instr_id, RegImmInstruction("addi", 0, 0, 0, is_design_64bit=fuzzerstate.is_design_64bit)) # RawDataWord(0)
 
             # We can do this one more time
             fuzzerstate = _turn_sandwich_instructions_into_nops(fuzzerstate, failing_bb_id, failing_instr_id, pillar_bb_id, pillar_instr, fault_from_prev_bb)
@@ -3,11 +3,14 @@
 # SPDX-License-Identifier: GPL-3.0-only
 
 from params.runparams import DO_ASSERT, NO_REMOVE_TMPFILES
+from params.fuzzparams import is_iss_enabled, is_spike_inmem_enabled
 from common.designcfgs import get_design_march_flags_nocompressed
-from common.spike import run_trace_all_pcs, run_trace_regs_at_pc_locs, SPIKE_STARTADDR, FPREG_ABINAMES
+from common.spike import run_trace_all_pcs, run_trace_regs_at_pc_locs, run_trace_regs_at_pc_locs_batch, SPIKE_STARTADDR, FPREG_ABINAMES
+from common.iss import run_iss_regs_at_pc_locs
+from common.spikeinmem import remove_spike_inmem_elf, count_spike_file_removal
 
 from cascade.cfinstructionclasses import PlaceholderConsumerInstr, BranchInstruction, PlaceholderProducerInstr0, PlaceholderProducerInstr1, JALRInstruction, PlaceholderPreConsumerInstr, IntStoreInstruction, FloatStoreInstruction
-from cascade.genelf import gen_elf_from_bbs
+from cascade.genelf import gen_elf_from_bbs, gen_patchable_memimage_from_bbs
 from cascade.util import IntRegIndivState
 
 import os
@@ -235,17 +238,79 @@ def _check_pc_trace_from_spike(fuzzerstate, spike_pc_seq):
 # 1 (does not contain the zero register)
 def spike_resolution(fuzzerstate, check_pc_spike_again: bool = False):
     design_name = fuzzerstate.design_name
-    _transmit_addrs_to_producers_for_spike_resolution(fuzzerstate)
+    prepare_spike_resolution(fuzzerstate)
     # print('start addrs', list(map(hex, fuzzerstate.bb_start_addr_seq)))
-    spike_resolution_elfpath = gen_elf_from_bbs(fuzzerstate, True, 'spikeresol', fuzzerstate.instance_to_str(), SPIKE_STARTADDR)
-    # print('Spike resolution elfpath:', spike_resolution_elfpath)
     regdump_reqs = gen_regdump_reqs(fuzzerstate)
+    num_fp_regs = fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0
+
+    iss_ret = _run_iss_for_spike_resolution(fuzzerstate, regdump_reqs)
+    if iss_ret is not None:
+        regvals, (finalintregvals_spikeresol, finalfpuregvals_spikeresol) = iss_ret
+    else:
+        # The in-memory ELFs cannot be kept for debugging.
+        use_spike_inmem = is_spike_inmem_enabled() and not NO_REMOVE_TMPFILES
+        spike_resolution_elfpath = gen_elf_from_bbs(fuzzerstate, True, 'spikeresol', fuzzerstate.instance_to_str(), SPIKE_STARTADDR, use_spike_inmem)
+        # print('Spike resolution elfpath:', spike_resolution_elfpath)
+        # len(flat_instr_objs)+1: the +1 is to reach the final basic block and thereby overwrite the potential destination register of a jal/jalr
+        regvals, (finalintregvals_spikeresol, finalfpuregvals_spikeresol) = run_trace_regs_at_pc_locs(fuzzerstate.instance_to_str(), spike_resolution_elfpath, get_design_march_flags_nocompressed(design_name), SPIKE_STARTADDR, regdump_reqs, True, fuzzerstate.final_bb_base_addr+SPIKE_STARTADDR, num_fp_regs, fuzzerstate.design_has_fpud, use_spike_inmem=use_spike_inmem)
+        if use_spike_inmem:
+            remove_spike_inmem_elf(spike_resolution_elfpath)
+        elif not NO_REMOVE_TMPFILES:
+            os.remove(spike_resolution_elfpath)
+            count_spike_file_removal()
+            del spike_resolution_elfpath
+
+    return _complete_spike_resolution(fuzzerstate, regvals, finalintregvals_spikeresol, finalfpuregvals_spikeresol, check_pc_spike_again)
+
+# Resolves several fuzzerstates at once, and returns the list of their outputs of spike_resolution.
+# Each fuzzerstate must have been prepared by prepare_spike_resolution right after its basic blocks were generated.
+# The instances that the reference ISS does not resolve are run by run_trace_regs_at_pc_locs_batch, with at most max_num_procs concurrent Spike processes.
+# If max_num_procs is None, the default of run_trace_regs_at_pc_locs_batch applies, which is a single Spike process in the workers of run_campaign. Pass max_num_procs explicitly to run several Spike processes per worker, for example if there are fewer workers than cores.
+def spike_resolution_batch(fuzzerstates: list, check_pc_spike_again: bool = False, max_num_procs: int = None) -> list:
+    regdump_reqs_list = [gen_regdump_reqs(fuzzerstate) for fuzzerstate in fuzzerstates]
+    outputs = [_run_iss_for_spike_resolution(fuzzerstate, regdump_reqs) for fuzzerstate, regdump_reqs in zip(fuzzerstates, regdump_reqs_list)]
+
+    # The in-memory ELFs cannot be kept for debugging.
+    use_spike_inmem = is_spike_inmem_enabled() and not NO_REMOVE_TMPFILES
+    spike_instance_ids = [instance_id for instance_id, output in enumerate(outputs) if output is None]
+    # The ELFs are removed even if a Spike run or the construction of a later ELF fails.
+    spike_resolution_elfpaths = []
+    try:
+        batch_reqs = []
+        for instance_id in spike_instance_ids:
+            fuzzerstate = fuzzerstates[instance_id]
+            spike_resolution_elfpaths.append(gen_elf_from_bbs(fuzzerstate, True, 'spikeresol', fuzzerstate.instance_to_str(), SPIKE_STARTADDR, use_spike_inmem))
+            batch_reqs.append((fuzzerstate.instance_to_str(), spike_resolution_elfpaths[-1], get_design_march_flags_nocompressed(fuzzerstate.design_name), SPIKE_STARTADDR, regdump_reqs_list[instance_id], True, fuzzerstate.final_bb_base_addr+SPIKE_STARTADDR, fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0, fuzzerstate.design_has_fpud))
+        for instance_id, output in zip(spike_instance_ids, run_trace_regs_at_pc_locs_batch(batch_reqs, max_num_procs)):
+            outputs[instance_id] = output
+    finally:
+        for spike_resolution_elfpath in spike_resolution_elfpaths:
+            if use_spike_inmem:
+                remove_spike_inmem_elf(spike_resolution_elfpath)
+            elif not NO_REMOVE_TMPFILES:
+                os.remove(spike_resolution_elfpath)
+                count_spike_file_removal()
+
+    ret = []
+    for fuzzerstate, (regvals, (finalintregvals_spikeresol, finalfpuregvals_spikeresol)) in zip(fuzzerstates, outputs):
+        ret.append(_complete_spike_resolution(fuzzerstate, regvals, finalintregvals_spikeresol, finalfpuregvals_spikeresol, check_pc_spike_again))
+    return ret
+
+# Draws the target addresses of the unused producers, hence must be called right after the basic blocks are generated for spike_resolution_batch to be equivalent to spike_resolution.
+def prepare_spike_resolution(fuzzerstate):
+    _transmit_addrs_to_producers_for_spike_resolution(fuzzerstate)
+
+# The reference ISS executes the memory image in process. It returns None for the programs it does not support, which are then resolved by Spike.
+# @return the output of run_trace_regs_at_pc_locs, or None if the ISS is disabled or does not support the program.
+def _run_iss_for_spike_resolution(fuzzerstate, regdump_reqs):
+    if not is_iss_enabled():
+        return None
+    return run_iss_regs_at_pc_locs(gen_patchable_memimage_from_bbs(fuzzerstate), get_design_march_flags_nocompressed(fuzzerstate.design_name), SPIKE_STARTADDR, regdump_reqs, True, fuzzerstate.final_bb_base_addr+SPIKE_STARTADDR, fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0, fuzzerstate.design_has_fpud)
+
+# Feeds the register dumps to the instructions, optionally double-checks the RTL ELF with Spike, and returns the output of spike_resolution.
+def _complete_spike_resolution(fuzzerstate, regvals: list, finalintregvals_spikeresol: list, finalfpuregvals_spikeresol: list, check_pc_spike_again: bool):
+    design_name = fuzzerstate.design_name
     flat_instr_objs = list(itertools.chain.from_iterable(fuzzerstate.instr_objs_seq))
-    # len(flat_instr_objs)+1: the +1 is to reach the final basic block and thereby overwrite the potential destination register of a jal/jalr
-    regvals, (finalintregvals_spikeresol, finalfpuregvals_spikeresol) = run_trace_regs_at_pc_locs(fuzzerstate.instance_to_str(), spike_resolution_elfpath, get_design_march_flags_nocompressed(design_name), SPIKE_STARTADDR, regdump_reqs, True, fuzzerstate.final_bb_base_addr+SPIKE_STARTADDR, fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0, fuzzerstate.design_has_fpud)
-    if not NO_REMOVE_TMPFILES:
-        os.remove(spike_resolution_elfpath)
-        del spike_resolution_elfpath
 
     # IMPORTANT: We reset the randomness here to have deterministic branch instructions.
     # (Rare) example where it matters: assume we need to pop the last bb, say with id 20. Then we could have a bug with request size 19 but not with request size 20, or vice versa.
@@ -261,6 +326,7 @@ def spike_resolution(fuzzerstate, check_pc_spike_again: bool = False):
         rtl_spike_pc_seq, (finalintregvals_spikecheck, finalfpuregvals_spikecheck) = run_trace_all_pcs(fuzzerstate.instance_to_str(), rtl_spike_elfpath, get_design_march_flags_nocompressed(design_name), len(flat_instr_objs)+1, SPIKE_STARTADDR, True,  fuzzerstate.num_pickable_floating_regs if fuzzerstate.design_has_fpu else 0, fuzzerstate.design_has_fpud, fuzzerstate)
         if not NO_REMOVE_TMPFILES:
             os.remove(rtl_spike_elfpath)
+            count_spike_file_removal()
             del rtl_spike_elfpath
 
         # Check PC sequence
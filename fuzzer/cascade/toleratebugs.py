@@ -6,6 +6,11 @@
 # This allows, for example, to measure time to bug detection.
 # Some bugs must be reintroduced in hw and cannot simply be reintroduced as a non-workaround in the fuzzer.
 
+# Incremented each time the tolerances change, to invalidate the design profiles that were built with the previous ones (see cascade/designprofile.py).
+__TOLERANCES_VERSION = 0
+def get_tolerances_version():
+    return __TOLERANCES_VERSION
+
 __NO_INTERACTION_MINSTRET = False
 def is_no_interaction_minstret(design_name):
     return __NO_INTERACTION_MINSTRET or 'cva6' in design_name
@@ -216,6 +221,7 @@ if __TOLERATE_VEXRISCV_MHPMCOUNTERN:
 
 # Toleration function for timing the reduction
 def tolerate_bug_for_eval_reduction(design_name: str , is_activate: bool = True):
+    global __TOLERANCES_VERSION
     global __TOLERATE_BOOM_MINSTRET
     global __TOLERATE_ROCKET_MINSTRET
     global __TOLERATE_CVA6_MHPMCOUNTER
@@ -244,12 +250,14 @@ def tolerate_bug_for_eval_reduction(design_name: str , is_activate: bool = True)
         print(f"WARNING: Tolerating one bug for evaluating reduction (activate: {is_activate}): __TOLERATE_VEXRISCV_MINSTRET")
     else:
         raise Exception('Unknown design name in __tolerate_bug_for_eval_reduction: ' + design_name)
+    __TOLERANCES_VERSION += 1
 
 
 # Toleration function for timing the reduction
 # Design name is simply used for sanity checking
 # @param is_activate: if false, then de-tolerate the bug
 def tolerate_bug_for_bug_timing(design_name: str, bug_name: str, is_activate: bool):
+    global __TOLERANCES_VERSION
     global __TOLERATE_PICORV32_READNONIMPLCSR
     global __TOLERATE_PICORV32_MISSINGMANDATORYCSRS
     global __TOLERATE_PICORV32_WRITEHPM
@@ -563,3 +571,4 @@ def tolerate_bug_for_bug_timing(design_name: str, bug_name: str, is_activate: bo
 
     else:
         raise NotImplementedError(f'Unknown bug `{bug_name}`')
+    __TOLERANCES_VERSION += 1
@@ -3,14 +3,65 @@
 # SPDX-License-Identifier: GPL-3.0-only
 
 # This module is dedicated to transforming bytes to ELF files.
-# The script is not super robust, but sufficient for Cascade.
-# It may be a performance bottleneck of Cascade, so it will be worth optimizing it at some point.
+# gen_elf writes the final loadable ELF32 or ELF64 image directly, in a single write.
+# gen_elf_objcopy is the former implementation, based on makeelf and objcopy. It is kept as a reference for equivalence checks.
 
 from params.runparams import DO_ASSERT
-from makeelf.elf import *
 import os
+import struct
 import subprocess
 
+###
+# Native ELF writer
+###
+
+ELF_EM_RISCV = 243
+ELF_ET_EXEC = 2
+ELF_PT_LOAD = 1
+ELF_PF_RWX = 0x7
+ELF_SHT_PROGBITS = 1
+ELF_SHT_STRTAB = 3
+ELF_SHF_ALLOC_EXECINSTR = 0x6 # Loadable and executable
+
+ELF_SECTION_NAME = b'.text.init'
+ELF_SHSTRTAB = b'\0' + ELF_SECTION_NAME + b'\0.shstrtab\0'
+ELF_SHSTRTAB_NAME_OFFSET = 1 + len(ELF_SECTION_NAME) + 1
+
+# For each ELF class: (header struct, program header struct, section header struct)
+ELF_STRUCTS = {
+    False: (struct.Struct('<16sHHIIIIIHHHHHH'), struct.Struct('<IIIIIIII'), struct.Struct('<IIIIIIIIII')),
+    True:  (struct.Struct('<16sHHIQQQIHHHHHH'), struct.Struct('<IIQQQQQQ'), struct.Struct('<IIQQQQIIQQ')),
+}
+
+# @brief Builds the bytes of a single-segment RISC-V ELF.
+# @param section_addr the address of the section and of the segment. If None, start_addr is used.
+# @return the ELF bytes.
+def gen_elf_bytes(inbytes: bytes, start_addr: int, section_addr: int, is_64bit: bool) -> bytes:
+    if section_addr is None:
+        section_addr = start_addr
+    ehdr_struct, phdr_struct, shdr_struct = ELF_STRUCTS[is_64bit]
+    alignment = 8 if is_64bit else 4
+
+    # Layout: ELF header, program header, section content, shstrtab, section headers
+    phdr_offset = ehdr_struct.size
+    data_offset = phdr_offset + phdr_struct.size
+    shstrtab_offset = data_offset + len(inbytes)
+    shdr_offset = (shstrtab_offset + len(ELF_SHSTRTAB) + alignment - 1) & ~(alignment - 1)
+
+    e_ident = b'\x7fELF' + bytes((2 if is_64bit else 1, 1, 1, 0))
+    ret = bytearray(shdr_offset + 3 * shdr_struct.size)
+    ehdr_struct.pack_into(ret, 0, e_ident, ELF_ET_EXEC, ELF_EM_RISCV, 1, start_addr, phdr_offset, shdr_offset, 0, ehdr_struct.size, phdr_struct.size, 1, shdr_struct.size, 3, 2)
+    if is_64bit:
+        phdr_struct.pack_into(ret, phdr_offset, ELF_PT_LOAD, ELF_PF_RWX, data_offset, section_addr, section_addr, len(inbytes), len(inbytes), 4)
+    else:
+        phdr_struct.pack_into(ret, phdr_offset, ELF_PT_LOAD, data_offset, section_addr, section_addr, len(inbytes), len(inbytes), ELF_PF_RWX, 4)
+    ret[data_offset:shstrtab_offset] = inbytes
+    ret[shstrtab_offset:shstrtab_offset+len(ELF_SHSTRTAB)] = ELF_SHSTRTAB
+    # Section headers: null, .text.init, .shstrtab
+    shdr_struct.pack_into(ret, shdr_offset + shdr_struct.size, 1, ELF_SHT_PROGBITS, ELF_SHF_ALLOC_EXECINSTR, section_addr, data_offset, len(inbytes), 0, 0, 4, 0)
+    shdr_struct.pack_into(ret, shdr_offset + 2 * shdr_struct.size, ELF_SHSTRTAB_NAME_OFFSET, ELF_SHT_STRTAB, 0, 0, shstrtab_offset, len(ELF_SHSTRTAB), 0, 0, 1, 0)
+    return bytes(ret)
+
 # @param inbytes the bytes to put into the ELF file. Be careful that they must be in little endian format already.
 # @param section_addr may be None
 # @return None
@@ -18,6 +69,22 @@ def gen_elf(inbytes: bytes, start_addr: int, section_addr: int, destination_path
     if DO_ASSERT:
         assert destination_path
 
+    with open(destination_path, 'wb') as f:
+        f.write(gen_elf_bytes(inbytes, start_addr, section_addr, is_64bit))
+
+###
+# Reference implementation
+###
+
+# Former implementation, relying on makeelf and on objcopy.
+# @param inbytes the bytes to put into the ELF file. Be careful that they must be in little endian format already.
+# @param section_addr may be None
+# @return None
+def gen_elf_objcopy(inbytes: bytes, start_addr: int, section_addr: int, destination_path: str, is_64bit: bool) -> None:
+    from makeelf.elf import ELF, EM, ELFDATA
+    if DO_ASSERT:
+        assert destination_path
+
     elf = ELF(e_machine=EM.EM_RISCV, e_data=ELFDATA.ELFDATA2LSB, e_entry=start_addr)
 
     # Create the section
@@ -43,3 +110,42 @@ def gen_elf(inbytes: bytes, start_addr: int, section_addr: int, destination_path
     else:
         if is_64bit:
             subprocess.run([f"riscv{os.environ['CASCADE_RISCV_BITWIDTH']}-unknown-elf-objcopy", '-I', 'elf32-littleriscv', '-O', 'elf64-littleriscv', destination_path])
+
+###
+# ELF reader, for equivalence checks
+###
+
+# @brief Extracts what a loader sees from an ELF file.
+# @return a dict with the ELF class, machine, entry point, the list of loadable segments (vaddr, paddr, memsz, content) and the address and content of the .text.init section.
+def get_elf_loadable_image(elf_bytes: bytes) -> dict:
+    if DO_ASSERT:
+        assert elf_bytes[:4] == b'\x7fELF', "Not an ELF file."
+    is_64bit = elf_bytes[4] == 2
+    ehdr_struct, phdr_struct, shdr_struct = ELF_STRUCTS[is_64bit]
+    _, _, e_machine, _, e_entry, e_phoff, e_shoff, _, _, e_phentsize, e_phnum, e_shentsize, e_shnum, e_shstrndx = ehdr_struct.unpack_from(elf_bytes, 0)
+
+    segments = []
+    for phdr_id in range(e_phnum):
+        if is_64bit:
+            p_type, _, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, _ = phdr_struct.unpack_from(elf_bytes, e_phoff + phdr_id * e_phentsize)
+        else:
+            p_type, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, _, _ = phdr_struct.unpack_from(elf_bytes, e_phoff + phdr_id * e_phentsize)
+        if p_type == ELF_PT_LOAD:
+            segments.append((p_vaddr, p_paddr, p_memsz, elf_bytes[p_offset:p_offset+p_filesz]))
+
+    shdrs = [shdr_struct.unpack_from(elf_bytes, e_shoff + shdr_id * e_shentsize) for shdr_id in range(e_shnum)]
+    shstrtab_offset = shdrs[e_shstrndx][4]
+    section_addr, section_content = None, None
+    for sh_name, _, _, sh_addr, sh_offset, sh_size, _, _, _, _ in shdrs:
+        name_end = elf_bytes.index(b'\0', shstrtab_offset + sh_name)
+        if elf_bytes[shstrtab_offset + sh_name:name_end] == ELF_SECTION_NAME:
+            section_addr, section_content = sh_addr, elf_bytes[sh_offset:sh_offset+sh_size]
+
+    return {
+        'is_64bit': is_64bit,
+        'machine': e_machine,
+        'entry': e_entry,
+        'segments': segments,
+        'section_addr': section_addr,
+        'section_content': section_content,
+    }
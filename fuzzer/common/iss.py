@@ -0,0 +1,986 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module implements an in-process reference instruction set simulator (ISS) that can answer the register dump requests of the Spike resolution without writing an ELF nor spawning Spike.
+# It mimics Spike on the subset of the architecture that the generated programs rely on: RV32/RV64 I, M, F and D, Zicsr and Zifencei, the M, S and U privilege modes, synchronous exceptions and the CSRs touched by the generator.
+# Whenever the execution leaves this subset, for example for an access outside the memory image, an unmodeled CSR or an AMO, the ISS gives up by raising IssUnsupportedError, and the caller falls back to Spike.
+# Hence the ISS must never produce a value that differs from Spike's, but it may give up.
+
+from common.issfpu import FLOAT32, FLOAT64, fadd, fmul, fdiv, fsqrt, fmuladd, feq, flt_fle, fmin_fmax, fclass, fsgnj, f_to_int, int_to_f, f_to_f
+from common.spike import SPIKE_MEDELEG_MASK, FPREG_ABINAMES
+from rv.csrids import CSR_IDS
+
+import struct
+
+# Upper bound on the number of executed instructions of a single ISS run. Programs that run longer, typically because of an unexpected infinite loop, are left to Spike, which is subject to its own timeout.
+ISS_MAX_NUM_STEPS = 1 << 20
+
+# Spike starts with a 5-instruction boot ROM, which leaves some values in the registers and in the counters.
+SPIKE_BOOTROM_NUM_INSTRS = 5
+SPIKE_BOOTROM_A1 = 0x1020
+
+PRV_U = 0
+PRV_S = 1
+PRV_M = 3
+PRIV_CHARS = {PRV_U: 'U', PRV_S: 'S', PRV_M: 'M'}
+
+CAUSE_MISALIGNED_FETCH = 0
+CAUSE_ILLEGAL_INSTRUCTION = 2
+CAUSE_BREAKPOINT = 3
+CAUSE_MISALIGNED_LOAD = 4
+CAUSE_MISALIGNED_STORE = 6
+CAUSE_USER_ECALL = 8 # Plus the privilege level of the ecall
+
+MSTATUS_SIE  = 1 << 1
+MSTATUS_MIE  = 1 << 3
+MSTATUS_SPIE = 1 << 5
+MSTATUS_MPIE = 1 << 7
+MSTATUS_SPP  = 1 << 8
+MSTATUS_MPP_SHIFT = 11
+MSTATUS_MPP  = 3 << MSTATUS_MPP_SHIFT
+MSTATUS_FS   = 3 << 13
+MSTATUS_MPRV = 1 << 17
+MSTATUS_TW   = 1 << 21
+MSTATUS_TSR  = 1 << 22
+MSTATUS_UXL_SXL_RV64 = 0xa << 32
+# Fields whose value is certain in Spike.
+MSTATUS_WRITE_MASK = MSTATUS_SIE | MSTATUS_MIE | MSTATUS_SPIE | MSTATUS_MPIE | MSTATUS_SPP | MSTATUS_MPP | MSTATUS_MPRV | MSTATUS_TW | MSTATUS_TSR
+# Fields whose writability depends on the Spike version or configuration, such as the endianness, paging or vector control bits. They are not written, and a read of mstatus is unsupported once they have been requested.
+MSTATUS_UNCERTAIN_MASK = (1 << 6) | (3 << 9) | (3 << 15) | (1 << 18) | (1 << 19) | (1 << 20) | (3 << 36)
+
+# Value of the first pmpcfg byte and of pmpaddr0 that give the S and U modes access to the whole memory, as written by the initial block.
+PMPCFG_ALL_RWX_NAPOT = 0x1f
+
+MASK_32 = (1 << 32) - 1
+MASK_64 = (1 << 64) - 1
+FREG_BOX_32 = ((1 << 128) - 1) ^ MASK_32
+FREG_BOX_64 = ((1 << 128) - 1) ^ MASK_64
+
+_unpack_u32 = struct.Struct('<I').unpack_from
+
+# Per-process counters of the ISS runs that resolved the requests or that fell back to Spike, and of the fallback reasons.
+__iss_stats = {'num_resolved': 0, 'num_fallbacks': 0, 'num_instrs': 0}
+__iss_fallback_reasons = {}
+
+class IssUnsupportedError(Exception):
+    pass
+
+# Raised by the instruction handlers and caught by the execution loop, which then takes the trap.
+class _IssTrap(Exception):
+    def __init__(self, cause: int, tval: int):
+        self.cause = cause
+        self.tval = tval
+
+def _sext(val: int, num_bits: int) -> int:
+    sign_bit = 1 << (num_bits - 1)
+    return (val & (sign_bit - 1)) - (val & sign_bit)
+
+# @return a function of two width-bit unsigned operands that returns the result, not masked.
+def _gen_int_op_fn(op_name: str, width: int):
+    sign_bit = 1 << (width - 1)
+    shamt_mask = width - 1
+    mask = (1 << width) - 1
+    def s(v):
+        return (v & (sign_bit - 1)) - (v & sign_bit)
+    def div_trunc(a, b):
+        q = abs(a) // abs(b)
+        return -q if (a < 0) != (b < 0) else q
+    if op_name == 'add':
+        return lambda a, b: a + b
+    if op_name == 'sub':
+        return lambda a, b: a - b
+    if op_name == 'sll':
+        return lambda a, b: a << (b & shamt_mask)
+    if op_name == 'slt':
+        return lambda a, b: int(s(a) < s(b))
+    if op_name == 'sltu':
+        return lambda a, b: int(a < b)
+    if op_name == 'xor':
+        return lambda a, b: a ^ b
+    if op_name == 'srl':
+        return lambda a, b: a >> (b & shamt_mask)
+    if op_name == 'sra':
+        return lambda a, b: s(a) >> (b & shamt_mask)
+    if op_name == 'or':
+        return lambda a, b: a | b
+    if op_name == 'and':
+        return lambda a, b: a & b
+    if op_name == 'mul':
+        return lambda a, b: a * b
+    if op_name == 'mulh':
+        return lambda a, b: (s(a) * s(b)) >> width
+    if op_name == 'mulhsu':
+        return lambda a, b: (s(a) * b) >> width
+    if op_name == 'mulhu':
+        return lambda a, b: (a * b) >> width
+    if op_name == 'div':
+        return lambda a, b: mask if not b else (a if a == sign_bit and b == mask else div_trunc(s(a), s(b)))
+    if op_name == 'divu':
+        return lambda a, b: a // b if b else mask
+    if op_name == 'rem':
+        return lambda a, b: a if not b else (0 if a == sign_bit and b == mask else s(a) - s(b) * div_trunc(s(a), s(b)))
+    if op_name == 'remu':
+        return lambda a, b: a % b if b else a
+    raise ValueError(f"Unknown integer operation `{op_name}`.")
+
+# (funct7, funct3) -> operation name, for the OP and OP-32 opcodes.
+_OP_NAMES = {
+    (0x00, 0): 'add', (0x20, 0): 'sub', (0x00, 1): 'sll', (0x00, 2): 'slt', (0x00, 3): 'sltu', (0x00, 4): 'xor', (0x00, 5): 'srl', (0x20, 5): 'sra', (0x00, 6): 'or', (0x00, 7): 'and',
+    (0x01, 0): 'mul', (0x01, 1): 'mulh', (0x01, 2): 'mulhsu', (0x01, 3): 'mulhu', (0x01, 4): 'div', (0x01, 5): 'divu', (0x01, 6): 'rem', (0x01, 7): 'remu',
+}
+_OP32_NAMES = {
+    (0x00, 0): 'add', (0x20, 0): 'sub', (0x00, 1): 'sll', (0x00, 5): 'srl', (0x20, 5): 'sra',
+    (0x01, 0): 'mul', (0x01, 4): 'div', (0x01, 5): 'divu', (0x01, 6): 'rem', (0x01, 7): 'remu',
+}
+_OPIMM_NAMES = {0: 'add', 2: 'slt', 3: 'sltu', 4: 'xor', 6: 'or', 7: 'and'}
+# funct3 -> (size in bytes, is_signed, is_rv64_only)
+_LOAD_TYPES = {0: (1, True, False), 1: (2, True, False), 2: (4, True, False), 3: (8, False, True), 4: (1, False, False), 5: (2, False, False), 6: (4, False, True)}
+
+# @param rvflags for example rv64imafd, as given to Spike.
+# @return a pair (xlen, set of single-letter extensions)
+def _parse_rvflags(rvflags: str):
+    rvflags = rvflags.lower()
+    if rvflags.startswith('rv32'):
+        xlen = 32
+    elif rvflags.startswith('rv64'):
+        xlen = 64
+    else:
+        raise ValueError(f"Unexpected ISA string `{rvflags}`.")
+    extensions = set(rvflags[4:].split('_')[0])
+    if 'g' in extensions:
+        extensions |= set('imafd')
+    return xlen, extensions
+
+class ReferenceIss:
+    # @param memimage the bytes of the memory image, mapped at base_addr.
+    # @param rvflags the ISA string, as given to Spike.
+    # @param startpc the address at which the execution starts, after the Spike boot ROM.
+    def __init__(self, memimage: bytes, rvflags: str, base_addr: int, startpc: int, max_num_steps: int = ISS_MAX_NUM_STEPS):
+        self.xlen, self.extensions = _parse_rvflags(rvflags)
+        self.xmask = (1 << self.xlen) - 1
+        self.mem = bytearray(memimage)
+        self.base_addr = base_addr
+        self.max_num_steps = max_num_steps
+
+        self.xregs = [0] * 32
+        # Spike stores the floating registers on 128 bits. Narrower values are NaN-boxed.
+        self.fregs = [0] * 32
+        self.pc = startpc
+        self.priv = PRV_M
+        self.num_steps = 0
+        self.num_traps = 0
+
+        self.mstatus = MSTATUS_UXL_SXL_RV64 if self.xlen == 64 else 0
+        self.is_mstatus_uncertain = False
+        self.medeleg = 0
+        self.mtvec = self.mepc = self.mcause = self.mtval = self.mscratch = 0
+        self.stvec = self.sepc = self.scause = self.stval = self.sscratch = 0
+        self.fflags = self.frm = 0
+        self.is_pmp_all_allowed = False
+        self.pmpcfg0 = self.pmpaddr0 = 0
+        # The counters are stored as offsets to the number of retired instructions.
+        self.minstret_offset = self.mcycle_offset = SPIKE_BOOTROM_NUM_INSTRS
+
+        # Register values left by the boot ROM.
+        self.xregs[5] = startpc
+        self.xregs[11] = SPIKE_BOOTROM_A1
+
+        # Maps instruction words to their handlers. A handler takes the pc and returns the next pc.
+        self.__decode_cache = {}
+
+    ###
+    # Execution
+    ###
+
+    def get_num_retired(self) -> int:
+        return self.num_steps - self.num_traps
+
+    # @brief Executes instructions until the pc is target_pc. Does nothing if the pc is already target_pc.
+    def run_until(self, target_pc: int):
+        pc = self.pc
+        while pc != target_pc:
+            pc = self.__step(pc)
+        self.pc = pc
+
+    # @brief Executes num_steps instructions, including the ones that trap.
+    # @param pc_trace if not None, a list to which the pc of each executed instruction is appended.
+    def run_steps(self, num_steps: int, pc_trace: list = None):
+        pc = self.pc
+        for _ in range(num_steps):
+            if pc_trace is not None:
+                pc_trace.append(pc)
+            pc = self.__step(pc)
+        self.pc = pc
+
+    # @return the pc of the next instruction.
+    def __step(self, pc: int) -> int:
+        if self.num_steps >= self.max_num_steps:
+            raise IssUnsupportedError('step budget exceeded')
+        if self.priv != PRV_M and not self.is_pmp_all_allowed:
+            raise IssUnsupportedError('fetch subject to PMP')
+        offset = pc - self.base_addr
+        if offset < 0 or offset + 4 > len(self.mem):
+            raise IssUnsupportedError('fetch outside the memory image')
+        word = _unpack_u32(self.mem, offset)[0]
+        handler = self.__decode_cache.get(word)
+        if handler is None:
+            handler = self.__decode(word)
+            self.__decode_cache[word] = handler
+        try:
+            next_pc = handler(pc)
+        except _IssTrap as trap:
+            next_pc = self.__take_trap(pc, trap.cause, trap.tval)
+            self.num_traps += 1
+        self.num_steps += 1
+        return next_pc
+
+    # @return the pc of the trap handler.
+    def __take_trap(self, pc: int, cause: int, tval: int) -> int:
+        # Exceptions are never vectored.
+        if self.priv <= PRV_S and (self.medeleg >> cause) & 1:
+            self.scause = cause
+            self.sepc = pc & ~1
+            self.stval = tval
+            mstatus = self.mstatus & ~(MSTATUS_SPIE | MSTATUS_SPP | MSTATUS_SIE)
+            if self.mstatus & MSTATUS_SIE:
+                mstatus |= MSTATUS_SPIE
+            if self.priv == PRV_S:
+                mstatus |= MSTATUS_SPP
+            self.mstatus = mstatus
+            self.priv = PRV_S
+            return self.stvec & ~3
+        self.mcause = cause
+        self.mepc = pc & ~1
+        self.mtval = tval
+        mstatus = self.mstatus & ~(MSTATUS_MPIE | MSTATUS_MPP | MSTATUS_MIE)
+        if self.mstatus & MSTATUS_MIE:
+            mstatus |= MSTATUS_MPIE
+        self.mstatus = mstatus | (self.priv << MSTATUS_MPP_SHIFT)
+        self.priv = PRV_M
+        return self.mtvec & ~3
+
+    ###
+    # Memory
+    ###
+
+    # @return the offset of the access in the memory image.
+    def __check_mem_access(self, addr: int, size: int, misaligned_cause: int) -> int:
+        if addr & (size - 1):
+            raise _IssTrap(misaligned_cause, addr)
+        effective_priv = self.priv
+        if self.priv == PRV_M and self.mstatus & MSTATUS_MPRV:
+            effective_priv = (self.mstatus & MSTATUS_MPP) >> MSTATUS_MPP_SHIFT
+        if effective_priv != PRV_M and not self.is_pmp_all_allowed:
+            raise IssUnsupportedError('memory access subject to PMP')
+        offset = addr - self.base_addr
+        if offset < 0 or offset + size > len(self.mem):
+            raise IssUnsupportedError('memory access outside the memory image')
+        return offset
+
+    def __load(self, addr: int, size: int) -> int:
+        offset = self.__check_mem_access(addr, size, CAUSE_MISALIGNED_LOAD)
+        return int.from_bytes(self.mem[offset:offset+size], 'little')
+
+    def __store(self, addr: int, size: int, val: int):
+        offset = self.__check_mem_access(addr, size, CAUSE_MISALIGNED_STORE)
+        self.mem[offset:offset+size] = (val & ((1 << (8*size)) - 1)).to_bytes(size, 'little')
+
+    ###
+    # Floating-point state
+    ###
+
+    def __require_fp(self, word: int):
+        if not self.mstatus & MSTATUS_FS:
+            raise _IssTrap(CAUSE_ILLEGAL_INSTRUCTION, word)
+
+    def __set_fs_dirty(self):
+        self.mstatus |= MSTATUS_FS | (1 << (self.xlen - 1))
+
+    def __get_rm(self, rm: int, word: int) -> int:
+        if rm == 7:
+            rm = self.frm
+        if rm > 4:
+            raise _IssTrap(CAUSE_ILLEGAL_INSTRUCTION, word)
+        return rm
+
+    def __accrue_fflags(self, flags: int):
+        if flags:
+            self.fflags |= flags
+            self.__set_fs_dirty()
+
+    # @brief Reads a floating register as a value of the given format. Improperly NaN-boxed values read as the canonical NaN.
+    def __read_freg(self, reg_id: int, fmt) -> int:
+        val = self.fregs[reg_id]
+        if fmt is FLOAT32:
+            return val & MASK_32 if val >> 32 == FREG_BOX_32 >> 32 else FLOAT32.canonical_nan
+        return val & MASK_64 if val >> 64 == FREG_BOX_64 >> 64 else FLOAT64.canonical_nan
+
+    def __write_freg(self, reg_id: int, fmt, val: int):
+        self.fregs[reg_id] = val | (FREG_BOX_32 if fmt is FLOAT32 else FREG_BOX_64)
+        self.__set_fs_dirty()
+
+    ###
+    # CSRs
+    ###
+
+    def __csr_read(self, csr_id: int, word: int, is_value_used: bool) -> int:
+        if csr_id in (CSR_IDS.FFLAGS, CSR_IDS.FRM, CSR_IDS.FCSR):
+            if 'f' not in self.extensions:
+                raise _IssTrap(CAUSE_ILLEGAL_INSTRUCTION, word)
+            self.__require_fp(word)
+            if csr_id == CSR_IDS.FFLAGS:
+                return self.fflags
+            if csr_id == CSR_IDS.FRM:
+                return self.frm
+            return (self.frm << 5) | self.fflags
+        if csr_id == CSR_IDS.MSTATUS:
+            if is_value_used and self.is_mstatus_uncertain:
+                raise IssUnsupportedError('read of uncertain mstatus fields')
+            return self.mstatus & self.xmask
+        if csr_id == CSR_IDS.MINSTRET:
+            return (self.get_num_retired() + self.minstret_offset) & self.xmask
+        if csr_id == CSR_IDS.MCYCLE:
+            return (self.get_num_retired() + self.mcycle_offset) & self.xmask
+        if self.xlen == 32 and csr_id in (CSR_IDS.MINSTRETH, CSR_IDS.MCYCLEH):
+            offset = self.minstret_offset if csr_id == CSR_IDS.MINSTRETH else self.mcycle_offset
+            return ((self.get_num_retired() + offset) >> 32) & MASK_32
+        if CSR_IDS.MHPMCOUNTER3 <= csr_id <= CSR_IDS.MHPMCOUNTER31 or CSR_IDS.MHPMEVENT3 <= csr_id <= CSR_IDS.MHPMEVENT31:
+            # Spike does not count any event.
+            return 0
+        if csr_id in (CSR_IDS.PMPCFG0, CSR_IDS.PMPADDR0):
+            if is_value_used:
+                raise IssUnsupportedError(f"read of CSR 0x{csr_id:x}")
+            return 0
+        if csr_id in _SIMPLE_CSR_ATTRS:
+            return getattr(self, _SIMPLE_CSR_ATTRS[csr_id]) & self.xmask
+        raise IssUnsupportedError(f"unmodeled CSR 0x{csr_id:x}")
+
+    def __csr_write(self, csr_id: int, val: int):
+        if csr_id == CSR_IDS.FFLAGS:
+            self.fflags = val & 0x1f
+            self.__set_fs_dirty()
+        elif csr_id == CSR_IDS.FRM:
+            self.frm = val & 0x7
+            self.__set_fs_dirty()
+        elif csr_id == CSR_IDS.FCSR:
+            self.fflags = val & 0x1f
+            self.frm = (val >> 5) & 0x7
+            self.__set_fs_dirty()
+        elif csr_id == CSR_IDS.MSTATUS:
+            write_mask = MSTATUS_WRITE_MASK | (MSTATUS_FS if 'f' in self.extensions else 0)
+            if val & ~write_mask & (MSTATUS_UNCERTAIN_MASK | MSTATUS_FS):
+                self.is_mstatus_uncertain = True
+            # An mpp of 2 is illegal and replaced by U.
+            if (val & MSTATUS_MPP) >> MSTATUS_MPP_SHIFT == 2:
+                val &= ~MSTATUS_MPP
+            mstatus = (self.mstatus & ~write_mask) | (val & write_mask)
+            sd_bit = 1 << (self.xlen - 1)
+            if (mstatus & MSTATUS_FS) == MSTATUS_FS:
+                mstatus |= sd_bit
+            else:
+                mstatus &= ~sd_bit
+            self.mstatus = mstatus
+        elif csr_id == CSR_IDS.MEDELEG:
+            self.medeleg = val & SPIKE_MEDELEG_MASK
+        elif csr_id in (CSR_IDS.MTVEC, CSR_IDS.STVEC):
+            setattr(self, _SIMPLE_CSR_ATTRS[csr_id], val & ~2)
+        elif csr_id in (CSR_IDS.MEPC, CSR_IDS.SEPC):
+            setattr(self, _SIMPLE_CSR_ATTRS[csr_id], val & ~1)
+        elif csr_id in (CSR_IDS.MINSTRET, CSR_IDS.MCYCLE, CSR_IDS.MINSTRETH, CSR_IDS.MCYCLEH):
+            # The write takes precedence over the increment by the current instruction.
+            is_minstret = csr_id in (CSR_IDS.MINSTRET, CSR_IDS.MINSTRETH)
+            curr_val = self.get_num_retired() + (self.minstret_offset if is_minstret else self.mcycle_offset)
+            if csr_id in (CSR_IDS.MINSTRETH, CSR_IDS.MCYCLEH):
+                new_val = (val << 32) | (curr_val & MASK_32)
+            elif self.xlen == 32:
+                new_val = (curr_val & ~MASK_32) | val
+            else:
+                new_val = val
+            new_offset = (new_val & MASK_64) - (self.get_num_retired() + 1)
+            if is_minstret:
+                self.minstret_offset = new_offset
+            else:
+                self.mcycle_offset = new_offset
+        elif CSR_IDS.MHPMCOUNTER3 <= csr_id <= CSR_IDS.MHPMCOUNTER31 or CSR_IDS.MHPMEVENT3 <= csr_id <= CSR_IDS.MHPMEVENT31:
+            pass
+        elif csr_id in (CSR_IDS.PMPCFG0, CSR_IDS.PMPADDR0):
+            if csr_id == CSR_IDS.PMPCFG0:
+                if val not in (0, PMPCFG_ALL_RWX_NAPOT):
+                    raise IssUnsupportedError('unmodeled PMP configuration')
+                self.pmpcfg0 = val
+            else:
+                self.pmpaddr0 = val
+            # A NAPOT region with an all-ones address spans the whole address space.
+            pmpaddr_mask = MASK_32 if self.xlen == 32 else (1 << 54) - 1
+            self.is_pmp_all_allowed = self.pmpcfg0 == PMPCFG_ALL_RWX_NAPOT and self.pmpaddr0 & pmpaddr_mask == pmpaddr_mask
+        else:
+            setattr(self, _SIMPLE_CSR_ATTRS[csr_id], val)
+
+    ###
+    # Decoding
+    ###
+
+    def __nop(self, pc: int) -> int:
+        return pc + 4
+
+    # @return a handler that raises the given trap.
+    def __gen_trap_handler(self, cause: int, tval: int):
+        def h(pc):
+            raise _IssTrap(cause, tval)
+        return h
+
+    # @return a handler that raises an IssUnsupportedError. The error is raised upon execution and not upon decoding, so that unsupported words in data regions do not prevent the resolution.
+    def __gen_unsupported_handler(self, reason: str):
+        def h(pc):
+            raise IssUnsupportedError(reason)
+        return h
+
+    # @return the handler of the instruction word.
+    def __decode(self, word: int):
+        illegal = self.__gen_trap_handler(CAUSE_ILLEGAL_INSTRUCTION, word)
+        if word & 0x3 != 0x3:
+            # Compressed instructions are not supported by the generated programs.
+            return self.__gen_trap_handler(CAUSE_ILLEGAL_INSTRUCTION, word & 0xffff)
+        if word & 0x1c == 0x1c:
+            return self.__gen_unsupported_handler('instruction longer than 32 bits')
+
+        opcode = word & 0x7f
+        rd = (word >> 7) & 0x1f
+        funct3 = (word >> 12) & 0x7
+        rs1 = (word >> 15) & 0x1f
+        rs2 = (word >> 20) & 0x1f
+        funct7 = word >> 25
+        imm_i = _sext(word >> 20, 12)
+        x = self.xregs
+        xlen = self.xlen
+        xmask = self.xmask
+        is_rv64 = xlen == 64
+
+        if opcode == 0x37: # LUI
+            if not rd:
+                return self.__nop
+            val = _sext(word & 0xfffff000, 32) & xmask
+            def h(pc):
+                x[rd] = val
+                return pc + 4
+            return h
+
+        if opcode == 0x17: # AUIPC
+            if not rd:
+                return self.__nop
+            offset = _sext(word & 0xfffff000, 32)
+            def h(pc):
+                x[rd] = (pc + offset) & xmask
+                return pc + 4
+            return h
+
+        if opcode == 0x6f: # JAL
+            offset = _sext(((word >> 31) << 20) | (((word >> 12) & 0xff) << 12) | (((word >> 20) & 1) << 11) | (((word >> 21) & 0x3ff) << 1), 21)
+            def h(pc):
+                target = (pc + offset) & xmask
+                if target & 2:
+                    raise _IssTrap(CAUSE_MISALIGNED_FETCH, target)
+                if rd:
+                    x[rd] = pc + 4
+                return target
+            return h
+
+        if opcode == 0x67: # JALR
+            if funct3:
+                return illegal
+            def h(pc):
+                target = (x[rs1] + imm_i) & xmask & ~1
+                if target & 2:
+                    raise _IssTrap(CAUSE_MISALIGNED_FETCH, target)
+                if rd:
+                    x[rd] = pc + 4
+                return target
+            return h
+
+        if opcode == 0x63: # BRANCH
+            offset = _sext(((word >> 31) << 12) | (((word >> 7) & 1) << 11) | (((word >> 25) & 0x3f) << 5) | (((word >> 8) & 0xf) << 1), 13)
+            sign_bit = 1 << (xlen - 1)
+            if funct3 == 0:
+                cond = lambda a, b: a == b
+            elif funct3 == 1:
+                cond = lambda a, b: a != b
+            elif funct3 == 4:
+                cond = lambda a, b: (a ^ sign_bit) < (b ^ sign_bit)
+            elif funct3 == 5:
+                cond = lambda a, b: (a ^ sign_bit) >= (b ^ sign_bit)
+            elif funct3 == 6:
+                cond = lambda a, b: a < b
+            elif funct3 == 7:
+                cond = lambda a, b: a >= b
+            else:
+                return illegal
+            def h(pc):
+                if cond(x[rs1], x[rs2]):
+                    target = (pc + offset) & xmask
+                    if target & 2:
+                        raise _IssTrap(CAUSE_MISALIGNED_FETCH, target)
+                    return target
+                return pc + 4
+            return h
+
+        if opcode == 0x03: # LOAD
+            if funct3 not in _LOAD_TYPES or (_LOAD_TYPES[funct3][2] and not is_rv64):
+                return illegal
+            size, is_signed, _ = _LOAD_TYPES[funct3]
+            load = self.__load
+            def h(pc):
+                val = load((x[rs1] + imm_i) & xmask, size)
+                if rd:
+                    x[rd] = (_sext(val, 8*size) & xmask) if is_signed else val
+                return pc + 4
+            return h
+
+        if opcode == 0x23: # STORE
+            if funct3 > 3 or (funct3 == 3 and not is_rv64):
+                return illegal
+            size = 1 << funct3
+            imm_s = _sext(((word >> 25) << 5) | ((word >> 7) & 0x1f), 12)
+            store = self.__store
+            def h(pc):
+                store((x[rs1] + imm_s) & xmask, size, x[rs2])
+                return pc + 4
+            return h
+
+        if opcode == 0x13: # OP-IMM
+            if funct3 in (1, 5):
+                shamt = (word >> 20) & 0x3f
+                if funct3 == 1 and word >> 26 == 0:
+                    fn = _gen_int_op_fn('sll', xlen)
+                elif funct3 == 5 and word >> 26 in (0, 0x10):
+                    fn = _gen_int_op_fn('sra' if word >> 26 else 'srl', xlen)
+                else:
+                    return illegal
+                if shamt >= xlen:
+                    return illegal
+                operand = shamt
+            else:
+                fn = _gen_int_op_fn(_OPIMM_NAMES[funct3], xlen)
+                operand = imm_i & xmask
+            if not rd:
+                return self.__nop
+            def h(pc):
+                x[rd] = fn(x[rs1], operand) & xmask
+                return pc + 4
+            return h
+
+        if opcode == 0x1b: # OP-IMM-32
+            if not is_rv64:
+                return illegal
+            if funct3 == 0:
+                fn = _gen_int_op_fn('add', 32)
+                operand = imm_i & MASK_32
+            elif funct3 == 1 and funct7 == 0:
+                fn = _gen_int_op_fn('sll', 32)
+                operand = rs2
+            elif funct3 == 5 and funct7 in (0, 0x20):
+                fn = _gen_int_op_fn('sra' if funct7 else 'srl', 32)
+                operand = rs2
+            else:
+                return illegal
+            if not rd:
+                return self.__nop
+            def h(pc):
+                x[rd] = _sext(fn(x[rs1] & MASK_32, operand) & MASK_32, 32) & xmask
+                return pc + 4
+            return h
+
+        if opcode in (0x33, 0x3b): # OP and OP-32
+            is_op32 = opcode == 0x3b
+            op_name = (_OP32_NAMES if is_op32 else _OP_NAMES).get((funct7, funct3))
+            if op_name is None or (is_op32 and not is_rv64) or (funct7 == 0x01 and 'm' not in self.extensions):
+                return illegal
+            if not rd:
+                return self.__nop
+            if is_op32:
+                fn = _gen_int_op_fn(op_name, 32)
+                def h(pc):
+                    x[rd] = _sext(fn(x[rs1] & MASK_32, x[rs2] & MASK_32) & MASK_32, 32) & xmask
+                    return pc + 4
+            else:
+                fn = _gen_int_op_fn(op_name, xlen)
+                def h(pc):
+                    x[rd] = fn(x[rs1], x[rs2]) & xmask
+                    return pc + 4
+            return h
+
+        if opcode == 0x0f: # MISC-MEM
+            if funct3 in (0, 1): # fence and fence.i
+                return self.__nop
+            return illegal
+
+        if opcode == 0x73: # SYSTEM
+            if funct3 == 0:
+                return self.__decode_system(word)
+            if funct3 == 4:
+                return self.__gen_unsupported_handler('hypervisor instruction')
+            return self.__decode_csr(word, rd, funct3, rs1, word >> 20)
+
+        if opcode == 0x2f: # AMO
+            if 'a' in self.extensions:
+                return self.__gen_unsupported_handler('atomic instruction')
+            return illegal
+
+        if opcode in (0x07, 0x27, 0x43, 0x47, 0x4b, 0x4f, 0x53):
+            return self.__decode_fp(word, opcode, rd, funct3, rs1, rs2, funct7)
+
+        return illegal
+
+    # @brief Decodes the SYSTEM instructions with funct3 == 0.
+    def __decode_system(self, word: int):
+        if word == 0x00000073: # ecall
+            def h(pc):
+                raise _IssTrap(CAUSE_USER_ECALL + self.priv, 0)
+            return h
+        if word == 0x00100073: # ebreak
+            def h(pc):
+                raise _IssTrap(CAUSE_BREAKPOINT, pc)
+            return h
+        if word == 0x30200073: # mret
+            def h(pc):
+                if self.priv != PRV_M:
+                    raise _IssTrap(CAUSE_ILLEGAL_INSTRUCTION, word)
+                mstatus = self.mstatus
+                prev_priv = (mstatus & MSTATUS_MPP) >> MSTATUS_MPP_SHIFT
+                mstatus &= ~(MSTATUS_MIE | MSTATUS_MPP)
+                if mstatus & MSTATUS_MPIE:
+                    mstatus |= MSTATUS_MIE
+                mstatus |= MSTATUS_MPIE
+                if prev_priv != PRV_M:
+                    mstatus &= ~MSTATUS_MPRV
+                self.mstatus = mstatus
+                self.priv = prev_priv
+                return self.mepc & ~2
+            return h
+        if word == 0x10200073: # sret
+            def h(pc):
+                if self.priv == PRV_U or (self.priv == PRV_S and self.mstatus & MSTATUS_TSR):
+                    raise _IssTrap(CAUSE_ILLEGAL_INSTRUCTION, word)
+                mstatus = self.mstatus
+                prev_priv = PRV_S if mstatus & MSTATUS_SPP else PRV_U
+                mstatus &= ~(MSTATUS_SIE | MSTATUS_SPP | MSTATUS_MPRV)
+                if mstatus & MSTATUS_SPIE:
+                    mstatus |= MSTATUS_SIE
+                mstatus |= MSTATUS_SPIE
+                self.mstatus = mstatus
+                self.priv = prev_priv
+                return self.sepc & ~2
+            return h
+        return self.__gen_unsupported_handler('unmodeled system instruction')
+
+    def __decode_csr(self, word: int, rd: int, funct3: int, rs1: int, csr_id: int):
+        x = self.xregs
+        xmask = self.xmask
+        is_imm = bool(funct3 & 4)
+        op = funct3 & 3
+        if op == 0:
+            return self.__gen_trap_handler(CAUSE_ILLEGAL_INSTRUCTION, word)
+        # csrrw always writes, csrrs and csrrc only write if their source is not x0 or a zero immediate.
+        is_write = op == 1 or rs1 != 0
+        csr_priv = (csr_id >> 8) & 3
+        is_read_only = csr_id >> 10 == 3
+        if is_write and is_read_only:
+            return self.__gen_trap_handler(CAUSE_ILLEGAL_INSTRUCTION, word)
+        csr_read = self.__csr_read
+        csr_write = self.__csr_write
+        def h(pc):
+            if self.priv < csr_priv:
+                raise _IssTrap(CAUSE_ILLEGAL_INSTRUCTION, word)
+            old_val = csr_read(csr_id, word, rd != 0)
+            if is_write:
+                src = rs1 if is_imm else x[rs1]
+                if op == 1:
+                    new_val = src
+                elif op == 2:
+                    new_val = old_val | src
+                else:
+                    new_val = old_val & ~src
+                csr_write(csr_id, new_val & xmask)
+            if rd:
+                x[rd] = old_val
+            return pc + 4
+        return h
+
+    def __decode_fp(self, word: int, opcode: int, rd: int, funct3: int, rs1: int, rs2: int, funct7: int):
+        illegal = self.__gen_trap_handler(CAUSE_ILLEGAL_INSTRUCTION, word)
+        x = self.xregs
+        xmask = self.xmask
+        is_rv64 = self.xlen == 64
+        f = self.fregs
+        require_fp = self.__require_fp
+        get_rm = self.__get_rm
+        read_freg = self.__read_freg
+        write_freg = self.__write_freg
+        accrue_fflags = self.__accrue_fflags
+
+        # Loads and stores
+        if opcode in (0x07, 0x27):
+            if funct3 not in (2, 3) or (funct3 == 3 and 'd' not in self.extensions) or 'f' not in self.extensions:
+                return illegal
+            fmt = FLOAT32 if funct3 == 2 else FLOAT64
+            size = fmt.num_bits // 8
+            if opcode == 0x07:
+                load = self.__load
+                def h(pc):
+                    require_fp(word)
+                    write_freg(rd, fmt, load((x[rs1] + _sext(word >> 20, 12)) & xmask, size))
+                    return pc + 4
+            else:
+                store = self.__store
+                imm_s = _sext(((word >> 25) << 5) | ((word >> 7) & 0x1f), 12)
+                def h(pc):
+                    require_fp(word)
+                    store((x[rs1] + imm_s) & xmask, size, f[rs2])
+                    return pc + 4
+            return h
+
+        fmt_id = funct7 & 3
+        if fmt_id > 1 or (fmt_id == 1 and 'd' not in self.extensions) or 'f' not in self.extensions:
+            return illegal
+        fmt = FLOAT64 if fmt_id else FLOAT32
+
+        # Fused multiply-add
+        if opcode != 0x53:
+            rs3 = word >> 27
+            negate_product = opcode in (0x4b, 0x4f)
+            negate_addend = opcode in (0x47, 0x4f)
+            def h(pc):
+                require_fp(word)
+                rm = get_rm(funct3, word)
+                res, flags = fmuladd(read_freg(rs1, fmt), read_freg(rs2, fmt), read_freg(rs3, fmt), fmt, rm, negate_product, negate_addend)
+                accrue_fflags(flags)
+                write_freg(rd, fmt, res)
+                return pc + 4
+            return h
+
+        op5 = funct7 >> 2
+        # Arithmetic operations with two operands and a rounding mode.
+        if op5 in (0x00, 0x01, 0x02, 0x03):
+            if op5 == 0x00:
+                fn = lambda a, b, rm: fadd(a, b, fmt, rm)
+            elif op5 == 0x01:
+                fn = lambda a, b, rm: fadd(a, b, fmt, rm, True)
+            elif op5 == 0x02:
+                fn = lambda a, b, rm: fmul(a, b, fmt, rm)
+            else:
+                fn = lambda a, b, rm: fdiv(a, b, fmt, rm)
+            def h(pc):
+                require_fp(word)
+                rm = get_rm(funct3, word)
+                res, flags = fn(read_freg(rs1, fmt), read_freg(rs2, fmt), rm)
+                accrue_fflags(flags)
+                write_freg(rd, fmt, res)
+                return pc + 4
+            return h
+
+        if op5 == 0x0b: # fsqrt
+            if rs2:
+                return illegal
+            def h(pc):
+                require_fp(word)
+                rm = get_rm(funct3, word)
+                res, flags = fsqrt(read_freg(rs1, fmt), fmt, rm)
+                accrue_fflags(flags)
+                write_freg(rd, fmt, res)
+                return pc + 4
+            return h
+
+        if op5 == 0x04: # fsgnj, fsgnjn, fsgnjx
+            if funct3 > 2:
+                return illegal
+            def h(pc):
+                require_fp(word)
+                write_freg(rd, fmt, fsgnj(read_freg(rs1, fmt), read_freg(rs2, fmt), fmt, funct3))
+                return pc + 4
+            return h
+
+        if op5 == 0x05: # fmin, fmax
+            if funct3 > 1:
+                return illegal
+            def h(pc):
+                require_fp(word)
+                res, flags = fmin_fmax(read_freg(rs1, fmt), read_freg(rs2, fmt), fmt, bool(funct3))
+                accrue_fflags(flags)
+                write_freg(rd, fmt, res)
+                return pc + 4
+            return h
+
+        if op5 == 0x08: # fcvt.s.d and fcvt.d.s
+            if rs2 != 1 - fmt_id or 'd' not in self.extensions:
+                return illegal
+            src_fmt = FLOAT32 if fmt_id else FLOAT64
+            def h(pc):
+                require_fp(word)
+                rm = get_rm(funct3, word)
+                res, flags = f_to_f(read_freg(rs1, src_fmt), src_fmt, fmt, rm)
+                accrue_fflags(flags)
+                write_freg(rd, fmt, res)
+                return pc + 4
+            return h
+
+        if op5 == 0x14: # feq, flt, fle
+            if funct3 == 2:
+                fn = lambda a, b: feq(a, b, fmt)
+            elif funct3 in (0, 1):
+                fn = lambda a, b: flt_fle(a, b, fmt, funct3 == 0)
+            else:
+                return illegal
+            def h(pc):
+                require_fp(word)
+                res, flags = fn(read_freg(rs1, fmt), read_freg(rs2, fmt))
+                accrue_fflags(flags)
+                if rd:
+                    x[rd] = res
+                return pc + 4
+            return h
+
+        if op5 == 0x18: # fcvt.w, fcvt.wu, fcvt.l, fcvt.lu
+            if rs2 > 3 or (rs2 > 1 and not is_rv64):
+                return illegal
+            num_bits = 64 if rs2 & 2 else 32
+            is_signed = not rs2 & 1
+            def h(pc):
+                require_fp(word)
+                rm = get_rm(funct3, word)
+                res, flags = f_to_int(read_freg(rs1, fmt), fmt, rm, num_bits, is_signed)
+                accrue_fflags(flags)
+                if rd:
+                    x[rd] = _sext(res, num_bits) & xmask
+                return pc + 4
+            return h
+
+        if op5 == 0x1a: # fcvt from integer
+            if rs2 > 3 or (rs2 > 1 and not is_rv64):
+                return illegal
+            num_bits = 64 if rs2 & 2 else 32
+            is_signed = not rs2 & 1
+            int_mask = (1 << num_bits) - 1
+            def h(pc):
+                require_fp(word)
+                rm = get_rm(funct3, word)
+                val = x[rs1] & int_mask
+                res, flags = int_to_f(_sext(val, num_bits) if is_signed else val, fmt, rm)
+                accrue_fflags(flags)
+                write_freg(rd, fmt, res)
+                return pc + 4
+            return h
+
+        if op5 == 0x1c: # fmv.x.w, fmv.x.d and fclass
+            if rs2 or funct3 > 1 or (funct3 == 0 and fmt is FLOAT64 and not is_rv64):
+                return illegal
+            if funct3 == 0:
+                # The raw register bits, regardless of NaN-boxing.
+                def h(pc):
+                    require_fp(word)
+                    if rd:
+                        x[rd] = _sext(f[rs1] & ((1 << fmt.num_bits) - 1), fmt.num_bits) & xmask
+                    return pc + 4
+            else:
+                def h(pc):
+                    require_fp(word)
+                    if rd:
+                        x[rd] = fclass(read_freg(rs1, fmt), fmt)
+                    return pc + 4
+            return h
+
+        if op5 == 0x1e: # fmv.w.x and fmv.d.x
+            if rs2 or funct3 or (fmt is FLOAT64 and not is_rv64):
+                return illegal
+            def h(pc):
+                require_fp(word)
+                write_freg(rd, fmt, x[rs1] & ((1 << fmt.num_bits) - 1))
+                return pc + 4
+            return h
+
+        return illegal
+
+    ###
+    # Register dumps, in the format of the Spike debug commands
+    ###
+
+    # @param reg an integer register id, 'priv', or a floating register id or ABI name if is_float.
+    def dump_reg(self, is_float: bool, reg):
+        if reg == 'priv':
+            return PRIV_CHARS[self.priv]
+        if is_float:
+            if isinstance(reg, str):
+                reg = FPREG_ABINAMES.index(reg)
+            return self.fregs[reg]
+        if not isinstance(reg, int):
+            raise IssUnsupportedError(f"dump of register `{reg}`")
+        return self.xregs[reg]
+
+    # @return a pair (list of the 32 integer register values, list of the floating register values, truncated to 64 or 32 bits).
+    def dump_final_regs(self, num_fp_regs: int, has_fpdouble_support: bool):
+        fpreg_mask = MASK_64 if has_fpdouble_support else MASK_32
+        return list(self.xregs), [self.fregs[fp_reg_id] & fpreg_mask for fp_reg_id in range(num_fp_regs)]
+
+# Maps the CSRs that simply hold their last written value to their attribute.
+_SIMPLE_CSR_ATTRS = {
+    CSR_IDS.MTVEC: 'mtvec', CSR_IDS.MEPC: 'mepc', CSR_IDS.MCAUSE: 'mcause', CSR_IDS.MTVAL: 'mtval', CSR_IDS.MSCRATCH: 'mscratch', CSR_IDS.MEDELEG: 'medeleg',
+    CSR_IDS.STVEC: 'stvec', CSR_IDS.SEPC: 'sepc', CSR_IDS.SCAUSE: 'scause', CSR_IDS.STVAL: 'stval', CSR_IDS.SSCRATCH: 'sscratch',
+}
+
+def __record_iss_fallback(reason: str):
+    __iss_stats['num_fallbacks'] += 1
+    __iss_fallback_reasons[reason] = __iss_fallback_reasons.get(reason, 0) + 1
+
+###
+# Exposed functions
+###
+
+# @brief Same as run_trace_regs_at_pc_locs in common/spike.py, but executes the memory image with the reference ISS.
+# @param memimage the bytes of the memory image, mapped at startpc.
+# @return the same as run_trace_regs_at_pc_locs, or None if the ISS does not support the program. In the latter case, the caller must fall back to Spike.
+def run_iss_regs_at_pc_locs(memimage: bytes, rvflags: str, startpc: int, regdump_reqs, dump_final_reg_vals: bool, final_addr: int, num_fp_regs: int, has_fpdouble_support: bool, max_num_steps: int = ISS_MAX_NUM_STEPS):
+    iss = ReferenceIss(memimage, rvflags, startpc, startpc, max_num_steps)
+    try:
+        ret = []
+        for req_pc, is_float_req, reg_to_dump in regdump_reqs:
+            iss.run_until(startpc + req_pc)
+            ret.append(iss.dump_reg(is_float_req, reg_to_dump))
+        if dump_final_reg_vals:
+            iss.run_until(final_addr)
+            ret = ret, iss.dump_final_regs(num_fp_regs, has_fpdouble_support)
+    except IssUnsupportedError as e:
+        __record_iss_fallback(str(e))
+        return None
+    finally:
+        __iss_stats['num_instrs'] += iss.num_steps
+    __iss_stats['num_resolved'] += 1
+    return ret
+
+# @brief Same as run_trace_all_pcs in common/spike.py, but executes the memory image with the reference ISS.
+# @param memimage the bytes of the memory image, mapped at startpc.
+# @return the same as run_trace_all_pcs, or None if the ISS does not support the program.
+def run_iss_trace_all_pcs(memimage: bytes, rvflags: str, numinstrs: int, startpc: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool, max_num_steps: int = ISS_MAX_NUM_STEPS):
+    iss = ReferenceIss(memimage, rvflags, startpc, startpc, max_num_steps)
+    pc_trace = []
+    try:
+        iss.run_steps(numinstrs, pc_trace)
+        if dump_final_reg_vals:
+            # Spike executes one more instruction before the final register dump.
+            iss.run_steps(1)
+            return pc_trace, iss.dump_final_regs(num_fp_regs, has_fpdouble_support)
+    except IssUnsupportedError as e:
+        __record_iss_fallback(str(e))
+        return None
+    finally:
+        __iss_stats['num_instrs'] += iss.num_steps
+    return pc_trace
+
+# @return a copy of the ISS counters of the current process: resolved runs, fallbacks to Spike, executed instructions, and the fallback reasons.
+def get_iss_stats() -> dict:
+    ret = dict(__iss_stats)
+    ret['fallback_reasons'] = dict(__iss_fallback_reasons)
+    return ret
+
+def reset_iss_stats():
+    for stat_name in __iss_stats:
+        __iss_stats[stat_name] = 0
+    __iss_fallback_reasons.clear()
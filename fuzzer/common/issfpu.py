@@ -0,0 +1,369 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module implements the binary32 and binary64 floating-point operations of the reference ISS (see common/iss.py).
+# It follows the semantics of Spike, i.e., of Berkeley SoftFloat with the RISC-V specialization: NaN results are canonical,
+# tininess is detected after rounding, and out-of-range float-to-integer conversions saturate.
+# Operands and results are raw bit patterns of the format width. The operations return pairs (result, exception flags as in fflags).
+# The exact result is computed on Python integers and rounded once. This is slow compared to SoftFloat, but simple enough to be trusted.
+
+from math import isqrt
+
+FFLAG_NX = 0x01 # Inexact
+FFLAG_UF = 0x02 # Underflow
+FFLAG_OF = 0x04 # Overflow
+FFLAG_DZ = 0x08 # Division by zero
+FFLAG_NV = 0x10 # Invalid operation
+
+RM_RNE = 0
+RM_RTZ = 1
+RM_RDN = 2
+RM_RUP = 3
+RM_RMM = 4
+
+# Kinds of unpacked values.
+FKIND_ZERO   = 0
+FKIND_FINITE = 1 # Normal or subnormal, non-zero
+FKIND_INF    = 2
+FKIND_QNAN   = 3
+FKIND_SNAN   = 4
+
+class FloatFormat:
+    def __init__(self, num_exp_bits: int, num_frac_bits: int):
+        self.num_exp_bits = num_exp_bits
+        self.num_frac_bits = num_frac_bits
+        self.num_bits = 1 + num_exp_bits + num_frac_bits
+        self.precision = num_frac_bits + 1
+        self.bias = (1 << (num_exp_bits - 1)) - 1
+        self.emin = 1 - self.bias
+        self.emax = self.bias
+        self.exp_mask = (1 << num_exp_bits) - 1
+        self.frac_mask = (1 << num_frac_bits) - 1
+        self.sign_bit = 1 << (self.num_bits - 1)
+        self.inf = self.exp_mask << num_frac_bits
+        self.max_finite = self.inf - 1
+        self.canonical_nan = self.inf | (1 << (num_frac_bits - 1))
+
+FLOAT32 = FloatFormat(8, 23)
+FLOAT64 = FloatFormat(11, 52)
+
+###
+# Unpacking and rounding
+###
+
+# @return a quadruple (sign, kind, mantissa, exponent). The value of finite numbers is mantissa * 2**exponent.
+def _unpack(bits: int, fmt: FloatFormat):
+    sign = bits >> (fmt.num_bits - 1)
+    biased_exp = (bits >> fmt.num_frac_bits) & fmt.exp_mask
+    frac = bits & fmt.frac_mask
+    if biased_exp == fmt.exp_mask:
+        if not frac:
+            return sign, FKIND_INF, 0, 0
+        return sign, (FKIND_QNAN if frac >> (fmt.num_frac_bits - 1) else FKIND_SNAN), 0, 0
+    if not biased_exp:
+        if not frac:
+            return sign, FKIND_ZERO, 0, 0
+        return sign, FKIND_FINITE, frac, fmt.emin - fmt.num_frac_bits
+    return sign, FKIND_FINITE, frac | (1 << fmt.num_frac_bits), biased_exp - fmt.bias - fmt.num_frac_bits
+
+def _is_nan(kind: int):
+    return kind >= FKIND_QNAN
+
+# @brief Computes the canonical NaN result of an operation that has at least one NaN operand.
+# @return the pair (canonical NaN, flags). The invalid flag is raised if any operand is a signaling NaN.
+def _nan_result(fmt: FloatFormat, *kinds):
+    return fmt.canonical_nan, (FFLAG_NV if FKIND_SNAN in kinds else 0)
+
+# @brief Divides mantissa by 2**shift and rounds the quotient to an integer.
+# @param sticky True if the exact value is slightly larger than mantissa, i.e., lies strictly between mantissa and mantissa+1.
+# @return a pair (rounded quotient, whether the rounding is inexact)
+def _shift_right_round(mantissa: int, shift: int, sticky: bool, sign: int, rm: int):
+    if shift <= 0:
+        quotient = mantissa << -shift
+        rem, half = int(sticky), 2 # Strictly below one half if sticky.
+    else:
+        quotient = mantissa >> shift
+        rem = mantissa & ((1 << shift) - 1)
+        half = 1 << (shift - 1)
+        # The sticky bit lies below the remainder: it only matters for breaking ties and for inexactness.
+        if sticky:
+            rem, half = 2*rem + 1, 2*half
+    if not rem:
+        return quotient, False
+    if rm == RM_RNE:
+        do_increment = rem > half or (rem == half and quotient & 1)
+    elif rm == RM_RMM:
+        do_increment = rem >= half
+    elif rm == RM_RTZ:
+        do_increment = False
+    elif rm == RM_RDN:
+        do_increment = bool(sign)
+    else:
+        do_increment = not sign
+    return quotient + do_increment, True
+
+# @brief Rounds (mantissa + epsilon) * 2**exponent to the format, where epsilon is in (0, 1) if sticky, else 0.
+# @param mantissa must be strictly positive. If sticky, it must have at least two more bits than the format precision.
+# @return the pair (bits, flags)
+def _round_pack(sign: int, mantissa: int, exponent: int, sticky: bool, fmt: FloatFormat, rm: int):
+    msb_exp = mantissa.bit_length() - 1 + exponent
+    lsb_exp = msb_exp - (fmt.precision - 1)
+    is_tiny = False
+    if msb_exp < fmt.emin:
+        # Tininess is detected after rounding, i.e., as if the exponent range were unbounded.
+        unbounded_rounded, _ = _shift_right_round(mantissa, lsb_exp - exponent, sticky, sign, rm)
+        is_tiny = unbounded_rounded.bit_length() - 1 + lsb_exp < fmt.emin
+        lsb_exp = fmt.emin - (fmt.precision - 1)
+    rounded, is_inexact = _shift_right_round(mantissa, lsb_exp - exponent, sticky, sign, rm)
+    if rounded.bit_length() > fmt.precision:
+        # The rounding carried into a new bit, hence the rounded value is a power of two.
+        rounded >>= 1
+        lsb_exp += 1
+    sign_bits = sign << (fmt.num_bits - 1)
+
+    if rounded and rounded.bit_length() - 1 + lsb_exp > fmt.emax:
+        if rm in (RM_RNE, RM_RMM) or (rm == RM_RUP and not sign) or (rm == RM_RDN and sign):
+            return sign_bits | fmt.inf, FFLAG_OF | FFLAG_NX
+        return sign_bits | fmt.max_finite, FFLAG_OF | FFLAG_NX
+
+    flags = 0
+    if is_inexact:
+        flags = FFLAG_NX | (FFLAG_UF if is_tiny else 0)
+    if rounded.bit_length() < fmt.precision:
+        # Subnormal or zero
+        return sign_bits | rounded, flags
+    return sign_bits | ((rounded.bit_length() - 1 + lsb_exp + fmt.bias) << fmt.num_frac_bits) | (rounded & fmt.frac_mask), flags
+
+# @brief The sign of an exact zero sum: negative if both addends are negative zeros, or in round-down mode if the addends have opposite signs.
+def _zero_sum_sign(sign_a: int, sign_b: int, rm: int):
+    if sign_a == sign_b:
+        return sign_a
+    return int(rm == RM_RDN)
+
+###
+# Arithmetic
+###
+
+def fadd(a: int, b: int, fmt: FloatFormat, rm: int, is_sub: bool = False):
+    sign_a, kind_a, mant_a, exp_a = _unpack(a, fmt)
+    sign_b, kind_b, mant_b, exp_b = _unpack(b, fmt)
+    sign_b ^= is_sub
+    if _is_nan(kind_a) or _is_nan(kind_b):
+        return _nan_result(fmt, kind_a, kind_b)
+    if kind_a == FKIND_INF:
+        if kind_b == FKIND_INF and sign_a != sign_b:
+            return fmt.canonical_nan, FFLAG_NV
+        return (sign_a << (fmt.num_bits - 1)) | fmt.inf, 0
+    if kind_b == FKIND_INF:
+        return (sign_b << (fmt.num_bits - 1)) | fmt.inf, 0
+    return _add_exact(sign_a, mant_a, exp_a, sign_b, mant_b, exp_b, fmt, rm)
+
+# @brief Rounds the exact sum of two finite or zero values.
+def _add_exact(sign_a: int, mant_a: int, exp_a: int, sign_b: int, mant_b: int, exp_b: int, fmt: FloatFormat, rm: int):
+    if not mant_a and not mant_b:
+        return _zero_sum_sign(sign_a, sign_b, rm) << (fmt.num_bits - 1), 0
+    if not mant_a:
+        exp_a = exp_b
+    elif not mant_b:
+        exp_b = exp_a
+    common_exp = min(exp_a, exp_b)
+    val_a = mant_a << (exp_a - common_exp)
+    val_b = mant_b << (exp_b - common_exp)
+    total = (-val_a if sign_a else val_a) + (-val_b if sign_b else val_b)
+    if not total:
+        return int(rm == RM_RDN) << (fmt.num_bits - 1), 0
+    return _round_pack(int(total < 0), abs(total), common_exp, False, fmt, rm)
+
+def fmul(a: int, b: int, fmt: FloatFormat, rm: int):
+    sign_a, kind_a, mant_a, exp_a = _unpack(a, fmt)
+    sign_b, kind_b, mant_b, exp_b = _unpack(b, fmt)
+    sign = sign_a ^ sign_b
+    if _is_nan(kind_a) or _is_nan(kind_b):
+        return _nan_result(fmt, kind_a, kind_b)
+    if kind_a == FKIND_INF or kind_b == FKIND_INF:
+        if kind_a == FKIND_ZERO or kind_b == FKIND_ZERO:
+            return fmt.canonical_nan, FFLAG_NV
+        return (sign << (fmt.num_bits - 1)) | fmt.inf, 0
+    if kind_a == FKIND_ZERO or kind_b == FKIND_ZERO:
+        return sign << (fmt.num_bits - 1), 0
+    return _round_pack(sign, mant_a * mant_b, exp_a + exp_b, False, fmt, rm)
+
+def fdiv(a: int, b: int, fmt: FloatFormat, rm: int):
+    sign_a, kind_a, mant_a, exp_a = _unpack(a, fmt)
+    sign_b, kind_b, mant_b, exp_b = _unpack(b, fmt)
+    sign = sign_a ^ sign_b
+    if _is_nan(kind_a) or _is_nan(kind_b):
+        return _nan_result(fmt, kind_a, kind_b)
+    if kind_a == FKIND_INF:
+        if kind_b == FKIND_INF:
+            return fmt.canonical_nan, FFLAG_NV
+        return (sign << (fmt.num_bits - 1)) | fmt.inf, 0
+    if kind_b == FKIND_INF:
+        return sign << (fmt.num_bits - 1), 0
+    if kind_b == FKIND_ZERO:
+        if kind_a == FKIND_ZERO:
+            return fmt.canonical_nan, FFLAG_NV
+        return (sign << (fmt.num_bits - 1)) | fmt.inf, FFLAG_DZ
+    if kind_a == FKIND_ZERO:
+        return sign << (fmt.num_bits - 1), 0
+    # Scale the dividend so that the quotient has at least two bits more than the precision.
+    scale = max(0, fmt.precision + 2 + mant_b.bit_length() - mant_a.bit_length())
+    quotient, remainder = divmod(mant_a << scale, mant_b)
+    return _round_pack(sign, quotient, exp_a - exp_b - scale, remainder != 0, fmt, rm)
+
+def fsqrt(a: int, fmt: FloatFormat, rm: int):
+    sign_a, kind_a, mant_a, exp_a = _unpack(a, fmt)
+    if _is_nan(kind_a):
+        return _nan_result(fmt, kind_a)
+    if kind_a == FKIND_ZERO:
+        return a, 0
+    if sign_a:
+        return fmt.canonical_nan, FFLAG_NV
+    if kind_a == FKIND_INF:
+        return a, 0
+    if exp_a & 1:
+        mant_a <<= 1
+        exp_a -= 1
+    # Scale the radicand so that the root has at least two bits more than the precision.
+    scale = max(0, (2*(fmt.precision + 2) - mant_a.bit_length() + 2) // 2)
+    radicand = mant_a << (2*scale)
+    root = isqrt(radicand)
+    return _round_pack(0, root, exp_a // 2 - scale, root*root != radicand, fmt, rm)
+
+# @brief Fused multiply-add: (+-)(a*b) (+-) c with a single rounding.
+def fmuladd(a: int, b: int, c: int, fmt: FloatFormat, rm: int, negate_product: bool, negate_addend: bool):
+    sign_a, kind_a, mant_a, exp_a = _unpack(a, fmt)
+    sign_b, kind_b, mant_b, exp_b = _unpack(b, fmt)
+    sign_c, kind_c, mant_c, exp_c = _unpack(c, fmt)
+    sign_prod = sign_a ^ sign_b ^ negate_product
+    sign_c ^= negate_addend
+    if _is_nan(kind_a) or _is_nan(kind_b):
+        return _nan_result(fmt, kind_a, kind_b, kind_c)
+    if (kind_a == FKIND_INF and kind_b == FKIND_ZERO) or (kind_a == FKIND_ZERO and kind_b == FKIND_INF):
+        # Invalid even if the addend is a quiet NaN.
+        return fmt.canonical_nan, FFLAG_NV
+    if _is_nan(kind_c):
+        return _nan_result(fmt, kind_c)
+    if kind_a == FKIND_INF or kind_b == FKIND_INF:
+        if kind_c == FKIND_INF and sign_c != sign_prod:
+            return fmt.canonical_nan, FFLAG_NV
+        return (sign_prod << (fmt.num_bits - 1)) | fmt.inf, 0
+    if kind_c == FKIND_INF:
+        return (sign_c << (fmt.num_bits - 1)) | fmt.inf, 0
+    return _add_exact(sign_prod, mant_a * mant_b, exp_a + exp_b, sign_c, mant_c, exp_c, fmt, rm)
+
+###
+# Comparisons, classification and sign injection
+###
+
+# @return a key that orders the non-NaN values, where both zeros are equal.
+def _order_key(bits: int, fmt: FloatFormat):
+    magnitude = bits & ~fmt.sign_bit
+    return -magnitude if bits & fmt.sign_bit else magnitude
+
+def feq(a: int, b: int, fmt: FloatFormat):
+    _, kind_a, _, _ = _unpack(a, fmt)
+    _, kind_b, _, _ = _unpack(b, fmt)
+    if _is_nan(kind_a) or _is_nan(kind_b):
+        return 0, (FFLAG_NV if FKIND_SNAN in (kind_a, kind_b) else 0)
+    return int(_order_key(a, fmt) == _order_key(b, fmt)), 0
+
+# @param or_equal True for fle, False for flt.
+def flt_fle(a: int, b: int, fmt: FloatFormat, or_equal: bool):
+    _, kind_a, _, _ = _unpack(a, fmt)
+    _, kind_b, _, _ = _unpack(b, fmt)
+    # Signaling comparisons: any NaN operand is invalid.
+    if _is_nan(kind_a) or _is_nan(kind_b):
+        return 0, FFLAG_NV
+    key_a, key_b = _order_key(a, fmt), _order_key(b, fmt)
+    return int(key_a <= key_b if or_equal else key_a < key_b), 0
+
+# @param is_max True for fmax, False for fmin.
+# @brief If exactly one operand is a NaN, the other operand is returned. The negative zero is smaller than the positive zero.
+def fmin_fmax(a: int, b: int, fmt: FloatFormat, is_max: bool):
+    _, kind_a, _, _ = _unpack(a, fmt)
+    _, kind_b, _, _ = _unpack(b, fmt)
+    flags = FFLAG_NV if FKIND_SNAN in (kind_a, kind_b) else 0
+    if _is_nan(kind_a) and _is_nan(kind_b):
+        return fmt.canonical_nan, flags
+    if _is_nan(kind_a):
+        return b, flags
+    if _is_nan(kind_b):
+        return a, flags
+    key_a, key_b = _order_key(a, fmt), _order_key(b, fmt)
+    if key_a == key_b:
+        # Equal values, but possibly zeros of different signs.
+        a_is_neg = bool(a & fmt.sign_bit)
+        return (a if a_is_neg != is_max else b), flags
+    return (a if (key_a > key_b) == is_max else b), flags
+
+# @return the fclass bit mask
+def fclass(a: int, fmt: FloatFormat):
+    sign_a, kind_a, mant_a, _ = _unpack(a, fmt)
+    if kind_a == FKIND_SNAN:
+        return 1 << 8
+    if kind_a == FKIND_QNAN:
+        return 1 << 9
+    if kind_a == FKIND_INF:
+        return 1 if sign_a else 1 << 7
+    if kind_a == FKIND_ZERO:
+        return 1 << 3 if sign_a else 1 << 4
+    is_subnormal = mant_a.bit_length() < fmt.precision
+    if sign_a:
+        return 1 << 2 if is_subnormal else 1 << 1
+    return 1 << 5 if is_subnormal else 1 << 6
+
+# @param mode 0 for fsgnj, 1 for fsgnjn, 2 for fsgnjx
+def fsgnj(a: int, b: int, fmt: FloatFormat, mode: int):
+    if mode == 0:
+        sign = b & fmt.sign_bit
+    elif mode == 1:
+        sign = ~b & fmt.sign_bit
+    else:
+        sign = (a ^ b) & fmt.sign_bit
+    return (a & ~fmt.sign_bit) | sign
+
+###
+# Conversions
+###
+
+# @param num_bits the width of the integer, 32 or 64.
+# @return the pair (integer as a num_bits-wide unsigned value, flags)
+def f_to_int(a: int, fmt: FloatFormat, rm: int, num_bits: int, is_signed: bool):
+    sign_a, kind_a, mant_a, exp_a = _unpack(a, fmt)
+    if is_signed:
+        min_val, max_val = -(1 << (num_bits - 1)), (1 << (num_bits - 1)) - 1
+    else:
+        min_val, max_val = 0, (1 << num_bits) - 1
+    mask = (1 << num_bits) - 1
+    if _is_nan(kind_a):
+        return max_val & mask, FFLAG_NV
+    if kind_a == FKIND_INF:
+        return (min_val if sign_a else max_val) & mask, FFLAG_NV
+    if kind_a == FKIND_ZERO:
+        return 0, 0
+    rounded, is_inexact = _shift_right_round(mant_a, -exp_a, False, sign_a, rm)
+    val = -rounded if sign_a else rounded
+    if val < min_val:
+        return min_val & mask, FFLAG_NV
+    if val > max_val:
+        return max_val & mask, FFLAG_NV
+    return val & mask, (FFLAG_NX if is_inexact else 0)
+
+# @param val a Python integer, already interpreted as signed or unsigned.
+def int_to_f(val: int, fmt: FloatFormat, rm: int):
+    if not val:
+        return 0, 0
+    return _round_pack(int(val < 0), abs(val), 0, False, fmt, rm)
+
+def f_to_f(a: int, src_fmt: FloatFormat, dst_fmt: FloatFormat, rm: int):
+    sign_a, kind_a, mant_a, exp_a = _unpack(a, src_fmt)
+    sign_bits = sign_a << (dst_fmt.num_bits - 1)
+    if _is_nan(kind_a):
+        return _nan_result(dst_fmt, kind_a)
+    if kind_a == FKIND_INF:
+        return sign_bits | dst_fmt.inf, 0
+    if kind_a == FKIND_ZERO:
+        return sign_bits, 0
+    return _round_pack(sign_a, mant_a, exp_a, False, dst_fmt, rm)
@@ -0,0 +1,164 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module schedules fuzzing campaigns, i.e., sequences of independent instances, on a pool of worker processes.
+# The pool callbacks feed a completion queue on which the parent process blocks, so that each worker slot is refilled as soon as its instance completes.
+# We do not use map because some instances, rarely, seem to be stuck if there are bugs in some of the EDA tools, and we must be able to terminate them.
+
+import multiprocessing as mp
+import queue
+import time
+
+# Reasons for the end of a campaign.
+CAMPAIGN_STOP_NUM_INSTANCES = 'num_instances'
+CAMPAIGN_STOP_TIME_LIMIT = 'time_limit'
+CAMPAIGN_STOP_FAILURE = 'failure'
+
+# Whether the current process is a worker of run_campaign.
+__is_campaign_worker = False
+
+# @return whether the current process is a worker of run_campaign. Each worker already occupies a core, hence the workers should not start concurrent processes of their own, such as the Spike processes of run_trace_regs_at_pc_locs_batch.
+def is_campaign_worker() -> bool:
+    return __is_campaign_worker
+
+# @brief Executed in each worker process when it starts.
+def _init_campaign_worker(initializer, initargs: tuple):
+    global __is_campaign_worker
+    __is_campaign_worker = True
+    if initializer is not None:
+        initializer(*initargs)
+
+class CampaignStats:
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self.num_submitted = 0
+        self.num_completed = 0
+        self.num_failures = 0
+        # Worker exceptions are not failures, see run_campaign.
+        self.num_worker_exceptions = 0
+        self.stop_reason = None
+        # Pair (instance_id, worker return value) of the first failing instance, or None.
+        self.first_failure = None
+        self.wall_seconds = 0
+        # Sum of the durations of the completed instances. Instances that are still running when the campaign stops are not accounted for.
+        self.busy_seconds = 0
+        # Sums of the worker statistics over the completed instances, see run_campaign.
+        self.worker_stats = dict()
+
+    # @param worker_stats a dict of numeric counters, as returned by _timed_worker.
+    def add_worker_stats(self, worker_stats: dict):
+        for stat_name, stat_val in worker_stats.items():
+            self.worker_stats[stat_name] = self.worker_stats.get(stat_name, 0) + stat_val
+
+    # @return the fraction of the worker time spent in completed instances.
+    def get_utilisation(self):
+        if self.wall_seconds == 0:
+            return 0
+        return self.busy_seconds / (self.num_workers * self.wall_seconds)
+
+    def __str__(self):
+        ret = f"Campaign stopped ({self.stop_reason}) after {self.wall_seconds:.1f}s: {self.num_completed}/{self.num_submitted} completed instances, {self.num_failures} failures, {self.num_worker_exceptions} worker exceptions, utilisation {100*self.get_utilisation():.1f}%."
+        if self.worker_stats:
+            ret += " Worker stats: " + ', '.join(f"{stat_name} {stat_val:g}" for stat_name, stat_val in self.worker_stats.items()) + "."
+        return ret
+
+# @brief Executed in the worker processes. Runs the worker function and measures its duration.
+# @param get_worker_stats if not None, returns the numeric counters of the worker process, which are compared before and after the worker function.
+# @return a quadruple (worker return value, duration in seconds, exception message or None, dict of the counter increments)
+def _timed_worker(worker_fn, args: tuple, get_worker_stats = None):
+    stats_before = get_worker_stats() if get_worker_stats is not None else dict()
+    start = time.time()
+    try:
+        ret = worker_fn(*args)
+        exception_msg = None
+    except Exception as e:
+        # Exceptions are not always picklable, hence we only transmit their message.
+        ret = None
+        exception_msg = str(e)
+    duration = time.time() - start
+    stats_after = get_worker_stats() if get_worker_stats is not None else dict()
+    return ret, duration, exception_msg, {stat_name: stat_val - stats_before.get(stat_name, 0) for stat_name, stat_val in stats_after.items()}
+
+# @brief Runs a campaign of instances on num_workers processes, refilling each worker slot as soon as its instance completes.
+# The campaign stops when any of the enabled termination conditions is met. The remaining running instances are then terminated.
+# @param worker_fn the function executed for each instance. Must be defined at module level to be picklable.
+# @param gen_instance_args called in the parent process, in increasing instance id order. Takes an instance id and returns the argument tuple of worker_fn.
+# @param max_num_instances if not None, the campaign stops after this number of completed instances.
+# @param time_limit_seconds if not None, the campaign stops when the wall time exceeds this duration, even if instances are still running.
+# @param is_failure if not None, called in the parent process on each worker return value to tell whether the instance failed.
+# @param stop_on_first_failure if True, the campaign stops at the first failure.
+# @param on_result if not None, called in the parent process with (instance_id, worker return value) for each completed instance.
+# Worker exceptions are logged and counted in CampaignStats.num_worker_exceptions, but they are neither failures nor results, since a crash of the fuzzer is not a bug found in the design. For example, the time to bug would be skewed if they stopped the campaign.
+# @param initializer if not None, called with initargs in each worker process when it starts, for example to install state that is expensive to build.
+# @param get_worker_stats if not None, a function defined at module level that returns a dict of the numeric counters of the calling process. Their increments during the instances are summed in CampaignStats.worker_stats.
+# @return a CampaignStats object
+def run_campaign(worker_fn, gen_instance_args, num_workers: int, first_instance_id: int = 0, max_num_instances: int = None, time_limit_seconds: float = None, is_failure = None, stop_on_first_failure: bool = False, on_result = None, initializer = None, initargs: tuple = (), get_worker_stats = None):
+    if num_workers <= 0:
+        raise ValueError(f"The number of workers must be positive, got {num_workers}.")
+    if max_num_instances is not None and max_num_instances <= 0:
+        raise ValueError(f"The maximal number of instances must be positive, got {max_num_instances}.")
+
+    stats = CampaignStats(num_workers)
+    # The callbacks are executed by a thread of the parent process, hence a thread-safe queue is sufficient.
+    completion_queue = queue.Queue()
+    next_instance_id = first_instance_id
+
+    def submit_instance():
+        nonlocal next_instance_id
+        instance_id = next_instance_id
+        next_instance_id += 1
+        stats.num_submitted += 1
+        # error_callback is only called if the task itself could not be executed, for instance if its arguments cannot be pickled.
+        pool.apply_async(_timed_worker, args=(worker_fn, gen_instance_args(instance_id), get_worker_stats),
+            callback=lambda ret: completion_queue.put((instance_id, ret)),
+            error_callback=lambda e: completion_queue.put((instance_id, (None, 0, str(e), dict()))))
+
+    start_time = time.time()
+    pool = mp.Pool(processes=num_workers, initializer=_init_campaign_worker, initargs=(initializer, initargs))
+    try:
+        for _ in range(num_workers if max_num_instances is None else min(num_workers, max_num_instances)):
+            submit_instance()
+
+        while stats.stop_reason is None:
+            if time_limit_seconds is None:
+                remaining_seconds = None
+            else:
+                remaining_seconds = time_limit_seconds - (time.time() - start_time)
+                if remaining_seconds <= 0:
+                    stats.stop_reason = CAMPAIGN_STOP_TIME_LIMIT
+                    break
+            try:
+                instance_id, (ret, duration, exception_msg, worker_stats) = completion_queue.get(timeout=remaining_seconds)
+            except queue.Empty:
+                continue
+
+            stats.num_completed += 1
+            stats.busy_seconds += duration
+            stats.add_worker_stats(worker_stats)
+            if exception_msg is not None:
+                print(f"Instance {instance_id} raised an exception: {exception_msg}")
+                stats.num_worker_exceptions += 1
+                is_curr_failure = False
+            else:
+                if on_result is not None:
+                    on_result(instance_id, ret)
+                is_curr_failure = is_failure is not None and is_failure(ret)
+            if is_curr_failure:
+                stats.num_failures += 1
+                if stats.first_failure is None:
+                    stats.first_failure = (instance_id, ret)
+
+            if stop_on_first_failure and is_curr_failure:
+                stats.stop_reason = CAMPAIGN_STOP_FAILURE
+            elif max_num_instances is not None and stats.num_completed >= max_num_instances:
+                stats.stop_reason = CAMPAIGN_STOP_NUM_INSTANCES
+            elif max_num_instances is None or stats.num_submitted < max_num_instances:
+                submit_instance()
+    finally:
+        stats.wall_seconds = time.time() - start_time
+        # Kill all remaining processes
+        pool.terminate()
+        pool.join()
+
+    return stats
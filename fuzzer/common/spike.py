@@ -5,10 +5,20 @@
 # This script is a helper for interacting with spike.
 
 import itertools
+import numpy as np
 import os
+import re
 import subprocess
+import time
 from pathlib import Path
 from params.runparams import DO_ASSERT, PATH_TO_TMP, NO_REMOVE_TMPFILES
+from params.fuzzparams import is_spike_forkserver_enabled, is_spike_cache_enabled, is_spike_stream_parser_enabled, get_spike_trace_backend, is_spike_adaptive_timeout_enabled, is_spike_inmem_enabled
+from common.spikeforkserver import get_spike_forkserver
+from common.spikecache import gen_spike_cache_key, spike_cache_get, spike_cache_put
+from common.spikestream import SpikeRegdumpStreamParser, run_spike_with_stream_parser, run_spikes_with_stream_parsers
+from common.spiketimeout import get_spike_timeout_model
+from common.spikeinmem import count_spike_file_write, count_spike_file_removal, count_spike_dir_creation, count_spike_piped_dbgcmds
+from common.scheduler import is_campaign_worker
 
 # Python 3.8 compatibility: cache was added in Python 3.9
 try:
@@ -20,6 +30,15 @@ except ImportError:
 SPIKE_STARTADDR = 0x80000000
 SPIKE_MEDELEG_MASK = 0xb3ff
 
+# Backends of run_trace_all_pcs.
+# - debug:     one `r 1` debug command per instruction.
+# - commitlog: a single `r` debug command for all the instructions, with --log-commits to also get the written registers.
+SPIKE_TRACE_BACKENDS = ('debug', 'commitlog')
+
+# Default maximal number of concurrent Spike processes of run_trace_regs_at_pc_locs_batch.
+# In the workers of run_campaign (see common/scheduler.py), the default is 1 instead, because the workers already occupy all the cores.
+SPIKE_BATCH_MAX_NUM_PROCS = 4
+
 ###
 # Helper functions
 ###
@@ -61,10 +80,21 @@ def __get_all_regs_from_spike_out(spike_out: str, is_design_64bit: bool):
 # @param regdump_reqs: an ordered (in program order, NOT necessarily in increasing PC order) list of tuples (pc_to_req, tuple of registers to prompt). The register is dumped before the instruction at that PC is executed. Note: we currently do not use producer/consumer instructions for branches. If the third element of the tuple is 'priv', then we do not dump a register value or a CSR value, but the privilege mode.
 # @param dump_freg_format either '' or 'd' for 'fregd' or 's' for 'fregs'.
 def __gen_spike_dbgcmd_file_for_trace_regs_at_pc_locs(identifier_str: str, startpc: int, regdump_reqs, dump_final_reg_vals: bool, final_addr: int, num_fp_regs: int, dump_freg_format: str = ''):
-    assert not dump_freg_format # This assertion is to check whether we actually can remove dump_freg_format.
     path_to_debug_file = os.path.join(PATH_TO_TMP, 'dbgcmds', f"cmds_trace_regs_at_pc_locs_{identifier_str}")
     # if not os.path.exists(path_to_debug_file):
     Path(os.path.dirname(path_to_debug_file)).mkdir(parents=True, exist_ok=True)
+    count_spike_dir_creation()
+    spike_debug_commands_str = __gen_spike_dbgcmds_for_trace_regs_at_pc_locs(startpc, regdump_reqs, dump_final_reg_vals, final_addr, num_fp_regs, dump_freg_format)
+
+    with open(path_to_debug_file, 'w') as f:
+        f.write(spike_debug_commands_str)
+    count_spike_file_write(len(spike_debug_commands_str))
+
+    return path_to_debug_file
+
+# @brief Generate the spike debug commands for __gen_spike_dbgcmd_file_for_trace_regs_at_pc_locs, as a string.
+def __gen_spike_dbgcmds_for_trace_regs_at_pc_locs(startpc: int, regdump_reqs, dump_final_reg_vals: bool, final_addr: int, num_fp_regs: int, dump_freg_format: str = ''):
+    assert not dump_freg_format # This assertion is to check whether we actually can remove dump_freg_format.
     spike_debug_commands = [
         f"until pc 0 0x{startpc:x}"
     ]
@@ -89,12 +119,7 @@ def __gen_spike_dbgcmd_file_for_trace_regs_at_pc_locs(identifier_str: str, start
             for fp_reg_id in range(num_fp_regs):
                 spike_debug_commands.append(f"freg{dump_freg_format} 0 {FPREG_ABINAMES[fp_reg_id]}")
     spike_debug_commands.append('q\n')
-    spike_debug_commands_str = '\n'.join(spike_debug_commands)
-
-    with open(path_to_debug_file, 'w') as f:
-        f.write(spike_debug_commands_str)
-
-    return path_to_debug_file
+    return '\n'.join(spike_debug_commands)
 
 # @brief Generate the spike debug command file (as understood by spike --debug-cmd) and returns its path.
 # This command file will prompt the PC at every cycle
@@ -102,6 +127,7 @@ def __gen_spike_dbgcmd_file_for_trace_pcs(identifier_str: str, numinstrs: int, s
     path_to_debug_file = os.path.join(PATH_TO_TMP, 'dbgcmds', f"cmds_trace_pcs_{identifier_str}")
     # if not os.path.exists(path_to_debug_file):
     Path(os.path.dirname(path_to_debug_file)).mkdir(parents=True, exist_ok=True)
+    count_spike_dir_creation()
     spike_debug_commands = [
         f"until pc 0 0x{startpc:x}"
     ]
@@ -119,6 +145,32 @@ def __gen_spike_dbgcmd_file_for_trace_pcs(identifier_str: str, numinstrs: int, s
 
     with open(path_to_debug_file, 'w') as f:
         f.write(spike_debug_commands_str)
+    count_spike_file_write(len(spike_debug_commands_str))
+
+    return path_to_debug_file
+
+# @brief Generate the spike debug command file for run_trace_commits and returns its path.
+# All the instructions are executed by a single `r` command. Together with --log-commits, Spike then prints, for each instruction,
+# the disassembled instruction before executing it and, if the instruction retires, a commit line with the written registers.
+def __gen_spike_dbgcmd_file_for_trace_commits(identifier_str: str, numinstrs: int, startpc: int, dump_final_reg_vals: bool, num_fp_regs: int):
+    path_to_debug_file = os.path.join(PATH_TO_TMP, 'dbgcmds', f"cmds_trace_commits_{identifier_str}")
+    Path(os.path.dirname(path_to_debug_file)).mkdir(parents=True, exist_ok=True)
+    count_spike_dir_creation()
+    spike_debug_commands = [
+        f"until pc 0 0x{startpc:x}",
+        # The additional step for the final register values is consistent with __gen_spike_dbgcmd_file_for_trace_pcs.
+        f"r {numinstrs + int(dump_final_reg_vals)}"
+    ]
+    if dump_final_reg_vals:
+        spike_debug_commands.append('reg 0')
+        for fp_reg_id in range(num_fp_regs):
+            spike_debug_commands.append(f"freg 0 {FPREG_ABINAMES[fp_reg_id]}")
+    spike_debug_commands.append('q\n')
+    spike_debug_commands_str = '\n'.join(spike_debug_commands)
+
+    with open(path_to_debug_file, 'w') as f:
+        f.write(spike_debug_commands_str)
+    count_spike_file_write(len(spike_debug_commands_str))
 
     return path_to_debug_file
 
@@ -129,32 +181,163 @@ def __gen_spike_dbgcmd_file_for_trace_pcs(identifier_str: str, numinstrs: int, s
 # @brief runs and traces every PC location.
 # @param regdump_reqs: see __gen_spike_dbgcmd_file_for_trace_regs_at_pc_locs
 # @param dump_freg_format either '' or 'd' for 'fregd' or 's' for 'fregs'
+# @param use_spike_forkserver if True, fork Spike from the fork server of this process (see common/spikeforkserver.py) instead of forking Spike from this process. If None, determined by the CASCADE_SPIKE_FORKSERVER environment variable.
+# @param use_spike_cache if True, look up and store the register dumps in the on-disk Spike cache (see common/spikecache.py). If None, determined by the CASCADE_SPIKE_CACHE environment variable.
+# @param use_stream_parser if True, parse the Spike output while it is produced (see common/spikestream.py). If None, determined by the CASCADE_SPIKE_STREAM_PARSER environment variable.
+# @param use_spike_inmem if True, pipe the debug commands to the Spike stdin instead of writing a debug command file (see common/spikeinmem.py). If None, determined by the CASCADE_SPIKE_IN_MEMORY environment variable.
 # @return a list of register values. If dump_final_reg_vals is True, then the output is a pair, whose second element is a pair of array of final register values, for int and float registers
-def run_trace_regs_at_pc_locs(identifier_str: str, elfpath: str, rvflags: str, startpc: int, regdump_reqs, dump_final_reg_vals: bool, final_addr: int, num_fp_regs: int, has_fpdouble_support: bool, dump_freg_format: str = '') -> list:
+def run_trace_regs_at_pc_locs(identifier_str: str, elfpath: str, rvflags: str, startpc: int, regdump_reqs, dump_final_reg_vals: bool, final_addr: int, num_fp_regs: int, has_fpdouble_support: bool, dump_freg_format: str = '', use_spike_forkserver: bool = None, use_spike_cache: bool = None, use_stream_parser: bool = None, use_spike_inmem: bool = None) -> list:
     if DO_ASSERT:
         assert '32' in rvflags or '64' in rvflags
 
-    # First, create the file that contains the commands, if it does not already exist
-    path_to_debug_file = __gen_spike_dbgcmd_file_for_trace_regs_at_pc_locs(identifier_str, startpc, regdump_reqs, dump_final_reg_vals, final_addr, num_fp_regs, dump_freg_format)
-
-    # Second, run the Spike command
-    spike_shell_command = (
-        "spike",
-        "-d",
-        f"--debug-cmd={path_to_debug_file}",
-        f"--isa={rvflags}",
-        f"--pc={startpc}",
-        elfpath
-    )
+    if use_spike_cache is None:
+        use_spike_cache = is_spike_cache_enabled()
+    if use_spike_cache:
+        cache_key = gen_spike_cache_key(elfpath, (rvflags, startpc, tuple(regdump_reqs), dump_final_reg_vals, final_addr, num_fp_regs, has_fpdouble_support, dump_freg_format))
+        ret = spike_cache_get(cache_key)
+        if ret is not None:
+            return ret
+
+    if use_spike_forkserver is None:
+        use_spike_forkserver = is_spike_forkserver_enabled()
+    if use_stream_parser is None:
+        use_stream_parser = is_spike_stream_parser_enabled()
+    if use_spike_inmem is None:
+        use_spike_inmem = is_spike_inmem_enabled()
+    # The stream parser does not support the additional floating register dumps of dump_freg_format.
+    use_stream_parser = use_stream_parser and not dump_freg_format
+    if use_stream_parser:
+        stream_parser = SpikeRegdumpStreamParser(len(regdump_reqs), dump_final_reg_vals, num_fp_regs, has_fpdouble_support)
+
+    timeout_model_key = f"regs_{rvflags}"
+    timeout_seconds = get_spike_run_timeout_seconds(timeout_model_key, len(regdump_reqs))
+    start_time = time.perf_counter()
+    if use_spike_forkserver:
+        # The debug commands are transmitted to the Spike fork server of this process through a pipe.
+        spike_debug_commands_str = __gen_spike_dbgcmds_for_trace_regs_at_pc_locs(startpc, regdump_reqs, dump_final_reg_vals, final_addr, num_fp_regs, dump_freg_format)
+        spike_out = get_spike_forkserver(rvflags).run(elfpath, startpc, spike_debug_commands_str, timeout_seconds)
+        if spike_out is None:
+            record_spike_run_timeout(timeout_model_key, len(regdump_reqs), timeout_seconds)
+            raise Exception(f"Spike timeout (A) for identifier str: {identifier_str}. Command: spike --isa={rvflags} --pc={startpc} {elfpath} (Spike fork server)")
+        if use_stream_parser:
+            stream_parser.feed(spike_out)
+            if not stream_parser.finish():
+                raise Exception(f"Spike terminated prematurely for identifier str: {identifier_str}. Parsed {stream_parser.get_progress_str()}. Command: spike --isa={rvflags} --pc={startpc} {elfpath} (Spike fork server)")
+    else:
+        # First, create the file that contains the commands, if it does not already exist, or prepare the commands to pipe to the Spike stdin
+        if use_spike_inmem:
+            spike_debug_commands = __gen_spike_dbgcmds_for_trace_regs_at_pc_locs(startpc, regdump_reqs, dump_final_reg_vals, final_addr, num_fp_regs, dump_freg_format).encode('ascii')
+            path_to_debug_file = '/dev/stdin'
+            count_spike_piped_dbgcmds()
+        else:
+            spike_debug_commands = None
+            path_to_debug_file = __gen_spike_dbgcmd_file_for_trace_regs_at_pc_locs(identifier_str, startpc, regdump_reqs, dump_final_reg_vals, final_addr, num_fp_regs, dump_freg_format)
+
+        # Second, run the Spike command
+        spike_shell_command = (
+            "spike",
+            "-d",
+            f"--debug-cmd={path_to_debug_file}",
+            f"--isa={rvflags}",
+            f"--pc={startpc}",
+            elfpath
+        )
+
+        if use_stream_parser:
+            try:
+                run_spike_with_stream_parser(spike_shell_command, stream_parser, timeout_seconds, spike_debug_commands)
+            except TimeoutError as e:
+                record_spike_run_timeout(timeout_model_key, len(regdump_reqs), timeout_seconds)
+                raise Exception(f"Spike timeout (A) for identifier str: {identifier_str}. {e} Command: {' '.join(filter(lambda s: '--debug-cmd' not in s, spike_shell_command))}  Debug file: {path_to_debug_file}")
+            except Exception as e:
+                raise Exception(f"{e} Identifier str: {identifier_str}. Command: {' '.join(filter(lambda s: '--debug-cmd' not in s, spike_shell_command))}  Debug file: {path_to_debug_file}")
+        else:
+            try:
+                spike_out = subprocess.run(spike_shell_command, input=spike_debug_commands, capture_output=True, timeout=timeout_seconds).stderr
+            except Exception as e:
+                if isinstance(e, subprocess.TimeoutExpired):
+                    record_spike_run_timeout(timeout_model_key, len(regdump_reqs), timeout_seconds)
+                raise Exception(f"Spike timeout (A) for identifier str: {identifier_str}. Command: {' '.join(filter(lambda s: '--debug-cmd' not in s, spike_shell_command))}  Debug file: {path_to_debug_file}")
+        if not use_spike_inmem and not NO_REMOVE_TMPFILES:
+            os.remove(path_to_debug_file)
+            count_spike_file_removal()
+            del path_to_debug_file
+    record_spike_run_time(timeout_model_key, len(regdump_reqs), time.perf_counter() - start_time, timeout_seconds)
+
+    if use_stream_parser:
+        ret = stream_parser.get_result()
+    else:
+        ret = _parse_trace_regs_at_pc_locs(spike_out, rvflags, regdump_reqs, dump_final_reg_vals, num_fp_regs, has_fpdouble_support, dump_freg_format)
+    if use_spike_cache:
+        spike_cache_put(cache_key, ret)
+    return ret
 
-    try:
-        spike_out = subprocess.run(spike_shell_command, capture_output=True, timeout=get_spike_timeout_seconds()).stderr
-    except Exception as e:
-        raise Exception(f"Spike timeout (A) for identifier str: {identifier_str}. Command: {' '.join(filter(lambda s: '--debug-cmd' not in s, spike_shell_command))}  Debug file: {path_to_debug_file}")
-    if not NO_REMOVE_TMPFILES:
-        os.remove(path_to_debug_file)
-        del path_to_debug_file
+# @brief Equivalent to calling run_trace_regs_at_pc_locs for each request, but the Spike processes of the requests run concurrently and are served by a single event loop.
+# Each program still runs in its own Spike process: the programs are position-dependent and Spike harts share their memory, hence several programs cannot share an invocation without changing their register dumps.
+# The debug commands are always piped to Spike and the outputs are always parsed by the stream parser. The Spike fork server is not used.
+# @param batch_reqs a list of tuples (identifier_str, elfpath, rvflags, startpc, regdump_reqs, dump_final_reg_vals, final_addr, num_fp_regs, has_fpdouble_support), see run_trace_regs_at_pc_locs.
+# @param max_num_procs the maximal number of concurrent Spike processes. If None, 1 in the workers of run_campaign, else SPIKE_BATCH_MAX_NUM_PROCS.
+# @return the list of the outputs of run_trace_regs_at_pc_locs, in the order of the requests. If some request fails, an exception is raised once all the requests have completed.
+def run_trace_regs_at_pc_locs_batch(batch_reqs: list, max_num_procs: int = None, use_spike_cache: bool = None) -> list:
+    if max_num_procs is None:
+        # Concurrent Spike processes would oversubscribe the cores that the campaign workers already occupy.
+        max_num_procs = 1 if is_campaign_worker() else SPIKE_BATCH_MAX_NUM_PROCS
+    if use_spike_cache is None:
+        use_spike_cache = is_spike_cache_enabled()
+
+    ret = [None] * len(batch_reqs)
+    cache_keys = [None] * len(batch_reqs)
+    # The requests that are not in the cache.
+    run_req_ids = []
+    spike_shell_commands = []
+    stream_parsers = []
+    timeouts_seconds = []
+    spike_debug_commands_list = []
+    for req_id, (identifier_str, elfpath, rvflags, startpc, regdump_reqs, dump_final_reg_vals, final_addr, num_fp_regs, has_fpdouble_support) in enumerate(batch_reqs):
+        if DO_ASSERT:
+            assert '32' in rvflags or '64' in rvflags
+        if use_spike_cache:
+            cache_keys[req_id] = gen_spike_cache_key(elfpath, (rvflags, startpc, tuple(regdump_reqs), dump_final_reg_vals, final_addr, num_fp_regs, has_fpdouble_support, ''))
+            ret[req_id] = spike_cache_get(cache_keys[req_id])
+            if ret[req_id] is not None:
+                continue
+        run_req_ids.append(req_id)
+        spike_shell_commands.append((
+            "spike",
+            "-d",
+            "--debug-cmd=/dev/stdin",
+            f"--isa={rvflags}",
+            f"--pc={startpc}",
+            elfpath
+        ))
+        stream_parsers.append(SpikeRegdumpStreamParser(len(regdump_reqs), dump_final_reg_vals, num_fp_regs, has_fpdouble_support))
+        timeouts_seconds.append(get_spike_run_timeout_seconds(f"regs_{rvflags}", len(regdump_reqs)))
+        spike_debug_commands_list.append(__gen_spike_dbgcmds_for_trace_regs_at_pc_locs(startpc, regdump_reqs, dump_final_reg_vals, final_addr, num_fp_regs).encode('ascii'))
+        count_spike_piped_dbgcmds()
+
+    errors, runtimes_seconds = run_spikes_with_stream_parsers(spike_shell_commands, stream_parsers, timeouts_seconds, spike_debug_commands_list, max_num_procs)
+
+    failure_strs = []
+    for run_id, req_id in enumerate(run_req_ids):
+        identifier_str, elfpath, rvflags, startpc, regdump_reqs = batch_reqs[req_id][:5]
+        timeout_model_key = f"regs_{rvflags}"
+        if errors[run_id] is None:
+            record_spike_run_time(timeout_model_key, len(regdump_reqs), runtimes_seconds[run_id], timeouts_seconds[run_id])
+            ret[req_id] = stream_parsers[run_id].get_result()
+            if use_spike_cache:
+                spike_cache_put(cache_keys[req_id], ret[req_id])
+        elif isinstance(errors[run_id], TimeoutError):
+            record_spike_run_timeout(timeout_model_key, len(regdump_reqs), timeouts_seconds[run_id])
+            failure_strs.append(f"Spike timeout (A) for identifier str: {identifier_str}. {errors[run_id]} Command: spike --isa={rvflags} --pc={startpc} {elfpath} (Spike batch)")
+        else:
+            failure_strs.append(f"{errors[run_id]} Identifier str: {identifier_str}. Command: spike --isa={rvflags} --pc={startpc} {elfpath} (Spike batch)")
+    if failure_strs:
+        raise Exception(f"{len(failure_strs)}/{len(batch_reqs)} Spike runs of the batch failed. " + ' '.join(failure_strs))
+    return ret
 
+# @brief Parses the Spike output of run_trace_regs_at_pc_locs.
+# @return see run_trace_regs_at_pc_locs
+def _parse_trace_regs_at_pc_locs(spike_out: bytes, rvflags: str, regdump_reqs, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool, dump_freg_format: str):
     addr_str_splitted = spike_out.split(b"\n")
     addr_str_splitted = list(filter(lambda s: b'exception' not in s, addr_str_splitted))
     ret = []
@@ -194,7 +377,19 @@ def run_trace_regs_at_pc_locs(identifier_str: str, elfpath: str, rvflags: str, s
 # Only used for debugging purposes
 # @brief runs and traces every PC location.
 # @return a list of PCs. If dump_final_reg_vals is True, then the output is a pair, whose second element is an array of final register values
-def run_trace_all_pcs(identifier_str: str, elfpath: str, rvflags: str, numinstrs: int, startpc: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool, fuzzerstate_for_debug: list) -> list:
+# @param trace_backend one of SPIKE_TRACE_BACKENDS. If None, determined by the CASCADE_SPIKE_TRACE_BACKEND environment variable.
+def run_trace_all_pcs(identifier_str: str, elfpath: str, rvflags: str, numinstrs: int, startpc: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool, fuzzerstate_for_debug: list, trace_backend: str = None) -> list:
+    if trace_backend is None:
+        trace_backend = get_spike_trace_backend()
+    if trace_backend == 'commitlog':
+        commits_ret = run_trace_commits(identifier_str, elfpath, rvflags, numinstrs, startpc, dump_final_reg_vals, num_fp_regs, has_fpdouble_support)
+        if dump_final_reg_vals:
+            (pcs, _, _), final_reg_vals = commits_ret
+            return pcs.tolist(), final_reg_vals
+        return commits_ret[0].tolist()
+    elif trace_backend != 'debug':
+        raise ValueError(f"Unknown Spike trace backend `{trace_backend}`. Supported backends: {SPIKE_TRACE_BACKENDS}.")
+
     # First, create the file that contains the commands, if it does not already exist
     path_to_debug_file = __gen_spike_dbgcmd_file_for_trace_pcs(identifier_str, numinstrs, startpc, dump_final_reg_vals, num_fp_regs)
     
@@ -208,15 +403,27 @@ def run_trace_all_pcs(identifier_str: str, elfpath: str, rvflags: str, numinstrs
         elfpath
     )
 
+    timeout_model_key = f"pcs_{rvflags}"
+    timeout_seconds = get_spike_run_timeout_seconds(timeout_model_key, numinstrs)
+    start_time = time.perf_counter()
     try:
-        spike_out = subprocess.run(spike_shell_command, capture_output=True, timeout=get_spike_timeout_seconds()).stderr
+        spike_out = subprocess.run(spike_shell_command, capture_output=True, timeout=timeout_seconds).stderr
     except Exception as e:
+        if isinstance(e, subprocess.TimeoutExpired):
+            record_spike_run_timeout(timeout_model_key, numinstrs, timeout_seconds)
         raise Exception(f"Spike timeout (B) for identifier str: {identifier_str}.\nCommand: {' '.join(spike_shell_command)}")
+    record_spike_run_time(timeout_model_key, numinstrs, time.perf_counter() - start_time, timeout_seconds)
 
     if not NO_REMOVE_TMPFILES:
         os.remove(path_to_debug_file)
+        count_spike_file_removal()
         del path_to_debug_file
 
+    return _parse_trace_all_pcs(spike_out, rvflags, numinstrs, dump_final_reg_vals, num_fp_regs, has_fpdouble_support)
+
+# @brief Parses the Spike output of run_trace_all_pcs with the debug backend, where each instruction line is selected by its position.
+# @return see run_trace_all_pcs
+def _parse_trace_all_pcs(spike_out: bytes, rvflags: str, numinstrs: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool):
     addr_str_splitted = spike_out.split(b"\n")
     addr_str_splitted = list(filter(lambda s: b'exception' not in s and b'tval 0x' not in s, addr_str_splitted))
     ret = []
@@ -245,6 +452,109 @@ def run_trace_all_pcs(identifier_str: str, elfpath: str, rvflags: str, numinstrs
     else:
         return ret
 
+# Disassembly line printed by Spike before executing an instruction, for example `core   0: 0x0000000080000000 (0x00000297) auipc   t0, 0x0`
+# The other lines of the processor that are not commit lines or exception reports are the lines of trapping instructions, whose PC is at offset SPIKE_TRAP_LINE_PC_OFFSET, as in run_trace_all_pcs.
+SPIKE_DISASM_LINE_REGEX = re.compile(rb'^core\s+\d+: 0x([0-9a-f]+) \(0x[0-9a-f]+\)')
+# Commit line printed by Spike when an instruction retires, for example `core   0: 3 0x0000000080000000 (0x00000297) x5  0x0000000080000000`
+SPIKE_COMMIT_LINE_REGEX = re.compile(rb'^core\s+\d+: \d 0x([0-9a-f]+) \(0x[0-9a-f]+\)(.*)$')
+# Integer or floating register write in a commit line, for example ` x5  0x0000000080000000`. CSR writes and memory accesses are ignored.
+SPIKE_COMMIT_REGWRITE_REGEX = re.compile(rb' ([xf])(\d+)\s+0x([0-9a-f]+)')
+SPIKE_TRAP_LINE_PC_OFFSET = 27
+
+# Index of the first floating register in the written register arrays of run_trace_commits.
+SPIKE_COMMIT_FIRST_FPREG = 32
+
+# @brief runs Spike once with --log-commits and traces every PC location and the written registers.
+# @return a triple of numpy arrays of length numinstrs (pcs, written_regs, written_vals). written_regs is -1 if the instruction did not retire or did not write an integer or floating register,
+#         else the register id, offset by SPIKE_COMMIT_FIRST_FPREG for floating registers. If dump_final_reg_vals is True, then the output is a pair, whose second element is as in run_trace_all_pcs.
+def run_trace_commits(identifier_str: str, elfpath: str, rvflags: str, numinstrs: int, startpc: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool):
+    path_to_debug_file = __gen_spike_dbgcmd_file_for_trace_commits(identifier_str, numinstrs, startpc, dump_final_reg_vals, num_fp_regs)
+
+    spike_shell_command = (
+        "spike",
+        "-d",
+        "--log-commits",
+        f"--debug-cmd={path_to_debug_file}",
+        f"--isa={rvflags}",
+        f"--pc={startpc}",
+        elfpath
+    )
+
+    timeout_model_key = f"commits_{rvflags}"
+    timeout_seconds = get_spike_run_timeout_seconds(timeout_model_key, numinstrs)
+    start_time = time.perf_counter()
+    try:
+        spike_out = subprocess.run(spike_shell_command, capture_output=True, timeout=timeout_seconds).stderr
+    except Exception as e:
+        if isinstance(e, subprocess.TimeoutExpired):
+            record_spike_run_timeout(timeout_model_key, numinstrs, timeout_seconds)
+        raise Exception(f"Spike timeout (C) for identifier str: {identifier_str}.\nCommand: {' '.join(spike_shell_command)}")
+    record_spike_run_time(timeout_model_key, numinstrs, time.perf_counter() - start_time, timeout_seconds)
+
+    if not NO_REMOVE_TMPFILES:
+        os.remove(path_to_debug_file)
+        count_spike_file_removal()
+        del path_to_debug_file
+
+    return _parse_trace_commits(identifier_str, spike_out, rvflags, numinstrs, dump_final_reg_vals, num_fp_regs, has_fpdouble_support)
+
+# @brief Parses the Spike output of run_trace_commits. The instruction lines are recognized by their format rather than by their position, hence the output may also be the one of the debug backend of run_trace_all_pcs, in which case no register is written.
+# @return see run_trace_commits
+def _parse_trace_commits(identifier_str: str, spike_out: bytes, rvflags: str, numinstrs: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool):
+    pc_num_hexdigits = 8+8*int('64' in rvflags)
+    pcs = np.zeros(numinstrs, dtype=np.uint64)
+    written_regs = np.full(numinstrs, -1, dtype=np.int8)
+    written_vals = np.zeros(numinstrs, dtype=np.uint64)
+    dump_lines = [] # Lines that are not emitted by the processor, i.e., the register dumps.
+
+    instr_id = -1 # Index of the last disassembled instruction. The commit lines that precede the first one come from the boot ROM.
+    for line in spike_out.split(b"\n"):
+        if not line.startswith(b'core'):
+            dump_lines.append(line)
+            continue
+        # The exception reports, as filtered by run_trace_all_pcs.
+        if b'exception' in line or b'tval 0x' in line:
+            continue
+        commit_match = SPIKE_COMMIT_LINE_REGEX.match(line)
+        if commit_match is None:
+            instr_id += 1
+            if instr_id < numinstrs:
+                disasm_match = SPIKE_DISASM_LINE_REGEX.match(line)
+                if disasm_match:
+                    pcs[instr_id] = int(disasm_match.group(1), base=16)
+                else:
+                    pcs[instr_id] = int(line[SPIKE_TRAP_LINE_PC_OFFSET:SPIKE_TRAP_LINE_PC_OFFSET+pc_num_hexdigits], base=16)
+            continue
+        if instr_id < 0 or instr_id >= numinstrs:
+            continue
+        if DO_ASSERT:
+            assert int(commit_match.group(1), base=16) == pcs[instr_id], f"Commit of PC `{commit_match.group(1)}` does not match the last disassembled PC `{hex(pcs[instr_id])}`."
+        regwrite_match = SPIKE_COMMIT_REGWRITE_REGEX.search(commit_match.group(2))
+        if regwrite_match:
+            written_regs[instr_id] = int(regwrite_match.group(2)) + SPIKE_COMMIT_FIRST_FPREG*int(regwrite_match.group(1) == b'f')
+            written_vals[instr_id] = int(regwrite_match.group(3), base=16)
+
+    if instr_id + 1 < numinstrs:
+        raise Exception(f"Spike traced only {instr_id + 1} instructions out of {numinstrs} for identifier str: {identifier_str}.")
+
+    # Potentially get the final register values
+    if dump_final_reg_vals:
+        final_intreg_vals = __get_all_regs_from_spike_out(spike_out, '64' in rvflags)
+        final_fpureg_vals = []
+        if num_fp_regs:
+            # The floating register dumps follow the 8 rows of the integer register dump.
+            for row_id, dump_line in enumerate(dump_lines):
+                if dump_line[:10] == b'0xffffffff':
+                    fp_base_row_addr = row_id
+                    break
+            else:
+                raise Exception('Parsing went wrong.')
+            for fp_reg_id in range(num_fp_regs):
+                final_fpureg_vals.append(int(dump_lines[fp_base_row_addr+fp_reg_id][18+8*int(not has_fpdouble_support):], 16))
+        return (pcs, written_regs, written_vals), (final_intreg_vals, final_fpureg_vals)
+    else:
+        return pcs, written_regs, written_vals
+
 ###
 # Timeout management
 ###
@@ -260,6 +570,24 @@ def _get_spike_ns_per_instr() -> int:
 def get_spike_timeout_seconds() -> int:
     return max((SPIKE_TIMEOUT_SLACK_FACTOR*_get_spike_ns_per_instr())/1e9, 10)
 
+# @brief If the adaptive timeout is enabled, the timeout of a run is given by the timeout model of this process (see common/spiketimeout.py), else it is get_spike_timeout_seconds().
+# @param timeout_model_key identifies the kind of run and the ISA.
+# @param size the size of the run, i.e., its number of register dump requests or of traced instructions.
+def get_spike_run_timeout_seconds(timeout_model_key: str, size: int) -> float:
+    if not is_spike_adaptive_timeout_enabled():
+        return get_spike_timeout_seconds()
+    return get_spike_timeout_model(timeout_model_key).get_deadline_seconds(size, get_spike_timeout_seconds())
+
+# @brief Records the runtime of a completed run in the timeout model, if the adaptive timeout is enabled.
+def record_spike_run_time(timeout_model_key: str, size: int, seconds: float, timeout_seconds: float):
+    if is_spike_adaptive_timeout_enabled():
+        get_spike_timeout_model(timeout_model_key).record_runtime(size, seconds, timeout_seconds)
+
+# @brief Records a timed out run in the timeout model, if the adaptive timeout is enabled.
+def record_spike_run_timeout(timeout_model_key: str, size: int, timeout_seconds: float):
+    if is_spike_adaptive_timeout_enabled():
+        get_spike_timeout_model(timeout_model_key).record_timeout(size, timeout_seconds)
+
 # @brief Runs a spike instance and returns the average nanoseconds per instruction.
 @cache
 def calibrate_spikespeed(numinstrs:int = 10000) -> list:
@@ -0,0 +1,176 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module provides an on-disk, content-addressed cache of the parsed Spike register dumps.
+# A Spike run is deterministic given the Spike binary, the ELF and the debug commands. Hence the parsed register dumps are stored under a hash of the ELF bytes and of the dump request,
+# and are shared by all the processes that use the same CASCADE_DATADIR, for example when the same descriptor is regenerated during reduction or across campaigns.
+# Entries are written to a temporary file and then renamed, so that concurrent processes never observe a partial entry.
+# The modification time of an entry is refreshed upon each hit and serves as its LRU timestamp. The least recently used entries are evicted when the cache exceeds its size bound.
+
+from params.runparams import PATH_TO_TMP
+from params.fuzzparams import get_spike_cache_max_bytes
+
+import fcntl
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import zlib
+
+# Python 3.8 compatibility: cache was added in Python 3.9
+try:
+    from functools import cache
+except ImportError:
+    from functools import lru_cache
+    cache = lru_cache(maxsize=None)
+
+# Must be incremented whenever the format of the cached values changes, to invalidate the previous entries.
+SPIKECACHE_FORMAT_VERSION = 1
+# After an eviction, the cache occupies at most this fraction of its size bound, so that evictions do not happen at every insertion.
+SPIKECACHE_EVICTION_LOW_WATERMARK = 0.9
+# Number of insertions by a process between two checks of the cache size. Checking requires listing the whole cache.
+SPIKECACHE_EVICTION_CHECK_PERIOD = 64
+# Temporary files older than this have been left by killed processes and are removed during evictions.
+SPIKECACHE_STALE_TMPFILE_SECONDS = 60*60
+
+SPIKECACHE_TMPFILE_PREFIX = '.tmp'
+
+# The counters are per process.
+__spike_cache_stats = {'hits': 0, 'misses': 0, 'insertions': 0, 'evictions': 0}
+__num_insertions_since_size_check = SPIKECACHE_EVICTION_CHECK_PERIOD # Check the size upon the first insertion.
+
+def get_spike_cache_dir() -> str:
+    return os.path.join(PATH_TO_TMP, 'spikecache')
+
+def __get_entry_path(key: str) -> str:
+    return os.path.join(get_spike_cache_dir(), key[:2], key[2:])
+
+# @brief Identifies the Spike binary, so that the entries produced by another Spike version are not reused.
+@cache
+def _get_spike_binary_fingerprint() -> tuple:
+    spike_path = shutil.which('spike')
+    if spike_path is None:
+        return None
+    spike_stat = os.stat(spike_path)
+    return spike_path, spike_stat.st_size, spike_stat.st_mtime_ns
+
+# @brief Computes the cache key of a Spike run.
+# @param request_params a tuple of all the parameters that influence the Spike output or its parsing, besides the ELF. Must have a deterministic repr.
+# @return the key as a hex string
+def gen_spike_cache_key(elfpath: str, request_params: tuple) -> str:
+    hasher = hashlib.sha256(repr((SPIKECACHE_FORMAT_VERSION, _get_spike_binary_fingerprint(), request_params)).encode('ascii'))
+    with open(elfpath, 'rb') as f:
+        hasher.update(f.read())
+    return hasher.hexdigest()
+
+# @return the cached value, or None if the key is not in the cache.
+def spike_cache_get(key: str):
+    entry_path = __get_entry_path(key)
+    try:
+        with open(entry_path, 'rb') as f:
+            entry_bytes = f.read()
+        os.utime(entry_path)
+    except FileNotFoundError:
+        # Also happens if the entry was evicted by another process in the meantime.
+        __spike_cache_stats['misses'] += 1
+        return None
+    try:
+        ret = pickle.loads(zlib.decompress(entry_bytes))
+    except (zlib.error, pickle.UnpicklingError, EOFError):
+        print(f"Warning: removing corrupted Spike cache entry {entry_path}.")
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        __spike_cache_stats['misses'] += 1
+        return None
+    __spike_cache_stats['hits'] += 1
+    return ret
+
+# @param value a picklable value, typically the return value of run_trace_regs_at_pc_locs.
+def spike_cache_put(key: str, value):
+    global __num_insertions_since_size_check
+    entry_path = __get_entry_path(key)
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), prefix=SPIKECACHE_TMPFILE_PREFIX)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1))
+        os.replace(tmp_path, entry_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    __spike_cache_stats['insertions'] += 1
+
+    __num_insertions_since_size_check += 1
+    if __num_insertions_since_size_check >= SPIKECACHE_EVICTION_CHECK_PERIOD:
+        __num_insertions_since_size_check = 0
+        evict_spike_cache()
+
+# @brief Evicts the least recently used entries if the cache exceeds its size bound.
+# Only one process evicts at a time. The other processes skip the eviction instead of waiting.
+# @param max_bytes the size bound. If None, given by get_spike_cache_max_bytes().
+# @return the number of evicted entries
+def evict_spike_cache(max_bytes: int = None) -> int:
+    if max_bytes is None:
+        max_bytes = get_spike_cache_max_bytes()
+    cache_dir = get_spike_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    with open(os.path.join(cache_dir, '.lock'), 'a') as lockfile:
+        try:
+            fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+
+        # Triples (mtime, size, path)
+        entries = []
+        total_bytes = 0
+        curr_time = time.time()
+        for subdir in os.scandir(cache_dir):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                try:
+                    entry_stat = entry.stat()
+                    if entry.name.startswith(SPIKECACHE_TMPFILE_PREFIX):
+                        if curr_time - entry_stat.st_mtime > SPIKECACHE_STALE_TMPFILE_SECONDS:
+                            os.remove(entry.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+                total_bytes += entry_stat.st_size
+
+        if total_bytes <= max_bytes:
+            return 0
+
+        entries.sort()
+        num_evicted = 0
+        for _, entry_size, entry_path in entries:
+            if total_bytes <= SPIKECACHE_EVICTION_LOW_WATERMARK * max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= entry_size
+            num_evicted += 1
+
+    __spike_cache_stats['evictions'] += num_evicted
+    return num_evicted
+
+# @brief Removes all the entries of the cache.
+def clear_spike_cache():
+    shutil.rmtree(get_spike_cache_dir(), ignore_errors=True)
+
+# @return a copy of the cache counters of the current process: hits, misses, insertions and evictions.
+def get_spike_cache_stats() -> dict:
+    return dict(__spike_cache_stats)
+
+def reset_spike_cache_stats():
+    for stat_name in __spike_cache_stats:
+        __spike_cache_stats[stat_name] = 0
@@ -0,0 +1,153 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module provides Spike fork servers, one per fuzzing worker (process) and ISA configuration.
+# Spike binds its ELF when it starts and its debug interface cannot load another ELF, so a single Spike process cannot serve several test instances, and each Spike run still pays the Spike startup and ELF loading.
+# Instead, a fork server is a long-lived, lightweight process that receives (ELF path, debug commands) requests over pipes,
+# starts a fresh Spike process for each request, feeds the debug commands to Spike through its stdin (no debug command file is written to disk) and returns the Spike output.
+# This only spares the (potentially large) fuzzing process from forking for every Spike call.
+# This module must only import standard modules at the top level, because it is also executed as the fork server script.
+
+import atexit
+import os
+import pickle
+import subprocess
+import sys
+
+# Status codes sent by the fork server.
+SPIKEFORKSERVER_STATUS_OK = 0
+SPIKEFORKSERVER_STATUS_TIMEOUT = 1
+SPIKEFORKSERVER_STATUS_ERROR = 2
+
+###
+# Fork server side
+###
+
+# @brief Serves Spike requests from stdin until stdin is closed or a None request is received.
+# Each request is a pickled tuple (elfpath, rvflags, startpc, dbgcmds: bytes, timeout_seconds), each response is a pickled pair (status, spike stderr).
+def _spike_forkserver_loop(fin, fout):
+    while True:
+        try:
+            req = pickle.load(fin)
+        except EOFError:
+            return
+        if req is None:
+            return
+        elfpath, rvflags, startpc, dbgcmds, timeout_seconds = req
+        spike_shell_command = (
+            "spike",
+            "-d",
+            "--debug-cmd=/dev/stdin",
+            f"--isa={rvflags}",
+            f"--pc={startpc}",
+            elfpath
+        )
+        try:
+            spike_out = subprocess.run(spike_shell_command, input=dbgcmds, capture_output=True, timeout=timeout_seconds).stderr
+            resp = (SPIKEFORKSERVER_STATUS_OK, spike_out)
+        except subprocess.TimeoutExpired:
+            resp = (SPIKEFORKSERVER_STATUS_TIMEOUT, b'')
+        except Exception as e:
+            resp = (SPIKEFORKSERVER_STATUS_ERROR, str(e).encode('ascii', errors='replace'))
+        pickle.dump(resp, fout)
+        fout.flush()
+
+###
+# Fuzzer side
+###
+
+class SpikeForkServer:
+    # @param rvflags the ISA string given to Spike. A fork server only serves requests for this ISA configuration.
+    def __init__(self, rvflags: str):
+        self.rvflags = rvflags
+        self.num_requests = 0
+        self.__process = None
+        # Process of the request in progress, if any. A request may be abandoned midway, typically by common/timeout.py, which gives up on the thread that runs it.
+        self.__busy_process = None
+        self.__start()
+
+    def __start(self):
+        # Fuzzing workers are typically daemonic pool processes, which are not allowed to have multiprocessing children. Hence we use subprocess.
+        self.__process = subprocess.Popen((sys.executable, os.path.abspath(__file__)), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    # @brief Kills a fork server process without reading its pending reply, such that its pipes are never reused.
+    def __discard(self, process):
+        process.kill()
+        process.wait()
+        if self.__process is process:
+            self.__process = None
+        if self.__busy_process is process:
+            self.__busy_process = None
+
+    def is_alive(self) -> bool:
+        return self.__process is not None and self.__process.poll() is None
+
+    # @brief Runs Spike on the given ELF with the given debug commands.
+    # After a Spike timeout, an error or an abandoned request, the fork server is discarded and a new one is started upon the next request.
+    # @param dbgcmds the debug commands, as would be written in a --debug-cmd file.
+    # @return the Spike stderr output as bytes, or None if Spike timed out.
+    def run(self, elfpath: str, startpc: int, dbgcmds: str, timeout_seconds: float):
+        if self.__busy_process is not None:
+            # The previous request was abandoned, hence its reply may still arrive on the pipe.
+            self.__discard(self.__busy_process)
+        if not self.is_alive():
+            self.__start()
+        process = self.__process
+        self.__busy_process = process
+        try:
+            pickle.dump((elfpath, self.rvflags, startpc, dbgcmds.encode('ascii'), timeout_seconds), process.stdin)
+            process.stdin.flush()
+            status, spike_out = pickle.load(process.stdout)
+        except (BrokenPipeError, EOFError):
+            self.__discard(process)
+            raise Exception(f"Spike fork server for ISA `{self.rvflags}` died unexpectedly.")
+        except BaseException:
+            self.__discard(process)
+            raise
+        self.num_requests += 1
+        if status != SPIKEFORKSERVER_STATUS_OK:
+            self.__discard(process)
+            if status == SPIKEFORKSERVER_STATUS_TIMEOUT:
+                return None
+            raise Exception(f"Spike fork server for ISA `{self.rvflags}` failed: {spike_out.decode('ascii')}")
+        if self.__busy_process is process:
+            self.__busy_process = None
+        return spike_out
+
+    def close(self):
+        if self.__process is None:
+            return
+        if self.__busy_process is not None:
+            self.__discard(self.__busy_process)
+            return
+        try:
+            pickle.dump(None, self.__process.stdin)
+            self.__process.stdin.close()
+            self.__process.wait(timeout=5)
+        except Exception:
+            self.__process.kill()
+        self.__process = None
+
+# Fork servers are keyed by (pid, rvflags), such that forked fuzzing processes never share a fork server with their parent.
+__spike_forkservers = dict()
+
+# @brief Returns the Spike fork server of the current process for the given ISA, and creates it if it does not exist yet.
+def get_spike_forkserver(rvflags: str) -> SpikeForkServer:
+    key = (os.getpid(), rvflags)
+    if key not in __spike_forkservers:
+        __spike_forkservers[key] = SpikeForkServer(rvflags)
+    return __spike_forkservers[key]
+
+# @brief Closes all the Spike fork servers owned by the current process.
+def close_spike_forkservers():
+    curr_pid = os.getpid()
+    for key in list(__spike_forkservers.keys()):
+        if key[0] == curr_pid:
+            __spike_forkservers[key].close()
+            del __spike_forkservers[key]
+
+atexit.register(close_spike_forkservers)
+
+if __name__ == '__main__':
+    _spike_forkserver_loop(sys.stdin.buffer, sys.stdout.buffer)
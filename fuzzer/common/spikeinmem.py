@@ -0,0 +1,102 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module delivers the inputs of Spike without creating files in PATH_TO_TMP, which may be on a shared filesystem where the file churn of the workers adds latency and contention.
+# The debug commands are piped to the Spike stdin (see run_trace_regs_at_pc_locs in common/spike.py).
+# The ELFs are placed in anonymous memory files (memfd), which Spike opens through /proc/<pid>/fd/<fd>. Where memory files are not supported, they are placed in a tmpfs-backed directory instead.
+# The in-memory ELFs are released by remove_spike_inmem_elf, and at the latest when the process exits.
+# This module also counts the filesystem operations of the test instances of the current process, i.e., on the ELFs and the debug command files, to compare both delivery modes.
+
+from params.runparams import DO_ASSERT, PATH_TO_TMP
+
+import atexit
+import os
+
+# Directory of the in-memory ELFs if memory files are not supported. PATH_TO_TMP is used if it does not exist.
+SPIKEINMEM_TMPFS_DIR = '/dev/shm'
+
+###
+# Filesystem operation counters
+###
+
+__spike_fs_stats = {
+    'num_file_writes': 0,     # Files created or overwritten in the filesystem
+    'num_file_removals': 0,   # Files removed from the filesystem
+    'num_dir_creations': 0,   # Directory creation attempts, which may be no-ops if the directory exists
+    'num_bytes_written': 0,   # Bytes written to files in the filesystem
+    'num_inmem_elfs': 0,      # ELFs placed in memory
+    'num_piped_dbgcmds': 0,   # Debug command sequences piped to Spike
+}
+
+def count_spike_file_write(num_bytes: int):
+    __spike_fs_stats['num_file_writes'] += 1
+    __spike_fs_stats['num_bytes_written'] += num_bytes
+
+def count_spike_file_removal():
+    __spike_fs_stats['num_file_removals'] += 1
+
+def count_spike_dir_creation():
+    __spike_fs_stats['num_dir_creations'] += 1
+
+def count_spike_piped_dbgcmds():
+    __spike_fs_stats['num_piped_dbgcmds'] += 1
+
+# @return the number of filesystem operations, i.e., the file writes, removals and directory creations.
+def get_spike_num_fs_ops() -> int:
+    return __spike_fs_stats['num_file_writes'] + __spike_fs_stats['num_file_removals'] + __spike_fs_stats['num_dir_creations']
+
+def get_spike_fs_stats() -> dict:
+    return dict(__spike_fs_stats)
+
+def reset_spike_fs_stats():
+    for stat_name in __spike_fs_stats:
+        __spike_fs_stats[stat_name] = 0
+
+###
+# In-memory ELFs
+###
+
+# Maps the paths of the in-memory ELFs to pairs (pid of the owner process, memory file descriptor or None for the files in a directory).
+# Forked processes inherit the entries of their parent, but never release them.
+__spike_inmem_elfs = dict()
+
+def __is_memfd_supported() -> bool:
+    return hasattr(os, 'memfd_create') and os.path.isdir(f"/proc/{os.getpid()}/fd")
+
+# @param name the name of the ELF, only used for debugging.
+# @return a path to the ELF, which is valid until remove_spike_inmem_elf is called.
+def write_spike_inmem_elf(elf_bytes: bytes, name: str) -> str:
+    if __is_memfd_supported():
+        fd = os.memfd_create(name)
+        with os.fdopen(fd, 'wb', closefd=False) as f:
+            f.write(elf_bytes)
+        # The descriptor is close-on-exec, hence Spike does not inherit it and opens the file through the descriptor table of the current process instead.
+        # It stays open in the current process until remove_spike_inmem_elf, so the path remains valid for all the Spike runs on this ELF.
+        elfpath = f"/proc/{os.getpid()}/fd/{fd}"
+    else:
+        fd = None
+        elfpath = os.path.join(SPIKEINMEM_TMPFS_DIR if os.path.isdir(SPIKEINMEM_TMPFS_DIR) else PATH_TO_TMP, f"cascade_{os.getpid()}_{name}")
+        with open(elfpath, 'wb') as f:
+            f.write(elf_bytes)
+    __spike_inmem_elfs[elfpath] = (os.getpid(), fd)
+    __spike_fs_stats['num_inmem_elfs'] += 1
+    return elfpath
+
+def remove_spike_inmem_elf(elfpath: str):
+    owner_pid, fd = __spike_inmem_elfs.pop(elfpath)
+    if DO_ASSERT:
+        assert owner_pid == os.getpid(), f"The in-memory ELF `{elfpath}` is owned by process {owner_pid}."
+    if fd is None:
+        os.remove(elfpath)
+    else:
+        os.close(fd)
+
+# @brief Removes all the in-memory ELFs owned by the current process.
+def remove_all_spike_inmem_elfs():
+    curr_pid = os.getpid()
+    for elfpath, (owner_pid, _) in list(__spike_inmem_elfs.items()):
+        if owner_pid == curr_pid:
+            remove_spike_inmem_elf(elfpath)
+
+atexit.register(remove_all_spike_inmem_elfs)
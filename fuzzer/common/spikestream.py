@@ -0,0 +1,364 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module parses the Spike output of run_trace_regs_at_pc_locs incrementally, while Spike is still running.
+# The output is read from the pipe chunk by chunk. Complete lines are scanned in place in the receive buffer by precompiled patterns,
+# and the values are written to preallocated arrays, so that no split copy of the full output is ever built.
+# Reading incrementally also permits detecting timeouts and premature terminations of Spike as soon as they happen.
+
+from params.runparams import DO_ASSERT
+
+import numpy as np
+import os
+import re
+import selectors
+import subprocess
+import time
+
+# Row of the integer register table, for example `  tp: 0x0000000000000000  t0: 0x0000000000000000  t1: 0x0000000000000000  t2: 0x0000000000000000`
+SPIKE_REGTABLE_ENTRY_REGEX = re.compile(rb'\w+: 0x([0-9a-f]+)')
+# Value of each byte as a hexadecimal digit.
+SPIKESTREAM_HEXDIGIT_INVALID = 0xff
+SPIKESTREAM_HEXDIGIT_LUT = np.full(256, SPIKESTREAM_HEXDIGIT_INVALID, dtype=np.uint64)
+for __hexdigit_id, __hexdigit_char in enumerate(b'0123456789abcdef'):
+    SPIKESTREAM_HEXDIGIT_LUT[__hexdigit_char] = __hexdigit_id
+    SPIKESTREAM_HEXDIGIT_LUT[ord(chr(__hexdigit_char).upper())] = __hexdigit_id
+
+SPIKE_REGTABLE_NUM_ROWS = 8
+SPIKE_REGTABLE_NUM_COLS = 4
+
+# Chunk size for reading the Spike output.
+SPIKESTREAM_READ_CHUNK_BYTES = 1 << 16
+# Chunk size for writing the debug commands to the Spike stdin.
+SPIKESTREAM_WRITE_CHUNK_BYTES = 1 << 16
+# The consumed prefix of the receive buffer is discarded when it exceeds this size.
+SPIKESTREAM_COMPACT_BYTES = 1 << 16
+
+# Parser states, in order.
+SPIKESTREAM_STATE_PREAMBLE      = 0 # The first line is not a register dump.
+SPIKESTREAM_STATE_DUMPS         = 1 # Requested register and privilege dumps.
+SPIKESTREAM_STATE_INTREG_SEARCH = 2 # Lines until the first row of the final integer register table.
+SPIKESTREAM_STATE_INTREGS       = 3 # Rows of the final integer register table.
+SPIKESTREAM_STATE_FPREG_SEARCH  = 4 # Lines until the first final floating register dump.
+SPIKESTREAM_STATE_FPREGS        = 5 # Final floating register dumps.
+SPIKESTREAM_STATE_DONE          = 6
+
+class SpikeRegdumpStreamParser:
+    # @param num_regdump_reqs the number of register dump requests, see run_trace_regs_at_pc_locs.
+    # @param dump_final_reg_vals, num_fp_regs, has_fpdouble_support: see run_trace_regs_at_pc_locs.
+    def __init__(self, num_regdump_reqs: int, dump_final_reg_vals: bool, num_fp_regs: int, has_fpdouble_support: bool):
+        self.num_regdump_reqs = num_regdump_reqs
+        self.dump_final_reg_vals = dump_final_reg_vals
+        self.num_fp_regs = num_fp_regs
+        # Offset of the floating register value in its dump line, as in run_trace_regs_at_pc_locs.
+        self.fpreg_val_offset = 18+8*int(not has_fpdouble_support)
+
+        self.regvals = np.zeros(num_regdump_reqs, dtype=np.uint64)
+        self.privs = bytearray(num_regdump_reqs) # Zero where the dump is a register value, else the privilege character.
+        self.final_intreg_vals = np.zeros(SPIKE_REGTABLE_NUM_ROWS*SPIKE_REGTABLE_NUM_COLS, dtype=np.uint64)
+        self.final_fpureg_vals = np.zeros(num_fp_regs, dtype=np.uint64)
+
+        self.num_parsed_bytes = 0
+        self.__buf = bytearray()
+        self.__pos = 0 # Start of the first unconsumed line in __buf.
+        self.__state = SPIKESTREAM_STATE_PREAMBLE
+        self.__num_parsed_in_state = 0
+        self.__skip_empty_states()
+
+    def is_done(self) -> bool:
+        return self.__state == SPIKESTREAM_STATE_DONE
+
+    # @return a short description of the parsing progress, for error messages.
+    def get_progress_str(self) -> str:
+        if self.__state <= SPIKESTREAM_STATE_DUMPS:
+            return f"{self.__num_parsed_in_state if self.__state == SPIKESTREAM_STATE_DUMPS else 0}/{self.num_regdump_reqs} register dumps"
+        return f"all {self.num_regdump_reqs} register dumps, final register values incomplete (parser state {self.__state})"
+
+    def __skip_empty_states(self):
+        if self.__state == SPIKESTREAM_STATE_PREAMBLE and not self.num_regdump_reqs and not self.dump_final_reg_vals:
+            self.__set_state(SPIKESTREAM_STATE_DONE)
+        if self.__state == SPIKESTREAM_STATE_DUMPS and self.__num_parsed_in_state == self.num_regdump_reqs:
+            self.__set_state(SPIKESTREAM_STATE_INTREG_SEARCH if self.dump_final_reg_vals else SPIKESTREAM_STATE_DONE)
+        if self.__state == SPIKESTREAM_STATE_FPREG_SEARCH and not self.num_fp_regs:
+            self.__set_state(SPIKESTREAM_STATE_DONE)
+
+    def __set_state(self, new_state: int):
+        self.__state = new_state
+        self.__num_parsed_in_state = 0
+
+    # @brief Consumes a chunk of Spike output. The chunk does not need to end at a line boundary.
+    def feed(self, chunk: bytes):
+        self.num_parsed_bytes += len(chunk)
+        if self.__state == SPIKESTREAM_STATE_DONE:
+            return
+        buf = self.__buf
+        buf += chunk
+        while self.__state != SPIKESTREAM_STATE_DONE:
+            if self.__state == SPIKESTREAM_STATE_DUMPS:
+                if not self.__parse_dump_lines():
+                    break
+                continue
+            line_end = buf.find(b'\n', self.__pos)
+            if line_end == -1:
+                break
+            self.__parse_line(self.__pos, line_end)
+            self.__pos = line_end + 1
+        if self.__pos >= SPIKESTREAM_COMPACT_BYTES:
+            del buf[:self.__pos]
+            self.__pos = 0
+
+    # @brief Must be called once the whole output has been fed.
+    # Spike terminates all its lines, hence a trailing line without a newline indicates a truncated output and is not parsed.
+    # @return True iff all the expected values have been parsed.
+    def finish(self) -> bool:
+        return self.is_done()
+
+    # @brief Parses the complete register dump lines available in the buffer, which are the bulk of the output.
+    # The lines are located and the register values of the common width are decoded from a numpy view of the buffer. The few other lines are handled one by one.
+    # @return True iff the dump state was completed.
+    def __parse_dump_lines(self) -> bool:
+        buf = self.__buf
+        region_end = buf.rfind(b'\n', self.__pos) + 1
+        if region_end <= self.__pos:
+            return False
+        pos = self.__pos
+        first_dump_id = self.__num_parsed_in_state
+        num_remaining_dumps = self.num_regdump_reqs - first_dump_id
+
+        # The view must be released before the buffer is resized.
+        region_view = np.frombuffer(buf, dtype=np.uint8, count=region_end-pos, offset=pos)
+        line_ends = np.flatnonzero(region_view == ord('\n'))
+        line_starts = np.empty_like(line_ends)
+        line_starts[0] = 0
+        line_starts[1:] = line_ends[:-1] + 1
+        # Lines are at least one newline long, hence line_starts+1 is always in the region.
+        is_hex_line = (region_view[line_starts] == ord('0')) & (region_view[np.minimum(line_starts+1, len(region_view)-1)] == ord('x'))
+        # Values are printed with a fixed width, which we take from the first register dump line.
+        hex_line_ids = np.flatnonzero(is_hex_line)
+        num_hexdigits = int(line_ends[hex_line_ids[0]] - line_starts[hex_line_ids[0]]) - 2 if len(hex_line_ids) else 0
+        is_regular_line = is_hex_line & (line_ends - line_starts == num_hexdigits + 2)
+        if 0 < num_hexdigits <= 16:
+            regular_line_ids = np.flatnonzero(is_regular_line)
+            hexdigits = SPIKESTREAM_HEXDIGIT_LUT[region_view[line_starts[regular_line_ids, None] + 2 + np.arange(num_hexdigits)]]
+            is_regular_line[regular_line_ids] = (hexdigits != SPIKESTREAM_HEXDIGIT_INVALID).all(axis=1)
+        else:
+            is_regular_line[:] = False
+        del region_view
+
+        # Lines that are not regular register dumps are rare. Exception reports are ignored, as in run_trace_regs_at_pc_locs.
+        is_dump_line = np.ones(len(line_ends), dtype=bool)
+        irregular_line_ids = np.flatnonzero(~is_regular_line).tolist()
+        for line_id in irregular_line_ids:
+            if buf.find(b'exception', pos+int(line_starts[line_id]), pos+int(line_ends[line_id])) != -1:
+                is_dump_line[line_id] = False
+
+        # Only consume the lines up to the last expected dump.
+        line_dump_ids = np.cumsum(is_dump_line) - 1
+        num_lines = int(np.searchsorted(line_dump_ids, num_remaining_dumps))
+        if num_lines < len(line_ends):
+            num_lines = int(np.searchsorted(line_dump_ids, num_remaining_dumps-1)) + 1
+
+        if 0 < num_hexdigits <= 16:
+            regular_dump_sel = is_regular_line[regular_line_ids] & (regular_line_ids < num_lines)
+            line_vals = np.zeros(int(regular_dump_sel.sum()), dtype=np.uint64)
+            regular_hexdigits = hexdigits[regular_dump_sel]
+            for digit_id in range(num_hexdigits):
+                line_vals = (line_vals << np.uint64(4)) | regular_hexdigits[:, digit_id]
+            self.regvals[first_dump_id + line_dump_ids[regular_line_ids[regular_dump_sel]]] = line_vals
+
+        for line_id in irregular_line_ids:
+            if line_id >= num_lines:
+                break
+            if not is_dump_line[line_id]:
+                continue
+            line_start, line_end = pos+int(line_starts[line_id]), pos+int(line_ends[line_id])
+            dump_id = first_dump_id + int(line_dump_ids[line_id])
+            if buf.startswith(b'0x', line_start, line_end):
+                self.regvals[dump_id] = int(buf[line_start+2:line_end], base=16)
+            elif line_end - line_start == 1:
+                # This should be a privilege dump
+                if DO_ASSERT:
+                    assert chr(buf[line_start]) in ('M', 'S', 'U'), f"Found a single character, but did not expect it to be {chr(buf[line_start])}."
+                self.privs[dump_id] = buf[line_start]
+            else:
+                raise NotImplementedError(f"Line not supported: {bytes(buf[line_start:line_end])}.")
+
+        self.__num_parsed_in_state = first_dump_id + (int(line_dump_ids[num_lines-1]) + 1 if num_lines else 0)
+        self.__pos = pos + (int(line_ends[num_lines-1]) + 1 if num_lines else 0)
+        self.__skip_empty_states()
+        return self.__state != SPIKESTREAM_STATE_DUMPS
+
+    # @brief Parses the line buf[line_start:line_end] in place.
+    def __parse_line(self, line_start: int, line_end: int):
+        buf = self.__buf
+        # Exception reports are ignored, as in run_trace_regs_at_pc_locs.
+        if buf.find(b'exception', line_start, line_end) != -1:
+            return
+
+        if self.__state == SPIKESTREAM_STATE_PREAMBLE:
+            self.__set_state(SPIKESTREAM_STATE_DUMPS)
+
+        elif self.__state == SPIKESTREAM_STATE_INTREG_SEARCH:
+            if buf.find(b'zero: 0x', line_start, line_end) != -1:
+                self.__set_state(SPIKESTREAM_STATE_INTREGS)
+                self.__parse_line(line_start, line_end)
+
+        elif self.__state == SPIKESTREAM_STATE_INTREGS:
+            row_id = self.__num_parsed_in_state
+            col_id = 0
+            for entry_match in SPIKE_REGTABLE_ENTRY_REGEX.finditer(buf, line_start, line_end):
+                if col_id == SPIKE_REGTABLE_NUM_COLS:
+                    break
+                self.final_intreg_vals[(row_id << 2) + col_id] = int(entry_match.group(1), base=16)
+                col_id += 1
+            if col_id != SPIKE_REGTABLE_NUM_COLS:
+                raise NotImplementedError(f"Unexpected register table row: {bytes(buf[line_start:line_end])}.")
+            self.__num_parsed_in_state += 1
+            if self.__num_parsed_in_state == SPIKE_REGTABLE_NUM_ROWS:
+                self.__set_state(SPIKESTREAM_STATE_FPREG_SEARCH)
+
+        elif self.__state == SPIKESTREAM_STATE_FPREG_SEARCH:
+            if buf.startswith(b'0xffffffff', line_start, line_end):
+                self.__set_state(SPIKESTREAM_STATE_FPREGS)
+                self.__parse_line(line_start, line_end)
+
+        elif self.__state == SPIKESTREAM_STATE_FPREGS:
+            self.final_fpureg_vals[self.__num_parsed_in_state] = int(buf[line_start+self.fpreg_val_offset:line_end], base=16)
+            self.__num_parsed_in_state += 1
+            if self.__num_parsed_in_state == self.num_fp_regs:
+                self.__set_state(SPIKESTREAM_STATE_DONE)
+
+        self.__skip_empty_states()
+
+    # @return the parsed values, in the format of run_trace_regs_at_pc_locs.
+    def get_result(self):
+        if DO_ASSERT:
+            assert self.is_done(), f"The Spike output is incomplete: parsed {self.get_progress_str()}."
+        ret = self.regvals.tolist()
+        for dump_id, priv in enumerate(self.privs):
+            if priv:
+                ret[dump_id] = chr(priv)
+        if self.dump_final_reg_vals:
+            return ret, (self.final_intreg_vals.tolist(), self.final_fpureg_vals.tolist())
+        return ret
+
+# @brief Runs Spike and feeds its stderr to the parser while it is produced.
+# Raises TimeoutError if the parser did not complete within timeout_seconds, and an Exception if Spike terminated before the parser completed.
+# Spike is killed as soon as the parser completed or failed.
+# @param dbgcmds if not None, the debug commands, written to the Spike stdin while the output is read. The command must then contain --debug-cmd=/dev/stdin.
+# @return the parser
+def run_spike_with_stream_parser(spike_shell_command: tuple, parser: SpikeRegdumpStreamParser, timeout_seconds: float, dbgcmds: bytes = None):
+    errors, _ = run_spikes_with_stream_parsers([spike_shell_command], [parser], [timeout_seconds], [dbgcmds], 1)
+    if errors[0] is not None:
+        raise errors[0]
+    return parser
+
+# @brief Runs several Spike processes concurrently and feeds the stderr of each to its parser while it is produced, all from a single event loop.
+# Each process behaves as in run_spike_with_stream_parser, and its timeout starts when it is launched.
+# @param dbgcmds_list for each process, its debug commands or None, see run_spike_with_stream_parser.
+# @param max_num_procs the maximal number of processes running at the same time. The next process is launched as soon as one completes.
+# @return a pair (errors, runtimes_seconds), where errors[i] is None if the parser i completed, else the exception that run_spike_with_stream_parser would raise.
+def run_spikes_with_stream_parsers(spike_shell_commands: list, parsers: list, timeouts_seconds: list, dbgcmds_list: list, max_num_procs: int):
+    if DO_ASSERT:
+        assert len(spike_shell_commands) == len(parsers) == len(timeouts_seconds) == len(dbgcmds_list)
+        assert max_num_procs > 0
+
+    num_procs = len(spike_shell_commands)
+    errors = [None] * num_procs
+    runtimes_seconds = [None] * num_procs
+    # proc_id -> [process, start time, deadline, debug command view or None, number of debug command bytes written]
+    active_procs = dict()
+    next_proc_id = 0
+    selector = selectors.DefaultSelector()
+
+    def launch_proc(proc_id: int):
+        start_time = time.time()
+        dbgcmds = dbgcmds_list[proc_id]
+        process = subprocess.Popen(spike_shell_commands[proc_id], stdin=subprocess.DEVNULL if dbgcmds is None else subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        active_procs[proc_id] = [process, start_time, start_time + timeouts_seconds[proc_id], None if dbgcmds is None else memoryview(dbgcmds), 0]
+        selector.register(process.stderr.fileno(), selectors.EVENT_READ, (proc_id, False))
+        if dbgcmds is not None:
+            # The debug commands are written without blocking, so that Spike never waits for its stderr to be read while we wait for its stdin to be consumed.
+            os.set_blocking(process.stdin.fileno(), False)
+            selector.register(process.stdin.fileno(), selectors.EVENT_WRITE, (proc_id, True))
+
+    # The stdin of a process is registered in the selector until it is closed.
+    def close_stdin(process):
+        if process.stdin is None or process.stdin.closed:
+            return
+        selector.unregister(process.stdin.fileno())
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def close_proc(proc_id: int):
+        process = active_procs[proc_id][0]
+        runtimes_seconds[proc_id] = time.time() - active_procs[proc_id][1]
+        close_stdin(process)
+        selector.unregister(process.stderr.fileno())
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stderr.close()
+        del active_procs[proc_id]
+
+    try:
+        while next_proc_id < num_procs or active_procs:
+            while next_proc_id < num_procs and len(active_procs) < max_num_procs:
+                launch_proc(next_proc_id)
+                # A parser may expect no output at all.
+                if parsers[next_proc_id].is_done():
+                    close_proc(next_proc_id)
+                next_proc_id += 1
+
+            curr_time = time.time()
+            for proc_id in list(active_procs):
+                if active_procs[proc_id][2] <= curr_time:
+                    errors[proc_id] = TimeoutError(f"Spike did not complete within {timeouts_seconds[proc_id]:.1f}s. Parsed {parsers[proc_id].get_progress_str()}.")
+                    close_proc(proc_id)
+            if not active_procs:
+                continue
+
+            events = selector.select(min(active_proc[2] for active_proc in active_procs.values()) - curr_time)
+            for key, _ in events:
+                proc_id, is_stdin = key.data
+                # The process may have been closed by a previous event of this iteration.
+                if proc_id not in active_procs:
+                    continue
+                process, _, _, dbgcmds_view, num_dbgcmd_bytes_written = active_procs[proc_id]
+                if is_stdin:
+                    try:
+                        num_dbgcmd_bytes_written += os.write(key.fd, dbgcmds_view[num_dbgcmd_bytes_written:num_dbgcmd_bytes_written+SPIKESTREAM_WRITE_CHUNK_BYTES])
+                    except BlockingIOError:
+                        pass
+                    except BrokenPipeError:
+                        # Spike does not read its commands anymore. Its termination is detected on stderr.
+                        num_dbgcmd_bytes_written = len(dbgcmds_view)
+                    active_procs[proc_id][4] = num_dbgcmd_bytes_written
+                    if num_dbgcmd_bytes_written == len(dbgcmds_view):
+                        close_stdin(process)
+                    continue
+
+                parser = parsers[proc_id]
+                chunk = os.read(key.fd, SPIKESTREAM_READ_CHUNK_BYTES)
+                if not chunk:
+                    # End of the output
+                    if not parser.finish():
+                        errors[proc_id] = Exception(f"Spike terminated prematurely (return code: {process.wait()}). Parsed {parser.get_progress_str()}.")
+                    close_proc(proc_id)
+                    continue
+                try:
+                    parser.feed(chunk)
+                except Exception as e:
+                    errors[proc_id] = e
+                    close_proc(proc_id)
+                    continue
+                if parser.is_done():
+                    close_proc(proc_id)
+    finally:
+        for proc_id in list(active_procs):
+            close_proc(proc_id)
+        selector.close()
+    return errors, runtimes_seconds
@@ -0,0 +1,111 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module provides an adaptive timeout model for the Spike runs.
+# The calibrated timeout of get_spike_timeout_seconds in common/spike.py does not depend on the program, hence a looping Spike instance blocks its worker for the whole calibrated timeout.
+# The model learns, online and separately in each worker process and for each kind of run and ISA, the distribution of the Spike runtime per unit of program size, where the size is typically the number of debug commands.
+# The deadline of a run is a high quantile of this distribution, scaled to the size of the run, plus a margin. It never exceeds the calibrated timeout, which is also used until enough runs have been observed.
+# Timeouts and near-misses, i.e., completed runs that consumed a large fraction of their deadline, are recorded.
+
+import bisect
+import collections
+
+# Quantile of the observed runtimes per unit of size on which the deadline is based.
+SPIKE_TIMEOUT_QUANTILE = 0.99
+# The deadline is SPIKE_TIMEOUT_MARGIN_FACTOR times the quantile, plus SPIKE_TIMEOUT_MARGIN_SECONDS.
+SPIKE_TIMEOUT_MARGIN_FACTOR = 2
+SPIKE_TIMEOUT_MARGIN_SECONDS = 1
+# Number of most recent runs that the model learns from, so that it follows changes of the system load.
+SPIKE_TIMEOUT_WINDOW_SIZE = 512
+# The calibrated timeout is used until this number of runs have been observed.
+SPIKE_TIMEOUT_MIN_NUM_SAMPLES = 32
+# The fixed cost of a Spike run (process creation, ELF loading), expressed in size units. Prevents short runs from dominating the runtimes per unit of size.
+SPIKE_TIMEOUT_FIXED_SIZE = 64
+# Completed runs that consumed at least this fraction of their deadline are recorded as near-misses.
+SPIKE_TIMEOUT_NEAR_MISS_FRACTION = 0.5
+# Maximal number of recorded timeouts and near-misses per model.
+SPIKE_TIMEOUT_MAX_NUM_EVENTS = 256
+
+SPIKE_TIMEOUT_EVENT_TIMEOUT = 'timeout'
+SPIKE_TIMEOUT_EVENT_NEAR_MISS = 'near_miss'
+
+class SpikeTimeoutModel:
+    def __init__(self, quantile: float = SPIKE_TIMEOUT_QUANTILE, margin_factor: float = SPIKE_TIMEOUT_MARGIN_FACTOR, margin_seconds: float = SPIKE_TIMEOUT_MARGIN_SECONDS, window_size: int = SPIKE_TIMEOUT_WINDOW_SIZE, min_num_samples: int = SPIKE_TIMEOUT_MIN_NUM_SAMPLES):
+        if not 0 < quantile <= 1:
+            raise ValueError(f"The quantile must be in (0, 1], got {quantile}.")
+        if min_num_samples > window_size:
+            raise ValueError(f"The minimal number of samples ({min_num_samples}) cannot exceed the window size ({window_size}).")
+        self.quantile = quantile
+        self.margin_factor = margin_factor
+        self.margin_seconds = margin_seconds
+        self.min_num_samples = min_num_samples
+        # The runtimes per unit of size, in arrival order and sorted.
+        self.__window = collections.deque(maxlen=window_size)
+        self.__sorted_window = []
+        self.num_runs = 0
+        self.num_timeouts = 0
+        self.num_near_misses = 0
+        # Triples (event type, size, seconds): for timeouts, seconds is the deadline, for near-misses, it is the runtime.
+        self.events = collections.deque(maxlen=SPIKE_TIMEOUT_MAX_NUM_EVENTS)
+
+    def is_trained(self) -> bool:
+        return len(self.__window) >= self.min_num_samples
+
+    # @return the current quantile of the runtimes per unit of size, or None if the model is not trained yet.
+    def get_quantile_seconds_per_unit(self) -> float:
+        if not self.is_trained():
+            return None
+        return self.__sorted_window[min(int(self.quantile * len(self.__sorted_window)), len(self.__sorted_window) - 1)]
+
+    # @param calibrated_timeout_seconds the calibrated timeout, which bounds the deadline and is used while the model is not trained.
+    # @return the deadline of a run of the given size, in seconds
+    def get_deadline_seconds(self, size: int, calibrated_timeout_seconds: float) -> float:
+        if not self.is_trained():
+            return calibrated_timeout_seconds
+        learned_deadline = self.margin_factor * self.get_quantile_seconds_per_unit() * (size + SPIKE_TIMEOUT_FIXED_SIZE) + self.margin_seconds
+        return min(learned_deadline, calibrated_timeout_seconds)
+
+    # @brief Records a completed run.
+    def record_runtime(self, size: int, seconds: float, deadline_seconds: float):
+        self.num_runs += 1
+        if seconds >= SPIKE_TIMEOUT_NEAR_MISS_FRACTION * deadline_seconds:
+            self.num_near_misses += 1
+            self.events.append((SPIKE_TIMEOUT_EVENT_NEAR_MISS, size, seconds))
+        if len(self.__window) == self.__window.maxlen:
+            oldest = self.__window.popleft()
+            del self.__sorted_window[bisect.bisect_left(self.__sorted_window, oldest)]
+        seconds_per_unit = seconds / (size + SPIKE_TIMEOUT_FIXED_SIZE)
+        self.__window.append(seconds_per_unit)
+        bisect.insort(self.__sorted_window, seconds_per_unit)
+
+    # @brief Records a run that was killed at its deadline. Its runtime is unknown, hence it is not learned from.
+    def record_timeout(self, size: int, deadline_seconds: float):
+        self.num_runs += 1
+        self.num_timeouts += 1
+        self.events.append((SPIKE_TIMEOUT_EVENT_TIMEOUT, size, deadline_seconds))
+
+    def get_stats(self) -> dict:
+        return {
+            'num_runs': self.num_runs,
+            'num_timeouts': self.num_timeouts,
+            'num_near_misses': self.num_near_misses,
+            'quantile_seconds_per_unit': self.get_quantile_seconds_per_unit(),
+            'events': list(self.events),
+        }
+
+# Maps the model keys to the models of the current process.
+__spike_timeout_models = {}
+
+# @param model_key identifies the kind of run and the ISA, for example `regs_rv64imafd`.
+def get_spike_timeout_model(model_key: str) -> SpikeTimeoutModel:
+    if model_key not in __spike_timeout_models:
+        __spike_timeout_models[model_key] = SpikeTimeoutModel()
+    return __spike_timeout_models[model_key]
+
+# @return a dict model key -> model statistics, for the current process.
+def get_spike_timeout_stats() -> dict:
+    return {model_key: model.get_stats() for model_key, model in __spike_timeout_models.items()}
+
+def reset_spike_timeout_models():
+    __spike_timeout_models.clear()
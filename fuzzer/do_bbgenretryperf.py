@@ -0,0 +1,26 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script measures the retries of the basic block generation with full resets and with rollbacks to checkpoints.
+
+# sys.argv[1]: design name
+# sys.argv[2]: number of test instances
+# sys.argv[3]: (optional) memory size of all the instances, for example 8192 to provoke retries
+
+from benchmarking.bbgenretryperf import benchmark_bbgen_retries
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 3:
+        raise Exception("Usage: python3 do_bbgenretryperf.py <design_name> <num_instances> [memsize]")
+
+    benchmark_bbgen_retries(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else None)
+
+else:
+    raise Exception("This module must be at the toplevel.")
@@ -0,0 +1,25 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script measures the per-instance savings of the initial and final block templates, and checks that the programs are identical with and without templates.
+
+# sys.argv[1]: design name
+# sys.argv[2]: number of test instances
+
+from benchmarking.blocktemplateperf import benchmark_block_templates
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 3:
+        raise Exception("Usage: python3 do_blocktemplateperf.py <design_name> <num_instances>")
+
+    benchmark_block_templates(sys.argv[1], int(sys.argv[2]))
+
+else:
+    raise Exception("This module must be at the toplevel.")
@@ -0,0 +1,25 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script breaks down the construction time of the spike resolution and RTL ELFs, with the RTL memory image generated from the instructions or patched from the spike resolution image, and checks that both RTL images are identical.
+
+# sys.argv[1]: design name
+# sys.argv[2]: number of test instances
+
+from benchmarking.elfpatchperf import benchmark_elf_patch
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 3:
+        raise Exception("Usage: python3 do_elfpatchperf.py <design_name> <num_instances>")
+
+    benchmark_elf_patch(sys.argv[1], int(sys.argv[2]))
+
+else:
+    raise Exception("This module must be at the toplevel.")
@@ -0,0 +1,19 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script checks the native ELF writer against the makeelf+objcopy reference and compares their throughputs.
+
+from benchmarking.elfwriterperf import check_elfwriter_equivalence, benchmark_elfwriter_throughput
+
+import os
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    check_elfwriter_equivalence(100)
+    benchmark_elfwriter_throughput(20)
+
+else:
+    raise Exception("This module must be at the toplevel.")
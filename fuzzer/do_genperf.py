@@ -0,0 +1,30 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script measures the intermediate program generation time as a function of the program length.
+
+# sys.argv[1]: design name
+# sys.argv[2]: number of repetitions per program length
+
+from benchmarking.genperf import benchmark_gen_duration_vs_length, plot_gen_duration_vs_length
+from common.profiledesign import profile_get_medeleg_mask
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 3:
+        raise Exception("Usage: python3 do_genperf.py <design_name> <num_reps>")
+
+    design_name = sys.argv[1]
+    profile_get_medeleg_mask(design_name)
+
+    benchmark_gen_duration_vs_length(design_name, int(sys.argv[2]))
+    plot_gen_duration_vs_length(design_name)
+
+else:
+    raise Exception("This module must be at the toplevel.")
@@ -0,0 +1,25 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script checks the reference ISS used for the Spike resolution (see CASCADE_ISS in params/fuzzparams.py), and compares its latency with Spike's if Spike is available.
+
+# sys.argv[1]: design name
+# sys.argv[2]: number of programs to resolve
+
+from benchmarking.issperf import benchmark_iss
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 3:
+        raise Exception("Usage: python3 do_issperf.py <design_name> <num_instances>")
+
+    benchmark_iss(sys.argv[1], int(sys.argv[2]))
+
+else:
+    raise Exception("This module must be at the toplevel.")
@@ -0,0 +1,21 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script checks the equivalence of the MemoryView backends and the validity of the prefix sum sampler, and compares their performance, including the free address sampling under memory saturation.
+
+from benchmarking.memviewperf import check_memview_backends_equivalence, check_memview_sampler, benchmark_memview_backends, benchmark_memview_sampler_saturation
+
+import os
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    check_memview_backends_equivalence(20)
+    check_memview_sampler()
+    benchmark_memview_backends()
+    benchmark_memview_sampler_saturation()
+
+else:
+    raise Exception("This module must be at the toplevel.")
@@ -0,0 +1,25 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script compares the worker utilisation of the event-driven campaign scheduler against the former sleep-polling loop, on a stub workload.
+
+# sys.argv[1]: number of workers
+# sys.argv[2]: number of stub instances
+
+from benchmarking.schedulerperf import benchmark_scheduler_utilisation
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 3:
+        raise Exception("Usage: python3 do_schedulerperf.py <num_workers> <num_instances>")
+
+    benchmark_scheduler_utilisation(int(sys.argv[1]), int(sys.argv[2]))
+
+else:
+    raise Exception("This module must be at the toplevel.")
@@ -0,0 +1,25 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script measures the spike resolution latency with and without the on-disk Spike cache. It clears the Spike cache.
+
+# sys.argv[1]: design name
+# sys.argv[2]: number of instances
+
+from benchmarking.spikecacheperf import benchmark_spike_cache
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 3:
+        raise Exception("Usage: python3 do_spikecacheperf.py <design_name> <num_instances>")
+
+    benchmark_spike_cache(sys.argv[1], int(sys.argv[2]))
+
+else:
+    raise Exception("This module must be at the toplevel.")
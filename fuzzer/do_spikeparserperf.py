@@ -0,0 +1,19 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script checks the streaming Spike register dump parser against the reference parser and compares their throughputs.
+
+from benchmarking.spikeparserperf import check_stream_parser_equivalence, benchmark_stream_parser_throughput
+
+import os
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    check_stream_parser_equivalence(500)
+    benchmark_stream_parser_throughput()
+
+else:
+    raise Exception("This module must be at the toplevel.")
@@ -0,0 +1,24 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script compares the false-kill rate and the worker time of the adaptive Spike timeout model against the calibrated timeout, on simulated Spike runtime traces.
+
+# sys.argv[1]: number of simulated Spike runs per trace
+
+from benchmarking.spiketimeoutperf import benchmark_spike_timeout
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 2:
+        raise Exception("Usage: python3 do_spiketimeoutperf.py <num_runs>")
+
+    benchmark_spike_timeout(int(sys.argv[1]))
+
+else:
+    raise Exception("This module must be at the toplevel.")
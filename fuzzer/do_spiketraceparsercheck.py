@@ -0,0 +1,29 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script records the Spike outputs of both trace backends, or checks the Spike trace parsers against each other on recorded outputs.
+
+# sys.argv[1]: record or check
+# sys.argv[2]: directory of the recorded outputs
+# sys.argv[3]: design name (record only)
+# sys.argv[4]: number of programs (record only)
+
+from benchmarking.spiketraceparsercheck import record_spike_trace_logs, check_spike_trace_parsers
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) == 5 and sys.argv[1] == 'record':
+        record_spike_trace_logs(sys.argv[3], int(sys.argv[4]), sys.argv[2])
+    elif len(sys.argv) == 3 and sys.argv[1] == 'check':
+        check_spike_trace_parsers(sys.argv[2])
+    else:
+        raise Exception("Usage: python3 do_spiketraceparsercheck.py record <log_dir> <design_name> <num_programs> | check <log_dir>")
+
+else:
+    raise Exception("This module must be at the toplevel.")
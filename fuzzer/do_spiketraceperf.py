@@ -0,0 +1,25 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This script compares the duration of the full Spike PC traces with the debug and the commitlog backends, across program sizes.
+
+# sys.argv[1]: design name
+# sys.argv[2]: number of instances per program size
+
+from benchmarking.spiketraceperf import benchmark_spike_trace_backends
+
+import os
+import sys
+
+if __name__ == '__main__':
+    if "CASCADE_ENV_SOURCED" not in os.environ:
+        raise Exception("The Cascade environment must be sourced prior to running the Python recipes.")
+
+    if len(sys.argv) < 3:
+        raise Exception("Usage: python3 do_spiketraceperf.py <design_name> <num_instances>")
+
+    benchmark_spike_trace_backends(sys.argv[1], int(sys.argv[2]))
+
+else:
+    raise Exception("This module must be at the toplevel.")
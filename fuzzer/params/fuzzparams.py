@@ -56,6 +56,16 @@ MAX_NUM_FENCES_PER_EXECUTION = 10
 LIMIT_MEM_SATURATION_RATIO = 0.8
 
 
+###
+# Generation retries
+###
+
+# If is_bbgen_rollback_enabled, a checkpoint of the generation is taken every BBGEN_CHECKPOINT_PERIOD basic blocks.
+# A failed generation then rolls back to the previous checkpoints, at most BBGEN_MAX_ROLLBACKS times, before resetting the whole fuzzer state.
+BBGEN_CHECKPOINT_PERIOD = 8
+BBGEN_MAX_ROLLBACKS = 4
+
+
 ###
 # Register picking
 ###
@@ -73,6 +83,10 @@ MAX_NUM_PICKABLE_REGS = 25
 MIN_NUM_PICKABLE_FLOATING_REGS = 1
 MAX_NUM_PICKABLE_FLOATING_REGS = 14
 
+# The saved integer register states only hold the registers modified since the previous save, except every INTREG_SNAPSHOT_KEYFRAME_PERIOD saves, which hold all the registers.
+# This bounds the number of saves to walk through to restore a state, see IntRegSnapshot in cascade/randomize/pickreg.py.
+INTREG_SNAPSHOT_KEYFRAME_PERIOD = 16
+
 RELOCATOR_REGISTER_ID = 31
 RDEP_MASK_REGISTER_ID = 30 # The mask to limit the value of the dependent register at the consumer level
 FPU_ENDIS_REGISTER_ID = 29 # The mask to enable or disable the FPU
@@ -138,3 +152,100 @@ def is_no_dependency_bias():
         return bool(os.environ['CASCADE_NO_DEPENDENCY_BIAS'])
     else:
         return False
+
+def is_spike_forkserver_enabled():
+    # Return whether the spike resolution should fork Spike from the fork servers of common/spikeforkserver.py
+    import os
+    if 'CASCADE_SPIKE_FORKSERVER' in os.environ:
+        return bool(int(os.environ['CASCADE_SPIKE_FORKSERVER']))
+    else:
+        return False
+
+def get_memview_backend():
+    # Return the MemoryView backend name (see cascade/memview.py), either `list`, `bisect` or `bisect_prefixsum`
+    import os
+    if 'CASCADE_MEMVIEW_BACKEND' in os.environ:
+        return os.environ['CASCADE_MEMVIEW_BACKEND']
+    else:
+        return 'bisect'
+
+def is_spike_cache_enabled():
+    # Return whether the Spike register dumps should be cached on disk (see common/spikecache.py)
+    import os
+    if 'CASCADE_SPIKE_CACHE' in os.environ:
+        return bool(int(os.environ['CASCADE_SPIKE_CACHE']))
+    else:
+        return False
+
+def get_spike_cache_max_bytes():
+    # Return the size bound of the Spike cache, given in megabytes by the CASCADE_SPIKE_CACHE_MAX_MB environment variable
+    import os
+    if 'CASCADE_SPIKE_CACHE_MAX_MB' in os.environ:
+        return int(float(os.environ['CASCADE_SPIKE_CACHE_MAX_MB']) * (1 << 20))
+    else:
+        return 1 << 30
+
+def get_spike_trace_backend():
+    # Return the backend of run_trace_all_pcs (see common/spike.py), either `debug` (one debug command per instruction) or `commitlog` (single run with --log-commits)
+    import os
+    if 'CASCADE_SPIKE_TRACE_BACKEND' in os.environ:
+        return os.environ['CASCADE_SPIKE_TRACE_BACKEND']
+    else:
+        return 'debug'
+
+def is_spike_stream_parser_enabled():
+    # Return whether the Spike register dumps should be parsed while Spike is running (see common/spikestream.py)
+    import os
+    if 'CASCADE_SPIKE_STREAM_PARSER' in os.environ:
+        return bool(int(os.environ['CASCADE_SPIKE_STREAM_PARSER']))
+    else:
+        return False
+
+def is_iss_enabled():
+    # Return whether the spike resolution should first try the in-process reference ISS of common/iss.py, and only fall back to Spike if the ISS does not support the program
+    # Spike remains the default until do_issperf.py reports no mismatch between the ISS and Spike on the recorded cases.
+    import os
+    if 'CASCADE_ISS' in os.environ:
+        return bool(int(os.environ['CASCADE_ISS']))
+    else:
+        return False
+
+def is_spike_adaptive_timeout_enabled():
+    # Return whether the Spike runs should use the adaptive timeout model of common/spiketimeout.py, which learns the Spike runtimes of each worker process instead of only using the calibrated timeout
+    import os
+    if 'CASCADE_SPIKE_ADAPTIVE_TIMEOUT' in os.environ:
+        return bool(int(os.environ['CASCADE_SPIKE_ADAPTIVE_TIMEOUT']))
+    else:
+        return False
+
+def is_spike_inmem_enabled():
+    # Return whether the spike resolution should pipe the debug commands to Spike and place the ELFs in memory (see common/spikeinmem.py), instead of writing them to PATH_TO_TMP
+    import os
+    if 'CASCADE_SPIKE_IN_MEMORY' in os.environ:
+        return bool(int(os.environ['CASCADE_SPIKE_IN_MEMORY']))
+    else:
+        return False
+
+def is_block_templates_enabled():
+    # Return whether the initial and final blocks should be instantiated from cached templates with pre-encoded bytes (see cascade/initialblock.py and cascade/finalblock.py), instead of being rebuilt for every program
+    import os
+    if 'CASCADE_BLOCK_TEMPLATES' in os.environ:
+        return bool(int(os.environ['CASCADE_BLOCK_TEMPLATES']))
+    else:
+        return False
+
+def is_regpick_numpy_rng_enabled():
+    # Return whether the register picks should draw from a numpy.random.Generator seeded by the test instance seed (see cascade/randomize/pickreg.py), instead of from the random module. This is faster, but maps the seeds to other programs.
+    import os
+    if 'CASCADE_REGPICK_NUMPY_RNG' in os.environ:
+        return bool(int(os.environ['CASCADE_REGPICK_NUMPY_RNG']))
+    else:
+        return False
+
+def is_bbgen_rollback_enabled():
+    # Return whether a failed basic block generation should roll back to a checkpoint taken at a basic block boundary (see gen_basicblocks in cascade/basicblock.py), instead of resetting the whole fuzzer state. This maps the seeds whose generation fails to other programs.
+    import os
+    if 'CASCADE_BBGEN_ROLLBACK' in os.environ:
+        return bool(int(os.environ['CASCADE_BBGEN_ROLLBACK']))
+    else:
+        return False
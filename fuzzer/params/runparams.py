@@ -10,8 +10,48 @@ os.makedirs(PATH_TO_TMP, exist_ok=True)
 PATH_TO_FIGURES = os.environ['CASCADE_PATH_TO_FIGURES']
 os.makedirs(PATH_TO_FIGURES, exist_ok=True)
 
-DO_ASSERT = True
-DO_EXPENSIVE_ASSERT = False # More expensive assertions
+# Assertion tiers. Each tier includes the checks of the lower tiers.
+# - off:       no check.
+# - cheap:     constant-time checks that protect the correctness of the generated programs (DO_CHEAP_ASSERT).
+# - full:      all the regular checks (DO_ASSERT). This is the default.
+# - expensive: also the checks that traverse large structures (DO_EXPENSIVE_ASSERT).
+ASSERT_TIER_OFF       = 0
+ASSERT_TIER_CHEAP     = 1
+ASSERT_TIER_FULL      = 2
+ASSERT_TIER_EXPENSIVE = 3
+ASSERT_TIERS = {
+    'off':       ASSERT_TIER_OFF,
+    'cheap':     ASSERT_TIER_CHEAP,
+    'full':      ASSERT_TIER_FULL,
+    'expensive': ASSERT_TIER_EXPENSIVE,
+}
+ASSERT_TIER_DEFAULT = 'full'
+
+# @brief Reads the assertion tier from the environment variable CASCADE_ASSERT_TIER, formatted as `<tier>[,<module>=<tier>]*`, for example `cheap,memview=full`.
+# The tiers are read when the modules are imported, so that disabled checks cost nothing at runtime.
+# @param module_name the short name of the module, for example memview, pickreg or rvprotoinstrs. If None or not listed, the default tier applies.
+# @return the assertion tier, one of ASSERT_TIERS.values().
+def get_assert_tier(module_name: str = None) -> int:
+    tier_str = ASSERT_TIER_DEFAULT
+    module_tier_strs = dict()
+    for tier_spec in filter(None, map(str.strip, os.environ.get('CASCADE_ASSERT_TIER', '').split(','))):
+        if '=' in tier_spec:
+            curr_module_name, curr_tier_str = map(str.strip, tier_spec.split('=', 1))
+            module_tier_strs[curr_module_name] = curr_tier_str
+        else:
+            tier_str = tier_spec
+    if module_name is not None and module_name in module_tier_strs:
+        tier_str = module_tier_strs[module_name]
+    if tier_str not in ASSERT_TIERS:
+        raise ValueError(f"Unknown assertion tier: `{tier_str}`. Supported tiers: {list(ASSERT_TIERS.keys())}.")
+    return ASSERT_TIERS[tier_str]
+
+# @return the triple (DO_CHEAP_ASSERT, DO_ASSERT, DO_EXPENSIVE_ASSERT) for the given module.
+def get_assert_flags(module_name: str = None):
+    assert_tier = get_assert_tier(module_name)
+    return assert_tier >= ASSERT_TIER_CHEAP, assert_tier >= ASSERT_TIER_FULL, assert_tier >= ASSERT_TIER_EXPENSIVE
+
+DO_CHEAP_ASSERT, DO_ASSERT, DO_EXPENSIVE_ASSERT = get_assert_flags()
 
 NO_REMOVE_TMPFILES = False # Used for debugging purposes.
 
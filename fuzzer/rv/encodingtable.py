@@ -0,0 +1,276 @@
+# Copyright 2023 Flavien Solt, ETH Zurich.
+# Licensed under the General Public License, Version 3.0, see LICENSE for details.
+# SPDX-License-Identifier: GPL-3.0-only
+
+# This module provides a table-driven encoder for the uncompressed instructions.
+# The rv/* encoder functions remain the reference. This module precomputes, for each instruction id, the bits that do not depend on the operands,
+# so that encoding an instruction boils down to a list lookup and a few shifts.
+
+from params.runparams import get_assert_flags
+from rv.util import INSTRUCTION_IDS
+from rv.rv32i import RV32I_OPCODE_LUI, RV32I_OPCODE_AUIPC, RV32I_OPCODE_JAL, RV32I_OPCODE_JALR, RV32I_OPCODE_B, RV32I_OPCODE_L, RV32I_OPCODE_S, RV32I_OPCODE_ALU_IMM, RV32I_OPCODE_ALU_REG, RV32I_OPCODE_FEN, RV32I_OPCODE_E
+from rv.rv64i import RV64I_OPCODE_LWU, RV64I_OPCODE_LD, RV64I_OPCODE_SD, RV64I_OPCODE_ALU_IMM, RV64I_OPCODE_ALU_REG
+from rv.rv32m import RV32M_OPCODE_MUL
+from rv.rv64m import RV64M_OPCODE_MUL
+from rv.rv32f import RV32F_OPCODE_FLW, RV32F_OPCODE_FSW, RV32F_OPCODE_FMADDS, RV32F_OPCODE_FMSUBS, RV32F_OPCODE_FNMSUBS, RV32F_OPCODE_FNMADDS, RV32F_OPCODE_FALU
+from rv.rv32d import RV32D_OPCODE_FLD, RV32D_OPCODE_FSD, RV32D_OPCODE_FMADDD, RV32D_OPCODE_FMSUBD, RV32D_OPCODE_FNMSUBD, RV32D_OPCODE_FNMADDD, RV32D_OPCODE_FALU
+from rv.rv64f import RV64F_OPCODE_FCVT
+from rv.rv64d import RV64D_OPCODE_FCVT
+from rv.zicsr import ZICSR_OPCODE_CSR
+from rv.zifencei import ZIFENCEI_OPCODE_FENCEI
+
+_, DO_ASSERT, _ = get_assert_flags('encodingtable')
+
+ENCODING_FORMAT_R  = 0
+ENCODING_FORMAT_R4 = 1
+ENCODING_FORMAT_I  = 2
+ENCODING_FORMAT_S  = 3
+ENCODING_FORMAT_B  = 4
+ENCODING_FORMAT_U  = 5
+ENCODING_FORMAT_J  = 6
+
+# mnemonic: (format, opcode, funct3, funct7, fixed upper field)
+# - For instructions that take a rounding mode, funct3 is 0 here and the rounding mode is provided at encoding time.
+# - For R4 instructions, funct7 holds funct2, which is located at the same offset.
+# - The fixed upper field starts at bit 20. It is the fixed rs2 field of R instructions (for example for conversions), or the fixed immediate bits of I instructions (for example for srai and fence).
+ENCODING_FIELDS = {
+    # rv32i
+    "lui":       (ENCODING_FORMAT_U,  RV32I_OPCODE_LUI,      0b000, 0b0000000, 0),
+    "auipc":     (ENCODING_FORMAT_U,  RV32I_OPCODE_AUIPC,    0b000, 0b0000000, 0),
+    "jal":       (ENCODING_FORMAT_J,  RV32I_OPCODE_JAL,      0b000, 0b0000000, 0),
+    "jalr":      (ENCODING_FORMAT_I,  RV32I_OPCODE_JALR,     0b000, 0b0000000, 0),
+    "beq":       (ENCODING_FORMAT_B,  RV32I_OPCODE_B,        0b000, 0b0000000, 0),
+    "bne":       (ENCODING_FORMAT_B,  RV32I_OPCODE_B,        0b001, 0b0000000, 0),
+    "blt":       (ENCODING_FORMAT_B,  RV32I_OPCODE_B,        0b100, 0b0000000, 0),
+    "bge":       (ENCODING_FORMAT_B,  RV32I_OPCODE_B,        0b101, 0b0000000, 0),
+    "bltu":      (ENCODING_FORMAT_B,  RV32I_OPCODE_B,        0b110, 0b0000000, 0),
+    "bgeu":      (ENCODING_FORMAT_B,  RV32I_OPCODE_B,        0b111, 0b0000000, 0),
+    "lb":        (ENCODING_FORMAT_I,  RV32I_OPCODE_L,        0b000, 0b0000000, 0),
+    "lh":        (ENCODING_FORMAT_I,  RV32I_OPCODE_L,        0b001, 0b0000000, 0),
+    "lw":        (ENCODING_FORMAT_I,  RV32I_OPCODE_L,        0b010, 0b0000000, 0),
+    "lbu":       (ENCODING_FORMAT_I,  RV32I_OPCODE_L,        0b100, 0b0000000, 0),
+    "lhu":       (ENCODING_FORMAT_I,  RV32I_OPCODE_L,        0b101, 0b0000000, 0),
+    "sb":        (ENCODING_FORMAT_S,  RV32I_OPCODE_S,        0b000, 0b0000000, 0),
+    "sh":        (ENCODING_FORMAT_S,  RV32I_OPCODE_S,        0b001, 0b0000000, 0),
+    "sw":        (ENCODING_FORMAT_S,  RV32I_OPCODE_S,        0b010, 0b0000000, 0),
+    "addi":      (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b000, 0b0000000, 0),
+    "slti":      (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b010, 0b0000000, 0),
+    "sltiu":     (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b011, 0b0000000, 0),
+    "xori":      (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b100, 0b0000000, 0),
+    "ori":       (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b110, 0b0000000, 0),
+    "andi":      (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b111, 0b0000000, 0),
+    "slli":      (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b001, 0b0000000, 0),
+    "srli":      (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b101, 0b0000000, 0),
+    "srai":      (ENCODING_FORMAT_I,  RV32I_OPCODE_ALU_IMM,  0b101, 0b0000000, 0b010000000000),
+    "add":       (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b000, 0b0000000, 0),
+    "sub":       (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b000, 0b0100000, 0),
+    "sll":       (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b001, 0b0000000, 0),
+    "slt":       (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b010, 0b0000000, 0),
+    "sltu":      (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b011, 0b0000000, 0),
+    "xor":       (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b100, 0b0000000, 0),
+    "srl":       (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b101, 0b0000000, 0),
+    "sra":       (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b101, 0b0100000, 0),
+    "or":        (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b110, 0b0000000, 0),
+    "and":       (ENCODING_FORMAT_R,  RV32I_OPCODE_ALU_REG,  0b111, 0b0000000, 0),
+    "fence":     (ENCODING_FORMAT_I,  RV32I_OPCODE_FEN,      0b000, 0b0000000, 0b000011111111),
+    "ecall":     (ENCODING_FORMAT_I,  RV32I_OPCODE_E,        0b000, 0b0000000, 0),
+    "ebreak":    (ENCODING_FORMAT_I,  RV32I_OPCODE_E,        0b000, 0b0000000, 1),
+    # rv64i
+    "lwu":       (ENCODING_FORMAT_I,  RV64I_OPCODE_LWU,      0b110, 0b0000000, 0),
+    "ld":        (ENCODING_FORMAT_I,  RV64I_OPCODE_LD,       0b011, 0b0000000, 0),
+    "sd":        (ENCODING_FORMAT_S,  RV64I_OPCODE_SD,       0b011, 0b0000000, 0),
+    "addiw":     (ENCODING_FORMAT_I,  RV64I_OPCODE_ALU_IMM,  0b000, 0b0000000, 0),
+    "slliw":     (ENCODING_FORMAT_I,  RV64I_OPCODE_ALU_IMM,  0b001, 0b0000000, 0),
+    "srliw":     (ENCODING_FORMAT_I,  RV64I_OPCODE_ALU_IMM,  0b101, 0b0000000, 0),
+    "sraiw":     (ENCODING_FORMAT_I,  RV64I_OPCODE_ALU_IMM,  0b101, 0b0000000, 0b010000000000),
+    "addw":      (ENCODING_FORMAT_R,  RV64I_OPCODE_ALU_REG,  0b000, 0b0000000, 0),
+    "subw":      (ENCODING_FORMAT_R,  RV64I_OPCODE_ALU_REG,  0b000, 0b0100000, 0),
+    "sllw":      (ENCODING_FORMAT_R,  RV64I_OPCODE_ALU_REG,  0b001, 0b0000000, 0),
+    "srlw":      (ENCODING_FORMAT_R,  RV64I_OPCODE_ALU_REG,  0b101, 0b0000000, 0),
+    "sraw":      (ENCODING_FORMAT_R,  RV64I_OPCODE_ALU_REG,  0b101, 0b0100000, 0),
+    # zifencei
+    "fence.i":   (ENCODING_FORMAT_I,  ZIFENCEI_OPCODE_FENCEI, 0b001, 0b0000000, 0),
+    # zicsr
+    "csrrw":     (ENCODING_FORMAT_I,  ZICSR_OPCODE_CSR,      0b001, 0b0000000, 0),
+    "csrrs":     (ENCODING_FORMAT_I,  ZICSR_OPCODE_CSR,      0b010, 0b0000000, 0),
+    "csrrc":     (ENCODING_FORMAT_I,  ZICSR_OPCODE_CSR,      0b011, 0b0000000, 0),
+    "csrrwi":    (ENCODING_FORMAT_I,  ZICSR_OPCODE_CSR,      0b101, 0b0000000, 0),
+    "csrrsi":    (ENCODING_FORMAT_I,  ZICSR_OPCODE_CSR,      0b110, 0b0000000, 0),
+    "csrrci":    (ENCODING_FORMAT_I,  ZICSR_OPCODE_CSR,      0b111, 0b0000000, 0),
+    # rv32m
+    "mul":       (ENCODING_FORMAT_R,  RV32M_OPCODE_MUL,      0b000, 0b0000001, 0),
+    "mulh":      (ENCODING_FORMAT_R,  RV32M_OPCODE_MUL,      0b001, 0b0000001, 0),
+    "mulhsu":    (ENCODING_FORMAT_R,  RV32M_OPCODE_MUL,      0b010, 0b0000001, 0),
+    "mulhu":     (ENCODING_FORMAT_R,  RV32M_OPCODE_MUL,      0b011, 0b0000001, 0),
+    "div":       (ENCODING_FORMAT_R,  RV32M_OPCODE_MUL,      0b100, 0b0000001, 0),
+    "divu":      (ENCODING_FORMAT_R,  RV32M_OPCODE_MUL,      0b101, 0b0000001, 0),
+    "rem":       (ENCODING_FORMAT_R,  RV32M_OPCODE_MUL,      0b110, 0b0000001, 0),
+    "remu":      (ENCODING_FORMAT_R,  RV32M_OPCODE_MUL,      0b111, 0b0000001, 0),
+    # rv64m
+    "mulw":      (ENCODING_FORMAT_R,  RV64M_OPCODE_MUL,      0b000, 0b0000001, 0),
+    "divw":      (ENCODING_FORMAT_R,  RV64M_OPCODE_MUL,      0b100, 0b0000001, 0),
+    "divuw":     (ENCODING_FORMAT_R,  RV64M_OPCODE_MUL,      0b101, 0b0000001, 0),
+    "remw":      (ENCODING_FORMAT_R,  RV64M_OPCODE_MUL,      0b110, 0b0000001, 0),
+    "remuw":     (ENCODING_FORMAT_R,  RV64M_OPCODE_MUL,      0b111, 0b0000001, 0),
+    # rv32f
+    "flw":       (ENCODING_FORMAT_I,  RV32F_OPCODE_FLW,      0b010, 0b0000000, 0),
+    "fsw":       (ENCODING_FORMAT_S,  RV32F_OPCODE_FSW,      0b010, 0b0000000, 0),
+    "fmadd.s":   (ENCODING_FORMAT_R4, RV32F_OPCODE_FMADDS,   0b000, 0b00,      0),
+    "fmsub.s":   (ENCODING_FORMAT_R4, RV32F_OPCODE_FMSUBS,   0b000, 0b00,      0),
+    "fnmsub.s":  (ENCODING_FORMAT_R4, RV32F_OPCODE_FNMSUBS,  0b000, 0b00,      0),
+    "fnmadd.s":  (ENCODING_FORMAT_R4, RV32F_OPCODE_FNMADDS,  0b000, 0b00,      0),
+    "fadd.s":    (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b0000000, 0),
+    "fsub.s":    (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b0000100, 0),
+    "fmul.s":    (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b0001000, 0),
+    "fdiv.s":    (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b0001100, 0),
+    "fsqrt.s":   (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b0101100, 0),
+    "fsgnj.s":   (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b0010000, 0),
+    "fsgnjn.s":  (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b001, 0b0010000, 0),
+    "fsgnjx.s":  (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b010, 0b0010000, 0),
+    "fmin.s":    (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b0010100, 0),
+    "fmax.s":    (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b001, 0b0010100, 0),
+    "fcvt.w.s":  (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b1100000, 0b00000),
+    "fcvt.wu.s": (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b1100000, 0b00001),
+    "fmv.x.w":   (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b1110000, 0),
+    "feq.s":     (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b010, 0b1010000, 0),
+    "flt.s":     (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b001, 0b1010000, 0),
+    "fle.s":     (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b1010000, 0),
+    "fclass.s":  (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b001, 0b1110000, 0),
+    "fcvt.s.w":  (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b1101000, 0b00000),
+    "fcvt.s.wu": (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b1101000, 0b00001),
+    "fmv.w.x":   (ENCODING_FORMAT_R,  RV32F_OPCODE_FALU,     0b000, 0b1111000, 0),
+    # rv64f
+    "fcvt.l.s":  (ENCODING_FORMAT_R,  RV64F_OPCODE_FCVT,     0b000, 0b1100000, 0b00010),
+    "fcvt.lu.s": (ENCODING_FORMAT_R,  RV64F_OPCODE_FCVT,     0b000, 0b1100000, 0b00011),
+    "fcvt.s.l":  (ENCODING_FORMAT_R,  RV64F_OPCODE_FCVT,     0b000, 0b1101000, 0b00010),
+    "fcvt.s.lu": (ENCODING_FORMAT_R,  RV64F_OPCODE_FCVT,     0b000, 0b1101000, 0b00011),
+    # rv32d
+    "fld":       (ENCODING_FORMAT_I,  RV32D_OPCODE_FLD,      0b011, 0b0000000, 0),
+    "fsd":       (ENCODING_FORMAT_S,  RV32D_OPCODE_FSD,      0b011, 0b0000000, 0),
+    "fmadd.d":   (ENCODING_FORMAT_R4, RV32D_OPCODE_FMADDD,   0b000, 0b01,      0),
+    "fmsub.d":   (ENCODING_FORMAT_R4, RV32D_OPCODE_FMSUBD,   0b000, 0b01,      0),
+    "fnmsub.d":  (ENCODING_FORMAT_R4, RV32D_OPCODE_FNMSUBD,  0b000, 0b01,      0),
+    "fnmadd.d":  (ENCODING_FORMAT_R4, RV32D_OPCODE_FNMADDD,  0b000, 0b01,      0),
+    "fadd.d":    (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0000001, 0),
+    "fsub.d":    (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0000101, 0),
+    "fmul.d":    (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0001001, 0),
+    "fdiv.d":    (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0001101, 0),
+    "fsqrt.d":   (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0101101, 0),
+    "fsgnj.d":   (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0010001, 0),
+    "fsgnjn.d":  (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b001, 0b0010001, 0),
+    "fsgnjx.d":  (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b010, 0b0010001, 0),
+    "fmin.d":    (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0010101, 0),
+    "fmax.d":    (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b001, 0b0010101, 0),
+    "fcvt.s.d":  (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0100000, 0b00001),
+    "fcvt.d.s":  (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b0100001, 0b00000),
+    "feq.d":     (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b010, 0b1010001, 0),
+    "flt.d":     (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b001, 0b1010001, 0),
+    "fle.d":     (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b1010001, 0),
+    "fclass.d":  (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b001, 0b1110001, 0),
+    "fcvt.w.d":  (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b1100001, 0b00000),
+    "fcvt.wu.d": (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b1100001, 0b00001),
+    "fcvt.d.w":  (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b1101001, 0b00000),
+    "fcvt.d.wu": (ENCODING_FORMAT_R,  RV32D_OPCODE_FALU,     0b000, 0b1101001, 0b00001),
+    # rv64d
+    "fcvt.l.d":  (ENCODING_FORMAT_R,  RV64D_OPCODE_FCVT,     0b000, 0b1100001, 0b00010),
+    "fcvt.lu.d": (ENCODING_FORMAT_R,  RV64D_OPCODE_FCVT,     0b000, 0b1100001, 0b00011),
+    "fmv.x.d":   (ENCODING_FORMAT_R,  RV64D_OPCODE_FCVT,     0b000, 0b1110001, 0b00000),
+    "fcvt.d.l":  (ENCODING_FORMAT_R,  RV64D_OPCODE_FCVT,     0b000, 0b1101001, 0b00010),
+    "fcvt.d.lu": (ENCODING_FORMAT_R,  RV64D_OPCODE_FCVT,     0b000, 0b1101001, 0b00011),
+    "fmv.d.x":   (ENCODING_FORMAT_R,  RV64D_OPCODE_FCVT,     0b000, 0b1111001, 0b00000),
+}
+
+# Indexed by instruction id. None for the instructions that have no table entry (atomics and compressed instructions).
+ENCODING_FORMATS = [None] * len(INSTRUCTION_IDS)
+ENCODING_BASES   = [None] * len(INSTRUCTION_IDS)
+for __mnemo, (__format, __opcode, __funct3, __funct7, __fixed_upper) in ENCODING_FIELDS.items():
+    if DO_ASSERT:
+        assert 0 <= __opcode < (1 << 7), f"Opcode out of range for `{__mnemo}`."
+        assert 0 <= __funct3 < 8, f"funct3 out of range for `{__mnemo}`."
+        if __format == ENCODING_FORMAT_R:
+            assert 0 <= __funct7 < (1 << 7), f"funct7 out of range for `{__mnemo}`."
+            assert 0 <= __fixed_upper < 32, f"Fixed rs2 out of range for `{__mnemo}`."
+        elif __format == ENCODING_FORMAT_R4:
+            assert 0 <= __funct7 < (1 << 2), f"funct2 out of range for `{__mnemo}`."
+            assert __fixed_upper == 0, f"Unexpected fixed upper field for `{__mnemo}`."
+        elif __format == ENCODING_FORMAT_I:
+            assert __funct7 == 0, f"Unexpected funct7 for `{__mnemo}`."
+            assert 0 <= __fixed_upper < (1 << 12), f"Fixed immediate out of range for `{__mnemo}`."
+        else:
+            assert __format in (ENCODING_FORMAT_S, ENCODING_FORMAT_B, ENCODING_FORMAT_U, ENCODING_FORMAT_J), f"Unexpected format for `{__mnemo}`."
+            assert __funct7 == 0 and __fixed_upper == 0, f"Unexpected funct7 or fixed upper field for `{__mnemo}`."
+    ENCODING_FORMATS[INSTRUCTION_IDS[__mnemo]] = __format
+    ENCODING_BASES[INSTRUCTION_IDS[__mnemo]] = __opcode | (__funct3 << 12) | (__fixed_upper << 20) | (__funct7 << 25)
+
+ENCODING_ID_ADDI = INSTRUCTION_IDS["addi"]
+ENCODING_ID_JAL  = INSTRUCTION_IDS["jal"]
+
+###
+# Encoders
+###
+
+# The encoders below are bit-identical to the instruc_*type functions in rvprotoinstrs.py.
+# Like these, they check the register indices and the rounding modes, but not the immediates, which are masked.
+# They also check that the instruction has the format of the encoder.
+
+# @param rm: the rounding mode, if any. Provided as the funct3 field.
+# @return uint32_t
+def encode_rtype(instr_id: int, rd: int, rs1: int, rs2: int, rm: int = 0):
+    if DO_ASSERT:
+        assert ENCODING_FORMATS[instr_id] == ENCODING_FORMAT_R, f"Instruction id {instr_id} does not have the R format."
+        assert 0 <= rd < 32, f"rd out of range: {rd}"
+        assert 0 <= rs1 < 32, f"rs1 out of range: {rs1}"
+        assert 0 <= rs2 < 32, f"rs2 out of range: {rs2}"
+        assert 0 <= rm < 8, f"Rounding mode out of range: {rm}"
+    return ENCODING_BASES[instr_id] | (rd << 7) | (rm << 12) | (rs1 << 15) | (rs2 << 20)
+
+# @return uint32_t
+def encode_r4type(instr_id: int, rd: int, rs1: int, rs2: int, rs3: int, rm: int):
+    if DO_ASSERT:
+        assert ENCODING_FORMATS[instr_id] == ENCODING_FORMAT_R4, f"Instruction id {instr_id} does not have the R4 format."
+        assert 0 <= rd < 32, f"rd out of range: {rd}"
+        assert 0 <= rs1 < 32, f"rs1 out of range: {rs1}"
+        assert 0 <= rs2 < 32, f"rs2 out of range: {rs2}"
+        assert 0 <= rs3 < 32, f"rs3 out of range: {rs3}"
+        assert 0 <= rm < 8, f"Rounding mode out of range: {rm}"
+    return ENCODING_BASES[instr_id] | (rd << 7) | (rm << 12) | (rs1 << 15) | (rs2 << 20) | (rs3 << 27)
+
+# @return uint32_t
+def encode_itype(instr_id: int, rd: int, rs1: int, imm: int):
+    if DO_ASSERT:
+        assert ENCODING_FORMATS[instr_id] == ENCODING_FORMAT_I, f"Instruction id {instr_id} does not have the I format."
+        assert 0 <= rd < 32, f"rd out of range: {rd}"
+        assert 0 <= rs1 < 32, f"rs1 out of range: {rs1}"
+    return ENCODING_BASES[instr_id] | (rd << 7) | (rs1 << 15) | ((imm & 0xfff) << 20)
+
+# @return uint32_t
+def encode_stype(instr_id: int, rs1: int, rs2: int, imm: int):
+    if DO_ASSERT:
+        assert ENCODING_FORMATS[instr_id] == ENCODING_FORMAT_S, f"Instruction id {instr_id} does not have the S format."
+        assert 0 <= rs1 < 32, f"rs1 out of range: {rs1}"
+        assert 0 <= rs2 < 32, f"rs2 out of range: {rs2}"
+    return ENCODING_BASES[instr_id] | ((imm & 0x1f) << 7) | (rs1 << 15) | (rs2 << 20) | (((imm >> 5) & 0x7f) << 25)
+
+# @param imm the lsb should be zero (will be ignored).
+# @return uint32_t
+def encode_btype(instr_id: int, rs1: int, rs2: int, imm: int):
+    if DO_ASSERT:
+        assert ENCODING_FORMATS[instr_id] == ENCODING_FORMAT_B, f"Instruction id {instr_id} does not have the B format."
+        assert 0 <= rs1 < 32, f"rs1 out of range: {rs1}"
+        assert 0 <= rs2 < 32, f"rs2 out of range: {rs2}"
+    return ENCODING_BASES[instr_id] | (((imm >> 11) & 0x1) << 7) | (((imm >> 1) & 0xf) << 8) | (rs1 << 15) | (rs2 << 20) | (((imm >> 5) & 0x3f) << 25) | (((imm >> 12) & 0x1) << 31)
+
+# @return uint32_t
+def encode_utype(instr_id: int, rd: int, imm: int):
+    if DO_ASSERT:
+        assert ENCODING_FORMATS[instr_id] == ENCODING_FORMAT_U, f"Instruction id {instr_id} does not have the U format."
+        assert 0 <= rd < 32, f"rd out of range: {rd}"
+    return ENCODING_BASES[instr_id] | (rd << 7) | ((imm & 0xfffff) << 12)
+
+# @param imm the lsb should be zero (will be ignored).
+# @return uint32_t
+def encode_jtype(instr_id: int, rd: int, imm: int):
+    if DO_ASSERT:
+        assert ENCODING_FORMATS[instr_id] == ENCODING_FORMAT_J, f"Instruction id {instr_id} does not have the J format."
+        assert 0 <= rd < 32, f"rd out of range: {rd}"
+    return ENCODING_BASES[instr_id] | (rd << 7) | (((imm >> 12) & 0xff) << 12) | (((imm >> 11) & 0x1) << 20) | (((imm >> 1) & 0x3ff) << 21) | (((imm >> 20) & 0x1) << 31)
@@ -2,7 +2,9 @@
 # Licensed under the General Public License, Version 3.0, see LICENSE for details.
 # SPDX-License-Identifier: GPL-3.0-only
 
-from params.runparams import DO_ASSERT
+from params.runparams import get_assert_flags
+
+_, DO_ASSERT, _ = get_assert_flags('rvprotoinstrs')
 
 # @return uint32_t
 # @param opcode: uint8_t
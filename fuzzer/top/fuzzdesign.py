@@ -6,36 +6,20 @@
 
 from common.spike import calibrate_spikespeed
 from common.profiledesign import profile_get_medeleg_mask
+from common.scheduler import run_campaign
 from cascade.fuzzfromdescriptor import gen_new_test_instance, fuzz_single_from_descriptor
-
-import time
-import threading
-
-callback_lock = threading.Lock()
-newly_finished_tests = 0
-curr_round_id = 0
-all_times_to_detection = []
-
-def test_done_callback(arg):
-    global newly_finished_tests
-    global callback_lock
-    global curr_round_id
-    global all_times_to_detection
-    with callback_lock:
-        newly_finished_tests += 1
-
-def fuzzdesign(design_name: str, num_cores: int, seed_offset: int, can_authorize_privileges: bool):
-    global newly_finished_tests
-    global callback_lock
-    global all_times_to_detection
-    global curr_round_id
-
-    newly_finished_tests = 0
-    curr_round_id = 0
-    all_times_to_detection = []
-
-    import multiprocessing as mp
-
+from cascade.designprofile import get_design_profile, install_design_profiles
+from cascade.basicblock import get_bbgen_retry_stats
+
+# @brief fuzz_single_from_descriptor returns None on timeout and zero times on failure.
+def _is_failed_instance(gathered_times) -> bool:
+    return gathered_times is None or gathered_times == (0, 0, 0, 0)
+
+# @param max_num_instances if not None, stop after this number of instances. Else, fuzz until interrupted.
+# @param time_limit_seconds if not None, stop after this wall time.
+# @param stop_on_first_failure if True, stop at the first failing instance.
+# @return a CampaignStats object
+def fuzzdesign(design_name: str, num_cores: int, seed_offset: int, can_authorize_privileges: bool, max_num_instances: int = None, time_limit_seconds: float = None, stop_on_first_failure: bool = False):
     num_workers = num_cores
     assert num_workers > 0
 
@@ -43,27 +27,11 @@ def fuzzdesign(design_name: str, num_cores: int, seed_offset: int, can_authorize
     profile_get_medeleg_mask(design_name)
     print(f"Starting parallel testing of `{design_name}` on {num_workers} processes.")
 
-    newly_finished_tests = 0
-    pool = mp.Pool(processes=num_workers)
-    process_instance_id = seed_offset
-    # First, apply the function to all the workers.
-    for _ in range(num_workers):
+    def gen_instance_args(process_instance_id: int):
         memsize, _, _, num_bbs, authorize_privileges = gen_new_test_instance(design_name, process_instance_id, can_authorize_privileges)
-        pool.apply_async(fuzz_single_from_descriptor, args=(memsize, design_name, process_instance_id, num_bbs, authorize_privileges, None, True), callback=test_done_callback)
-        process_instance_id += 1
-
-    while True:
-        time.sleep(2)
-        # Check whether we received new coverage paths
-        with callback_lock:
-            if newly_finished_tests > 0:
-                for _ in range(newly_finished_tests):
-                    memsize, _, _, num_bbs, authorize_privileges = gen_new_test_instance(design_name, process_instance_id, can_authorize_privileges)
-                    pool.apply_async(fuzz_single_from_descriptor, args=(memsize, design_name, process_instance_id, num_bbs, authorize_privileges, None, True), callback=test_done_callback)
-                    process_instance_id += 1
-                newly_finished_tests = 0
+        return memsize, design_name, process_instance_id, num_bbs, authorize_privileges, None, True
 
-    # This code should never be reached.
-    # Kill all remaining processes
-    pool.close()
-    pool.terminate()
+    # The workers receive the design profile ready-built, and report the retries of the program generation.
+    campaign_stats = run_campaign(fuzz_single_from_descriptor, gen_instance_args, num_workers, seed_offset, max_num_instances, time_limit_seconds, _is_failed_instance, stop_on_first_failure, initializer=install_design_profiles, initargs=([get_design_profile(design_name)],), get_worker_stats=get_bbgen_retry_stats)
+    print(campaign_stats)
+    return campaign_stats
@@ -8,27 +8,12 @@ from params.runparams import PATH_TO_TMP, PATH_TO_FIGURES
 from common.timeout import timeout
 from common.profiledesign import profile_get_medeleg_mask
 from common.spike import calibrate_spikespeed
+from common.scheduler import run_campaign, CAMPAIGN_STOP_FAILURE
 from cascade.fuzzfromdescriptor import gen_new_test_instance, run_rtl
+from cascade.designprofile import get_design_profile, install_design_profiles
 
-import threading
 import time
 
-callback_lock = threading.Lock()
-newly_finished_tests = 0
-curr_round_id = 0
-all_times_to_detection = []
-
-def bug_detection_callback(ret):
-    global newly_finished_tests
-    global callback_lock
-    global curr_round_id
-    global all_times_to_detection
-    with callback_lock:
-        newly_finished_tests += 1
-        if ret is not None:
-            if len(all_times_to_detection) <= curr_round_id:
-                all_times_to_detection.append(ret)
-
 @timeout(seconds=60*60*2)
 def run_rtl_single_for_timebugdetection(memsize: int, design_name: str, randseed: int, nmax_bbs: int, start_time: float, authorize_privileges: bool, nmax_instructions: int, nodependencybias: bool):
     assert type(nmax_instructions) == int or nmax_instructions is None, f"nmax_instructions must be an integer or None, but its type is {type(nmax_instructions)}"
@@ -50,17 +35,6 @@ def measure_time_to_bug(design_name: str, num_cores: int, num_reps: int, nmax_in
     assert type(nmax_instructions) == int or nmax_instructions is None, f"nmax_instructions must be an integer or None, but its type is {type(nmax_instructions)}"
     assert type(nodependencybias) == bool, f"nodependencybias must be a boolean, but its type is {type(nodependencybias)}"
 
-    global newly_finished_tests
-    global callback_lock
-    global all_times_to_detection
-    global curr_round_id
-
-    newly_finished_tests = 0
-    all_times_to_detection = []
-    curr_round_id = 0
-
-    import multiprocessing as mp
-
     num_workers = num_cores
     assert num_workers > 0
 
@@ -71,63 +45,28 @@ def measure_time_to_bug(design_name: str, num_cores: int, num_reps: int, nmax_in
 
     assert num_reps > 0, "num_reps must be > 0, may it be for bug detection timing or just normal fuzzing"
 
+    all_times_to_detection = []
     for global_iter_id in range(num_reps):
-        exit_global_loop = False
-        # print(f"Starting global iteration {global_iter_id}.")
-
-        newly_finished_tests = 0
-        exit_curr_global_rep = False
-
         start_time = time.time()
 
-        pool = mp.Pool(processes=num_workers)
-        process_instance_id = 0
-        # First, apply the function to all the workers. We do not use map because some instances, rarely, seem to be stuck if there are bugs in some of the EDA tools.
-        for process_id in range(num_workers):
+        def gen_instance_args(process_instance_id: int):
             memsize, _, _, num_bbs, authorize_privileges = gen_new_test_instance(design_name, process_instance_id, True)
             if nmax_instructions is not None:
                 num_bbs = 10000
-            pool.apply_async(run_rtl_single_for_timebugdetection, args=(memsize, design_name, process_instance_id+50000*global_iter_id, num_bbs, start_time, authorize_privileges, nmax_instructions, nodependencybias), callback=bug_detection_callback)
-            process_instance_id += 1
-
-        while not exit_curr_global_rep:
-            time.sleep(2)
-            # Check whether we received new coverage paths
-            with callback_lock:
-                if newly_finished_tests > 0:
-                    assert len(all_times_to_detection) <= curr_round_id + 1
-                    if len(all_times_to_detection) == curr_round_id + 1 or (time_limit_seconds is not None and time.time() - start_time > time_limit_seconds):
-                        # # If the detection failed, do not try again
-                        # if len(all_times_to_detection) <= curr_round_id:
-                        #     exit_global_loop = True
-                        #     print("Did not find. Abandoning this scenario.")
-                        exit_curr_global_rep = True
-                        curr_round_id += 1
-                        print(f"Curr all times to detection: [{' '.join(map(lambda x: f'{x:2f}', all_times_to_detection))}]")
-                        break
-
-                    for new_process_id in range(newly_finished_tests):
-                        memsize, _, _, num_bbs, authorize_privileges = gen_new_test_instance(design_name, process_instance_id, True)
-                        if nmax_instructions is not None:
-                            num_bbs = 10000
-                        pool.apply_async(run_rtl_single_for_timebugdetection, args=(memsize, design_name, process_instance_id+50000*global_iter_id, num_bbs, start_time, authorize_privileges, nmax_instructions, nodependencybias), callback=bug_detection_callback)
-                        process_instance_id += 1
-                    newly_finished_tests = 0
-
-        if exit_global_loop:
-            break
-
-        # This code is only reached if we are measuring the time to bug detection
-        pool.close()
-        pool.terminate()
-
-    # This code is only reached if we are measuring the time to bug detection
+            return memsize, design_name, process_instance_id+50000*global_iter_id, num_bbs, start_time, authorize_privileges, nmax_instructions, nodependencybias
+
+        # run_rtl_single_for_timebugdetection returns the time to detection if it detected a bug, else None.
+        campaign_stats = run_campaign(run_rtl_single_for_timebugdetection, gen_instance_args, num_workers, 0, None, time_limit_seconds, lambda ret: ret is not None, True, initializer=install_design_profiles, initargs=([get_design_profile(design_name)],))
+        if campaign_stats.stop_reason == CAMPAIGN_STOP_FAILURE and campaign_stats.first_failure[1] is not None:
+            all_times_to_detection.append(campaign_stats.first_failure[1])
+        else:
+            # The time limit was reached before any detection.
+            all_times_to_detection.append(None)
+        print(f"Curr all times to detection: [{' '.join(map(lambda x: f'{x:2f}' if x is not None else 'None', all_times_to_detection))}]")
+
     print(f"Times to bug detection (seconds): {all_times_to_detection}")
-    if len(all_times_to_detection) < curr_round_id:
+    if None in all_times_to_detection:
         print(f"WARNING: The time to bug detection was not measured for all the rounds. This is likely due to a timeout that we set to cap the duration dedicated to bug detection.")
-        # Fill the rest of times to detection with None
-        for _ in range(curr_round_id - len(all_times_to_detection)):
-            all_times_to_detection.append(None)
 
     return all_times_to_detection
 